@@ -4,12 +4,41 @@
 Advisor Scoring System - Win/Loss tracking and voting weight management
 """
 import json
+from bisect import bisect_right
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 import os
 
+import numpy as np
+
+try:
+    import yfinance as yf
+    YFINANCE_OK = True
+except ImportError:
+    YFINANCE_OK = False
+
 SCORING_FILE = 'advisor_scoring.json'
 
+# Automatic evaluation
+DIRECTION_SIGN = {
+    'up': 1, 'buy': 1,
+    'down': -1, 'sell': -1, 'reduce_exposure': -1,
+    'hold': 0
+}
+HOLD_BAND = 0.05          # |return| below 5% validates a 'hold' call
+MAGNITUDE_FULL_MOVE = 0.10  # A 10% move in the predicted direction earns full magnitude credit
+BASELINE_BRIER = 0.25     # Brier score of an uninformed 50% forecast
+
+# Asset aliases used in predictions -> Yahoo Finance symbols
+ASSET_SYMBOLS = {
+    'S&P500': '^GSPC', 'SP500': '^GSPC', 'NASDAQ': '^IXIC', 'WIG20': 'WIG20.WA',
+    'KGHM': 'KGH.WA', 'GOLD': 'GC=F'
+}
+CRYPTO_ASSETS = {'BTC', 'ETH', 'SOL', 'BNB', 'XRP', 'ADA', 'DOT', 'ATOM', 'DOGE', 'AVAX', 'LINK'}
+
+# Composite skill used by calculate_new_weights (sums to 1.0)
+SKILL_WEIGHTS = {'accuracy': 0.5, 'calibration': 0.3, 'magnitude': 0.2}
+
 def load_scoring_data() -> Dict:
     """Load scoring data from JSON file"""
     if not os.path.exists(SCORING_FILE):
@@ -94,6 +123,32 @@ def add_prediction(
     
     return prediction_id
 
+def _record_evaluation(advisor_data: Dict, pred: Dict, was_correct: bool, outcome_notes: str = "") -> None:
+    """Mark a prediction evaluated and update advisor win/loss stats (in memory)"""
+    pred['status'] = 'evaluated'
+    pred['was_correct'] = was_correct
+    pred['outcome'] = outcome_notes
+    pred['evaluation_date'] = datetime.now().strftime("%Y-%m-%d")
+    
+    advisor_data['pending_predictions'] -= 1
+    advisor_data['total_predictions'] += 1
+    
+    if was_correct:
+        advisor_data['correct_predictions'] += 1
+    else:
+        advisor_data['incorrect_predictions'] += 1
+    
+    # Recalculate accuracy
+    if advisor_data['total_predictions'] > 0:
+        advisor_data['accuracy_rate'] = (
+            advisor_data['correct_predictions'] / advisor_data['total_predictions']
+        )
+    
+    # Update confidence average
+    confidences = [p['confidence'] for p in advisor_data['predictions'] if p['status'] == 'evaluated']
+    if confidences:
+        advisor_data['confidence_avg'] = sum(confidences) / len(confidences)
+
 def evaluate_prediction(prediction_id: str, was_correct: bool, outcome_notes: str = "") -> None:
     """
     Evaluate a prediction and update advisor stats
@@ -117,32 +172,7 @@ def evaluate_prediction(prediction_id: str, was_correct: bool, outcome_notes: st
                     print(f"⚠️ Prediction {prediction_id} already evaluated: {pred['status']}")
                     return
                 
-                # Update prediction
-                pred['status'] = 'evaluated'
-                pred['was_correct'] = was_correct
-                pred['outcome'] = outcome_notes
-                pred['evaluation_date'] = datetime.now().strftime("%Y-%m-%d")
-                
-                # Update advisor stats
-                advisor_data['pending_predictions'] -= 1
-                advisor_data['total_predictions'] += 1
-                
-                if was_correct:
-                    advisor_data['correct_predictions'] += 1
-                else:
-                    advisor_data['incorrect_predictions'] += 1
-                
-                # Recalculate accuracy
-                if advisor_data['total_predictions'] > 0:
-                    advisor_data['accuracy_rate'] = (
-                        advisor_data['correct_predictions'] / advisor_data['total_predictions']
-                    )
-                
-                # Update confidence average
-                confidences = [p['confidence'] for p in advisor_data['predictions'] if p['status'] == 'evaluated']
-                if confidences:
-                    advisor_data['confidence_avg'] = sum(confidences) / len(confidences)
-                
+                _record_evaluation(advisor_data, pred, was_correct, outcome_notes)
                 found = True
                 
                 print(f"{'✅' if was_correct else '❌'} Prediction evaluated: {prediction_id}")
@@ -162,14 +192,230 @@ def evaluate_prediction(prediction_id: str, was_correct: bool, outcome_notes: st
     
     save_scoring_data(data)
 
-def calculate_new_weights() -> Dict[str, float]:
+def build_due_index(data: Dict) -> List[Tuple[str, str, int]]:
+    """
+    Date index of pending predictions: sorted (date_evaluate, advisor, position)
+    
+    Due predictions are a prefix of the index - found with one bisect instead of
+    scanning every advisor's prediction list.
+    """
+    index = []
+    for advisor_name, advisor_data in data['advisors'].items():
+        if advisor_data['type'] == 'human':
+            continue
+        for i, pred in enumerate(advisor_data.get('predictions', [])):
+            if pred.get('status') == 'pending' and pred.get('date_evaluate'):
+                index.append((pred['date_evaluate'], advisor_name, i))
+    index.sort()
+    return index
+
+def due_predictions(index: List[Tuple[str, str, int]], today: Optional[str] = None) -> List[Tuple[str, str, int]]:
+    """Entries of build_due_index with date_evaluate <= today (YYYY-MM-DD)"""
+    today = today or datetime.now().strftime("%Y-%m-%d")
+    return index[:bisect_right(index, (today, chr(0x10FFFF)))]
+
+def asset_symbol(pred: Dict) -> str:
+    """Yahoo Finance symbol for a prediction's asset (metadata['yf_symbol'] overrides)"""
+    override = (pred.get('metadata') or {}).get('yf_symbol')
+    if override:
+        return override
+    asset = (pred.get('asset') or '').strip().upper()
+    if asset in ASSET_SYMBOLS:
+        return ASSET_SYMBOLS[asset]
+    if asset in CRYPTO_ASSETS:
+        return f"{asset}-USD"
+    return asset.replace('_US_EQ', '').replace('_EQ', '')
+
+def fetch_price_histories(symbols: List[str], start: str, end: Optional[str] = None):
+    """
+    Daily closes for all symbols in ONE yfinance request
+    
+    Returns:
+        pandas.DataFrame (index: dates, columns: symbols) or None
+    """
+    symbols = sorted(set(s for s in symbols if s))
+    if not symbols or not YFINANCE_OK:
+        return None
+    
+    end_date = datetime.strptime(end, "%Y-%m-%d") if end else datetime.now()
+    try:
+        data = yf.download(symbols, start=start, end=(end_date + timedelta(days=1)).strftime("%Y-%m-%d"),
+                           progress=False, auto_adjust=False, threads=True)
+    except Exception as e:
+        print(f"⚠️ Price history download failed: {e}")
+        return None
+    if data is None or data.empty or 'Close' not in data:
+        return None
+    
+    close = data['Close']
+    if not hasattr(close, 'columns'):
+        close = close.to_frame(name=symbols[0])
+    return close
+
+def _close_on_or_before(histories, symbol: str, date: str) -> Optional[float]:
+    """Last close at or before a date (markets closed on weekends/holidays)"""
+    if histories is None or symbol not in histories.columns:
+        return None
+    series = histories[symbol].dropna()
+    series = series[series.index <= date]
+    if series.empty:
+        return None
+    return float(series.iloc[-1])
+
+def score_predictions(start_prices, end_prices, signs, confidences, targets=None) -> Dict[str, np.ndarray]:
+    """
+    Direction, magnitude and calibration scores for many predictions at once
+    
+    Args:
+        start_prices / end_prices: price at prediction and at due date
+        signs: +1 (up/buy), -1 (down/sell), 0 (hold)
+        confidences: stated confidence 0-1
+        targets: optional target prices (NaN where missing)
+    
+    Returns:
+        dict of arrays: returns, correct, magnitude (-1..1), brier (0..1)
+    """
+    p0 = np.asarray(start_prices, dtype=float)
+    p1 = np.asarray(end_prices, dtype=float)
+    sign = np.asarray(signs, dtype=float)
+    conf = np.clip(np.asarray(confidences, dtype=float), 0.0, 1.0)
+    
+    returns = p1 / p0 - 1
+    correct = np.where(sign == 0, np.abs(returns) < HOLD_BAND, np.sign(returns) == sign)
+    
+    # Magnitude: signed move in the predicted direction; for 'hold' - how well the price stayed put
+    magnitude = np.where(
+        sign == 0,
+        1 - np.abs(returns) / HOLD_BAND,
+        sign * returns / MAGNITUDE_FULL_MOVE
+    )
+    if targets is not None:
+        target = np.asarray(targets, dtype=float)
+        has_target = ~np.isnan(target) & (target != p0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            target_hit = 1 - np.abs(p1 - target) / np.abs(target - p0)
+        magnitude = np.where(has_target, target_hit, magnitude)
+    magnitude = np.clip(magnitude, -1.0, 1.0)
+    
+    brier = (conf - correct.astype(float)) ** 2
+    return {'returns': returns, 'correct': correct, 'magnitude': magnitude, 'brier': brier}
+
+def _record_scores(advisor_data: Dict, magnitude: float, brier: float) -> None:
+    """Running calibration/magnitude averages over automatically scored predictions"""
+    n = advisor_data.get('scored_predictions', 0)
+    advisor_data['brier_score'] = (advisor_data.get('brier_score', 0.0) * n + brier) / (n + 1)
+    advisor_data['magnitude_avg'] = (advisor_data.get('magnitude_avg', 0.0) * n + magnitude) / (n + 1)
+    advisor_data['scored_predictions'] = n + 1
+
+def evaluate_due_predictions(today: Optional[str] = None, histories=None, rebalance: bool = False,
+                             reason: str = "Monthly rebalancing", dry_run: bool = False) -> Dict:
+    """
+    Evaluate every due prediction in one pass
+    
+    One load of advisor_scoring.json, one batched price download for all assets,
+    vectorized scoring, then (optionally) rebalance_weights on the same data and
+    a single save.
+    
+    Args:
+        today: evaluation date YYYY-MM-DD (default: today)
+        histories: pre-fetched closes (DataFrame, columns = symbols) - default: fetch_price_histories
+        rebalance: run rebalance_weights on the updated stats
+        dry_run: score without saving
+    
+    Returns:
+        Summary dict: evaluated / no_price / unsupported / not_due + per-prediction results
+    """
+    data = load_scoring_data()
+    index = build_due_index(data)
+    due = due_predictions(index, today)
+    summary = {'evaluated': 0, 'no_price': 0, 'unsupported': 0,
+               'not_due': len(index) - len(due), 'results': []}
+    
+    candidates = []
+    for date_evaluate, advisor_name, i in due:
+        pred = data['advisors'][advisor_name]['predictions'][i]
+        direction = (pred.get('prediction_direction') or '').lower()
+        if direction not in DIRECTION_SIGN:
+            summary['unsupported'] += 1  # Needs manual evaluation (e.g. qualitative risk warning)
+            continue
+        candidates.append((advisor_name, pred, asset_symbol(pred), DIRECTION_SIGN[direction]))
+    
+    if candidates and histories is None:
+        start = min(pred['date_created'] for _, pred, _, _ in candidates)
+        start = (datetime.strptime(start, "%Y-%m-%d") - timedelta(days=7)).strftime("%Y-%m-%d")
+        histories = fetch_price_histories([sym for _, _, sym, _ in candidates], start, today)
+    
+    rows = []
+    for advisor_name, pred, symbol, sign in candidates:
+        p0 = pred.get('current_price_at_prediction') or _close_on_or_before(histories, symbol, pred['date_created'])
+        p1 = _close_on_or_before(histories, symbol, pred['date_evaluate'])
+        if not p0 or not p1:
+            summary['no_price'] += 1
+            continue
+        rows.append((advisor_name, pred, p0, p1, sign))
+    
+    if rows:
+        scores = score_predictions(
+            [r[2] for r in rows], [r[3] for r in rows], [r[4] for r in rows],
+            [r[1].get('confidence', 0.5) for r in rows],
+            [r[1].get('target_price') if r[1].get('target_price') is not None else np.nan for r in rows]
+        )
+        for k, (advisor_name, pred, p0, p1, sign) in enumerate(rows):
+            advisor_data = data['advisors'][advisor_name]
+            was_correct = bool(scores['correct'][k])
+            ret = float(scores['returns'][k])
+            pred['current_price_at_prediction'] = p0
+            pred['actual_price_at_evaluation'] = p1
+            pred['return_pct'] = round(ret * 100, 2)
+            pred['magnitude_score'] = round(float(scores['magnitude'][k]), 3)
+            pred['brier_score'] = round(float(scores['brier'][k]), 4)
+            _record_evaluation(advisor_data, pred, was_correct,
+                               f"Auto: {pred['asset']} {p0:.2f} → {p1:.2f} ({ret:+.1%})")
+            _record_scores(advisor_data, float(scores['magnitude'][k]), float(scores['brier'][k]))
+            summary['results'].append({
+                'prediction_id': pred['prediction_id'], 'advisor': advisor_name,
+                'asset': pred['asset'], 'return_pct': pred['return_pct'],
+                'was_correct': was_correct, 'brier': pred['brier_score']
+            })
+        summary['evaluated'] = len(rows)
+    
+    if dry_run:
+        return summary
+    if rebalance:
+        rebalance_weights(reason, data=data)  # Saves once, including the evaluations
+    elif rows:
+        save_scoring_data(data)
+    return summary
+
+def advisor_skill(advisor_data: Dict) -> float:
+    """
+    Performance delta vs. baseline (-0.5..+0.5)
+    
+    Accuracy relative to 50%; once predictions were scored automatically, blended with
+    calibration (Brier vs. uninformed 0.25) and magnitude of the moves called.
+    """
+    accuracy_delta = advisor_data['accuracy_rate'] - 0.5
+    if not advisor_data.get('scored_predictions'):
+        return accuracy_delta
+    
+    calibration_delta = float(np.clip((BASELINE_BRIER - advisor_data['brier_score']) * 2, -0.5, 0.5))
+    magnitude_delta = float(np.clip(advisor_data['magnitude_avg'] * 0.5, -0.5, 0.5))
+    return (SKILL_WEIGHTS['accuracy'] * accuracy_delta +
+            SKILL_WEIGHTS['calibration'] * calibration_delta +
+            SKILL_WEIGHTS['magnitude'] * magnitude_delta)
+
+def calculate_new_weights(data: Dict = None) -> Dict[str, float]:
     """
     Calculate new voting weights based on performance
     
+    Args:
+        data: already loaded scoring data (default: load from file)
+    
     Returns:
         Dict mapping advisor names to new weights
     """
-    data = load_scoring_data()
+    if data is None:
+        data = load_scoring_data()
     base_weight = data['metadata']['base_weight_per_advisor']
     dynamic_pool = data['metadata']['dynamic_pool']
     min_weight = data['metadata']['weight_limits']['min']
@@ -181,13 +427,12 @@ def calculate_new_weights() -> Dict[str, float]:
         if advisor_data['type'] == 'human':
             continue  # Skip human advisors
         
-        accuracy = advisor_data['accuracy_rate']
         total_preds = advisor_data['total_predictions']
         
         # Performance relative to baseline (50%)
         # Only consider if advisor has made at least 3 predictions
         if total_preds >= 3:
-            performance_delta = accuracy - 0.5  # -0.5 to +0.5
+            performance_delta = advisor_skill(advisor_data)  # -0.5 to +0.5
         else:
             performance_delta = 0  # Neutral if too few predictions
         
@@ -223,15 +468,17 @@ def calculate_new_weights() -> Dict[str, float]:
     
     return new_weights
 
-def rebalance_weights(reason: str = "Monthly rebalancing") -> None:
+def rebalance_weights(reason: str = "Monthly rebalancing", data: Dict = None) -> None:
     """
     Perform monthly rebalancing - update all voting weights
     
     Args:
         reason: Reason for rebalancing (logged in history)
+        data: already loaded (e.g. just evaluated) scoring data - saved at the end
     """
-    data = load_scoring_data()
-    new_weights = calculate_new_weights()
+    if data is None:
+        data = load_scoring_data()
+    new_weights = calculate_new_weights(data)
     
     print("\n" + "=" * 60)
     print("📊 MONTHLY REBALANCING - Voting Weights Update")
@@ -258,6 +505,7 @@ def rebalance_weights(reason: str = "Monthly rebalancing") -> None:
             "weight": new_weight,
             "reason": reason,
             "accuracy": advisor_data['accuracy_rate'],
+            "brier_score": advisor_data.get('brier_score'),
             "predictions_evaluated": advisor_data['total_predictions']
         })
         
@@ -380,6 +628,7 @@ if __name__ == "__main__":
         print("  python advisor_scoring_manager.py leaderboard")
         print("  python advisor_scoring_manager.py pending")
         print("  python advisor_scoring_manager.py rebalance")
+        print("  python advisor_scoring_manager.py evaluate_due")
         print("  python advisor_scoring_manager.py add_prediction <advisor> <text> <type> <asset> <direction> <confidence>")
         print("  python advisor_scoring_manager.py evaluate <prediction_id> <correct/incorrect> [notes]")
         sys.exit(1)
@@ -405,9 +654,20 @@ if __name__ == "__main__":
                 print()
     
     elif command == "rebalance":
-        rebalance_weights()
+        # Score everything that came due first, so weights reflect the whole backlog
+        summary = evaluate_due_predictions(rebalance=True)
+        print(f"🔍 Auto-evaluated: {summary['evaluated']} | no price: {summary['no_price']} | "
+              f"manual: {summary['unsupported']} | not due: {summary['not_due']}")
         print_leaderboard()
     
+    elif command == "evaluate_due":
+        summary = evaluate_due_predictions()
+        for r in summary['results']:
+            print(f"{'✅' if r['was_correct'] else '❌'} {r['advisor']}: {r['asset']} "
+                  f"({r['return_pct']:+.2f}%, Brier {r['brier']:.3f})")
+        print(f"\n🔍 Auto-evaluated: {summary['evaluated']} | no price: {summary['no_price']} | "
+              f"manual: {summary['unsupported']} | not due: {summary['not_due']}")
+    
     elif command == "add_prediction":
         if len(sys.argv) < 8:
             print("Error: add_prediction requires: advisor text type asset direction confidence")
@@ -3,13 +3,19 @@ API Usage Tracker - Monitorowanie wykorzystania limitów API
 Zapewnia, że autonomiczne rozmowy używają max 60% dziennego limitu
 """
 
+import atexit
 import json
 import os
-from datetime import datetime, timedelta
-from typing import Dict, Optional
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from usage_ledger import get_usage_ledger
 
 # Ścieżki plików
-USAGE_FILE = "api_usage.json"
+USAGE_FILE = "api_usage.json"  # Migawka dzisiejszego dnia (źródłem prawdy jest api_usage.db)
+HISTORY_FILE = "api_usage_history.json"  # Dawne archiwum - importowane do ledgera
 CONFIG_FILE = "api_limits_config.json"
 
 # Domyślne limity API (możesz edytować w api_limits_config.json)
@@ -33,12 +39,21 @@ DEFAULT_LIMITS = {
 
 
 class APIUsageTracker:
-    """Śledzi wykorzystanie API i egzekwuje limity"""
+    """
+    Śledzi wykorzystanie API i egzekwuje limity
+    
+    Liczniki i historia trzymane są w UsageLedger (SQLite) - atomowe inkrementy,
+    bezpieczne przy równoległych wywołaniach z wielu wątków i procesów.
+    api_usage.json jest tylko migawką dla persistent_storage / sync_data.
+    """
+    
+    SNAPSHOT_INTERVAL_SECONDS = 30  # Jak często odświeżać migawkę api_usage.json
     
     def __init__(self):
         self.config = self._load_config()
-        self.usage = self._load_usage()
-        self._check_daily_reset()
+        self.ledger = get_usage_ledger()
+        self._last_snapshot = 0.0
+        self._import_legacy_usage()
     
     def _load_config(self) -> Dict:
         """Załaduj konfigurację limitów"""
@@ -55,70 +70,74 @@ class APIUsageTracker:
         with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
             json.dump(config, f, indent=2, ensure_ascii=False)
     
-    def _load_usage(self) -> Dict:
-        """Załaduj dzisiejsze wykorzystanie"""
-        if os.path.exists(USAGE_FILE):
-            with open(USAGE_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        else:
-            return self._create_empty_usage()
+    def _import_legacy_usage(self):
+        """Jednorazowo przenieś liczniki z api_usage.json i api_usage_history.json do ledgera"""
+        days = []
+        for path in (HISTORY_FILE, USAGE_FILE):
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                days.extend(data if isinstance(data, list) else [data])
+            except Exception as e:
+                print(f"⚠️ Nie można zaimportować {path}: {e}")
+        
+        for day in days:
+            if day.get("date") and day.get("usage"):
+                self.ledger.import_day(day["date"], day["usage"], day.get("autonomous_conversations_today", 0))
     
-    def _create_empty_usage(self) -> Dict:
-        """Stwórz pustą strukturę usage - dynamicznie z config"""
-        usage_dict = {
-            "date": datetime.now().strftime("%Y-%m-%d"),
-            "usage": {},
-            "autonomous_conversations_today": 0,
-            "total_cost_usd": 0.0
+    @property
+    def usage(self) -> Dict:
+        """Dzisiejsze wykorzystanie w formacie api_usage.json"""
+        day_usage = self.ledger.get_day_usage()
+        usage = {
+            api_name: {"user": 0, "autonomous": 0, "total": 0}
+            for api_name in self.config.keys()
         }
+        usage.update(day_usage)
         
-        # Dodaj wszystkie API z config (dynamicznie)
-        for api_name in self.config.keys():
-            usage_dict["usage"][api_name] = {"user": 0, "autonomous": 0, "total": 0}
-        
-        return usage_dict
-    
-    def _save_usage(self):
-        """Zapisz aktualne wykorzystanie"""
-        with open(USAGE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(self.usage, f, indent=2, ensure_ascii=False)
-    
-    def _check_daily_reset(self):
-        """Sprawdź czy nowy dzień - jeśli tak, zresetuj"""
-        today = datetime.now().strftime("%Y-%m-%d")
-        if self.usage.get("date") != today:
-            # Archiwizuj wczorajsze dane
-            self._archive_yesterday()
-            # Reset na nowy dzień
-            self.usage = self._create_empty_usage()
-            self._save_usage()
-            print(f"📊 API Usage: Nowy dzień - limity zresetowane ({today})")
+        return {
+            "date": datetime.now().strftime("%Y-%m-%d"),
+            "usage": usage,
+            "autonomous_conversations_today": self.ledger.get_autonomous_conversations(),
+            "cache_hits_today": sum(api.get("cache_hits", 0) for api in usage.values()),
+            "total_cost_usd": sum(api.get("cost_usd", 0.0) for api in usage.values()),
+            "latency": self.ledger.get_latency_stats()
+        }
     
-    def _archive_yesterday(self):
-        """Zapisz wczorajsze dane do historii"""
-        archive_file = "api_usage_history.json"
-        history = []
-        
-        if os.path.exists(archive_file):
-            with open(archive_file, 'r', encoding='utf-8') as f:
-                history = json.load(f)
+    def _save_usage(self, force: bool = False):
+        """Odśwież migawkę api_usage.json (najwyżej raz na SNAPSHOT_INTERVAL_SECONDS)"""
+        now = time.time()
+        if not force and now - self._last_snapshot < self.SNAPSHOT_INTERVAL_SECONDS:
+            return
+        self._last_snapshot = now
         
-        history.append(self.usage)
-        
-        # Zachowaj ostatnie 30 dni
-        if len(history) > 30:
-            history = history[-30:]
-        
-        with open(archive_file, 'w', encoding='utf-8') as f:
-            json.dump(history, f, indent=2, ensure_ascii=False)
+        try:
+            tmp_file = f"{USAGE_FILE}.tmp.{os.getpid()}"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.usage, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_file, USAGE_FILE)
+        except Exception:
+            pass  # Streamlit Cloud - read-only filesystem
+    
+    def _autonomous_limit(self, api_name: str) -> int:
+        config = self.config[api_name]
+        return int(config["daily_limit"] * config["autonomous_percentage"] / 100)
     
-    def track_call(self, api_name: str, is_autonomous: bool = False) -> bool:
+    def track_call(self, api_name: str, is_autonomous: bool = False,
+                   latency_ms: Optional[float] = None, partner: Optional[str] = None) -> bool:
         """
         Zarejestruj wywołanie API
         
+        Sprawdzenie limitu i inkrement są jedną transakcją - wywołane PRZED
+        zapytaniem do modelu działa jak atomowa rezerwacja budżetu.
+        
         Args:
             api_name: "claude", "gemini", "gemini_nexus", lub "openai"
             is_autonomous: True jeśli to autonomiczna rozmowa, False jeśli user
+            latency_ms: Czas wywołania (opcjonalnie, do historii)
+            partner: Partner, dla którego wykonano wywołanie (opcjonalnie)
         
         Returns:
             bool: True jeśli wywołanie dozwolone, False jeśli przekroczono limit
@@ -127,42 +146,54 @@ class APIUsageTracker:
             print(f"⚠️ Nieznane API: {api_name}")
             return True  # Nie blokuj nieznanych API
         
-        # SAFE: Upewnij się że API jest w usage (auto-add jeśli nie ma)
-        if api_name not in self.usage["usage"]:
-            self.usage["usage"][api_name] = {"user": 0, "autonomous": 0, "total": 0}
-        
-        # Sprawdź czy można wykonać wywołanie
-        if is_autonomous and not self.can_make_autonomous_call(api_name):
+        allowed = self.ledger.record_call(
+            api_name,
+            is_autonomous=is_autonomous,
+            cost_usd=self.config[api_name]["cost_per_call"],
+            latency_ms=latency_ms,
+            partner=partner,
+            autonomous_limit=self._autonomous_limit(api_name) if is_autonomous else None
+        )
+        if not allowed:
             print(f"🚫 Limit autonomiczny przekroczony dla {api_name}")
             return False
         
-        # Zarejestruj wywołanie
-        if is_autonomous:
-            self.usage["usage"][api_name]["autonomous"] += 1
-        else:
-            self.usage["usage"][api_name]["user"] += 1
-        
-        self.usage["usage"][api_name]["total"] += 1
-        
-        # Aktualizuj koszt
-        cost = self.config[api_name]["cost_per_call"]
-        self.usage["total_cost_usd"] += cost
-        
         self._save_usage()
         return True
     
+    def track_cache_hit(self, api_name: str, is_autonomous: bool = False):
+        """
+        Zarejestruj odpowiedź z cache (koszt 0, nie zużywa limitu)
+        
+        Args:
+            api_name: API które obsłużyłoby wywołanie bez cache
+            is_autonomous: True jeśli to autonomiczna rozmowa
+        """
+        self.ledger.record_cache_hit(api_name, is_autonomous=is_autonomous)
+        self._save_usage()
+    
+    def track_latency(self, api_name: str, latency_ms: Optional[float] = None, ttft_ms: Optional[float] = None):
+        """Zarejestruj pomiar latencji wywołania (bez zmiany liczników)"""
+        self.ledger.record_latency(api_name, ttft_ms=ttft_ms, latency_ms=latency_ms)
+    
+    def track_ttft(self, api_name: str, ttft_ms: float, total_ms: Optional[float] = None):
+        """
+        Zarejestruj czas do pierwszego tokena (TTFT) odpowiedzi strumieniowej
+        
+        Args:
+            api_name: API które obsłużyło wywołanie
+            ttft_ms: Czas od wysłania zapytania do pierwszego fragmentu odpowiedzi
+            total_ms: Całkowity czas strumienia (opcjonalnie)
+        """
+        self.track_latency(api_name, latency_ms=total_ms, ttft_ms=ttft_ms)
+    
     def can_make_autonomous_call(self, api_name: str) -> bool:
         """Sprawdź czy można wykonać autonomiczne wywołanie"""
         if api_name not in self.config:
             return True
         
-        config = self.config[api_name]
-        current_autonomous = self.usage["usage"][api_name]["autonomous"]
-        
-        # Oblicz maksymalny limit autonomiczny
-        max_autonomous = int(config["daily_limit"] * config["autonomous_percentage"] / 100)
-        
-        return current_autonomous < max_autonomous
+        current_autonomous = self.ledger.get_day_usage().get(api_name, {}).get("autonomous", 0)
+        return current_autonomous < self._autonomous_limit(api_name)
     
     def get_remaining_budget(self, api_name: str) -> Dict:
         """Zwróć pozostały budżet dla API"""
@@ -170,14 +201,14 @@ class APIUsageTracker:
             return {"error": "Unknown API"}
         
         config = self.config[api_name]
-        usage = self.usage["usage"][api_name]
+        usage = self.ledger.get_day_usage().get(api_name, {"user": 0, "autonomous": 0, "total": 0})
         
         max_autonomous = int(config["daily_limit"] * config["autonomous_percentage"] / 100)
         max_user = config["daily_limit"] - max_autonomous
         
         return {
             "api": api_name,
-            "date": self.usage["date"],
+            "date": datetime.now().strftime("%Y-%m-%d"),
             "autonomous": {
                 "used": usage["autonomous"],
                 "limit": max_autonomous,
@@ -207,25 +238,38 @@ class APIUsageTracker:
     
     def increment_autonomous_conversation(self):
         """Zwiększ licznik autonomicznych rozmów"""
-        self.usage["autonomous_conversations_today"] += 1
-        self._save_usage()
+        self.ledger.increment_autonomous_conversations()
+        self._save_usage(force=True)
     
     def get_today_summary(self) -> Dict:
         """Zwróć podsumowanie dzisiejszego dnia"""
-        total_calls = sum(api["total"] for api in self.usage["usage"].values())
-        autonomous_calls = sum(api["autonomous"] for api in self.usage["usage"].values())
-        user_calls = sum(api["user"] for api in self.usage["usage"].values())
+        usage = self.usage
+        by_api = usage["usage"]
         
         return {
-            "date": self.usage["date"],
-            "total_calls": total_calls,
-            "user_calls": user_calls,
-            "autonomous_calls": autonomous_calls,
-            "autonomous_conversations": self.usage["autonomous_conversations_today"],
-            "total_cost_usd": round(self.usage["total_cost_usd"], 2),
-            "by_api": self.usage["usage"]
+            "date": usage["date"],
+            "total_calls": sum(api["total"] for api in by_api.values()),
+            "user_calls": sum(api["user"] for api in by_api.values()),
+            "autonomous_calls": sum(api["autonomous"] for api in by_api.values()),
+            "autonomous_conversations": usage["autonomous_conversations_today"],
+            "cache_hits": usage["cache_hits_today"],
+            "total_cost_usd": round(usage["total_cost_usd"], 2),
+            "by_api": by_api,
+            "latency": usage["latency"]
         }
     
+    def get_usage_history(self, since: Optional[str] = None, until: Optional[str] = None,
+                          group_by: str = "hour", api_name: Optional[str] = None) -> List[Dict]:
+        """
+        Historia wywołań per godzina/dzień i API (koszt, latencja, TTFT) - bez limitu 30 dni
+        
+        Args:
+            since, until: Granice okresu (ISO), np. "2025-11-01"
+            group_by: "hour" lub "day"
+            api_name: Opcjonalny filtr API
+        """
+        return self.ledger.get_history(since=since, until=until, group_by=group_by, api=api_name)
+    
     def print_status(self):
         """Wydrukuj status limitów (debug)"""
         print("\n" + "="*60)
@@ -245,17 +289,28 @@ class APIUsageTracker:
         summary = self.get_today_summary()
         print(f"\n💰 Total Cost Today: ${summary['total_cost_usd']}")
         print(f"🤖 Autonomous Conversations: {summary['autonomous_conversations']}")
+        print(f"💾 Cache Hits (koszt 0): {summary['cache_hits']}")
+        for api_name, latency in summary["latency"].items():
+            if not latency["count"]:
+                continue
+            print(f"⚡ TTFT {api_name}: śr. {latency['avg_ttft_ms']:.0f} ms "
+                  f"(ostatni {latency['last_ttft_ms']:.0f} ms, {latency['count']} strumieni)")
         print("="*60 + "\n")
 
 
 # Singleton instance
 _tracker_instance = None
+_tracker_lock = threading.Lock()
 
 def get_tracker() -> APIUsageTracker:
     """Zwróć singleton instance trackera"""
     global _tracker_instance
-    if _tracker_instance is None:
-        _tracker_instance = APIUsageTracker()
+    with _tracker_lock:
+        if _tracker_instance is None:
+            _tracker_instance = APIUsageTracker()
+            # Migawka jest dławiona - wywołania po ostatnim zapisie (np. analizy w tle)
+            # trafiają do api_usage.json dopiero przy wyjściu procesu
+            atexit.register(_tracker_instance._save_usage, force=True)
     return _tracker_instance
 
 
@@ -3,12 +3,20 @@ Autonomous Conversation Engine - Silnik autonomicznych rozmów Rady Partnerów
 Partnerzy rozmawiają ze sobą nawet gdy Zarządzającego nie ma
 """
 
+import asyncio
 import json
 import os
 import random
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, List, Dict, Optional, Tuple
 from api_usage_tracker import get_tracker
+from response_cache import get_response_cache, make_cache_key, is_cache_disabled
+from conversation_store import get_conversation_store
 import anthropic
 import google.generativeai as genai
 from openai import OpenAI
@@ -45,10 +53,37 @@ if not PERSONAS:
     print("⚠️ Nie można załadować PERSONAS z streamlit_app - używam pustego słownika")
     # PERSONAS już jest zdefiniowany jako {} powyżej
 
-# Pliki danych
-CONVERSATIONS_FILE = "autonomous_conversations.json"
+# Pliki danych (rozmowy: conversation_store -> autonomous_conversations/)
 TOPICS_FILE = "autonomous_topics_config.json"
 
+# Post-processing rozmowy (summary + meta-analiza Nexusa) - niezależne analizy równolegle
+POST_PROCESS_WORKERS = 2
+POST_PROCESS_TIMEOUT = 300  # Ile main() czeka na analizy przed demo Nexusa
+
+# Wspólne dla wszystkich instancji silnika (Streamlit tworzy nową przy każdym rerunie)
+_post_executor: Optional[ThreadPoolExecutor] = None
+_post_executor_lock = threading.Lock()
+_pending_post: Dict[str, List[Future]] = {}
+_pending_post_lock = threading.Lock()  # Batch wywołuje start_post_processing z wielu wątków
+
+
+# Tryb batch: kilka rozmów naraz (asyncio task na rozmowę, tury w rozmowie po kolei)
+BATCH_CONVERSATIONS = 4
+MAX_CONSECUTIVE_FAILURES = 3  # Tyle nieudanych tur z rzędu kończy rozmowę
+PROVIDER_CONCURRENCY = {"gemini": 4, "claude": 2, "openai": 2}  # Równoległe wywołania na dostawcę
+ANALYSIS_APIS = {"summary": "gemini", "nexus_meta_analysis": "gemini"}  # Nexus (single mode) = Gemini
+
+
+def get_post_executor() -> ThreadPoolExecutor:
+    """Pula wątków analiz po rozmowie (wątki dołączane przy wyjściu interpretera)"""
+    global _post_executor
+    if _post_executor is None:
+        with _post_executor_lock:
+            if _post_executor is None:
+                _post_executor = ThreadPoolExecutor(max_workers=POST_PROCESS_WORKERS,
+                                                    thread_name_prefix="conv-post")
+    return _post_executor
+
 # Domyślne tematy rozmów
 DEFAULT_TOPICS = {
     "portfolio_analysis": {
@@ -110,13 +145,59 @@ DEFAULT_TOPICS = {
 }
 
 
+class BudgetGovernor:
+    """
+    Wspólny budżet autonomiczny dla równoległych rozmów jednego batcha
+    
+    - rozmowa startuje tylko gdy zarezerwuje (atomowo, wszystko albo nic) wywołania
+      dla wszystkich swoich tur i analiz po rozmowie (summary, meta-analiza) - nie
+      zaczyna się rozmowy, której nie da się skończyć
+    - niewykorzystane rezerwacje (przerwana rozmowa) wracają do puli
+    - semafory ograniczają liczbę równoczesnych wywołań na dostawcę
+    
+    Każde wywołanie nadal przechodzi przez tracker.track_call (limit w ledgerze
+    sprawdzany i inkrementowany w jednej transakcji - także między procesami).
+    """
+    
+    def __init__(self, tracker, concurrency: Optional[Dict[str, int]] = None):
+        self.remaining = {
+            api_name: max(0, budget["autonomous"]["remaining"])
+            for api_name, budget in tracker.get_all_budgets().items()
+        }
+        self.concurrency = concurrency or PROVIDER_CONCURRENCY
+        self._lock = threading.Lock()
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+    
+    def reserve(self, needs: Dict[str, int]) -> bool:
+        """Zarezerwuj wywołania dla całej rozmowy (False = brak budżetu, nic nie zajęte)"""
+        with self._lock:
+            if any(self.remaining.get(api_name, 0) < count for api_name, count in needs.items()):
+                return False
+            for api_name, count in needs.items():
+                self.remaining[api_name] -= count
+            return True
+    
+    def release(self, unused: Dict[str, int]):
+        """Zwróć niewykorzystaną część rezerwacji"""
+        with self._lock:
+            for api_name, count in unused.items():
+                if count > 0:
+                    self.remaining[api_name] = self.remaining.get(api_name, 0) + count
+    
+    def slot(self, api_name: str) -> asyncio.Semaphore:
+        """Semafor równoległych wywołań dostawcy (tworzony w pętli zdarzeń batcha)"""
+        if api_name not in self._slots:
+            self._slots[api_name] = asyncio.Semaphore(self.concurrency.get(api_name, 1))
+        return self._slots[api_name]
+
+
 class AutonomousConversationEngine:
     """Silnik autonomicznych rozmów"""
     
     def __init__(self):
         self.tracker = get_tracker()
         self.topics_config = self._load_topics_config()
-        self.conversations_db = self._load_conversations()
+        self.store = get_conversation_store()
         
         # Konfiguruj AI clients
         self.claude_client = anthropic.Anthropic(api_key=ANTHROPIC_KEY) if ANTHROPIC_KEY else None
@@ -148,24 +229,9 @@ class AutonomousConversationEngine:
         with open(TOPICS_FILE, 'w', encoding='utf-8') as f:
             json.dump(config, f, indent=2, ensure_ascii=False)
     
-    def _load_conversations(self) -> List[Dict]:
-        """Załaduj historię rozmów"""
-        if os.path.exists(CONVERSATIONS_FILE):
-            with open(CONVERSATIONS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        else:
-            return []
-    
     def _save_conversation(self, conversation: Dict):
-        """Zapisz rozmowę do bazy"""
-        self.conversations_db.append(conversation)
-        
-        # Zachowaj ostatnie 100 rozmów
-        if len(self.conversations_db) > 100:
-            self.conversations_db = self.conversations_db[-100:]
-        
-        with open(CONVERSATIONS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(self.conversations_db, f, indent=2, ensure_ascii=False)
+        """Zapisz rozmowę do bazy (upsert po id - ponowny zapis nadpisuje, nie dubluje)"""
+        self.store.save(conversation)
     
     def check_api_budget(self) -> Tuple[bool, str]:
         """
@@ -206,6 +272,14 @@ class AutonomousConversationEngine:
         
         return topic_id, self.topics_config[topic_id]
     
+    def select_topics(self, count: int) -> List[Tuple[str, Dict]]:
+        """Wybierz do `count` różnych tematów dla batcha (najpierw HIGH priority)"""
+        high = [k for k, v in self.topics_config.items() if v.get("priority") == "HIGH"]
+        rest = [k for k in self.topics_config if k not in high]
+        random.shuffle(high)
+        random.shuffle(rest)
+        return [(topic_id, self.topics_config[topic_id]) for topic_id in (high + rest)[:count]]
+    
     def generate_opening_prompt(self, topic: Dict) -> str:
         """Wygeneruj początkowy prompt rozmowy"""
         template = topic.get("prompt_template", "Porozmawiajmy o {topic_name}")
@@ -248,7 +322,38 @@ class AutonomousConversationEngine:
         
         return participants
     
-    def call_ai_partner(self, partner_name: str, prompt: str, context: List[Dict]) -> Optional[str]:
+    def partner_api(self, partner_name: str) -> str:
+        """API trackera, z którego budżetu korzysta partner (Nexus = Gemini)"""
+        model_engine = PERSONAS.get(partner_name, {}).get("model_engine", "gemini")
+        if model_engine == "nexus":
+            return "gemini"
+        if model_engine.startswith("openrouter"):
+            return "openai"
+        return model_engine
+    
+    def plan_turns(self, participants: List[str], max_messages: int) -> Counter:
+        """Ile wywołań każdego API zużyją tury dialogu (tury rotują po uczestnikach)"""
+        return Counter(self.partner_api(participants[i % len(participants)]) for i in range(max_messages))
+    
+    def analysis_fields(self, message_count: int) -> List[str]:
+        """Analizy, które zostaną policzone dla rozmowy z `message_count` wiadomościami"""
+        fields = []
+        if message_count:
+            fields.append("summary")
+        if NEXUS_AVAILABLE and message_count >= 3:
+            fields.append("nexus_meta_analysis")
+        return fields
+    
+    def plan_analyses(self, message_count: int) -> Counter:
+        """Wywołania analiz po rozmowie (summary, meta-analiza Nexusa)"""
+        return Counter(ANALYSIS_APIS[field] for field in self.analysis_fields(message_count))
+    
+    def plan_calls(self, participants: List[str], max_messages: int) -> Counter:
+        """Ile wywołań każdego API zużyje cała rozmowa: tury + analizy po rozmowie"""
+        return self.plan_turns(participants, max_messages) + self.plan_analyses(max_messages)
+    
+    def call_ai_partner(self, partner_name: str, prompt: str, context: List[Dict],
+                        bypass_cache: bool = False) -> Optional[str]:
         """
         Wyślij prompt do AI partnera
         
@@ -256,6 +361,7 @@ class AutonomousConversationEngine:
             partner_name: Nazwa partnera
             prompt: Główny prompt
             context: Lista poprzednich wiadomości [{"partner": "...", "message": "..."}]
+            bypass_cache: True = pomiń cache odpowiedzi
         
         Returns:
             Odpowiedź AI lub None jeśli błąd
@@ -296,9 +402,17 @@ POPRZEDNIE WYPOWIEDZI:
 
 Twoja odpowiedź (jako moderator, zwięźle):"""
                 
-                result = nexus.generate_response(nexus_prompt, context=nexus_context)
+                # Trafienie w cache nie zużywa budżetu - inaczej rezerwacja przed wywołaniem
+                result = None if bypass_cache else nexus.get_cached_response(nexus_prompt, context=nexus_context)
+                if result is not None:
+                    self.tracker.track_cache_hit('gemini', is_autonomous=True)
+                elif not self.tracker.track_call('gemini', is_autonomous=True, partner="Nexus"):
+                    print("⚠️ Brak budżetu gemini dla Nexus")
+                    return None
+                else:
+                    result = nexus.generate_response(nexus_prompt, context=nexus_context, bypass_cache=True)
                 
-                if result.get('success'):
+                if result and result.get('success'):
                     answer = result.get('response', '')
                     
                     # Oczyść odpowiedź
@@ -307,12 +421,9 @@ Twoja odpowiedź (jako moderator, zwięźle):"""
                         answer = answer.replace(token, '')
                     answer = answer.strip()
                     
-                    # Track API call (Nexus używa Gemini w single mode)
-                    self.tracker.track_call('gemini', is_autonomous=True)
-                    
                     return answer
                 else:
-                    print(f"⚠️ Nexus zwrócił błąd: {result.get('error')}")
+                    print(f"⚠️ Nexus zwrócił błąd: {result.get('error') if result else 'brak odpowiedzi'}")
                     return None
                     
             except Exception as e:
@@ -325,11 +436,6 @@ Twoja odpowiedź (jako moderator, zwięźle):"""
         else:
             api_type = model_engine  # "gemini" lub "claude"
         
-        # Sprawdź budżet przed wywołaniem
-        if not self.tracker.can_make_autonomous_call(api_type):
-            print(f"⚠️ Brak budżetu {api_type} dla {partner_name}")
-            return None
-        
         # Przygotuj pełny prompt z kontekstem
         full_prompt = f"""Jesteś {partner_name}.
 
@@ -347,7 +453,22 @@ Rozmawiasz z kolegami z Rady. Bądź zwięzły (max 3-4 zdania).
         
         full_prompt += f"\n\nTemat dyskusji: {prompt}\n\nTwoja odpowiedź (zwięźle, 3-4 zdania):"
         
+        # Cache odpowiedzi - trafienie nie zużywa budżetu
+        response_cache = get_response_cache()
+        cache_key = make_cache_key(partner_name, model_engine, full_prompt)
+        if not bypass_cache and not is_cache_disabled():
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                self.tracker.track_cache_hit(api_type, is_autonomous=True)
+                return cached["response"]
+        
+        # Zarezerwuj budżet przed wywołaniem (atomowe sprawdzenie + inkrement w ledgerze)
+        if not self.tracker.track_call(api_type, is_autonomous=True, partner=partner_name):
+            print(f"⚠️ Brak budżetu {api_type} dla {partner_name}")
+            return None
+        
         # Wywołaj odpowiednie API na podstawie model_engine
+        call_start = time.perf_counter()
         try:
             # OPENROUTER (wszystkie modele openrouter_*)
             if model_engine.startswith("openrouter") and self.openai_client:
@@ -392,8 +513,11 @@ Rozmawiasz z kolegami z Rady. Bądź zwięzły (max 3-4 zdania).
                 answer = answer.replace(token, '')
             answer = answer.strip()
             
-            # Zarejestruj wywołanie
-            self.tracker.track_call(api_type, is_autonomous=True)
+            # Zarejestruj czas wywołania (samo wywołanie zarejestrowane przy rezerwacji)
+            self.tracker.track_latency(api_type, latency_ms=(time.perf_counter() - call_start) * 1000)
+            
+            if answer:
+                response_cache.set(cache_key, answer, {"partner": partner_name, "autonomous": True})
             
             return answer
             
@@ -401,12 +525,50 @@ Rozmawiasz z kolegami z Rady. Bądź zwięzły (max 3-4 zdania).
             print(f"❌ Błąd wywołania {api_type} dla {partner_name}: {e}")
             return None
     
-    def run_conversation(self, max_messages: int = 12) -> Optional[Dict]:
+    def _new_conversation(self, topic_id: str, topic: Dict, participants: List[str],
+                          opening_prompt: str, batch: bool = False) -> Dict:
+        """Pusty rekord rozmowy (w batchu id z tematem - kilka rozmów startuje w tej samej sekundzie)"""
+        conv_id = f"conv_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        return {
+            "id": f"{conv_id}_{topic_id}" if batch else conv_id,
+            "date": datetime.now().isoformat(),
+            "topic_id": topic_id,
+            "topic_name": topic['name'],
+            "opening_prompt": opening_prompt,  # ✅ DODANE: Pełny tekst opening
+            "participants": participants,
+            "messages": [],
+            "status": "in_progress",
+            "api_calls_used": 0
+        }
+    
+    def _record_turn(self, conversation: Dict, context: List[Dict], partner: str,
+                     response: Optional[str], number: int, failures: int) -> int:
+        """Dopisz turę do rozmowy; zwraca liczbę nieudanych tur z rzędu"""
+        if not response:
+            print(f"   ⚠️ {partner}: brak odpowiedzi (limit API?)")
+            return failures + 1
+        
+        conversation["messages"].append({
+            "partner": partner,
+            "message": response,
+            "timestamp": datetime.now().isoformat(),
+            "message_number": number
+        })
+        context.append({"partner": partner, "message": response})
+        conversation["api_calls_used"] += 1
+        print(f"   ✅ {partner}: {response[:150]}...")
+        return 0
+    
+    def run_conversation(self, max_messages: int = 12, wait_for_analyses: bool = False) -> Optional[Dict]:
         """
         Uruchom autonomiczną rozmowę
         
+        Zwraca zaraz po zakończeniu dialogu - summary i meta-analiza są dopisywane
+        do zapisanego rekordu w tle (patrz start_post_processing).
+        
         Args:
             max_messages: Maksymalna liczba wiadomości (domyślnie 12)
+            wait_for_analyses: True = czekaj na analizy przed zwróceniem rozmowy
         
         Returns:
             Dict z rozmową lub None jeśli błąd
@@ -435,19 +597,9 @@ Rozmawiasz z kolegami z Rady. Bądź zwięzły (max 3-4 zdania).
         print(f"💬 Opening: {opening_prompt[:100]}...")
         
         # 5. Rozpocznij rozmowę
-        conversation = {
-            "id": f"conv_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
-            "date": datetime.now().isoformat(),
-            "topic_id": topic_id,
-            "topic_name": topic['name'],
-            "opening_prompt": opening_prompt,  # ✅ DODANE: Pełny tekst opening
-            "participants": participants,
-            "messages": [],
-            "status": "in_progress",
-            "api_calls_used": 0
-        }
-        
+        conversation = self._new_conversation(topic_id, topic, participants, opening_prompt)
         context = []
+        failures = 0
         
         for i in range(max_messages):
             # Rotuj uczestników
@@ -457,71 +609,185 @@ Rozmawiasz z kolegami z Rady. Bądź zwięzły (max 3-4 zdania).
             
             # Wywołaj AI
             response = self.call_ai_partner(current_partner, opening_prompt, context)
-            
-            if response:
-                message = {
-                    "partner": current_partner,
-                    "message": response,
-                    "timestamp": datetime.now().isoformat(),
-                    "message_number": i + 1
-                }
-                
-                conversation["messages"].append(message)
-                context.append({"partner": current_partner, "message": response})
-                conversation["api_calls_used"] += 1
-                
-                print(f"   ✅ {response[:150]}...")
-            else:
-                print(f"   ⚠️ Brak odpowiedzi (limit API?)")
-                # Jeśli 3 kolejne błędy, przerwij
-                if i > 0 and all(m is None for m in conversation["messages"][-3:]):
-                    print("   🚫 Zbyt wiele błędów, przerywam rozmowę")
-                    break
+            failures = self._record_turn(conversation, context, current_partner, response, i + 1, failures)
+            if failures >= MAX_CONSECUTIVE_FAILURES:
+                print("   🚫 Zbyt wiele błędów, przerywam rozmowę")
+                break
         
         # 6. Zakończ rozmowę
         conversation["status"] = "completed"
         conversation["completed_at"] = datetime.now().isoformat()
         
-        # 7. Zapisz do bazy
-        self._save_conversation(conversation)
+        # 7. Zapisz do bazy i przekaż analizy do tła
         self.tracker.increment_autonomous_conversation()
+        self.start_post_processing(conversation)
         
         print(f"\n✅ Rozmowa zakończona: {len(conversation['messages'])} wiadomości")
         print(f"💾 Zapisano jako: {conversation['id']}")
         
-        # 8. Wygeneruj AI Summary (jeśli są wiadomości)
-        if len(conversation['messages']) > 0:
-            print(f"🤖 Generuję AI Summary...")
-            summary = self._generate_summary(conversation)
-            if summary:
-                conversation['summary'] = summary
-                print(f"✅ Summary wygenerowane")
-        
-        # 8b. ✨ NEXUS META-ANALYSIS (jeśli dostępny)
-        if NEXUS_AVAILABLE and len(conversation['messages']) >= 3:
-            print(f"🤖 Nexus przeprowadza meta-analizę...")
-            meta_analysis = self.nexus_meta_analysis(conversation)
-            if meta_analysis:
-                conversation['nexus_meta_analysis'] = meta_analysis
-                print(f"✅ Nexus meta-analysis ukończona")
-                print(f"   Jakość rozmowy: {meta_analysis.get('overall_quality', 0):.0%}")
-        
-        # Zapisz ze wszystkimi analizami
+        if wait_for_analyses:
+            self.wait_for_post_processing(conversation['id'])
+        
+        print("="*60 + "\n")
+        
+        return conversation
+    
+    # ============================================================================
+    # BATCH - kilka rozmów równolegle pod wspólnym budżetem
+    # ============================================================================
+    
+    async def _run_conversation_async(self, topic_id: str, topic: Dict, max_messages: int,
+                                      governor: BudgetGovernor) -> Optional[Dict]:
+        """Jedna rozmowa batcha: rezerwacja budżetu, tury po kolei, wywołania w wątkach"""
+        participants = self.select_participants(topic)
+        planned = self.plan_calls(participants, max_messages)
+        if not governor.reserve(planned):
+            print(f"⏭️ {topic['name']}: za mały budżet na {max_messages} tur - pomijam")
+            return None
+        
+        attempted = Counter()
+        analyses = Counter()  # Rezerwacja analiz zostaje do ich wywołania w tle
+        try:
+            opening_prompt = await asyncio.to_thread(self.generate_opening_prompt, topic)
+            conversation = self._new_conversation(topic_id, topic, participants, opening_prompt, batch=True)
+            print(f"💬 [{conversation['id']}] {topic['name']}: {', '.join(participants)}")
+            context = []
+            failures = 0
+            
+            for i in range(max_messages):
+                current_partner = participants[i % len(participants)]
+                api_name = self.partner_api(current_partner)
+                attempted[api_name] += 1
+                async with governor.slot(api_name):
+                    response = await asyncio.to_thread(
+                        self.call_ai_partner, current_partner, opening_prompt, list(context)
+                    )
+                failures = self._record_turn(conversation, context, current_partner, response, i + 1, failures)
+                if failures >= MAX_CONSECUTIVE_FAILURES:
+                    print(f"   🚫 [{conversation['id']}] Zbyt wiele błędów, przerywam rozmowę")
+                    break
+            analyses = self.plan_analyses(len(conversation["messages"]))
+        finally:
+            governor.release(planned - (attempted + analyses))
+        
+        conversation["status"] = "completed"
+        conversation["completed_at"] = datetime.now().isoformat()
+        self.tracker.increment_autonomous_conversation()
+        await asyncio.to_thread(self.start_post_processing, conversation)
+        print(f"✅ [{conversation['id']}] {len(conversation['messages'])} wiadomości")
+        return conversation
+    
+    async def run_batch_async(self, conversations: int = BATCH_CONVERSATIONS,
+                              max_messages: int = 12) -> List[Dict]:
+        """Uruchom kilka rozmów na różne tematy naraz (asyncio task na rozmowę)"""
+        can_proceed, budget_msg = self.check_api_budget()
+        print(budget_msg)
+        if not can_proceed:
+            return []
+        
+        governor = BudgetGovernor(self.tracker)
+        topics = self.select_topics(conversations)
+        print(f"🚀 Batch: {len(topics)} rozmów równolegle ({', '.join(t['name'] for _, t in topics)})")
+        
+        results = await asyncio.gather(
+            *(self._run_conversation_async(topic_id, topic, max_messages, governor) for topic_id, topic in topics),
+            return_exceptions=True
+        )
+        
+        finished = []
+        for (topic_id, _), result in zip(topics, results):
+            if isinstance(result, Exception):
+                print(f"❌ Rozmowa {topic_id} przerwana: {result}")
+            elif result:
+                finished.append(result)
+        return finished
+    
+    def run_batch(self, conversations: int = BATCH_CONVERSATIONS, max_messages: int = 12) -> List[Dict]:
+        """Synchroniczne wejście do run_batch_async (CLI / workflow)"""
+        return asyncio.run(self.run_batch_async(conversations, max_messages))
+    
+    # ============================================================================
+    # POST-PROCESSING - analizy równolegle, każdy wynik zapisywany od razu
+    # ============================================================================
+    
+    def _post_processors(self, conversation: Dict) -> List[Tuple[str, Callable[[Dict], Optional[Dict]]]]:
+        """Niezależne analizy rozmowy: (pole w rekordzie, funkcja)"""
+        funcs = {"summary": self._generate_summary, "nexus_meta_analysis": self.nexus_meta_analysis}
+        return [(field, funcs[field]) for field in self.analysis_fields(len(conversation['messages']))]
+    
+    def start_post_processing(self, conversation: Dict) -> List[Future]:
+        """
+        Zapisz rozmowę i uruchom analizy w tle
+        
+        Summary i meta-analiza Nexusa nie zależą od siebie - liczą się równolegle,
+        a każdy wynik jest dopisywany do rekordu i zapisywany zaraz po ukończeniu.
+        Po ostatniej analizie powiadomienie e-mail trafia do kolejki outboxa.
+        
+        Returns:
+            Lista Future (po jednym na analizę)
+        """
+        jobs = self._post_processors(conversation)
+        conversation["post_processing"] = {field: "pending" for field, _ in jobs}
         self._save_conversation(conversation)
         
-        # 9. Wyślij email notification (jeśli włączone)
+        if not jobs:
+            self._notify_completed(conversation)
+            return []
+        
+        state = {"remaining": len(jobs), "lock": threading.Lock()}
+        executor = get_post_executor()
+        futures = [
+            executor.submit(self._run_post_processor, conversation, field, func, state)
+            for field, func in jobs
+        ]
+        with _pending_post_lock:
+            for conv_id in [cid for cid, fs in _pending_post.items() if all(f.done() for f in fs)]:
+                _pending_post.pop(conv_id, None)
+            _pending_post[conversation['id']] = futures
+        print(f"🧵 Analizy w tle: {', '.join(field for field, _ in jobs)}")
+        return futures
+    
+    def _run_post_processor(self, conversation: Dict, field: str,
+                            func: Callable[[Dict], Optional[Dict]], state: Dict) -> Optional[Dict]:
+        """Jedna analiza: policz na kopii rekordu, dopisz wynik i zapisz pod blokadą"""
+        try:
+            result = func(dict(conversation))
+        except Exception as e:
+            print(f"❌ Błąd analizy {field}: {e}")
+            result = None
+        
+        with state["lock"]:
+            if result:
+                conversation[field] = result
+            conversation["post_processing"][field] = "done" if result else "failed"
+            self._save_conversation(conversation)
+            state["remaining"] -= 1
+            last = state["remaining"] == 0
+        
+        print(f"{'✅' if result else '⚠️'} {field} ({conversation['id']}): {conversation['post_processing'][field]}")
+        if last:
+            self._notify_completed(conversation)
+        return result
+    
+    def wait_for_post_processing(self, conv_id: str, timeout: Optional[float] = POST_PROCESS_TIMEOUT) -> bool:
+        """Poczekaj na analizy rozmowy (True = wszystkie zakończone)"""
+        with _pending_post_lock:
+            futures = _pending_post.get(conv_id, [])
+        if not futures:
+            return True
+        _, not_done = wait(futures, timeout=timeout)
+        return not not_done
+    
+    def _notify_completed(self, conversation: Dict):
+        """Wyślij email notification (jeśli włączone) - outbox wysyła w swoim wątku"""
         try:
             from email_notifier import get_conversation_notifier
             notifier = get_conversation_notifier()
             if notifier.config.get("enabled", False):
                 notifier.send_conversation_completed(conversation)
-                print(f"📧 Email notification wysłany")
+                print(f"📧 Email notification w kolejce wysyłki")
         except Exception as e:
             print(f"⚠️ Nie można wysłać email notification: {e}")
-        
-        print("="*60 + "\n")
-        
-        return conversation
     
     def _generate_summary(self, conversation: Dict) -> Optional[Dict]:
         """
@@ -559,6 +825,11 @@ Wygeneruj odpowiedź w formacie JSON z następującymi polami:
 Odpowiedź TYLKO w formacie JSON, bez dodatkowego tekstu:
 """
             
+            # Zarezerwuj budżet przed wywołaniem (jak tury rozmowy)
+            if not self.tracker.track_call('gemini', is_autonomous=True):
+                print("⚠️ Brak budżetu gemini na summary - pomijam")
+                return None
+            
             # Wywołaj Gemini
             model = genai.GenerativeModel('gemini-2.0-flash-exp')
             response = model.generate_content(prompt)
@@ -575,25 +846,19 @@ Odpowiedź TYLKO w formacie JSON, bez dodatkowego tekstu:
             
             summary_data = json.loads(response_text)
             
-            # Track API call
-            self.tracker.track_call('gemini', is_autonomous=True)
-            
             return summary_data
             
         except Exception as e:
             print(f"❌ Błąd generowania summary: {e}")
             return None
     
-    def get_recent_conversations(self, limit: int = 10) -> List[Dict]:
-        """Zwróć ostatnie N rozmów"""
-        return sorted(self.conversations_db, key=lambda x: x.get("date", ""), reverse=True)[:limit]
+    def get_recent_conversations(self, limit: int = 10, offset: int = 0) -> List[Dict]:
+        """Zwróć ostatnie N rozmów (pełne rekordy, czytane tylko dla tej strony)"""
+        return self.store.recent(limit=limit, offset=offset, with_messages=True)
     
     def get_conversation_by_id(self, conv_id: str) -> Optional[Dict]:
         """Zwróć konkretną rozmowę po ID"""
-        for conv in self.conversations_db:
-            if conv.get("id") == conv_id:
-                return conv
-        return None
+        return self.store.get(conv_id)
     
     # ============================================================================
     # NEXUS ENHANCED FEATURES - Meta-analysis, Voting Simulation, Knowledge Synthesis
@@ -662,8 +927,13 @@ Przeanalizuj i zwróć TYLKO JSON z następującymi polami:
 
 JSON (bez dodatkowego tekstu):"""
             
+            # Nexus w single mode używa Gemini - budżet rezerwowany przed wywołaniem
+            if not self.tracker.track_call('gemini', is_autonomous=True, partner="Nexus"):
+                print("⚠️ Brak budżetu gemini na meta-analizę - pomijam")
+                return None
+            
             context = {'conversation_analysis': True}
-            result = nexus.generate_response(analysis_prompt, context=context)
+            result = nexus.generate_response(analysis_prompt, context=context, bypass_cache=True)
             
             if result.get('success'):
                 # Parse JSON z odpowiedzi
@@ -881,16 +1151,7 @@ def main():
             print("🤖 NEXUS ENHANCED FEATURES - DEMO")
             print("="*60)
             
-            # 1. Meta-analysis już została wykonana w run_conversation()
-            if 'nexus_meta_analysis' in conversation:
-                meta = conversation['nexus_meta_analysis']
-                print(f"\n📊 Meta-Analysis Results:")
-                print(f"   Overall Quality: {meta.get('overall_quality', 0):.0%}")
-                print(f"   Main Themes: {', '.join(meta.get('main_themes', []))}")
-                print(f"   Consensus: {len(meta.get('consensus_points', []))} punktów")
-                print(f"   Disagreements: {len(meta.get('disagreement_points', []))} punktów")
-            
-            # 2. Voting Simulation - przykładowe pytanie
+            # 1. Voting Simulation - przykładowe pytanie
             print(f"\n🗳️ Voting Simulation Example:")
             decision_q = "Czy zwiększyć alokację w krypto do 30% portfela?"
             voting_result = engine.nexus_voting_simulation(conversation, decision_q)
@@ -902,7 +1163,7 @@ def main():
                 print(f"   Confidence: {voting_result.get('confidence_overall', 0):.0%}")
                 print(f"   Nexus Recommendation: {voting_result.get('nexus_recommendation', 'N/A')[:100]}...")
             
-            # 3. Knowledge Synthesis - pytanie bazujące na historii
+            # 2. Knowledge Synthesis - pytanie bazujące na historii
             recent = engine.get_recent_conversations(limit=5)
             if len(recent) > 0:
                 print(f"\n📚 Knowledge Synthesis Example:")
@@ -913,6 +1174,19 @@ def main():
                     print(f"   Pytanie: {query}")
                     print(f"   Nexus Answer:\n   {synthesis[:300]}...")
         
+        # Analizy liczyły się w tle równolegle z demo - poczekaj przed końcem procesu
+        if not engine.wait_for_post_processing(conversation['id']):
+            print(f"⚠️ Analizy nie zakończyły się w {POST_PROCESS_TIMEOUT}s")
+        
+        # 3. Meta-analysis (dopisana w tle przez start_post_processing)
+        if 'nexus_meta_analysis' in conversation:
+            meta = conversation['nexus_meta_analysis']
+            print(f"\n📊 Meta-Analysis Results:")
+            print(f"   Overall Quality: {meta.get('overall_quality', 0):.0%}")
+            print(f"   Main Themes: {', '.join(meta.get('main_themes', []))}")
+            print(f"   Consensus: {len(meta.get('consensus_points', []))} punktów")
+            print(f"   Disagreements: {len(meta.get('disagreement_points', []))} punktów")
+        
     else:
         print("\n❌ Nie udało się przeprowadzić rozmowy (brak budżetu API?)")
     
@@ -921,5 +1195,27 @@ def main():
     engine.tracker.print_status()
 
 
+def main_batch(conversations: int = BATCH_CONVERSATIONS):
+    """Tryb batch: nocna pula autonomiczna w kilku równoległych rozmowach"""
+    engine = AutonomousConversationEngine()
+    
+    print("\n📊 Status API przed batchem:")
+    engine.tracker.print_status()
+    
+    finished = engine.run_batch(conversations=conversations)
+    print(f"\n✅ Batch zakończony: {len(finished)}/{conversations} rozmów")
+    
+    for conversation in finished:
+        if not engine.wait_for_post_processing(conversation['id']):
+            print(f"⚠️ Analizy {conversation['id']} nie zakończyły się w {POST_PROCESS_TIMEOUT}s")
+    
+    print("\n📊 Status API po batchu:")
+    engine.tracker.print_status()
+
+
 if __name__ == "__main__":
-    main()
+    # python autonomous_conversation_engine.py [batch [liczba_rozmów]]
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        main_batch(int(sys.argv[2]) if len(sys.argv) > 2 else BATCH_CONVERSATIONS)
+    else:
+        main()
@@ -5,10 +5,17 @@ Moduł do porównywania wydajności portfela z benchmarkami rynkowymi.
 """
 
 import json
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from bisect import bisect_right
+from datetime import datetime, timedelta, date
+from typing import Dict, List, Optional, Tuple
 import yfinance as yf
 
+try:
+    from performance_engine import get_performance_engine
+    PERFORMANCE_ENGINE_OK = True
+except ImportError:
+    PERFORMANCE_ENGINE_OK = False
+
 
 class BenchmarkComparison:
     """Porównanie portfela z popularnymi benchmarkami"""
@@ -23,92 +30,229 @@ class BenchmarkComparison:
         'BTC-USD': 'Bitcoin'
     }
     
+    HISTORY_DAYS = 730  # Zakres pierwszego pobrania - wystarcza na okna do roku z zapasem
+    REFRESH_INTERVAL = timedelta(hours=6)  # Jak często dociągać nowe sesje
+    
     def __init__(self, cache_file: str = 'benchmark_cache.json'):
         self.cache_file = cache_file
         self.cache = self._load_cache()
     
     def _load_cache(self) -> Dict:
-        """Ładuje cache z danymi benchmarków"""
+        """
+        Ładuje lokalny magazyn cen benchmarków
+        
+        Format: {"prices": {symbol: {"YYYY-MM-DD": close}}, "updated_at": iso}
+        """
         try:
             with open(self.cache_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+                cache = json.load(f)
         except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+            cache = {}
+        
+        # Stary format ("SPY_30d": {...}) - zwroty per okres, nie do odzyskania jako ceny
+        if 'prices' not in cache:
+            cache = {'prices': {}, 'updated_at': None}
+        return cache
     
     def _save_cache(self):
         """Zapisuje cache"""
         try:
             with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.cache, f, indent=2)
+                json.dump(self.cache, f)
         except Exception as e:
             print(f"Error saving benchmark cache: {e}")
     
-    def get_benchmark_returns(self, period_days: int = 30) -> Dict[str, float]:
+    # ------------------------------------------------------------------
+    # Magazyn cen
+    # ------------------------------------------------------------------
+    
+    def _download_closes(self, start: date, end: Optional[date] = None) -> Dict[str, Dict[str, float]]:
+        """Jedno zbiorcze pobranie dziennych zamknięć wszystkich benchmarków"""
+        symbols = list(self.BENCHMARKS.keys())
+        data = yf.download(
+            symbols,
+            start=start.isoformat(),
+            end=(end or date.today() + timedelta(days=1)).isoformat(),
+            interval='1d',
+            auto_adjust=True,
+            group_by='column',
+            progress=False,
+            threads=True,
+            timeout=15
+        )
+        
+        closes = {}
+        if data is None or data.empty or 'Close' not in data.columns.get_level_values(0):
+            return closes
+        
+        close_frame = data['Close']
+        for symbol in symbols:
+            if symbol not in close_frame.columns:
+                continue
+            series = close_frame[symbol].dropna()
+            closes[symbol] = {idx.strftime('%Y-%m-%d'): round(float(value), 6) for idx, value in series.items()}
+        return closes
+    
+    def _merge_closes(self, closes: Dict[str, Dict[str, float]]):
+        prices = self.cache['prices']
+        for symbol, by_date in closes.items():
+            prices.setdefault(symbol, {}).update(by_date)
+    
+    def update_prices(self, force: bool = False, min_start: Optional[date] = None) -> bool:
+        """
+        Uzupełnij magazyn cen (najwyżej jedno zbiorcze zapytanie na brakujący zakres)
+        
+        - Pusty magazyn: historia HISTORY_DAYS wstecz
+        - Kolejne wywołania: tylko sesje od ostatniej zapisanej daty
+        - min_start wcześniejszy niż posiadana historia: jednorazowe dociągnięcie starszych danych
+        
+        Returns:
+            True jeśli pobrano dane z sieci
+        """
+        prices = {symbol: by_date for symbol, by_date in self.cache['prices'].items() if by_date}
+        today = date.today()
+        fetched = False
+        
+        # Nieudane pobranie też liczy się jako próba - bez sieci nie odpytujemy co wywołanie
+        updated_at = self.cache.get('updated_at')
+        stale = force or not updated_at or datetime.now() - datetime.fromisoformat(updated_at) >= self.REFRESH_INTERVAL
+        
+        try:
+            if not prices:
+                if stale:
+                    start = min(today - timedelta(days=self.HISTORY_DAYS), min_start or today)
+                    self._merge_closes(self._download_closes(start))
+                    fetched = True
+            else:
+                first_stored = date.fromisoformat(min(min(by_date) for by_date in prices.values()))
+                backfilled_from = self.cache.get('backfilled_from')
+                if (min_start and min_start < first_stored
+                        and (not backfilled_from or min_start < date.fromisoformat(backfilled_from))):
+                    self._merge_closes(self._download_closes(min_start, first_stored))
+                    self.cache['backfilled_from'] = min_start.isoformat()
+                    fetched = True
+                
+                if stale:
+                    # Od najstarszej "ostatniej daty" - dzisiejsza sesja mogła być niepełna
+                    last_stored = min(max(by_date) for by_date in prices.values())
+                    self._merge_closes(self._download_closes(date.fromisoformat(last_stored)))
+                    fetched = True
+        except Exception as e:
+            print(f"Error fetching benchmarks: {e}")
+            fetched = True
+        
+        if fetched:
+            self.cache['updated_at'] = datetime.now().isoformat()
+            self._save_cache()
+        return fetched
+    
+    def _sorted_closes(self, symbol: str) -> Tuple[List[str], List[float]]:
+        by_date = self.cache['prices'].get(symbol, {})
+        dates = sorted(by_date)
+        return dates, [by_date[d] for d in dates]
+    
+    @staticmethod
+    def _close_as_of(dates: List[str], closes: List[float], day: str) -> Optional[float]:
+        """Ostatnie zamknięcie w dniu `day` lub wcześniej (weekendy/święta)"""
+        idx = bisect_right(dates, day) - 1
+        return closes[idx] if idx >= 0 else None
+    
+    # ------------------------------------------------------------------
+    # Zwroty (liczone lokalnie z magazynu)
+    # ------------------------------------------------------------------
+    
+    def get_benchmark_returns(self, period_days: int = 30, end_date: Optional[date] = None) -> Dict[str, float]:
         """
         Pobiera zwroty benchmarków za określony okres
         
         Args:
             period_days: Liczba dni wstecz
+            end_date: Koniec okna (domyślnie dziś)
             
         Returns:
             Słownik {symbol: return_percentage}
         """
-        results = {}
-        
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=period_days + 5)  # +5 dni bufor
+        end_date = end_date or date.today()
+        start_date = end_date - timedelta(days=period_days)
+        self.update_prices(min_start=start_date - timedelta(days=5))  # +5 dni bufor na weekend/święta
         
-        for symbol, name in self.BENCHMARKS.items():
-            try:
-                # Sprawdź cache
-                cache_key = f"{symbol}_{period_days}d"
-                cache_entry = self.cache.get(cache_key, {})
-                
-                # Cache ważny przez 1 dzień
-                if cache_entry and cache_entry.get('timestamp'):
-                    cached_time = datetime.fromisoformat(cache_entry['timestamp'])
-                    if datetime.now() - cached_time < timedelta(days=1):
-                        results[symbol] = cache_entry['return']
-                        continue
-                
-                # Pobierz dane
-                ticker = yf.Ticker(symbol)
-                hist = ticker.history(start=start_date, end=end_date)
-                
-                if len(hist) < 2:
-                    continue
-                
-                # Oblicz zwrot
-                start_price = hist['Close'].iloc[0]
-                end_price = hist['Close'].iloc[-1]
-                ret = ((end_price - start_price) / start_price) * 100
-                
-                results[symbol] = round(ret, 2)
-                
-                # Cache
-                self.cache[cache_key] = {
-                    'return': ret,
-                    'timestamp': datetime.now().isoformat()
-                }
-                
-            except Exception as e:
-                print(f"Error fetching {symbol}: {e}")
+        results = {}
+        for symbol in self.BENCHMARKS:
+            dates, closes = self._sorted_closes(symbol)
+            start_price = self._close_as_of(dates, closes, start_date.isoformat())
+            end_price = self._close_as_of(dates, closes, end_date.isoformat())
+            if start_price is None:
+                # Historia krótsza niż okno - od pierwszej dostępnej sesji (jak wcześniej)
+                start_price = closes[0] if len(closes) >= 2 else None
+            if not start_price or end_price is None:
                 continue
+            results[symbol] = round((end_price - start_price) / start_price * 100, 2)
         
-        self._save_cache()
         return results
     
-    def compare_portfolio(self, portfolio_return: float, period_days: int = 30) -> Dict:
+    def get_returns_for_periods(self, periods: List[int] = (7, 30, 90, 365)) -> Dict[int, Dict[str, float]]:
+        """Zwroty dla wielu okien naraz - jedno uzupełnienie magazynu, reszta lokalnie"""
+        self.update_prices(min_start=date.today() - timedelta(days=max(periods) + 5))
+        return {period: self.get_benchmark_returns(period) for period in periods}
+    
+    def align_with_dates(self, dates: List[str]) -> Dict[str, List[Optional[float]]]:
+        """
+        Skumulowany zwrot (%) benchmarków na daty snapshotów portfela
+        
+        Args:
+            dates: Daty "YYYY-MM-DD" (np. z daily_snapshot) - rosnąco
+            
+        Returns:
+            {symbol: [zwrot od pierwszej daty lub None gdy brak notowań]}
+        """
+        if not dates:
+            return {}
+        
+        self.update_prices(min_start=date.fromisoformat(dates[0][:10]) - timedelta(days=5))
+        
+        aligned = {}
+        for symbol in self.BENCHMARKS:
+            stored_dates, closes = self._sorted_closes(symbol)
+            points = [self._close_as_of(stored_dates, closes, d[:10]) for d in dates]
+            base = points[0]
+            aligned[symbol] = [
+                round((p - base) / base * 100, 2) if base and p is not None else None
+                for p in points
+            ]
+        return aligned
+    
+    @staticmethod
+    def portfolio_twr(period_days: int = 30, asset_class: str = 'total') -> Optional[float]:
+        """
+        Zwrot portfela (TWR, w %) za okres - bez wpłat, zakupów i kredytów
+        
+        Returns:
+            Zwrot w % albo None, gdy brak historii snapshotów
+        """
+        if not PERFORMANCE_ENGINE_OK:
+            return None
+        twr = get_performance_engine().twr(asset_class, days=period_days)
+        return round(twr * 100, 2) if twr is not None else None
+    
+    def compare_portfolio(self, portfolio_return: Optional[float] = None, period_days: int = 30,
+                          asset_class: str = 'total') -> Dict:
         """
         Porównuje zwrot portfela z benchmarkami
         
         Args:
-            portfolio_return: Zwrot portfela w %
+            portfolio_return: Zwrot portfela w % (None = TWR z silnika zwrotów za ten sam okres)
             period_days: Okres w dniach
+            asset_class: 'total', 'stocks' lub 'crypto' (gdy zwrot liczony z silnika)
             
         Returns:
             Dict z wynikami porównania
         """
+        if portfolio_return is None:
+            portfolio_return = self.portfolio_twr(period_days, asset_class)
+            if portfolio_return is None:
+                print("⚠️ Brak historii snapshotów - zwrot portfela przyjęty jako 0%")
+                portfolio_return = 0.0
+        
         benchmark_returns = self.get_benchmark_returns(period_days)
         
         comparisons = []
@@ -138,12 +282,12 @@ class BenchmarkComparison:
         }
 
 
-def get_benchmark_comparison(portfolio_return: float, period_days: int = 30) -> Dict:
+def get_benchmark_comparison(portfolio_return: Optional[float] = None, period_days: int = 30) -> Dict:
     """
     Helper function - porównuje portfel z benchmarkami
     
     Args:
-        portfolio_return: Zwrot portfela w %
+        portfolio_return: Zwrot portfela w % (None = TWR ze snapshotów)
         period_days: Okres w dniach
         
     Returns:
@@ -156,12 +300,12 @@ def get_benchmark_comparison(portfolio_return: float, period_days: int = 30) ->
 if __name__ == "__main__":
     # Test
     bc = BenchmarkComparison()
-    returns = bc.get_benchmark_returns(30)
-    print("Benchmark Returns (30 days):")
-    for symbol, ret in returns.items():
-        print(f"  {symbol}: {ret:+.2f}%")
+    for period, returns in bc.get_returns_for_periods([7, 30, 90, 365]).items():
+        print(f"Benchmark Returns ({period} days):")
+        for symbol, ret in returns.items():
+            print(f"  {symbol}: {ret:+.2f}%")
     
     # Test porównania
-    comparison = bc.compare_portfolio(5.0, 30)
-    print(f"\nPortfolio: +5.0%")
+    comparison = bc.compare_portfolio(period_days=30)
+    print(f"\nPortfolio (TWR): {comparison['portfolio_return']:+.2f}%")
     print(f"Outperforming {comparison['outperforming_count']}/{comparison['total_benchmarks']} benchmarks")
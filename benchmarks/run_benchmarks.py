@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+run_benchmarks.py
+
+Benchmarki gorących ścieżek analityki na syntetycznych danych - w pełni offline.
+
+- dane generuje benchmarks/synthetic_data.py (kilka skal: 100-2000 pozycji, lata snapshotów)
+- yfinance, NBP (requests) i klienci LLM są podmienieni na deterministyczne atrapy
+- wyniki (mediana/min ms) porównywane z benchmarks/baselines.json:
+  * regresja bezwzględna: mediana > baseline × tolerancja (powyżej progu szumu)
+  * regresja skalowania: wzrost czasu small -> large > wzrost z baseline × tolerancja
+    (niezależne od szybkości maszyny - łapie przypadkowe O(n²))
+
+UŻYCIE:
+    python benchmarks/run_benchmarks.py                      # uruchom i porównaj z baseline
+    python benchmarks/run_benchmarks.py --update-baseline    # zapisz nowy baseline
+    python benchmarks/run_benchmarks.py --scales small --only normalize_stan_spolki
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+BASELINE_FILE = os.path.join(BENCH_DIR, "baselines.json")
+
+NOISE_FLOOR_MS = 2.0  # Różnice poniżej tego progu to szum pomiaru
+DEFAULT_TOLERANCE = 1.5
+FAKE_USD_PLN = 3.9
+
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+import synthetic_data  # noqa: E402
+
+
+# === ATRAPY ZEWNĘTRZNYCH USŁUG ===
+
+class FakeTicker:
+    """Atrapa yfinance.Ticker - deterministyczne dane dywidendowe bez sieci"""
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        seed = sum(ord(c) for c in symbol)
+        price = 5 + seed % 500
+        self.info = {
+            'longName': f"{symbol} Corp",
+            'currentPrice': price,
+            'dividendRate': round((seed % 7) * 0.35, 2),
+            'dividendYield': round((seed % 7) * 0.35 / price, 4),
+        }
+
+    def history(self, *args, **kwargs):
+        import pandas as pd
+        return pd.DataFrame()
+
+
+class FakeGenerativeModel:
+    """Atrapa genai.GenerativeModel - stała odpowiedź"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def generate_content(self, prompt, **kwargs):
+        class _Response:
+            text = "Benchmark: odpowiedź syntetyczna."
+            parts = [text]
+        return _Response()
+
+
+def install_offline_stubs():
+    """Podmienia sieć, yfinance i klientów LLM - żaden benchmark nie wychodzi na zewnątrz"""
+    import requests
+
+    def fake_request(self, method, url, *args, **kwargs):
+        if "api.nbp.pl" in str(url):
+            response = requests.Response()
+            response.status_code = 200
+            response._content = json.dumps({"rates": [{"mid": FAKE_USD_PLN}]}).encode()
+            response.headers["Content-Type"] = "application/json"
+            response.url = url
+            return response
+        raise requests.exceptions.ConnectionError(f"benchmark offline: {url}")
+
+    requests.sessions.Session.request = fake_request
+
+    try:
+        import yfinance
+        import pandas as pd
+        yfinance.Ticker = FakeTicker
+        yfinance.download = lambda *args, **kwargs: pd.DataFrame()
+    except ImportError:
+        pass
+
+    try:
+        import google.generativeai as genai
+        genai.GenerativeModel = FakeGenerativeModel
+        genai.configure = lambda *args, **kwargs: None
+    except ImportError:
+        pass
+
+    for var in ("GOOGLE_API_KEY", "GOOGLE_API_KEY_NEXUS", "ANTHROPIC_API_KEY", "OPENROUTER_API_KEY",
+                "TRADING212_API_KEY", "GMAIL_APP_PASSWORD"):
+        os.environ.pop(var, None)
+
+    silence_streamlit_logs()
+
+
+def silence_streamlit_logs():
+    """Tryb bare Streamlit loguje ostrzeżenia przy każdym st.* - w benchmarku to szum"""
+    try:
+        import logging
+        import streamlit.logger
+        streamlit.logger.set_log_level("error")
+        for name in list(logging.root.manager.loggerDict):
+            if name.startswith("streamlit"):
+                logging.getLogger(name).setLevel(logging.ERROR)
+    except Exception:
+        pass
+
+
+# === POMIAR ===
+
+def measure(fn, setup=None, repeat=5, warmup=1):
+    """Mediana i minimum czasu fn() w ms (setup nie jest mierzony)"""
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        'median_ms': round(statistics.median(samples), 3),
+        'min_ms': round(min(samples), 3),
+        'repeat': repeat
+    }
+
+
+def build_targets(sa, ctx):
+    """Lista (nazwa, fn, setup) dla bieżącej skali; sa = zaimportowany streamlit_app"""
+    from risk_analytics import RiskAnalytics
+    import goal_analytics
+    import daily_snapshot
+    import persona_memory_manager
+    from animated_timeline import AnimatedTimeline
+
+    dane_t212 = ctx['t212']['data']
+    cele = ctx['cele']
+
+    def clear_dividend_caches():
+        sa.pobierz_dane_dywidendowe_cached.clear()
+        sa.calculate_portfolio_dividends.clear()
+
+    return [
+        ('parsuj_dane_t212_do_portfela',
+         lambda: sa.parsuj_dane_t212_do_portfela(dane_t212, FAKE_USD_PLN, cele), None),
+        ('normalize_stan_spolki',
+         lambda: sa.normalize_stan_spolki(ctx['stan_raw']), clear_dividend_caches),
+        ('calculate_portfolio_dividends',
+         lambda: sa.calculate_portfolio_dividends(ctx['stan_spolki']), sa.calculate_portfolio_dividends.clear),
+        ('RiskAnalytics.generate_risk_report',
+         lambda: RiskAnalytics(ctx['stan_spolki'], ctx['snapshots']).generate_risk_report(), None),
+        ('GoalAnalytics.predict_all_goals',
+         lambda: goal_analytics.predict_all_goals(ctx['snapshots']), None),
+        ('get_relevant_knowledge',
+         lambda: sa.get_relevant_knowledge("ryzyko koncentracji i wycena dywidend", ctx['stan_spolki'],
+                                           "Warren Buffett"), None),
+        ('save_daily_snapshot',
+         lambda: daily_snapshot.save_daily_snapshot(), None),
+        ('persona_memory.get_persona_context',
+         lambda: persona_memory_manager.get_persona_context("Warren Buffett"), None),
+        ('AnimatedTimeline.generate_full_timeline_report',
+         lambda: AnimatedTimeline(ctx['history']).generate_full_timeline_report(), None),
+    ]
+
+
+def run_scale(scale, repeat, only=None):
+    """Generuje dane dla skali w katalogu tymczasowym i mierzy wszystkie cele"""
+    workdir = tempfile.mkdtemp(prefix=f"horyzont_bench_{scale}_")
+    old_cwd = os.getcwd()
+    results = {}
+    try:
+        info = synthetic_data.generate(workdir, scale)
+        os.chdir(workdir)
+
+        sink = io.StringIO()
+        with contextlib.redirect_stdout(sink):
+            import streamlit_app as sa
+            import semantic_index
+            silence_streamlit_logs()  # Import aplikacji przywraca domyślny poziom logów
+            semantic_index._index_instance = None  # Indeks z poprzedniej skali wskazywałby na stary katalog
+
+            with open('trading212_cache.json', encoding='utf-8') as f:
+                t212 = json.load(f)
+            with open('daily_snapshots.json', encoding='utf-8') as f:
+                snapshots = json.load(f)
+            with open('portfolio_history.json', encoding='utf-8') as f:
+                history = json.load(f)
+            cele = sa.wczytaj_cele()
+            stan_raw = sa.pobierz_stan_spolki(cele)
+            ctx = {
+                't212': t212,
+                'cele': cele,
+                'snapshots': snapshots,
+                'history': history,
+                'stan_raw': stan_raw,
+                'stan_spolki': sa.normalize_stan_spolki(stan_raw),
+            }
+
+            for name, fn, setup in build_targets(sa, ctx):
+                if only and name not in only:
+                    continue
+                results[name] = measure(fn, setup=setup, repeat=repeat)
+                sink.seek(0)
+                sink.truncate()
+
+        for name, res in results.items():
+            print(f"  {scale:>6} | {name:<48} {res['median_ms']:>10.2f} ms (min {res['min_ms']:.2f})")
+        return info, results
+    finally:
+        os.chdir(old_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# === BASELINE ===
+
+def load_baseline():
+    if not os.path.exists(BASELINE_FILE):
+        return None
+    with open(BASELINE_FILE, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(results, baseline, tolerance):
+    """Zwraca listę regresji (bezwzględnych i skalowania)"""
+    regressions = []
+    base = baseline.get('results', {})
+    scales = [s for s in synthetic_data.SCALES if s in results]
+
+    for scale in scales:
+        for name, res in results[scale].items():
+            ref = base.get(scale, {}).get(name)
+            if not ref:
+                continue
+            if (res['median_ms'] > ref['median_ms'] * tolerance
+                    and res['median_ms'] - ref['median_ms'] > NOISE_FLOOR_MS):
+                regressions.append(f"{name} @ {scale}: {res['median_ms']:.2f} ms vs baseline "
+                                   f"{ref['median_ms']:.2f} ms (x{res['median_ms'] / max(ref['median_ms'], 1e-9):.2f})")
+
+    if len(scales) >= 2:
+        small, large = scales[0], scales[-1]
+        for name in results[large]:
+            cur_small = results[small].get(name)
+            ref_small = base.get(small, {}).get(name)
+            ref_large = base.get(large, {}).get(name)
+            if not (cur_small and ref_small and ref_large):
+                continue
+            growth = results[large][name]['median_ms'] / max(cur_small['median_ms'], NOISE_FLOOR_MS)
+            ref_growth = ref_large['median_ms'] / max(ref_small['median_ms'], NOISE_FLOOR_MS)
+            if growth > ref_growth * tolerance and growth > 2:
+                regressions.append(f"{name}: skalowanie {small}->{large} x{growth:.1f} vs baseline x{ref_growth:.1f}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarki analityki Horyzont Partnerów")
+    parser.add_argument('--scales', default=','.join(synthetic_data.SCALES),
+                        help="Skale oddzielone przecinkiem (domyślnie wszystkie)")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', default='', help="Nazwy benchmarków oddzielone przecinkiem")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--update-baseline', action='store_true', help="Zapisz wyniki jako nowy baseline")
+    parser.add_argument('--output', help="Zapisz wyniki tego przebiegu do pliku JSON")
+    args = parser.parse_args(argv)
+
+    install_offline_stubs()
+    scales = [s.strip() for s in args.scales.split(',') if s.strip()]
+    only = {s.strip() for s in args.only.split(',') if s.strip()} or None
+
+    print(f"⏱️ Benchmarki offline: skale {', '.join(scales)}, powtórzenia {args.repeat}")
+    results, infos = {}, {}
+    for scale in scales:
+        infos[scale], results[scale] = run_scale(scale, args.repeat, only)
+
+    run = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'scales': infos,
+        'results': results
+    }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(run, f, indent=2, ensure_ascii=False)
+
+    if args.update_baseline:
+        with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(run, f, indent=2, ensure_ascii=False)
+        print(f"✅ Zapisano baseline: {BASELINE_FILE}")
+        return 0
+
+    baseline = load_baseline()
+    if baseline is None:
+        print("ℹ️ Brak baseline - uruchom z --update-baseline, aby go utworzyć")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n❌ Regresje wydajności ({len(regressions)}):")
+        for r in regressions:
+            print(f"   • {r}")
+        return 1
+    print(f"\n✅ Brak regresji względem baseline z {baseline.get('generated_at', '?')}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
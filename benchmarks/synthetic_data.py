@@ -0,0 +1,254 @@
+"""
+synthetic_data.py
+
+Generator realistycznych, deterministycznych danych do benchmarków.
+
+Tworzy w podanym katalogu komplet plików, które czyta aplikacja:
+- trading212_cache.json (100-2000 pozycji, świeży timestamp)
+- krypto.json, kredyty.json, cele.json, wyplaty.json
+- daily_snapshots.json (lata dziennych snapshotów) + portfolio_history.json
+- persona_memory.json (duża historia decyzji, lekcji i nastrojów)
+- knowledge_base/articles.json + quarterly_reports.json
+"""
+
+import json
+import math
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+# Skale benchmarków - nazwa -> parametry generatora
+SCALES = {
+    'small': {'positions': 100, 'years': 1, 'articles': 200, 'decisions': 200, 'crypto': 10},
+    'medium': {'positions': 500, 'years': 3, 'articles': 1000, 'decisions': 1000, 'crypto': 25},
+    'large': {'positions': 2000, 'years': 5, 'articles': 3000, 'decisions': 4000, 'crypto': 60},
+}
+
+REAL_TICKERS = ['AAPL', 'MSFT', 'CVX', 'GWW', 'BLK', 'PPG', 'JNJ', 'KO', 'PEP', 'O', 'ABBV', 'XOM',
+                'PG', 'MMM', 'T', 'VZ', 'MO', 'PM', 'JPM', 'HD']
+CRYPTO_SYMBOLS = ['BTC', 'ETH', 'ATOM', 'SOL', 'DOT', 'ADA', 'AVAX', 'LINK', 'MATIC', 'XRP']
+PERSONAS = ['Partner Zarządzający (JA)', 'Nexus', 'Warren Buffett', 'George Soros',
+            'Changpeng Zhao (CZ)', 'Benjamin Graham', 'Philip Fisher']
+CATEGORIES = ['value', 'growth', 'risk', 'psychology', 'diversification', 'crypto', 'valuation', 'trading']
+WORDS = ['dywidenda', 'wycena', 'ryzyko', 'wzrost', 'inflacja', 'stopy', 'Fed', 'zyski', 'marża',
+         'sprzedaż', 'guidance', 'recesja', 'bitcoin', 'ETF', 'obligacje', 'koncentracja', 'alokacja',
+         'earnings', 'buyback', 'valuation', 'volatility', 'leverage', 'momentum', 'sektor']
+
+
+def _write_json(path: str, data, indent=2):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False)
+
+
+def _sentence(rng: random.Random, n: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+
+def make_tickers(n: int) -> List[str]:
+    tickers = [f"{t}_US_EQ" for t in REAL_TICKERS[:n]]
+    for i in range(len(tickers), n):
+        tickers.append(f"S{i:04d}_US_EQ")
+    return tickers
+
+
+def make_trading212_cache(rng: random.Random, n_positions: int) -> Dict:
+    positions = []
+    for ticker in make_tickers(n_positions):
+        price = round(math.exp(rng.uniform(math.log(5), math.log(1500))), 2)
+        quantity = round(rng.lognormvariate(-1.5, 1.0), 8)
+        avg_price = round(price * rng.uniform(0.8, 1.2), 8)
+        positions.append({
+            "ticker": ticker,
+            "quantity": quantity,
+            "averagePrice": avg_price,
+            "currentPrice": price,
+            "ppl": round((price - avg_price) * quantity, 2),
+            "fxPpl": 0,
+            "initialFillDate": "2025-04-17T16:41:38.000+03:00",
+            "frontend": "AUTOINVEST" if rng.random() < 0.6 else "API",
+            "maxBuy": None,
+            "maxSell": None,
+            "pieQuantity": quantity
+        })
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "data": {
+            "positions": positions,
+            "account": {"free": round(rng.uniform(100, 10000), 2), "currencyCode": "USD"},
+            "dividends": []
+        }
+    }
+
+
+def make_krypto(rng: random.Random, n: int) -> Dict:
+    krypto = []
+    for i in range(n):
+        symbol = CRYPTO_SYMBOLS[i % len(CRYPTO_SYMBOLS)]
+        krypto.append({
+            "id": f"{1761000000 + i}.0",
+            "symbol": symbol,
+            "ilosc": round(rng.uniform(0.001, 50), 6),
+            "cena_zakupu_usd": round(math.exp(rng.uniform(0, 11)), 4),
+            "platforma": rng.choice(["Gate.io", "Binance", "Kraken"]),
+            "status": rng.choice(["Staking", "Earn", "Spot"]),
+            "apy": round(rng.uniform(0, 20), 2),
+            "notatki": "",
+            "data_dodania": "2025-10-21T19:18:04"
+        })
+    return {"krypto": krypto}
+
+
+def make_daily_snapshots(rng: random.Random, years: int, end: datetime) -> List[Dict]:
+    days = years * 365
+    snapshots = []
+    net_worth = 40000.0
+    for d in range(days):
+        day = end - timedelta(days=days - d)
+        net_worth *= math.exp(rng.gauss(0.0004, 0.012))
+        usd_pln = round(3.6 + 0.2 * math.sin(d / 90), 4)
+        stocks_pln = net_worth * 0.6
+        crypto_pln = net_worth * 0.45
+        debt_pln = net_worth * 0.05
+        snapshots.append({
+            'date': day.strftime('%Y-%m-%d 21:00:00'),
+            'date_only': day.strftime('%Y-%m-%d'),
+            'usd_pln_rate': usd_pln,
+            'stocks': {'value_usd': round(stocks_pln / usd_pln, 2), 'value_pln': round(stocks_pln, 2),
+                       'positions': 56, 'cash_usd': 1000.0},
+            'crypto': {'value_usd': round(crypto_pln / usd_pln, 2), 'value_pln': round(crypto_pln, 2),
+                       'positions': 17},
+            'debt': {'total_pln': round(debt_pln, 2), 'loans_count': 1},
+            'emergency_fund': {'current_pln': 5000 + d * 5, 'target_pln': 10000,
+                               'progress_pct': min(100.0, (5000 + d * 5) / 100)},
+            'totals': {'assets_usd': round((stocks_pln + crypto_pln) / usd_pln, 2),
+                       'assets_pln': round(stocks_pln + crypto_pln, 2),
+                       'debt_pln': round(debt_pln, 2), 'net_worth_pln': round(net_worth, 2)}
+        })
+    return snapshots
+
+
+def make_portfolio_history(snapshots: List[Dict]) -> List[Dict]:
+    """Format portfolio_history.json (AnimatedTimeline) wyprowadzony ze snapshotów"""
+    return [{
+        'timestamp': s['date'].replace(' ', 'T'),
+        'value': s['totals']['net_worth_pln'],
+        'value_usd': s['totals']['assets_usd'],
+        'leverage': round(s['totals']['debt_pln'] / s['totals']['assets_pln'] * 100, 2),
+        'stocks_count': s['stocks']['positions'],
+        'crypto_count': s['crypto']['positions']
+    } for s in snapshots]
+
+
+def make_persona_memory(rng: random.Random, decisions_per_persona: int, tickers: List[str]) -> Dict:
+    memory = {"meta": {"total_decisions": 0, "created": "2025-10-21"}}
+    for persona in PERSONAS:
+        history = []
+        for i in range(decisions_per_persona):
+            audited = rng.random() < 0.7
+            result = round(rng.gauss(2, 15), 2) if audited else None
+            history.append({
+                "id": f"{persona.replace(' ', '_')}_{i}",
+                "date": "2025-10-21",
+                "timestamp": "2025-10-21T10:00:00",
+                "decision_type": rng.choice(["BUY", "SELL", "HOLD", "WARN"]),
+                "ticker": rng.choice(tickers).replace('_US_EQ', ''),
+                "reasoning": _sentence(rng, 25)[:200],
+                "current_price": round(rng.uniform(5, 500), 2),
+                "confidence": round(rng.random(), 2),
+                "outcome": "audited" if audited else None,
+                "result_price": None,
+                "result_pct": result,
+                "was_correct": (result > 0) if audited else None,
+                "impact_pln": None
+            })
+        memory[persona] = {
+            "stats": {"sessions_participated": decisions_per_persona // 3, "decisions_made": decisions_per_persona,
+                      "successful_calls": 0, "failed_calls": 0, "credibility_score": 0.8,
+                      "total_impact_pln": 0, "last_updated": "2025-10-21"},
+            "personality_traits": {"risk_tolerance": 0.6, "optimism_bias": 0.1, "openness_to_crypto": 0.5,
+                                   "trust_in_team": 0.8, "decision_speed": 0.7},
+            "decision_history": history,
+            "key_lessons": [{"date": "2025-10-21", "lesson": _sentence(rng, 12)}
+                            for _ in range(decisions_per_persona // 10)],
+            "memorable_quotes": [_sentence(rng, 10) for _ in range(decisions_per_persona // 20)],
+            "emotional_state": {"current_mood": "neutral", "stress_level": 0.3, "excitement": 0.4,
+                                "fear_index": 0.2, "last_emotion_change": "2025-10-21",
+                                "mood_history": [{"date": "2025-10-21", "mood": rng.choice(["calm", "worried"])}
+                                                 for _ in range(decisions_per_persona // 5)]},
+            "relationships": {other: {"trust": 0.5, "agreement_rate": 0.5, "conflicts": 0, "alliances": 0,
+                                      "last_interaction": "neutral", "notable_moments": []}
+                              for other in PERSONAS if other != persona}
+        }
+        memory["meta"]["total_decisions"] += decisions_per_persona
+    return memory
+
+
+def make_knowledge_base(rng: random.Random, n_articles: int, tickers: List[str]) -> Dict[str, Dict]:
+    articles = []
+    for i in range(n_articles):
+        articles.append({
+            "id": f"a{i:06d}",
+            "date": (datetime(2025, 1, 1) + timedelta(hours=i * 3)).isoformat(),
+            "title": f"{rng.choice(tickers).replace('_US_EQ', '')} {_sentence(rng, 8)}",
+            "source": rng.choice(["Seeking Alpha", "Reuters", "Bloomberg", "Bankier"]),
+            "url": f"https://example.com/{i}",
+            "summary": _sentence(rng, 60),
+            "category": rng.choice(CATEGORIES),
+            "relevance": rng.randint(1, 10),
+            "type": "portfolio" if rng.random() < 0.3 else "market"
+        })
+    reports = []
+    for ticker in tickers[:max(10, n_articles // 20)]:
+        reports.append({
+            "ticker": ticker.replace('_US_EQ', ''),
+            "company": f"{ticker} Inc.",
+            "quarter": "Q3 2025",
+            "date": "2025-08-01",
+            "revenue": "$10.0B",
+            "revenue_growth": "+5% YoY",
+            "eps": "$1.40",
+            "eps_growth": "+8% YoY",
+            "highlights": [_sentence(rng, 10) for _ in range(4)],
+            "concerns": [_sentence(rng, 10) for _ in range(2)]
+        })
+    return {
+        "articles": {"last_updated": datetime.now().isoformat(), "total_articles": len(articles), "articles": articles},
+        "quarterly_reports": {"quarterly_reports": reports}
+    }
+
+
+def generate(workdir: str, scale: str = 'small', seed: int = 42) -> Dict:
+    """
+    Generuje komplet danych dla danej skali w katalogu workdir
+
+    Returns:
+        dict: parametry skali + liczności wygenerowanych zbiorów
+    """
+    params = SCALES[scale]
+    rng = random.Random(f"{seed}:{scale}")
+    end = datetime(2026, 1, 1)
+    tickers = make_tickers(params['positions'])
+
+    snapshots = make_daily_snapshots(rng, params['years'], end)
+    kb = make_knowledge_base(rng, params['articles'], tickers)
+
+    _write_json(os.path.join(workdir, 'trading212_cache.json'), make_trading212_cache(rng, params['positions']))
+    _write_json(os.path.join(workdir, 'krypto.json'), make_krypto(rng, params['crypto']))
+    _write_json(os.path.join(workdir, 'kredyty.json'), {"kredyty": [
+        {"id": "1", "nazwa": "VeloBank", "kwota_poczatkowa": 7999, "data_zaciagniecia": "2025-09-15",
+         "dzien_splaty": 15, "oprocentowanie": 0.0, "rata_miesieczna": 667, "splacono": 1334, "notatki": ""}]})
+    _write_json(os.path.join(workdir, 'cele.json'), {
+        "Rezerwa_gotowkowa_PLN": 10000, "Rezerwa_gotowkowa_obecna_PLN": 4000,
+        "ADD_wartosc_docelowa_PLN": 50000, "Dlugi_poczatkowe_PLN": 8000})
+    _write_json(os.path.join(workdir, 'wyplaty.json'), {"wyplaty": [
+        {"kwota": 6000 + i * 10, "data": f"2025-{(i % 12) + 1:02d}-10"} for i in range(24)]})
+    _write_json(os.path.join(workdir, 'daily_snapshots.json'), snapshots)
+    _write_json(os.path.join(workdir, 'portfolio_history.json'), make_portfolio_history(snapshots))
+    _write_json(os.path.join(workdir, 'persona_memory.json'),
+                make_persona_memory(rng, params['decisions'], tickers))
+    _write_json(os.path.join(workdir, 'knowledge_base', 'articles.json'), kb['articles'])
+    _write_json(os.path.join(workdir, 'knowledge_base', 'quarterly_reports.json'), kb['quarterly_reports'])
+
+    return dict(params, scale=scale, snapshots=len(snapshots))
@@ -323,7 +323,7 @@ Odpowiedź TYLKO w formacie JSON:
                 notifier = get_conversation_notifier()
                 if notifier.config.get("enabled", False):
                     notifier.send_consultation_completed(consultation)
-                    print(f"📧 Email notification wysłany")
+                    print(f"📧 Email notification w kolejce wysyłki")
             except Exception as e:
                 print(f"⚠️ Nie można wysłać email notification: {e}")
             
@@ -0,0 +1,282 @@
+"""
+conversation_store.py
+
+Magazyn autonomicznych rozmów Rady: jeden plik JSON na rozmowę + lekki indeks.
+
+    autonomous_conversations/
+        index.json                  # metadane wszystkich rozmów (bez treści wiadomości)
+        conv_20251102_192607.json   # pełny rekord jednej rozmowy
+
+- zapis rozmowy = zapis jej pliku + indeksu (bez przepisywania całej historii)
+- indeks po id (dict) i po dacie (posortowana lista + słownik dni) - "ostatnie N",
+  stronicowanie i filtry działają na metadanych
+- treść wiadomości wczytywana leniwie, dopiero gdy potrzebna (get / with_messages)
+- indeks jest przeładowywany, gdy zmieni go inny proces (np. git pull po workflow)
+- przy pierwszym użyciu importuje stary autonomous_conversations.json (jedna lista)
+"""
+
+import bisect
+import json
+import os
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+CONVERSATIONS_DIR = "autonomous_conversations"
+INDEX_NAME = "index.json"
+LEGACY_FILE = "autonomous_conversations.json"
+INDEX_VERSION = 1
+
+
+def _write_json_atomic(path: str, data) -> None:
+    """Zapis przez plik tymczasowy + os.replace - czytelnik nigdy nie widzi połowy pliku"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def conversation_meta(conversation: Dict) -> Dict:
+    """Metadane rozmowy trzymane w indeksie (wszystko poza treścią wiadomości)"""
+    summary = conversation.get("summary") or {}
+    return {
+        "id": conversation.get("id"),
+        "date": conversation.get("date", ""),
+        "topic_id": conversation.get("topic_id"),
+        "topic_name": conversation.get("topic_name", "Unknown"),
+        "participants": conversation.get("participants", []),
+        "status": conversation.get("status", "unknown"),
+        "message_count": len(conversation.get("messages", [])),
+        "api_calls_used": conversation.get("api_calls_used", 0),
+        "sentiment": summary.get("sentiment") if isinstance(summary, dict) else None,
+        "has_summary": bool(summary),
+    }
+
+
+class ConversationStore:
+    """Indeksowany magazyn rozmów (bezpieczny wątkowo w obrębie procesu)"""
+
+    def __init__(self, directory: str = CONVERSATIONS_DIR, legacy_file: Optional[str] = LEGACY_FILE):
+        self.directory = directory
+        self.index_path = os.path.join(directory, INDEX_NAME)
+        self.legacy_file = legacy_file
+        self._lock = threading.RLock()
+        self._by_id: Dict[str, Dict] = {}
+        self._order: List[Tuple[str, str]] = []  # (date, id) rosnąco
+        self._by_day: Dict[str, List[str]] = {}
+        self._index_mtime: Optional[float] = None
+        self._load()
+
+    # === INDEKS ===
+
+    def _record_path(self, conv_id: str) -> str:
+        return os.path.join(self.directory, f"{conv_id}.json")
+
+    def _reset(self, metas: List[Dict]):
+        self._by_id = {}
+        for meta in metas:
+            if meta.get("id"):
+                self._by_id[meta["id"]] = meta  # Późniejszy wpis wygrywa (duplikaty ze starego pliku)
+        self._order = sorted((m.get("date", ""), m["id"]) for m in self._by_id.values())
+        self._by_day = {}
+        for date, conv_id in self._order:
+            self._by_day.setdefault(date[:10], []).append(conv_id)
+
+    def _load(self):
+        with self._lock:
+            if os.path.exists(self.index_path):
+                try:
+                    with open(self.index_path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    self._reset(data.get("conversations", []))
+                    self._index_mtime = os.path.getmtime(self.index_path)
+                    return
+                except (OSError, json.JSONDecodeError) as e:
+                    print(f"⚠️ Indeks rozmów uszkodzony ({e}) - odbudowuję z plików")
+                    self.rebuild_index()
+                    return
+
+            if os.path.isdir(self.directory):
+                self.rebuild_index()
+            elif self.legacy_file and os.path.exists(self.legacy_file):
+                self._migrate_legacy()
+            else:
+                self._reset([])
+
+    def _refresh_if_changed(self):
+        """Przeładuj indeks, jeśli zapisał go inny proces"""
+        try:
+            mtime = os.path.getmtime(self.index_path)
+        except OSError:
+            return
+        if mtime != self._index_mtime:
+            self._load()
+
+    def _save_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        metas = [self._by_id[conv_id] for _, conv_id in self._order]
+        _write_json_atomic(self.index_path, {"version": INDEX_VERSION, "conversations": metas})
+        self._index_mtime = os.path.getmtime(self.index_path)
+
+    def rebuild_index(self) -> int:
+        """Odbuduj indeks skanując pliki rozmów (np. po ręcznej edycji katalogu)"""
+        with self._lock:
+            metas = []
+            if os.path.isdir(self.directory):
+                for name in sorted(os.listdir(self.directory)):
+                    if not name.endswith(".json") or name == INDEX_NAME:
+                        continue
+                    try:
+                        with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                            metas.append(conversation_meta(json.load(f)))
+                    except (OSError, json.JSONDecodeError) as e:
+                        print(f"⚠️ Pomijam uszkodzony plik rozmowy {name}: {e}")
+            self._reset(metas)
+            self._save_index()
+            return len(metas)
+
+    def _migrate_legacy(self):
+        """Jednorazowy import listy z autonomous_conversations.json"""
+        with open(self.legacy_file, 'r', encoding='utf-8') as f:
+            legacy = json.load(f)
+        if isinstance(legacy, dict):
+            legacy = legacy.get("conversations", [])
+
+        latest = {}
+        for conv in legacy:
+            if isinstance(conv, dict) and conv.get("id"):
+                latest[conv["id"]] = conv  # Stary silnik zapisywał rozmowę dwa razy
+
+        os.makedirs(self.directory, exist_ok=True)
+        for conv_id, conv in latest.items():
+            _write_json_atomic(self._record_path(conv_id), conv)
+        self._reset([conversation_meta(c) for c in latest.values()])
+        self._save_index()
+        print(f"📦 Zmigrowano {len(latest)} rozmów z {self.legacy_file} do {self.directory}/")
+
+    # === ZAPIS ===
+
+    def save(self, conversation: Dict) -> Dict:
+        """Zapisz (lub nadpisz) rozmowę - koszt niezależny od liczby rozmów w historii"""
+        conv_id = conversation.get("id")
+        if not conv_id:
+            raise ValueError("Rozmowa musi mieć pole 'id'")
+
+        meta = conversation_meta(conversation)
+        with self._lock:
+            self._refresh_if_changed()
+            os.makedirs(self.directory, exist_ok=True)
+            _write_json_atomic(self._record_path(conv_id), conversation)
+
+            old = self._by_id.get(conv_id)
+            if old is not None:
+                pos = bisect.bisect_left(self._order, (old.get("date", ""), conv_id))
+                if pos < len(self._order) and self._order[pos] == (old.get("date", ""), conv_id):
+                    self._order.pop(pos)
+                day_ids = self._by_day.get(old.get("date", "")[:10], [])
+                if conv_id in day_ids:
+                    day_ids.remove(conv_id)
+
+            self._by_id[conv_id] = meta
+            bisect.insort(self._order, (meta["date"], conv_id))
+            self._by_day.setdefault(meta["date"][:10], []).append(conv_id)
+            self._save_index()
+        return meta
+
+    # === ODCZYT ===
+
+    def __len__(self) -> int:
+        self._refresh_if_changed()
+        return len(self._order)
+
+    def get(self, conv_id: str) -> Optional[Dict]:
+        """Pełny rekord rozmowy (z wiadomościami) - O(1) przez indeks id"""
+        self._refresh_if_changed()
+        if conv_id not in self._by_id:
+            return None
+        try:
+            with open(self._record_path(conv_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Nie można wczytać rozmowy {conv_id}: {e}")
+            return None
+
+    def get_meta(self, conv_id: str) -> Optional[Dict]:
+        self._refresh_if_changed()
+        return self._by_id.get(conv_id)
+
+    def recent(self, limit: int = 10, offset: int = 0, with_messages: bool = False) -> List[Dict]:
+        """
+        Strona najnowszych rozmów (od najnowszej)
+
+        Args:
+            limit / offset: stronicowanie
+            with_messages: True = pełne rekordy (czyta tylko pliki z tej strony)
+        """
+        self._refresh_if_changed()
+        with self._lock:
+            end = len(self._order) - offset
+            start = max(0, end - limit)
+            ids = [conv_id for _, conv_id in reversed(self._order[start:max(end, 0)])]
+            metas = [self._by_id[conv_id] for conv_id in ids]
+        if not with_messages:
+            return metas
+        return [conv for conv in (self.get(m["id"]) for m in metas) if conv is not None]
+
+    def on_day(self, day: str, with_messages: bool = False) -> List[Dict]:
+        """Rozmowy z danego dnia (YYYY-MM-DD) - np. do dziennego digestu"""
+        self._refresh_if_changed()
+        ids = list(self._by_day.get(day, []))
+        if not with_messages:
+            return [self._by_id[conv_id] for conv_id in ids]
+        return [conv for conv in (self.get(conv_id) for conv_id in ids) if conv is not None]
+
+    def query(self, topic: Optional[str] = None, day: Optional[str] = None, min_messages: int = 0,
+              limit: int = 10, offset: int = 0) -> Tuple[int, List[Dict]]:
+        """
+        Filtrowanie po metadanych (bez czytania treści)
+
+        Returns:
+            (liczba pasujących, strona metadanych od najnowszej)
+        """
+        self._refresh_if_changed()
+        with self._lock:
+            if day:
+                candidates = [self._by_id[conv_id] for conv_id in reversed(self._by_day.get(day, []))]
+            else:
+                candidates = [self._by_id[conv_id] for _, conv_id in reversed(self._order)]
+        matches = [
+            m for m in candidates
+            if (not topic or m.get("topic_name") == topic) and m.get("message_count", 0) >= min_messages
+        ]
+        return len(matches), matches[offset:offset + limit]
+
+    def topics(self) -> List[str]:
+        self._refresh_if_changed()
+        return sorted({m.get("topic_name", "Unknown") for m in self._by_id.values()})
+
+    def days(self) -> List[str]:
+        """Dni z rozmowami, od najnowszego"""
+        self._refresh_if_changed()
+        return sorted(self._by_day, reverse=True)
+
+    def iter_conversations(self) -> Iterator[Dict]:
+        """Wszystkie rozmowy chronologicznie, wczytywane pojedynczo"""
+        self._refresh_if_changed()
+        for _, conv_id in list(self._order):
+            conv = self.get(conv_id)
+            if conv is not None:
+                yield conv
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_conversation_store() -> ConversationStore:
+    """Singleton magazynu rozmów"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ConversationStore()
+    return _store
@@ -20,7 +20,6 @@ import json
 import os
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
-import requests
 
 # Import istniejących modułów
 try:
@@ -35,6 +34,9 @@ try:
 except ImportError:
     CryptoPortfolioManager = None
 
+# Wspólny model portfela (to samo źródło co Streamlit/audyt/insight)
+from portfolio_model import get_portfolio_model, get_usd_pln_rate as _model_usd_pln_rate
+
 SNAPSHOT_FILE = "daily_snapshots.json"
 MONTHLY_SNAPSHOT_FILE = "monthly_snapshot.json"
 # Historia NIGDY nie jest usuwana - pełna historia od początku
@@ -42,10 +44,7 @@ MONTHLY_SNAPSHOT_FILE = "monthly_snapshot.json"
 def get_trading212_cash_usd() -> float:
     """Pobierz cash z Trading212 w USD"""
     try:
-        if os.path.exists('trading212_cache.json'):
-            with open('trading212_cache.json', 'r', encoding='utf-8') as f:
-                t212_data = json.load(f)
-                return float(t212_data.get('data', {}).get('account', {}).get('free', 0))
+        return get_portfolio_model().cash_usd
     except Exception as e:
         print(f"⚠️ Błąd pobierania cash z Trading212: {e}")
     return 0.0
@@ -147,42 +146,28 @@ def get_portfolio_data_from_main() -> Optional[Dict]:
         return None
 
 def get_crypto_data() -> Optional[Dict]:
-    """Pobierz dane crypto z lokalnego pliku + live prices"""
+    """Pobierz dane crypto z modelu portfela + live prices"""
     try:
-        if not os.path.exists('krypto.json'):
-            return None
-            
-        with open('krypto.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # Obsługa różnych formatów (może być bezpośrednio lista lub {'krypto': lista})
-        if isinstance(data, dict) and 'krypto' in data:
-            crypto_holdings = data['krypto']
-        elif isinstance(data, list):
-            crypto_holdings = data
-        else:
+        model = get_portfolio_model()
+        if not len(model.crypto):
             return None
         
         # Podstawowe dane z pliku
-        total_amount = sum(k.get('kwota_usd', 0) for k in crypto_holdings)
+        total_amount = model.crypto_usd
         
         # Spróbuj pobrać live prices jeśli manager dostępny
         if CryptoPortfolioManager:
             try:
                 manager = CryptoPortfolioManager()
-                symbols = [k.get('symbol') for k in crypto_holdings if k.get('symbol')]
-                prices = manager.get_current_prices(symbols)
+                prices = manager.get_current_prices(model.crypto.tickers)
                 
                 # Przelicz z live prices
                 live_value = 0
-                for holding in crypto_holdings:
-                    symbol = holding.get('symbol')
-                    quantity = holding.get('ilosc', 0)
-                    if symbol and symbol in prices:
-                        price_data = prices.get(symbol, {})
-                        current_price = price_data.get('current_price', 0)
-                        if current_price > 0:
-                            live_value += quantity * current_price
+                for holding in model.crypto:
+                    price_data = prices.get(holding.ticker, {})
+                    current_price = price_data.get('current_price', 0) if price_data else 0
+                    if current_price > 0:
+                        live_value += holding.quantity * current_price
                 
                 if live_value > 0:
                     total_amount = live_value
@@ -192,7 +177,7 @@ def get_crypto_data() -> Optional[Dict]:
         
         return {
             'total_value_usd': total_amount,
-            'positions_count': len(crypto_holdings)
+            'positions_count': len(model.crypto)
         }
     except Exception as e:
         print(f"⚠️ Błąd crypto: {e}")
@@ -201,25 +186,13 @@ def get_crypto_data() -> Optional[Dict]:
 def get_kredyty_data() -> Optional[Dict]:
     """Pobierz dane o zobowiązaniach"""
     try:
-        if not os.path.exists('kredyty.json'):
+        model = get_portfolio_model()
+        if not model.loans:
             return None
-            
-        with open('kredyty.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # Obsługa różnych formatów
-        if isinstance(data, dict) and 'kredyty' in data:
-            kredyty = data['kredyty']
-        elif isinstance(data, list):
-            kredyty = data
-        else:
-            return None
-        
-        total_debt = sum(k.get('pozostalo_do_splaty', 0) for k in kredyty)
         
         return {
-            'total_debt_pln': total_debt,
-            'loans_count': len(kredyty)
+            'total_debt_pln': model.debt_pln,
+            'loans_count': len(model.loans)
         }
     except Exception as e:
         print(f"⚠️ Błąd kredyty: {e}")
@@ -227,16 +200,7 @@ def get_kredyty_data() -> Optional[Dict]:
 
 def get_usd_pln_rate() -> float:
     """Pobierz aktualny kurs USD/PLN"""
-    try:
-        response = requests.get(
-            'https://api.nbp.pl/api/exchangerates/rates/a/usd/?format=json',
-            timeout=5
-        )
-        if response.status_code == 200:
-            return response.json()['rates'][0]['mid']
-    except:
-        pass
-    return 3.65  # Fallback jeśli API nie działa
+    return _model_usd_pln_rate()
 
 def load_snapshot_history() -> List[Dict]:
     """Wczytaj historię snapshots"""
@@ -294,33 +258,28 @@ def save_daily_snapshot(api_key: Optional[str] = None) -> bool:
     usd_pln = get_usd_pln_rate()
     print(f"💱 USD/PLN: {usd_pln:.4f}")
     
-    # Pobierz pełne dane z głównego programu
-    stan_spolki = get_portfolio_data_from_main()
-    
-    if not stan_spolki:
-        print("❌ Nie można pobrać danych portfela z gra_rpg.py!")
-        print("   Sprawdź czy główny program działa poprawnie")
+    # Wspólny model portfela (bez importu całej aplikacji Streamlit)
+    try:
+        model = get_portfolio_model(usd_pln)
+    except Exception as e:
+        print(f"❌ Nie można zbudować modelu portfela: {e}")
         return False
     
-    # Parsuj dane ze struktury gra_rpg
     try:
-        # Akcje - bezpośrednio w głównej strukturze
-        portfel_akcji = stan_spolki.get('PORTFEL_AKCJI', {})
-        stocks_usd = portfel_akcji.get('Suma_USD', 0)
-        stocks_pln = portfel_akcji.get('Suma_PLN', 0)
-        stocks_positions = portfel_akcji.get('Liczba_pozycji_calkowita', 0)
-        stocks_cash = portfel_akcji.get('Cash_free_USD', 0)
+        # Akcje
+        stocks_usd = model.stocks_usd
+        stocks_pln = model.stocks_pln
+        stocks_positions = len(model.stocks)
+        stocks_cash = model.cash_usd
         
-        # Crypto - bezpośrednio w głównej strukturze
-        portfel_krypto = stan_spolki.get('PORTFEL_KRYPTO', {})
-        crypto_usd = portfel_krypto.get('Suma_USD', 0)
-        crypto_pln = portfel_krypto.get('Suma_PLN', 0)
-        crypto_positions = portfel_krypto.get('Liczba_pozycji', 0)
+        # Crypto
+        crypto_usd = model.crypto_usd
+        crypto_pln = model.crypto_pln
+        crypto_positions = len(model.crypto)
         
-        # Zobowiązania - FIX: prawidłowa nazwa klucza i pola
-        zobowiazania = stan_spolki.get('ZOBOWIAZANIA', {})
-        debt_pln = zobowiazania.get('Suma_dlugu_PLN', 0)
-        debt_count = zobowiazania.get('Liczba_kredytow', 0)
+        # Zobowiązania
+        debt_pln = model.debt_pln
+        debt_count = len(model.loans)
         
         # Rezerwa gotówkowa - z cele.json + cash z Trading212
         try:
@@ -330,8 +289,7 @@ def save_daily_snapshot(api_key: Optional[str] = None) -> bool:
                 emergency_fund_target_pln = cele_data.get('Rezerwa_gotowkowa_PLN', 10000)
             
             # DODAJ cash z Trading212 do rezerwy
-            cash_usd = get_trading212_cash_usd()
-            cash_pln = cash_usd * usd_pln_rate
+            cash_pln = model.cash_pln
             emergency_fund_pln = emergency_fund_base_pln + cash_pln
             
             print(f"💵 Rezerwa gotówkowa: {emergency_fund_base_pln:,.2f} PLN (cele.json) + {cash_pln:,.2f} PLN (T212 cash) = {emergency_fund_pln:,.2f} PLN")
@@ -342,8 +300,8 @@ def save_daily_snapshot(api_key: Optional[str] = None) -> bool:
         
         # Totale
         total_usd = stocks_usd + crypto_usd
-        total_pln = stocks_pln + crypto_pln
-        net_worth_pln = total_pln - debt_pln
+        total_pln = model.assets_pln
+        net_worth_pln = model.net_worth_pln
         
     except Exception as e:
         print(f"❌ Błąd parsowania danych: {e}")
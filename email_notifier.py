@@ -2,13 +2,13 @@
 Email Notifier - Wysyłanie powiadomień o ważnych zmianach w portfelu
 """
 
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from datetime import datetime
 from typing import Dict, List, Optional
 import json
 import os
+import threading
+
+from email_outbox import EmailOutbox, get_email_outbox
 
 class EmailNotifier:
     """Menedżer powiadomień e-mail"""
@@ -27,7 +27,9 @@ class EmailNotifier:
         self.sender_password = os.getenv('NOTIFIER_PASSWORD')
         self.recipient_emails = []
         self.alert_thresholds = {}
-        
+        # Wspólna kolejka wysyłki (połączenie SMTP współdzielone w partii, wysyłka w tle)
+        self.outbox: EmailOutbox = get_email_outbox()
+    
     def add_recipient(self, email: str) -> None:
         """Dodaj adres e-mail do listy odbiorców"""
         if email not in self.recipient_emails:
@@ -94,50 +96,62 @@ class EmailNotifier:
         return alerts
     
     def send_email(self, recipient: str, subject: str, body: str, alerts: Optional[List[Dict]] = None) -> bool:
-        """Wyślij e-mail z powiadomieniami"""
-        if not self.sender_email or not self.sender_password:
+        """
+        Dodaj e-mail z powiadomieniami do kolejki wysyłki
+        
+        Nie blokuje na SMTP - wiadomość wysyła wątek outboxa.
+        
+        Returns:
+            bool: True jeśli wiadomość trafiła do kolejki
+        """
+        if not self.outbox.sender_email:
             print("⚠️ Brak konfiguracji e-mail (NOTIFIER_EMAIL, NOTIFIER_PASSWORD)")
             return False
         
         try:
-            # Utwórz wiadomość
-            message = MIMEMultipart("alternative")
-            message["Subject"] = subject
-            message["From"] = self.sender_email
-            message["To"] = recipient
-            
-            # HTML body
-            html_body = self._create_html_email(subject, body, alerts)
-            
-            message.attach(MIMEText(html_body, "html"))
-            
-            # Wyślij wiadomość
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.sender_email, self.sender_password)
-                server.sendmail(self.sender_email, recipient, message.as_string())
-            
-            print(f"✅ E-mail wysłany do {recipient}")
+            self.outbox.enqueue(recipient, subject, self._create_html_email(subject, body, alerts), kind="email")
             return True
-            
         except Exception as e:
-            print(f"❌ Błąd przy wysyłaniu e-mail: {e}")
+            print(f"❌ Błąd przy kolejkowaniu e-mail: {e}")
             return False
     
+    def send_notification(self, to_email: str, subject: str, html_body: str,
+                          notification_type: str = "notification") -> str:
+        """
+        Dodaj gotowy HTML do kolejki wysyłki
+        
+        Returns:
+            str: id wiadomości w outboxie
+        
+        Raises:
+            ValueError: brak adresu odbiorcy
+        """
+        if not to_email:
+            raise ValueError("Brak adresu odbiorcy (email_to)")
+        return self.outbox.enqueue(to_email, subject, html_body, kind=notification_type)
+    
     def send_alert_emails(self, alerts: List[Dict]) -> None:
-        """Wyślij e-maile ze wszystkimi alertami do wszystkich odbiorców"""
+        """
+        Dodaj alerty do digestu każdego odbiorcy
+        
+        Alerty zgłoszone w krótkim odstępie czasu trafiają do jednego e-maila
+        na odbiorcę zamiast osobnej wiadomości na alert.
+        """
         if not alerts or not self.recipient_emails:
             return
         
-        alert_html = self._create_alert_html(alerts)
-        
         for recipient in self.recipient_emails:
-            self.send_email(
-                recipient,
-                "🚨 Ważne powiadomienie o portfelu",
-                alert_html,
-                alerts
-            )
+            try:
+                self.outbox.enqueue_alerts(
+                    recipient,
+                    "🚨 Ważne powiadomienie o portfelu",
+                    alerts,
+                    render=lambda subject, digest_alerts: self._create_html_email(
+                        subject, self._create_alert_html(digest_alerts), digest_alerts
+                    )
+                )
+            except Exception as e:
+                print(f"❌ Błąd przy kolejkowaniu alertów dla {recipient}: {e}")
     
     def _create_html_email(self, subject: str, body: str, alerts: Optional[List[Dict]] = None) -> str:
         """Utwórz HTML wiadomości e-mail"""
@@ -265,6 +279,9 @@ class ConversationNotifier(EmailNotifier):
         super().__init__()
         self.config = self._load_notification_config()
         self.history = self._load_notification_history()
+        self._history_lock = threading.Lock()
+        # Wynik doręczenia (z wątku outboxa) trafia do historii powiadomień
+        self.outbox.add_listener(self._on_delivery)
     
     def _load_notification_config(self) -> Dict:
         """Załaduj konfigurację powiadomień"""
@@ -331,8 +348,30 @@ class ConversationNotifier(EmailNotifier):
             "status": status,
             "error": error
         }
-        self.history.append(entry)
-        self._save_notification_history()
+        with self._history_lock:
+            self.history.append(entry)
+            try:
+                self._save_notification_history()
+            except Exception:
+                pass  # Streamlit Cloud - read-only filesystem
+    
+    def _on_delivery(self, item: Dict, status: str, error: Optional[str] = None):
+        """Listener outboxa - loguje faktyczne doręczenie (lub błąd po wyczerpaniu ponowień)"""
+        self._log_notification(item.get("kind", "notification"), item.get("subject", ""), status, error)
+    
+    def _queue_notification(self, notification_type: str, subject: str, html_body: str) -> bool:
+        """Dodaj powiadomienie do kolejki - status doręczenia zaloguje _on_delivery"""
+        try:
+            self.send_notification(
+                to_email=self.config.get("email_to"),
+                subject=subject,
+                html_body=html_body,
+                notification_type=notification_type
+            )
+            return True
+        except Exception as e:
+            self._log_notification(notification_type, subject, "failed", str(e))
+            return False
     
     def send_conversation_completed(self, conversation: Dict) -> bool:
         """Wyślij powiadomienie o zakończonej rozmowie"""
@@ -429,17 +468,7 @@ class ConversationNotifier(EmailNotifier):
         
         subject = f"🗣️ Nowa rozmowa: {topic_name} ({messages_count} wiadomości)"
         
-        try:
-            self.send_notification(
-                to_email=self.config.get("email_to"),
-                subject=subject,
-                html_body=html_body
-            )
-            self._log_notification("conversation_completed", subject, "sent")
-            return True
-        except Exception as e:
-            self._log_notification("conversation_completed", subject, "failed", str(e))
-            return False
+        return self._queue_notification("conversation_completed", subject, html_body)
     
     def send_daily_digest(self, conversations: List[Dict], stats: Dict) -> bool:
         """Wyślij codzienny digest"""
@@ -506,20 +535,10 @@ class ConversationNotifier(EmailNotifier):
         
         subject = f"📊 Daily Digest - {today} ({conv_count} rozmów)"
         
-        try:
-            self.send_notification(
-                to_email=self.config.get("email_to"),
-                subject=subject,
-                html_body=html_body
-            )
-            self._log_notification("daily_digest", subject, "sent")
-            return True
-        except Exception as e:
-            self._log_notification("daily_digest", subject, "failed", str(e))
-            return False
+        return self._queue_notification("daily_digest", subject, html_body)
     
     def send_test_email(self) -> bool:
-        """Wyślij testowy email"""
+        """Wyślij testowy email (synchronicznie - UI czeka na wynik)"""
         html_body = f"""
         <html>
         <body style="font-family: Arial; padding: 20px;">
@@ -530,17 +549,12 @@ class ConversationNotifier(EmailNotifier):
         </html>
         """
         
-        try:
-            self.send_notification(
-                to_email=self.config.get("email_to"),
-                subject="🧪 Test Email - Horyzont Partnerów",
-                html_body=html_body
-            )
-            self._log_notification("test", "Test Email", "sent")
-            return True
-        except Exception as e:
-            self._log_notification("test", "Test Email", "failed", str(e))
+        to_email = self.config.get("email_to")
+        if not to_email:
+            self._log_notification("test", "Test Email", "failed", "Brak adresu odbiorcy (email_to)")
             return False
+        
+        return self.outbox.send_now(to_email, "🧪 Test Email - Horyzont Partnerów", html_body, kind="test")
     
     def send_consultation_completed(self, consultation: Dict) -> bool:
         """
@@ -670,26 +684,11 @@ class ConversationNotifier(EmailNotifier):
         </html>
         """
         
-        try:
-            self.send_notification(
-                to_email=self.config.get("email_to"),
-                subject=f"🗳️ Konsultacja zakończona: {question[:50]}...",
-                html_body=html_body
-            )
-            self._log_notification(
-                "consultation_completed",
-                f"Consultation {cons_id}",
-                "sent"
-            )
-            return True
-        except Exception as e:
-            self._log_notification(
-                "consultation_completed",
-                f"Consultation {cons_id}",
-                "failed",
-                str(e)
-            )
-            return False
+        return self._queue_notification(
+            "consultation_completed",
+            f"🗳️ Konsultacja zakończona: {question[:50]}... ({cons_id})",
+            html_body
+        )
     
     def get_recent_notifications(self, limit: int = 20) -> List[Dict]:
         """Zwróć ostatnie N powiadomień"""
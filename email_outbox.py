@@ -0,0 +1,417 @@
+"""
+📮 Email Outbox - trwała kolejka e-maili z wysyłką w tle
+
+- Kolejka w pliku email_outbox.json (przeżywa restart, współdzielona między procesami)
+- Wątek w tle wysyła wszystkie gotowe wiadomości przez JEDNO połączenie SMTP
+  (STARTTLS + login raz na partię)
+- Alerty dla tego samego odbiorcy łączone są w jeden digest
+- Ponawianie z wykładniczym backoffem, błędy trwałe (auth, odrzucony adres) bez ponowień
+- Wynik doręczenia przekazywany do listenerów (np. ConversationNotifier._log_notification)
+
+Do testów: EmailOutbox(smtp_server="localhost", smtp_port=1025, use_tls=False)
+z lokalnym serwerem SMTP (np. `python -m aiosmtpd -n -l localhost:1025`).
+"""
+
+import json
+import os
+import smtplib
+import threading
+import time
+import uuid
+import atexit
+from contextlib import contextmanager
+from datetime import datetime
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Callable, Dict, List, Optional
+
+try:
+    import fcntl
+    FCNTL_OK = True
+except ImportError:  # Windows - blokada tylko w obrębie procesu
+    FCNTL_OK = False
+
+OUTBOX_FILE = "email_outbox.json"
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 30  # 30s, 60s, 120s, 240s...
+BACKOFF_MAX_SECONDS = 3600
+SMTP_TIMEOUT = 20
+CLAIM_TTL_SECONDS = 300  # Po tym czasie wiadomość zajęta przez martwy proces wraca do kolejki
+DIGEST_WINDOW_SECONDS = 60  # Jak długo czekać na kolejne alerty do digestu
+EXIT_FLUSH_TIMEOUT = 10
+EXIT_RETRY_DELAY_SECONDS = 1  # Przy wyjściu ponawiamy bez backoffu - kolejka nie przeżyje świeżego checkoutu
+
+PERMANENT_ERRORS = (smtplib.SMTPAuthenticationError, smtplib.SMTPRecipientsRefused,
+                    smtplib.SMTPSenderRefused)
+
+
+class OutboxConfigError(Exception):
+    """Brak konfiguracji nadawcy - ponawianie nic nie da"""
+
+
+def _env_flag(name: str, default: str = "1") -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+class EmailOutbox:
+    """Trwała kolejka e-maili z wysyłką partiami w wątku w tle"""
+
+    def __init__(self, smtp_server: Optional[str] = None, smtp_port: Optional[int] = None,
+                 sender_email: Optional[str] = None, sender_password: Optional[str] = None,
+                 use_tls: Optional[bool] = None, outbox_file: str = OUTBOX_FILE,
+                 digest_window_seconds: float = DIGEST_WINDOW_SECONDS):
+        self.smtp_server = smtp_server or os.getenv("NOTIFIER_SMTP_SERVER", "smtp.gmail.com")
+        self.smtp_port = int(smtp_port or os.getenv("NOTIFIER_SMTP_PORT", 587))
+        self.sender_email = sender_email or os.getenv("NOTIFIER_EMAIL") or os.getenv("GMAIL_USER")
+        self.sender_password = sender_password or os.getenv("NOTIFIER_PASSWORD") or os.getenv("GMAIL_APP_PASSWORD")
+        self.use_tls = _env_flag("NOTIFIER_SMTP_TLS") if use_tls is None else use_tls
+        self.outbox_file = outbox_file
+        self.digest_window_seconds = digest_window_seconds
+
+        self._lock = threading.RLock()
+        self._wakeup = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        self._stop = False
+        self._listeners: List[Callable[[Dict, str, Optional[str]], None]] = []
+
+    # ------------------------------------------------------------------
+    # Plik kolejki (blokada wątków + procesów)
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def _locked_queue(self):
+        """Wczytaj kolejkę pod blokadą, zapisz ją po wyjściu z bloku"""
+        with self._lock:
+            lock_file = None
+            if FCNTL_OK:
+                lock_file = open(f"{self.outbox_file}.lock", "a")
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                queue = []
+                if os.path.exists(self.outbox_file):
+                    try:
+                        with open(self.outbox_file, "r", encoding="utf-8") as f:
+                            queue = json.load(f)
+                    except Exception as e:
+                        print(f"⚠️ Błąd wczytywania kolejki e-maili: {e}")
+
+                yield queue
+
+                tmp_file = f"{self.outbox_file}.tmp"
+                with open(tmp_file, "w", encoding="utf-8") as f:
+                    json.dump(queue, f, indent=2, ensure_ascii=False)
+                os.replace(tmp_file, self.outbox_file)
+            finally:
+                if lock_file is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    lock_file.close()
+
+    # ------------------------------------------------------------------
+    # Kolejkowanie
+    # ------------------------------------------------------------------
+
+    def enqueue(self, to_email: str, subject: str, html_body: str, kind: str = "notification") -> str:
+        """Dodaj wiadomość do kolejki (nie blokuje na SMTP). Zwraca id wiadomości."""
+        item = self._new_item(to_email, subject, html_body, kind)
+        with self._locked_queue() as queue:
+            queue.append(item)
+        self._notify_worker()
+        return item["id"]
+
+    def enqueue_alerts(self, to_email: str, subject: str, alerts: List[Dict],
+                       render: Callable[[str, List[Dict]], str]) -> str:
+        """
+        Dodaj alerty do digestu odbiorcy.
+
+        Jeśli dla odbiorcy czeka już niewysłany digest, alerty są do niego
+        dopisywane (bez duplikatów), a treść renderowana ponownie przez render(subject, alerts).
+        """
+        digest_key = f"alerts:{to_email}"
+        with self._locked_queue() as queue:
+            for item in queue:
+                if item.get("digest_key") == digest_key and item["status"] == "pending" and not item["attempts"]:
+                    seen = {(a.get("type"), a.get("title"), a.get("message")) for a in item["alerts"]}
+                    for alert in alerts:
+                        if (alert.get("type"), alert.get("title"), alert.get("message")) not in seen:
+                            item["alerts"].append(alert)
+                    item["subject"] = f"{subject} ({len(item['alerts'])})" if len(item["alerts"]) > 1 else subject
+                    item["html"] = render(item["subject"], item["alerts"])
+                    return item["id"]
+
+            item = self._new_item(to_email, subject, render(subject, list(alerts)), "alert_digest")
+            item["digest_key"] = digest_key
+            item["alerts"] = list(alerts)
+            # Okno zbierania alertów - kolejne alerty trafią do tego samego maila
+            item["next_attempt_at"] = time.time() + self.digest_window_seconds
+            queue.append(item)
+
+        self._notify_worker()
+        return item["id"]
+
+    def _new_item(self, to_email: str, subject: str, html_body: str, kind: str) -> Dict:
+        return {
+            "id": uuid.uuid4().hex[:12],
+            "kind": kind,
+            "to": to_email,
+            "subject": subject,
+            "html": html_body,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": 0,
+            "created_at": datetime.now().isoformat(),
+            "last_error": None,
+        }
+
+    # ------------------------------------------------------------------
+    # Listenery (log doręczeń)
+    # ------------------------------------------------------------------
+
+    def add_listener(self, listener: Callable[[Dict, str, Optional[str]], None]):
+        """listener(item, status, error) - status: 'sent' lub 'failed'"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def _emit(self, item: Dict, status: str, error: Optional[str] = None):
+        for listener in list(self._listeners):
+            try:
+                listener(item, status, error)
+            except Exception as e:
+                print(f"⚠️ Błąd listenera outboxa: {e}")
+
+    # ------------------------------------------------------------------
+    # SMTP
+    # ------------------------------------------------------------------
+
+    def _connect(self) -> smtplib.SMTP:
+        """Jedno uwierzytelnione połączenie na partię wiadomości"""
+        if not self.sender_email:
+            raise OutboxConfigError("Brak konfiguracji e-mail (NOTIFIER_EMAIL, NOTIFIER_PASSWORD)")
+
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=SMTP_TIMEOUT)
+        try:
+            if self.use_tls:
+                server.starttls()
+            if self.sender_password:
+                server.login(self.sender_email, self.sender_password)
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def _build_message(self, item: Dict) -> str:
+        message = MIMEMultipart("alternative")
+        message["Subject"] = item["subject"]
+        message["From"] = self.sender_email
+        message["To"] = item["to"]
+        message.attach(MIMEText(item["html"], "html"))
+        return message.as_string()
+
+    def _deliver_batch(self, items: List[Dict]) -> Dict[str, Optional[Exception]]:
+        """Wyślij partię przez jedno połączenie. Zwraca {id: None (ok) | wyjątek}"""
+        results: Dict[str, Optional[Exception]] = {}
+        server = None
+        try:
+            for item in items:
+                for attempt in range(2):  # Jedno ponowne połączenie jeśli serwer je zerwał
+                    if server is None:
+                        try:
+                            server = self._connect()
+                        except Exception as e:
+                            # Bez połączenia / logowania reszta partii też nie przejdzie
+                            for rest in items:
+                                results.setdefault(rest["id"], e)
+                            return results
+                    try:
+                        server.sendmail(self.sender_email, item["to"], self._build_message(item))
+                        results[item["id"]] = None
+                        break
+                    except smtplib.SMTPServerDisconnected as e:
+                        server = None
+                        results[item["id"]] = e
+                    except Exception as e:
+                        results[item["id"]] = e
+                        break
+        finally:
+            if server is not None:
+                try:
+                    server.quit()
+                except Exception:
+                    pass
+        return results
+
+    def send_now(self, to_email: str, subject: str, html_body: str, kind: str = "notification") -> bool:
+        """Wyślij od razu (synchronicznie) - np. testowy e-mail z UI"""
+        item = self._new_item(to_email, subject, html_body, kind)
+        error = self._deliver_batch([item]).get(item["id"])
+        self._emit(item, "sent" if error is None else "failed", None if error is None else str(error))
+        if error is not None:
+            print(f"❌ Błąd przy wysyłaniu e-mail: {error}")
+        return error is None
+
+    # ------------------------------------------------------------------
+    # Wysyłka kolejki
+    # ------------------------------------------------------------------
+
+    def drain(self, ignore_schedule: bool = False) -> Dict[str, int]:
+        """
+        Wyślij wszystkie gotowe wiadomości jedną partią. Zwraca liczniki sent/retry/failed.
+
+        ignore_schedule=True wysyła też otwarte digesty i wiadomości czekające na backoff.
+        """
+        now = time.time()
+        owner = f"{os.getpid()}:{threading.get_ident()}"
+
+        # 1. Zajmij gotowe wiadomości (inne procesy ich nie wyślą)
+        with self._locked_queue() as queue:
+            batch = []
+            for item in queue:
+                claim_expired = item["status"] == "sending" and item.get("claimed_until", 0) < now
+                due = ignore_schedule or item["next_attempt_at"] <= now
+                if (item["status"] == "pending" and due) or claim_expired:
+                    item["status"] = "sending"
+                    item["claimed_by"] = owner
+                    item["claimed_until"] = now + CLAIM_TTL_SECONDS
+                    batch.append(dict(item))
+
+        if not batch:
+            return {"sent": 0, "retry": 0, "failed": 0}
+
+        # 2. Wyślij poza blokadą
+        results = self._deliver_batch(batch)
+
+        # 3. Zapisz wyniki
+        counts = {"sent": 0, "retry": 0, "failed": 0}
+        finished = []
+        with self._locked_queue() as queue:
+            by_id = {item["id"]: item for item in queue}
+            for sent_item in batch:
+                item = by_id.get(sent_item["id"])
+                if item is None or item.get("claimed_by") != owner:
+                    continue
+                error = results.get(item["id"])
+                item.pop("claimed_by", None)
+                item.pop("claimed_until", None)
+
+                if error is None:
+                    item["status"] = "sent"
+                    counts["sent"] += 1
+                    finished.append((item, "sent", None))
+                    continue
+
+                item["attempts"] += 1
+                item["last_error"] = str(error)
+                permanent = isinstance(error, PERMANENT_ERRORS + (OutboxConfigError,))
+                if permanent or item["attempts"] >= MAX_ATTEMPTS:
+                    item["status"] = "failed"
+                    counts["failed"] += 1
+                    finished.append((item, "failed", str(error)))
+                else:
+                    item["status"] = "pending"
+                    item["next_attempt_at"] = now + min(BACKOFF_BASE_SECONDS * 2 ** (item["attempts"] - 1),
+                                                        BACKOFF_MAX_SECONDS)
+                    counts["retry"] += 1
+
+            # Zakończone wiadomości usuwane z kolejki - ślad zostaje w historii powiadomień
+            queue[:] = [item for item in queue if item["status"] not in ("sent", "failed")]
+
+        for item, status, error in finished:
+            self._emit(item, status, error)
+
+        print(f"📮 Outbox: wysłano {counts['sent']}, do ponowienia {counts['retry']}, błędy {counts['failed']}")
+        return counts
+
+    def pending_count(self) -> int:
+        with self._locked_queue() as queue:
+            return sum(1 for item in queue if item["status"] in ("pending", "sending"))
+
+    def _next_due_in(self) -> Optional[float]:
+        with self._locked_queue() as queue:
+            due = [item["next_attempt_at"] for item in queue if item["status"] == "pending"]
+        return max(min(due) - time.time(), 0) if due else None
+
+    # ------------------------------------------------------------------
+    # Wątek w tle
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Uruchom wątek wysyłki (idempotentne)"""
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._stop = False
+            self._worker = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+            self._worker.start()
+
+    def stop(self):
+        self._stop = True
+        with self._wakeup:
+            self._wakeup.notify()
+
+    def _notify_worker(self):
+        self.start()
+        with self._wakeup:
+            self._wakeup.notify()
+
+    def _run(self):
+        while not self._stop:
+            try:
+                self.drain()
+                wait = self._next_due_in()
+            except Exception as e:
+                print(f"⚠️ Błąd wątku outboxa: {e}")
+                wait = BACKOFF_BASE_SECONDS
+            with self._wakeup:
+                if not self._stop:
+                    self._wakeup.wait(timeout=wait if wait is not None else None)
+
+    def flush(self, timeout: float = EXIT_FLUSH_TIMEOUT, ignore_schedule: bool = False) -> bool:
+        """
+        Wyślij to, co gotowe, i poczekaj (max timeout) aż kolejka gotowych opustoszeje
+
+        ignore_schedule=True (wyjście procesu): otwarte digesty idą od razu, a nieudane
+        wysyłki są ponawiane co EXIT_RETRY_DELAY_SECONDS zamiast czekać na backoff.
+        """
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            self.drain(ignore_schedule=ignore_schedule)
+            due = self._next_due_in()
+            if due is None:
+                break
+            if ignore_schedule:
+                due = EXIT_RETRY_DELAY_SECONDS
+            if due > deadline - time.time():
+                break
+            time.sleep(due if ignore_schedule else min(due, 0.5))
+        return self._next_due_in() is None
+
+
+# Singleton instance
+_outbox_instance = None
+_outbox_lock = threading.Lock()
+
+def get_email_outbox() -> EmailOutbox:
+    """Zwróć singleton outboxa (konfiguracja z NOTIFIER_* w zmiennych środowiskowych)"""
+    global _outbox_instance
+    with _outbox_lock:
+        if _outbox_instance is None:
+            _outbox_instance = EmailOutbox()
+            atexit.register(_flush_on_exit)
+    return _outbox_instance
+
+
+def _flush_on_exit():
+    """
+    Skrypty (np. zaplanowane rozmowy) nie gubią maili przy wyjściu
+
+    email_outbox.json nie jest commitowany - w workflow kolejka ginie razem z
+    checkoutem, więc przy wyjściu wysyłamy wszystko, nie czekając na okna digestów
+    ani backoff ponowień.
+    """
+    if _outbox_instance is None:
+        return
+    try:
+        _outbox_instance.stop()
+        if not _outbox_instance.flush(ignore_schedule=True):
+            print(f"⚠️ Outbox: {_outbox_instance.pending_count()} wiadomości nie wysłano przy wyjściu")
+    except Exception as e:
+        print(f"⚠️ Outbox: nie udało się opróżnić kolejki przy wyjściu: {e}")
@@ -2,18 +2,27 @@
 Excel Report Generator - Generowanie raportów Excel z danymi portfela
 """
 
-from datetime import datetime
-from typing import Dict, List, Any
+from datetime import datetime, date
+from typing import Dict, List, Any, Iterable, Optional
+import json
 import os
+import tempfile
 
 try:
     from openpyxl import Workbook
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
     from openpyxl.utils import get_column_letter
+    from openpyxl.cell import WriteOnlyCell
     OPENPYXL_AVAILABLE = True
 except ImportError:
     OPENPYXL_AVAILABLE = False
 
+DAILY_SNAPSHOTS_FILE = "daily_snapshots.json"
+POSITION_HISTORY_FILE = "trading212_position_history.jsonl"
+WYPLATY_FILE = "wyplaty.json"
+KREDYTY_FILE = "kredyty.json"
+MAX_LOAN_MONTHS = 600  # Ochrona harmonogramu przed ratą niższą niż odsetki
+
 
 class ExcelReportGenerator:
     """Generator raportów Excel"""
@@ -248,3 +257,347 @@ def generate_full_report(portfolio: Dict[str, Any], output_filename: str = None)
     except Exception as e:
         print(f"❌ Błąd przy generowaniu raportu: {e}")
         return None
+
+
+# === STREAMING EXPORT (write-only) ===
+
+# Nazwane style rejestrowane raz na skoroszyt - komórki odwołują się do nich po nazwie,
+# zamiast nieść własne Font/PatternFill (mniej pamięci i mniejszy styles.xml)
+STYLE_NAGLOWEK = "hp_naglowek"
+STYLE_TYTUL = "hp_tytul"
+STYLE_KWOTA = "hp_kwota"
+STYLE_ILOSC = "hp_ilosc"
+STYLE_PROCENT = "hp_procent"
+STYLE_DATA = "hp_data"
+
+
+def _named_styles() -> List["NamedStyle"]:
+    naglowek = NamedStyle(name=STYLE_NAGLOWEK)
+    naglowek.font = Font(bold=True, color="FFFFFF")
+    naglowek.fill = PatternFill(start_color="1F4E78", end_color="1F4E78", fill_type="solid")
+    naglowek.alignment = Alignment(horizontal="center")
+
+    tytul = NamedStyle(name=STYLE_TYTUL)
+    tytul.font = Font(size=14, bold=True)
+
+    kwota = NamedStyle(name=STYLE_KWOTA, number_format="#,##0.00")
+    ilosc = NamedStyle(name=STYLE_ILOSC, number_format="#,##0.######")
+    procent = NamedStyle(name=STYLE_PROCENT, number_format="0.00%")
+    data = NamedStyle(name=STYLE_DATA, number_format="yyyy-mm-dd")
+    return [naglowek, tytul, kwota, ilosc, procent, data]
+
+
+def _parse_date(value) -> Any:
+    """'2025-10-19' / '2025-10-19 19:14:04' / ISO -> date (inaczej wartość bez zmian)"""
+    if not isinstance(value, str) or len(value) < 10:
+        return value
+    try:
+        return datetime.strptime(value[:10], "%Y-%m-%d").date()
+    except ValueError:
+        return value
+
+
+def _load_json(path: str, default):
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ Błąd wczytywania {path}: {e}")
+        return default
+
+
+class StreamingExcelReport:
+    """
+    Raport Excel w trybie write-only.
+
+    Każdy arkusz jest zapisywany wiersz po wierszu i zrzucany do pliku tymczasowego
+    openpyxl, więc pamięć nie rośnie z liczbą wierszy historii. Arkusze przyjmują
+    iteratory - źródła (np. historia pozycji JSONL) są czytane strumieniowo.
+    """
+
+    def __init__(self, filename: str = None):
+        if not OPENPYXL_AVAILABLE:
+            raise ImportError("Pakiet openpyxl nie jest zainstalowany. Zainstaluj: pip install openpyxl")
+
+        self.workbook = Workbook(write_only=True)
+        for style in _named_styles():
+            self.workbook.add_named_style(style)
+        self.filename = filename or os.path.join(
+            tempfile.gettempdir(),
+            f"raport_portfela_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        )
+        self.rows_written: Dict[str, int] = {}
+
+    def _cell(self, ws, value, style: Optional[str]):
+        if style is None or value is None or value == "":
+            return value
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style
+        return cell
+
+    def add_table(self, title: str, columns: List[tuple], rows: Iterable[Iterable]) -> int:
+        """
+        Dodaj arkusz-tabelę.
+
+        Args:
+            title: nazwa arkusza (max 31 znaków)
+            columns: [(nagłówek, szerokość, nazwa stylu lub None), ...]
+            rows: iterowalne wiersze wartości w kolejności kolumn
+
+        Returns:
+            int: liczba zapisanych wierszy danych
+        """
+        ws = self.workbook.create_sheet(title[:31])
+        for idx, (_, width, _) in enumerate(columns, 1):
+            ws.column_dimensions[get_column_letter(idx)].width = width
+        ws.freeze_panes = "A2"
+
+        ws.append([self._cell(ws, header, STYLE_NAGLOWEK) for header, _, _ in columns])
+        styles = [style for _, _, style in columns]
+
+        count = 0
+        for row in rows:
+            ws.append([self._cell(ws, value, style) for value, style in zip(row, styles)])
+            count += 1
+
+        if count:
+            ws.auto_filter.ref = f"A1:{get_column_letter(len(columns))}{count + 1}"
+        self.rows_written[title] = count
+        return count
+
+    def add_key_values(self, title: str, heading: str, items: Iterable[tuple]) -> None:
+        """Arkusz etykieta -> wartość (podsumowanie); items: (etykieta, wartość, styl)"""
+        ws = self.workbook.create_sheet(title[:31])
+        ws.column_dimensions['A'].width = 32
+        ws.column_dimensions['B'].width = 20
+        ws.append([self._cell(ws, heading, STYLE_TYTUL)])
+        ws.append([f"Data: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"])
+        ws.append([])
+        for label, value, style in items:
+            ws.append([label, self._cell(ws, value, style)])
+
+    def save(self) -> Optional[str]:
+        """Zapisz raport (skoroszyt write-only można zapisać tylko raz)"""
+        try:
+            self.workbook.save(self.filename)
+            print(f"✅ Raport Excel zapisany: {self.filename}")
+            return self.filename
+        except Exception as e:
+            print(f"❌ Błąd przy zapisywaniu raportu: {e}")
+            return None
+
+
+# --- Źródła wierszy ---
+
+def iter_stock_rows(model) -> Iterable[list]:
+    total = model.stocks.total
+    for i, p in enumerate(model.stocks.positions):
+        value = float(model.stocks.value[i])
+        yield [
+            p.ticker, p.quantity, p.avg_price, p.current_price, value,
+            value * model.usd_pln, p.ppl, (value / total) if total > 0 else 0.0,
+            "Pie" if p.in_pie else "Rdzeń"
+        ]
+
+
+def iter_crypto_rows(model) -> Iterable[list]:
+    total = model.crypto.total
+    for i, p in enumerate(model.crypto.positions):
+        raw = p.raw or {}
+        value = float(model.crypto.value[i])
+        yield [
+            p.ticker, p.quantity, p.avg_price, p.current_price, value,
+            value * model.usd_pln, (value / total) if total > 0 else 0.0,
+            raw.get('platforma', ''), raw.get('status', ''), raw.get('apy')
+        ]
+
+
+def iter_snapshot_rows(path: str = DAILY_SNAPSHOTS_FILE) -> Iterable[list]:
+    """Pełna historia dziennych snapshotów (jeden wiersz na dzień)"""
+    for snap in _load_json(path, []):
+        stocks = snap.get('stocks') or {}
+        crypto = snap.get('crypto') or {}
+        totals = snap.get('totals') or {}
+        yield [
+            _parse_date(snap.get('date_only') or snap.get('date')),
+            snap.get('usd_pln_rate'),
+            stocks.get('value_pln'), stocks.get('positions'), stocks.get('cash_usd'),
+            crypto.get('value_pln'), crypto.get('positions'),
+            totals.get('assets_pln'), totals.get('debt_pln'), totals.get('net_worth_pln')
+        ]
+
+
+def iter_ledger_rows(history_path: str = POSITION_HISTORY_FILE,
+                     wyplaty_path: str = WYPLATY_FILE,
+                     krypto_positions: Iterable = ()) -> Iterable[list]:
+    """
+    Rejestr transakcji: zmiany pozycji T212 (JSONL czytany linia po linii),
+    zakupy krypto i wpływy wypłat
+    """
+    if os.path.exists(history_path):
+        with open(history_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    wpis = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Urwana ostatnia linia po przerwanym zapisie
+                when = _parse_date(wpis.get('timestamp'))
+                for z in wpis.get('changes', []):
+                    delta = z.get('delta') or 0
+                    price = z.get('price')
+                    yield [
+                        when, "Trading212", z.get('event'), z.get('ticker'), z.get('quantity'),
+                        delta, price, (delta * price) if price is not None else None, "USD"
+                    ]
+
+    for p in krypto_positions:
+        raw = p.raw or {}
+        yield [
+            _parse_date(raw.get('data_dodania')), raw.get('platforma') or "Krypto", "zakup",
+            p.ticker, p.quantity, p.quantity, p.avg_price, p.quantity * p.avg_price, "USD"
+        ]
+
+    for w in _load_json(wyplaty_path, {}).get('wyplaty', []):
+        yield [_parse_date(w.get('data')), "Wypłata", "wpływ", w.get('notatki') or "",
+               None, None, None, w.get('kwota'), "PLN"]
+
+
+def iter_dividend_rows(szczegoly: Optional[List[Dict]] = None,
+                       otrzymane: Optional[List[Dict]] = None) -> Iterable[list]:
+    """Prognoza dywidend (calculate_portfolio_dividends) + wypłacone dywidendy T212"""
+    for d in szczegoly or []:
+        yield [
+            "prognoza", None, d.get('ticker'), d.get('ilosc'), d.get('dividend_rate'),
+            d.get('roczna_kwota_usd'), d.get('roczna_kwota_pln'),
+            (d.get('dividend_yield') or 0) / 100
+        ]
+    for d in otrzymane or []:
+        yield [
+            "otrzymana", _parse_date(d.get('paidOn')), d.get('ticker'), d.get('quantity'),
+            d.get('grossAmountPerShare'), d.get('amount'), None, None
+        ]
+
+
+def loan_schedule(loan: Dict, today: Optional[date] = None) -> Iterable[list]:
+    """
+    Harmonogram pozostałych rat kredytu (annuitet z kredyty.json)
+
+    Odsetki liczone miesięcznie od salda (oprocentowanie roczne w %);
+    ostatnia rata jest pomniejszana do pozostałego salda.
+    """
+    today = today or date.today()
+    saldo = max(0.0, float(loan.get('kwota_poczatkowa', 0)) - float(loan.get('splacono', 0)))
+    rata = float(loan.get('rata_miesieczna', 0))
+    stopa = float(loan.get('oprocentowanie', 0) or 0) / 100 / 12
+    dzien = min(max(int(loan.get('dzien_splaty', 1) or 1), 1), 28)
+    if rata <= 0:
+        return
+
+    rok, miesiac = today.year, today.month
+    if today.day > dzien:
+        miesiac += 1
+    nr = 0
+    while saldo > 0.005 and nr < MAX_LOAN_MONTHS:
+        rok += (miesiac - 1) // 12
+        miesiac = (miesiac - 1) % 12 + 1
+        odsetki = saldo * stopa
+        if rata <= odsetki:
+            break  # Rata nie pokrywa odsetek - harmonogram się nie domyka
+        kapital = min(rata - odsetki, saldo)
+        saldo -= kapital
+        nr += 1
+        yield [loan.get('nazwa', ''), nr, date(rok, miesiac, dzien),
+               kapital + odsetki, odsetki, kapital, max(saldo, 0.0)]
+        miesiac += 1
+
+
+def iter_loan_rows(path: str = KREDYTY_FILE) -> Iterable[list]:
+    for loan in _load_json(path, {}).get('kredyty', []):
+        yield from loan_schedule(loan)
+
+
+STOCK_COLUMNS = [
+    ("Ticker", 16, None), ("Ilość", 12, STYLE_ILOSC), ("Cena średnia", 14, STYLE_KWOTA),
+    ("Cena aktualna", 14, STYLE_KWOTA), ("Wartość USD", 14, STYLE_KWOTA),
+    ("Wartość PLN", 14, STYLE_KWOTA), ("Zysk/strata USD", 15, STYLE_KWOTA),
+    ("% Akcji", 10, STYLE_PROCENT), ("Typ", 8, None)
+]
+CRYPTO_COLUMNS = [
+    ("Symbol", 12, None), ("Ilość", 14, STYLE_ILOSC), ("Cena zakupu", 14, STYLE_KWOTA),
+    ("Cena aktualna", 14, STYLE_KWOTA), ("Wartość USD", 14, STYLE_KWOTA),
+    ("Wartość PLN", 14, STYLE_KWOTA), ("% Krypto", 10, STYLE_PROCENT),
+    ("Platforma", 14, None), ("Status", 12, None), ("APY %", 8, None)
+]
+SNAPSHOT_COLUMNS = [
+    ("Data", 12, STYLE_DATA), ("USD/PLN", 10, None), ("Akcje PLN", 14, STYLE_KWOTA),
+    ("Pozycje akcji", 10, None), ("Gotówka USD", 12, STYLE_KWOTA), ("Krypto PLN", 14, STYLE_KWOTA),
+    ("Pozycje krypto", 10, None), ("Aktywa PLN", 14, STYLE_KWOTA), ("Dług PLN", 12, STYLE_KWOTA),
+    ("Wartość netto PLN", 16, STYLE_KWOTA)
+]
+LEDGER_COLUMNS = [
+    ("Data", 12, STYLE_DATA), ("Źródło", 12, None), ("Zdarzenie", 10, None),
+    ("Ticker / opis", 18, None), ("Ilość po", 12, STYLE_ILOSC), ("Zmiana ilości", 12, STYLE_ILOSC),
+    ("Cena", 12, STYLE_KWOTA), ("Kwota", 14, STYLE_KWOTA), ("Waluta", 8, None)
+]
+DIVIDEND_COLUMNS = [
+    ("Rodzaj", 10, None), ("Data wypłaty", 12, STYLE_DATA), ("Ticker", 12, None),
+    ("Ilość", 12, STYLE_ILOSC), ("Na akcję USD", 12, STYLE_KWOTA), ("Kwota USD", 12, STYLE_KWOTA),
+    ("Rocznie PLN netto", 16, STYLE_KWOTA), ("Stopa", 8, STYLE_PROCENT)
+]
+LOAN_COLUMNS = [
+    ("Kredyt", 16, None), ("Nr raty", 8, None), ("Data", 12, STYLE_DATA),
+    ("Rata PLN", 12, STYLE_KWOTA), ("Odsetki", 12, STYLE_KWOTA), ("Kapitał", 12, STYLE_KWOTA),
+    ("Saldo po racie", 14, STYLE_KWOTA)
+]
+
+
+def generate_streaming_report(model=None, dywidendy_szczegoly: Optional[List[Dict]] = None,
+                              output_filename: str = None) -> Optional[str]:
+    """
+    Pełny raport z historią w trybie write-only (stała pamięć niezależnie od długości historii)
+
+    Args:
+        model: PortfolioModel (domyślnie get_portfolio_model())
+        dywidendy_szczegoly: calculate_portfolio_dividends(...)['szczegoly'] - opcjonalnie
+        output_filename: ścieżka wyniku (domyślnie katalog tymczasowy, nie katalog repo)
+
+    Returns:
+        str: ścieżka zapisanego pliku lub None
+    """
+    try:
+        if model is None:
+            from portfolio_model import get_portfolio_model
+            model = get_portfolio_model()
+
+        report = StreamingExcelReport(output_filename)
+        report.add_key_values("Podsumowanie", "RAPORT PORTFELA", [
+            ("Wartość netto (PLN):", model.net_worth_pln, STYLE_KWOTA),
+            ("Aktywa (PLN):", model.assets_pln, STYLE_KWOTA),
+            ("Akcje (PLN):", model.stocks_pln, STYLE_KWOTA),
+            ("Krypto (PLN):", model.crypto_pln, STYLE_KWOTA),
+            ("Gotówka T212 (PLN):", model.cash_pln, STYLE_KWOTA),
+            ("Zadłużenie (PLN):", model.debt_pln, STYLE_KWOTA),
+            ("Raty miesięczne (PLN):", model.monthly_payments_pln, STYLE_KWOTA),
+            ("Kurs USD/PLN:", model.usd_pln, None),
+            ("Liczba pozycji akcji:", len(model.stocks), None),
+            ("Liczba pozycji krypto:", len(model.crypto), None),
+        ])
+        report.add_table("Akcje", STOCK_COLUMNS, iter_stock_rows(model))
+        report.add_table("Krypto", CRYPTO_COLUMNS, iter_crypto_rows(model))
+        report.add_table("Historia dzienna", SNAPSHOT_COLUMNS, iter_snapshot_rows())
+        report.add_table("Transakcje", LEDGER_COLUMNS,
+                         iter_ledger_rows(krypto_positions=model.crypto.positions))
+        report.add_table("Dywidendy", DIVIDEND_COLUMNS,
+                         iter_dividend_rows(dywidendy_szczegoly, model.dividends))
+        report.add_table("Harmonogram kredytów", LOAN_COLUMNS, iter_loan_rows())
+
+        return report.save()
+
+    except Exception as e:
+        print(f"❌ Błąd przy generowaniu raportu: {e}")
+        return None
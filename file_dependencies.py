@@ -0,0 +1,72 @@
+"""
+file_dependencies.py
+
+Sygnatury plików źródłowych do unieważniania cache'y wyników pochodnych.
+
+Zamiast ślepego TTL wynik jest kluczowany sygnaturą plików, które czyta:
+- sygnatura = skrót ZAWARTOŚCI pliku (blake2b), więc sync z GitHub Actions,
+  który przepisuje plik bez zmian, nie wymusza przeliczenia
+- plik jest haszowany ponownie tylko gdy zmieni się jego mtime lub rozmiar
+  (tani os.stat przy każdym wywołaniu, czytanie tylko po zmianie)
+- wzorce glob (np. knowledge_base/*.json) są rozwijane przy każdym wywołaniu,
+  więc nowy plik w katalogu też zmienia sygnaturę
+"""
+
+import glob
+import hashlib
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+_digest_memo: Dict[str, Tuple[int, int, str]] = {}  # path -> (mtime_ns, size, digest)
+_memo_lock = threading.Lock()
+
+
+def file_digest(path: str) -> Optional[str]:
+    """Skrót zawartości pliku (None gdy plik nie istnieje)"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    with _memo_lock:
+        memo = _digest_memo.get(path)
+    if memo and memo[0] == st.st_mtime_ns and memo[1] == st.st_size:
+        return memo[2]
+
+    h = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+    except OSError:
+        return None
+    digest = h.hexdigest()
+
+    with _memo_lock:
+        _digest_memo[path] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+
+def files_signature(*patterns: str) -> Tuple[Tuple[str, Optional[str]], ...]:
+    """
+    Sygnatura zbioru plików: ((ścieżka, skrót), ...)
+
+    Args:
+        patterns: ścieżki lub wzorce glob; brakujący plik daje skrót None
+    """
+    paths = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            paths.extend(sorted(glob.glob(pattern)))
+        else:
+            paths.append(pattern)
+    return tuple((path, file_digest(path)) for path in paths)
+
+
+def signature_key(*patterns: str) -> str:
+    """Krótki klucz tekstowy sygnatury - wygodny jako argument funkcji z @st.cache_data"""
+    h = hashlib.blake2b(digest_size=12)
+    for path, digest in files_signature(*patterns):
+        h.update(f"{path}\0{digest}\n".encode('utf-8'))
+    return h.hexdigest()
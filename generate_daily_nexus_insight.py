@@ -19,6 +19,9 @@ except ImportError:
     print("❌ Nie można zaimportować nexus_ai_engine.py")
     sys.exit(1)
 
+# Wspólny model portfela (to samo źródło co Streamlit/snapshoty/audyt)
+from portfolio_model import get_portfolio_model
+
 # Import update_trading212 do pobrania świeżych danych
 try:
     from update_trading212 import update_all_portfolio_data
@@ -41,102 +44,28 @@ def load_json_file(filename, default=None):
 
 def get_suma_kredytow():
     """Oblicza sumę aktualnych kredytów (kwota_poczatkowa - splacono)"""
-    kredyty_data = load_json_file('kredyty.json', default={})
-    
-    if not isinstance(kredyty_data, dict):
-        return 0
-    
-    kredyty_list = kredyty_data.get('kredyty', [])
-    
-    if not isinstance(kredyty_list, list):
-        return 0
-    
-    suma = 0
-    for k in kredyty_list:
-        if isinstance(k, dict):
-            kwota_poczatkowa = k.get('kwota_poczatkowa', 0)
-            splacono = k.get('splacono', 0)
-            aktualna_kwota = kwota_poczatkowa - splacono
-            suma += max(0, aktualna_kwota)  # Nie może być ujemna
-    
-    return suma
+    return get_portfolio_model().debt_pln
 
 
 def pobierz_dane_portfela():
     """
-    Pobiera dane portfela z trading212_cache.json (to samo źródło co Streamlit/Nexus).
-    Przetwarza surowe dane API Trading212 do formatu używanego przez Nexusa.
+    Pobiera dane portfela ze wspólnego modelu (trading212_cache.json + krypto.json).
+    Kurs USD/PLN z NBP - ten sam co w Streamlit, zamiast stałej 4.0.
     """
     try:
-        # Wczytaj z cache
-        cache_file = 'trading212_cache.json'
-        if not os.path.exists(cache_file):
-            print(f"❌ Brak {cache_file}")
-            return None
-        
-        print(f"   Wczytywanie {cache_file}...")
-        with open(cache_file, 'r', encoding='utf-8') as f:
-            cache_data = json.load(f)
+        model = get_portfolio_model()
         
-        # Cache ma strukturę: {"timestamp": "...", "data": {"positions": [...], "account": {...}}}
-        trading212_data = cache_data.get('data', {})
-        
-        if not trading212_data:
-            print("❌ Brak danych w cache (klucz 'data' nie istnieje)")
+        if model.t212_timestamp is None:
+            print("❌ Brak danych w trading212_cache.json")
             return None
         
-        # Parsuj pozycje Trading212
-        positions = trading212_data.get('positions', [])
-        
-        if not positions:
+        if not len(model.stocks):
             print("❌ Brak pozycji w trading212_cache.json")
             return None
         
-        # Kurs USD->PLN (approx, można улучшyć później)
-        kurs_usd_pln = 4.0
+        print(f"   ✅ Załadowano {len(model.stocks)} pozycji akcji, wartość {model.stocks_pln:.2f} PLN (USD/PLN {model.usd_pln:.4f})")
         
-        # Przetworz pozycje
-        akcje_pozycje = {}
-        total_stocks_value_pln = 0
-        
-        for pos in positions:
-            ticker = pos.get('ticker', 'UNKNOWN')
-            quantity = pos.get('quantity', 0)
-            current_price = pos.get('currentPrice', 0)
-            avg_price = pos.get('averagePrice', 0)
-            
-            value_usd = quantity * current_price
-            value_pln = value_usd * kurs_usd_pln
-            
-            akcje_pozycje[ticker] = {
-                'ilosc': quantity,
-                'cena_aktualna': current_price,
-                'cena_srednia': avg_price,
-                'wartosc_usd': value_usd,
-                'wartosc_pln': value_pln,
-                'frontend': pos.get('frontend', '')
-            }
-            
-            total_stocks_value_pln += value_pln
-        
-        pozycje_count = len(akcje_pozycje)
-        
-        print(f"   ✅ Załadowano {pozycje_count} pozycji akcji, wartość {total_stocks_value_pln:.2f} PLN")
-        
-        # Zwróć w formacie stan_spolki
-        stan_spolki = {
-            'akcje': {
-                'wartosc_pln': total_stocks_value_pln,
-                'pozycje': akcje_pozycje,
-                'liczba_pozycji': pozycje_count
-            },
-            'krypto': {
-                'wartosc_pln': 0,
-                'pozycje': {}
-            }
-        }
-        
-        return stan_spolki
+        return model.to_stan_spolki_lite()
         
     except Exception as e:
         print(f"❌ Błąd pobierania danych portfela: {type(e).__name__}: {str(e)}")
@@ -162,38 +91,11 @@ def generate_daily_insight():
     # 2. Pobierz cele i crypto
     print("📋 Wczytywanie celów i krypto...")
     cele = load_json_file('cele.json')
-    krypto_data = load_json_file('krypto.json')
     
-    # Update crypto value (struktura: {"krypto": [...]})
-    if krypto_data and isinstance(krypto_data, dict):
-        crypto_list = krypto_data.get('krypto', [])
-        
-        if isinstance(crypto_list, list):
-            # Oblicz wartość krypto (potrzebujemy API do cen - dla teraz użyj cache)
-            crypto_value = 0
-            crypto_positions = {}
-            
-            for coin in crypto_list:
-                if isinstance(coin, dict):
-                    symbol = coin.get('symbol', 'UNKNOWN')
-                    ilosc = coin.get('ilosc', 0)
-                    # Spróbuj użyć cached price lub cena_zakupu
-                    cena = coin.get('cena_aktualna_usd', coin.get('cena_zakupu_usd', 0))
-                    wartosc_usd = ilosc * cena
-                    wartosc_pln = wartosc_usd * 4.0  # Approx USD->PLN (można улучшyć)
-                    
-                    crypto_positions[symbol] = {
-                        'ilosc': ilosc,
-                        'cena_usd': cena,
-                        'wartosc_pln': wartosc_pln
-                    }
-                    crypto_value += wartosc_pln
-            
-            stan_spolki['krypto']['wartosc_pln'] = crypto_value
-            stan_spolki['krypto']['pozycje'] = crypto_positions
-            print(f"   Krypto: {crypto_value:.2f} PLN ({len(crypto_positions)} monet)")
-        else:
-            print(f"   ⚠️ Nieprawidłowa struktura krypto.json")
+    # Krypto jest już w modelu (ceny aktualne jeśli zapisane, inaczej ceny zakupu)
+    krypto_info = stan_spolki.get('krypto', {})
+    if krypto_info.get('pozycje'):
+        print(f"   Krypto: {krypto_info['wartosc_pln']:.2f} PLN ({len(krypto_info['pozycje'])} monet)")
     else:
         print(f"   ⚠️ Brak danych krypto")
     
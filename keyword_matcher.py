@@ -0,0 +1,131 @@
+"""
+keyword_matcher.py
+
+Wspólny matcher słów kluczowych dla heurystyk Rady (kolejność wypowiedzi,
+reakcje, przerwania, głosy, tematy bazy wiedzy).
+
+- wszystkie zestawy słów kompilowane RAZ do jednego regexu w kształcie drzewa
+  prefiksowego (trie) z lookahead - dopasowania nakładające się też są znajdowane,
+  a na pozycjach bez słowa kluczowego regex odpada po pierwszym znaku
+- tekst i słowa kluczowe: lowercase + bez polskich znaków ("błąd" == "blad")
+- scan(text) przechodzi tekst jeden raz i zwraca WSZYSTKIE trafione kategorie
+- semantyka jak `any(kw in text for kw in ...)` - dopasowanie podciągu
+"""
+
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, Optional
+
+SCAN_CACHE_SIZE = 512  # Te same odpowiedzi skanowane wielokrotnie (przerwania, głosy, reakcje)
+
+_FOLD_TABLE = str.maketrans("ąćęłńóśźżĄĆĘŁŃÓŚŹŻ", "acelnoszzACELNOSZZ")
+
+# Kategorie "obszar.nazwa" - kolejność w obszarze = priorytet w heurystykach
+COUNCIL_KEYWORDS: Dict[str, Iterable[str]] = {
+    # determine_speaking_order
+    "speaking.crypto": ['krypto', 'bitcoin', 'btc', 'eth', 'blockchain', 'defi', 'nft', 'altcoin', 'token'],
+    "speaking.value": ['wartość', 'fundamenty', 'dywidenda', 'p/e', 'p/b', 'margin of safety', 'value investing'],
+    "speaking.trading": ['trading', 'short', 'spekulacja', 'momentum', 'swing', 'pozycja krótka'],
+    "speaking.quality": ['jakość', 'zarządzanie', 'moat', 'przewaga konkurencyjna', 'model biznesowy'],
+    "speaking.strategic": ['strategia', 'plan', 'cel', 'alokacja', 'dywersyfikacja', 'portfel'],
+    # analyze_sentiment
+    "sentiment.zaprzeczenie": ['nie zgadzam się'],
+    "sentiment.zgoda": ['zgadzam się', 'całkowicie racja', 'dokładnie', 'wspieramy', 'popieram'],
+    "sentiment.sprzeciw": ['nie zgadzam się', 'błąd', 'mylisz się', 'to ryzykowne', 'ostrzegam', 'sprzeciwiam'],
+    "sentiment.ostrzezenie": ['uwaga', 'ostrożnie', 'ryzyko', 'problem', 'zagrożenie'],
+    "sentiment.refleksja": ['rozumiem', 'widzę', 'interesujące', 'warto rozważyć'],
+    "sentiment.pytanie": ['?', 'czy', 'jak', 'dlaczego', 'kiedy'],
+    # should_interrupt
+    "interrupt.complicated": ['skomplikowany'],
+    "interrupt.intuition": ['intuicja', 'przeczucie', 'feeling'],
+    "interrupt.crypto": ['bitcoin', 'krypto', 'blockchain'],
+    # Głosy w odpowiedziach partnerów
+    "vote.za": ['[głosuję: tak]', 'głosuję za'],
+    "vote.przeciw": ['[głosuję: nie]', 'głosuję przeciw'],
+    "vote.wstrzymany": ['[głosuję: wstrzymuję]', 'wstrzymuję się'],
+    # get_relevant_knowledge
+    "topic.value": ["value", "wartość", "wycena", "graham", "p/e", "p/b", "margin", "bezpieczeństwo"],
+    "topic.growth": ["wzrost", "growth", "fisher", "innowacja", "tech", "roi", "roe"],
+    "topic.risk": ["ryzyko", "risk", "dźwignia", "leverage", "straty", "volatility", "bezpieczeństwo"],
+    "topic.psychology": ["psychologia", "psychology", "emocje", "soros", "refleksywność", "panika"],
+    "topic.diversification": ["dywersyfikacja", "diversification", "koncentracja", "alokacja"],
+    "topic.crypto": ["crypto", "krypto", "bitcoin", "ethereum", "blockchain"],
+    "topic.valuation": ["wycena", "valuation", "p/e", "pe", "eps", "earnings"],
+    "topic.trading": ["sprzedaż", "trading", "realizacja", "profit", "zyski", "stop loss"],
+}
+
+
+def fold_text(text: str) -> str:
+    """Lowercase + usunięcie polskich znaków diakrytycznych"""
+    return (text or "").lower().translate(_FOLD_TABLE)
+
+
+def _trie_pattern(keywords: Iterable[str]) -> str:
+    """Alternatywa słów jako regex-trie: wspólne prefiksy sprawdzane raz, najdłuższe dopasowanie"""
+    trie: Dict = {}
+    for keyword in keywords:
+        node = trie
+        for ch in keyword:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """Wiele zestawów słów kluczowych skompilowanych do jednego automatu (regex)"""
+
+    def __init__(self, keyword_sets: Dict[str, Iterable[str]]):
+        self.categories = list(keyword_sets)
+        categories_by_keyword: Dict[str, set] = {}
+        for category, keywords in keyword_sets.items():
+            for keyword in keywords:
+                categories_by_keyword.setdefault(fold_text(keyword), set()).add(category)
+
+        # Regex zwraca na danej pozycji najdłuższe słowo - krótsze słowa zawarte
+        # w nim (np. "jak" w "jakość") dokładamy z góry, żeby nic nie zgubić
+        self._hits: Dict[str, FrozenSet[str]] = {}
+        for keyword, categories in categories_by_keyword.items():
+            implied = set(categories)
+            for other, other_categories in categories_by_keyword.items():
+                if other != keyword and other in keyword:
+                    implied |= other_categories
+            self._hits[keyword] = frozenset(implied)
+
+        self._pattern = re.compile(f"(?=({_trie_pattern(self._hits)}))") if self._hits else None
+        self.scan = lru_cache(maxsize=SCAN_CACHE_SIZE)(self._scan)
+
+    def _scan(self, text: str) -> FrozenSet[str]:
+        if not text or self._pattern is None:
+            return frozenset()
+        hits = set()
+        for match in self._pattern.finditer(fold_text(text)):
+            hits |= self._hits[match.group(1)]
+        return frozenset(hits)
+
+    def first(self, text_or_hits, *categories: str) -> Optional[str]:
+        """Pierwsza (wg kolejności argumentów) kategoria obecna w tekście / wyniku scan()"""
+        hits = text_or_hits if isinstance(text_or_hits, frozenset) else self.scan(text_or_hits)
+        return next((category for category in categories if category in hits), None)
+
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+
+def get_council_matcher() -> KeywordMatcher:
+    """Singleton matchera ze wszystkimi zestawami COUNCIL_KEYWORDS"""
+    global _matcher
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                _matcher = KeywordMatcher(COUNCIL_KEYWORDS)
+    return _matcher
@@ -6,12 +6,16 @@ Uruchamiany automatycznie w poniedziałki o 08:00 UTC przez GitHub Actions
 Źródła:
 - Google News RSS (market trends, S&P500, crypto news)
 - Aktualizuje knowledge_base/articles.json
+- Warunkowe GET (ETag/Last-Modified) zapisywane w knowledge_base/feed_state.json
 """
 
 import json
 import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import hashlib
 
 try:
@@ -21,8 +25,15 @@ except ImportError:
     FEEDPARSER_OK = False
     print("⚠️ feedparser not installed - install with: pip install feedparser")
 
+try:
+    import requests
+    REQUESTS_OK = True
+except ImportError:
+    REQUESTS_OK = False
+
 KNOWLEDGE_BASE_DIR = "knowledge_base"
 ARTICLES_FILE = os.path.join(KNOWLEDGE_BASE_DIR, "articles.json")
+FEED_STATE_FILE = os.path.join(KNOWLEDGE_BASE_DIR, "feed_state.json")
 
 # RSS feeds dla wiadomości rynkowych
 NEWS_FEEDS = {
@@ -44,6 +55,12 @@ NEWS_FEEDS = {
 MAX_ARTICLES = 50  # Maksymalna liczba artykułów do zachowania
 DAYS_TO_KEEP = 30  # Usuń artykuły starsze niż 30 dni
 
+ENTRIES_PER_FEED = 5          # Wpisy z feedu bez zapisanego stanu (pierwsze pobranie)
+ENTRIES_PER_CHANGED_FEED = 20  # Głębsza historia gdy feed się zmienił od ostatniego runu
+FEED_TIMEOUT = 15  # Timeout (s) pojedynczego feedu
+MAX_FEED_WORKERS = 8  # Liczba równoległych pobrań
+USER_AGENT = "HoryzontPartnerow-KnowledgeBot/1.0"
+
 def load_existing_articles() -> Dict[str, Any]:
     """Załaduj istniejące artykuły"""
     if not os.path.exists(ARTICLES_FILE):
@@ -64,22 +81,109 @@ def load_existing_articles() -> Dict[str, Any]:
             'articles': []
         }
 
+def load_feed_state() -> Dict[str, Dict[str, Any]]:
+    """Załaduj zapisane nagłówki ETag/Last-Modified per feed"""
+    if not os.path.exists(FEED_STATE_FILE):
+        return {}
+    
+    try:
+        with open(FEED_STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ Error loading feed state: {e}")
+        return {}
+
+def save_feed_state(state: Dict[str, Dict[str, Any]]) -> bool:
+    """Zapisz stan feedów (ETag/Last-Modified) do pliku"""
+    os.makedirs(KNOWLEDGE_BASE_DIR, exist_ok=True)
+    
+    try:
+        with open(FEED_STATE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2, ensure_ascii=False)
+        return True
+    except Exception as e:
+        print(f"⚠️ Error saving feed state: {e}")
+        return False
+
 def generate_article_id(title: str, url: str) -> str:
     """Generuj unikalny ID artykułu"""
     content = f"{title}{url}"
     return hashlib.md5(content.encode()).hexdigest()[:16]
 
-def fetch_news_from_feed(feed_url: str, category: str) -> List[Dict[str, Any]]:
-    """Pobierz wiadomości z RSS feed"""
+def generate_content_hash(title: str, summary: str = '') -> str:
+    """
+    Hash treści artykułu niezależny od URL.
+    
+    Google News publikuje ten sam artykuł pod różnymi linkami w kilku feedach,
+    więc sam `generate_article_id` nie wyłapuje duplikatów.
+    """
+    text = re.sub(r'<[^>]+>', ' ', f"{title} {summary}")
+    text = re.sub(r'\s+', ' ', text).strip().lower()
+    return hashlib.md5(text.encode('utf-8')).hexdigest()[:16]
+
+def _download_feed(feed_url: str, state: Dict[str, Any]) -> Tuple[int, Optional[bytes], Dict[str, Any]]:
+    """
+    Pobierz surową treść feedu warunkowym GET-em.
+    
+    Returns:
+        (status, body, new_state) - body jest None gdy feed się nie zmienił (304)
+    """
+    headers = {'User-Agent': USER_AGENT}
+    if state.get('etag'):
+        headers['If-None-Match'] = state['etag']
+    if state.get('last_modified'):
+        headers['If-Modified-Since'] = state['last_modified']
+    
+    response = requests.get(feed_url, headers=headers, timeout=FEED_TIMEOUT)
+    
+    new_state = dict(state)
+    new_state['last_checked'] = datetime.now().isoformat()
+    new_state['last_status'] = response.status_code
+    
+    if response.status_code == 304:
+        return 304, None, new_state
+    
+    response.raise_for_status()
+    
+    new_state['etag'] = response.headers.get('ETag')
+    new_state['last_modified'] = response.headers.get('Last-Modified')
+    new_state['last_changed'] = new_state['last_checked']
+    
+    return response.status_code, response.content, new_state
+
+def fetch_news_from_feed(feed_url: str, category: str,
+                         state: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Pobierz wiadomości z RSS feed
+    
+    Args:
+        feed_url: URL feedu RSS
+        category: Kategoria artykułów (klucz w NEWS_FEEDS)
+        state: Zapisany stan feedu (etag, last_modified) z poprzedniego runu
+    
+    Returns:
+        (articles, new_state) - pusta lista gdy serwer odpowiedział 304
+    """
+    state = state or {}
     if not FEEDPARSER_OK:
-        return []
+        return [], state
     
     articles = []
+    new_state = state
     
     try:
-        feed = feedparser.parse(feed_url)
+        if REQUESTS_OK:
+            status, body, new_state = _download_feed(feed_url, state)
+            if status == 304:
+                return [], new_state
+            feed = feedparser.parse(body)
+        else:
+            feed = feedparser.parse(feed_url)
+        
+        # Feed zmieniony od poprzedniego runu -> sięgnij głębiej w historię
+        limit = ENTRIES_PER_CHANGED_FEED if state else ENTRIES_PER_FEED
         
-        for entry in feed.entries[:5]:  # Max 5 artykułów z każdego feed
+        for entry in feed.entries[:limit]:
             # Parsuj datę
             published = None
             if hasattr(entry, 'published_parsed') and entry.published_parsed:
@@ -87,13 +191,16 @@ def fetch_news_from_feed(feed_url: str, category: str) -> List[Dict[str, Any]]:
             else:
                 published = datetime.now().isoformat()
             
+            summary = entry.summary if hasattr(entry, 'summary') else ''
+            
             article = {
                 'id': generate_article_id(entry.title, entry.link),
+                'content_hash': generate_content_hash(entry.title, summary),
                 'date': published,
                 'title': entry.title,
                 'source': entry.source.title if hasattr(entry, 'source') else 'Unknown',
                 'url': entry.link,
-                'summary': entry.summary if hasattr(entry, 'summary') else '',
+                'summary': summary,
                 'ticker': None,  # Można rozszerzyć o ekstrakcję tickerów z tytułu
                 'type': category,
                 'relevance': 7,  # Domyślna relevance
@@ -105,10 +212,58 @@ def fetch_news_from_feed(feed_url: str, category: str) -> List[Dict[str, Any]]:
     except Exception as e:
         print(f"⚠️ Error fetching feed {feed_url}: {e}")
     
-    return articles
+    return articles, new_state
+
+def fetch_all_feeds(feed_state: Dict[str, Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """
+    Pobierz wszystkie feedy z NEWS_FEEDS równolegle.
+    
+    Czas całego runu ~ czas najwolniejszego feedu (ograniczony FEED_TIMEOUT),
+    a nie suma czasów wszystkich feedów.
+    
+    Returns:
+        (articles, updated_feed_state)
+    """
+    jobs = [
+        (category, feed_url)
+        for category, feeds in NEWS_FEEDS.items()
+        for feed_url in feeds
+    ]
+    
+    articles = []
+    updated_state = dict(feed_state)
+    unchanged = 0
+    
+    with ThreadPoolExecutor(max_workers=min(MAX_FEED_WORKERS, len(jobs) or 1)) as executor:
+        futures = {
+            executor.submit(fetch_news_from_feed, feed_url, category, feed_state.get(feed_url)): (category, feed_url)
+            for category, feed_url in jobs
+        }
+        
+        for future in as_completed(futures):
+            category, feed_url = futures[future]
+            feed_articles, new_state = future.result()
+            updated_state[feed_url] = new_state
+            
+            if new_state.get('last_status') == 304:
+                unchanged += 1
+            else:
+                print(f"  🔍 {category}: {len(feed_articles)} entries")
+            
+            articles.extend(feed_articles)
+    
+    print(f"  ⏸️ Unchanged feeds (304): {unchanged}/{len(jobs)}")
+    
+    return articles, updated_state
 
-def update_knowledge_base() -> Dict[str, Any]:
-    """Aktualizuj bazę wiedzy z najnowszymi wiadomościami"""
+def update_knowledge_base() -> Tuple[Dict[str, Any], Optional[Dict[str, Dict[str, Any]]]]:
+    """
+    Aktualizuj bazę wiedzy z najnowszymi wiadomościami
+    
+    Returns:
+        (dane bazy wiedzy, nowy stan feedów lub None) - stan feedów zapisuje się
+        dopiero po zapisaniu artykułów, inaczej odpowiedzi 304 zgubiłyby je na stałe
+    """
     print("📰 Knowledge Base Update - START")
     print(f"📅 {datetime.now().isoformat()}")
     print("-" * 60)
@@ -117,26 +272,36 @@ def update_knowledge_base() -> Dict[str, Any]:
     existing_data = load_existing_articles()
     existing_articles = existing_data.get('articles', [])
     existing_ids = {article['id'] for article in existing_articles}
+    existing_hashes = {
+        article.get('content_hash') or generate_content_hash(article.get('title', ''), article.get('summary', ''))
+        for article in existing_articles
+    }
     
     print(f"📚 Existing articles: {len(existing_articles)}")
     
     # Pobierz nowe artykuły
     new_articles = []
+    feed_state = None
     
     if not FEEDPARSER_OK:
         print("⚠️ feedparser not available - skipping RSS fetch")
         print("💡 Install with: pip install feedparser")
     else:
-        for category, feeds in NEWS_FEEDS.items():
-            print(f"\n🔍 Fetching {category} news...")
-            for feed_url in feeds:
-                articles = fetch_news_from_feed(feed_url, category)
-                
-                # Dodaj tylko nowe artykuły
-                for article in articles:
-                    if article['id'] not in existing_ids:
-                        new_articles.append(article)
-                        print(f"  ✅ New: {article['title'][:60]}...")
+        print(f"\n🔍 Fetching {sum(len(f) for f in NEWS_FEEDS.values())} feeds concurrently...")
+        start = time.time()
+        
+        articles, feed_state = fetch_all_feeds(load_feed_state())
+        
+        print(f"  ⏱️ Fetch time: {time.time() - start:.1f}s")
+        
+        # Dodaj tylko nowe artykuły (po ID i po hashu treści)
+        for article in articles:
+            if article['id'] in existing_ids or article['content_hash'] in existing_hashes:
+                continue
+            existing_ids.add(article['id'])
+            existing_hashes.add(article['content_hash'])
+            new_articles.append(article)
+            print(f"  ✅ New: {article['title'][:60]}...")
     
     print(f"\n📰 New articles found: {len(new_articles)}")
     
@@ -171,7 +336,7 @@ def update_knowledge_base() -> Dict[str, Any]:
         'articles': filtered_articles
     }
     
-    return updated_data
+    return updated_data, feed_state
 
 def save_knowledge_base(data: Dict[str, Any]) -> bool:
     """Zapisz bazę wiedzy do pliku"""
@@ -194,10 +359,20 @@ def main():
     """Główna funkcja update"""
     try:
         # Aktualizuj bazę wiedzy
-        updated_data = update_knowledge_base()
+        updated_data, feed_state = update_knowledge_base()
         
-        # Zapisz
+        # Zapisz (ETag/Last-Modified dopiero gdy artykuły są na dysku)
         success = save_knowledge_base(updated_data)
+        if success and feed_state is not None:
+            save_feed_state(feed_state)
+        
+        # Dołącz nowe artykuły do indeksu semantycznego
+        if success:
+            try:
+                from semantic_index import get_semantic_index
+                get_semantic_index()
+            except Exception as e:
+                print(f"⚠️ Semantic index update skipped: {e}")
         
         print("-" * 60)
         if success:
@@ -0,0 +1,145 @@
+"""
+⚡ LLM Streaming - strumieniowanie odpowiedzi modeli AI fragment po fragmencie
+
+- Generatory fragmentów dla klientów Gemini, Claude (Anthropic) i OpenAI/OpenRouter
+- TimedStream: mierzy czas do pierwszego tokena (TTFT) per dostawca,
+  zbiera pełny tekst i po zakończeniu wywołuje callback (np. zapis do pamięci)
+
+Generatory nadają się bezpośrednio do st.write_stream().
+"""
+
+import time
+from typing import Callable, Iterable, Iterator, Optional
+
+CLAUDE_MODEL = "claude-3-5-sonnet-20241022"
+
+
+def stream_gemini(model, prompt: str) -> Iterator[str]:
+    """Fragmenty odpowiedzi z genai.GenerativeModel (generate_content stream=True)"""
+    response = model.generate_content(prompt, stream=True)
+    yielded = False
+    for chunk in response:
+        if not chunk.parts:
+            continue
+        yielded = True
+        yield chunk.text
+    if not yielded:
+        yield "[ODPOWIEDŹ ZABLOKOWANA PRZEZ FILTRY BEZPIECZEŃSTWA GEMINI]"
+
+
+def stream_claude(client, prompt: str, model: str = CLAUDE_MODEL, max_tokens: int = 2048) -> Iterator[str]:
+    """Fragmenty odpowiedzi z anthropic.Anthropic (messages.stream)"""
+    with client.messages.stream(
+        model=model,
+        max_tokens=max_tokens,
+        messages=[{"role": "user", "content": prompt}]
+    ) as stream:
+        for text in stream.text_stream:
+            yield text
+
+
+def stream_openai(client, prompt: str, model: str, temperature: float = 0.7,
+                  max_tokens: Optional[int] = None) -> Iterator[str]:
+    """Fragmenty odpowiedzi z klienta OpenAI / OpenRouter (chat.completions stream=True)"""
+    kwargs = {"max_tokens": max_tokens} if max_tokens else {}
+    response = client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=temperature,
+        stream=True,
+        **kwargs
+    )
+    for chunk in response:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
+
+
+class TimedStream:
+    """
+    Opakowanie strumienia fragmentów odpowiedzi.
+
+    - Mierzy TTFT i całkowity czas, zapisuje je w APIUsageTracker (track_ttft)
+    - Zbiera pełny tekst w `self.text`
+    - Po wyczerpaniu strumienia wywołuje on_complete(text) dokładnie raz
+    - Wyjątek dostawcy zamieniany jest na fragment "[BŁĄD API: ...]"
+    """
+
+    def __init__(self, chunks: Iterable[str], api_name: str,
+                 on_complete: Optional[Callable[[str], None]] = None, track_latency: bool = True,
+                 cached: bool = False):
+        self._chunks = chunks
+        self.api_name = api_name
+        self.on_complete = on_complete
+        self.track_latency = track_latency and not cached
+        self.cached = cached  # True = odpowiedź z cache (bez wywołania API)
+
+        self.parts = []
+        self.ttft_ms: Optional[float] = None
+        self.total_ms: Optional[float] = None
+        self.error: Optional[str] = None
+        self.interrupted = False
+        self.finished = False
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    def __iter__(self) -> Iterator[str]:
+        if self.finished:
+            yield from self.parts
+            return
+
+        start = time.perf_counter()
+        try:
+            for chunk in self._chunks:
+                if not chunk:
+                    continue
+                if self.ttft_ms is None:
+                    self.ttft_ms = (time.perf_counter() - start) * 1000
+                self.parts.append(chunk)
+                yield chunk
+        except GeneratorExit:
+            self.interrupted = True  # Konsument porzucił strumień - nie zapisuj urwanej odpowiedzi
+            raise
+        except Exception as e:
+            self.error = str(e)
+            message = f"[BŁĄD API: {e}]"
+            self.parts.append(message)
+            yield message
+        finally:
+            self.total_ms = (time.perf_counter() - start) * 1000
+            self._finish()
+
+    def consume(self) -> str:
+        """Wyczerpj strumień (jeśli nikt go nie wyświetlił) i zwróć pełny tekst"""
+        for _ in self:
+            pass
+        return self.text
+
+    def _finish(self):
+        if self.finished:
+            return
+        self.finished = True
+
+        if self.track_latency and self.ttft_ms is not None and self.error is None:
+            try:
+                from api_usage_tracker import get_tracker
+                get_tracker().track_ttft(self.api_name, self.ttft_ms, self.total_ms)
+            except Exception as e:
+                print(f"⚠️ Nie można zapisać TTFT: {e}")
+            try:
+                from perf_registry import get_timing_registry
+                registry = get_timing_registry()
+                registry.record(f"llm.{self.api_name}.ttft", self.ttft_ms)
+                registry.record(f"llm.{self.api_name}.stream", self.total_ms)
+            except ImportError:
+                pass
+
+        if self.on_complete is not None and not self.interrupted:
+            try:
+                self.on_complete(self.text)
+            except Exception as e:
+                print(f"⚠️ Błąd po zakończeniu strumienia ({self.api_name}): {e}")
@@ -12,7 +12,9 @@ import json
 import os
 from datetime import datetime
 from typing import Dict, List, Any
-import requests
+
+# Wspólny model portfela (to samo źródło co Streamlit/snapshoty/insight)
+from portfolio_model import get_portfolio_model, get_usd_pln_rate as _model_usd_pln_rate
 
 # Import CryptoPortfolioManager dla live prices
 try:
@@ -45,46 +47,28 @@ def save_json_file(filepath: str, data: Any) -> bool:
         return False
 
 def get_usd_pln_rate() -> float:
-    """Pobierz aktualny kurs USD/PLN z NBP"""
-    try:
-        response = requests.get('https://api.nbp.pl/api/exchangerates/rates/a/usd/?format=json', timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            return data['rates'][0]['mid']
-    except Exception as e:
-        print(f"⚠️ Błąd pobierania kursu USD/PLN: {e}")
-    
-    return 3.65  # Fallback rate
+    """Pobierz aktualny kurs USD/PLN z NBP (zapamiętywany w procesie)"""
+    return _model_usd_pln_rate()
 
 def analyze_trading212_portfolio() -> Dict[str, Any]:
     """Analiza portfela Trading212"""
-    cache = load_json_file('trading212_cache.json')
+    model = get_portfolio_model(get_usd_pln_rate())
     
-    if not cache or 'data' not in cache:
+    if model.t212_timestamp is None:
         return {'total_value_usd': 0, 'positions': 0, 'cash_usd': 0}
     
-    data = cache.get('data', {})
-    positions = data.get('positions', [])
-    account = data.get('account', {})
-    
-    # Wartość pozycji
-    total_value = sum(float(pos.get('quantity', 0)) * float(pos.get('currentPrice', 0)) for pos in positions)
-    
-    # Cash z account.free
-    cash = float(account.get('free', 0))
-    
     return {
-        'total_value_usd': round(total_value, 2),
-        'positions': len(positions),
-        'cash_usd': round(cash, 2),
-        'total_with_cash_usd': round(total_value + cash, 2)
+        'total_value_usd': round(model.stocks_usd, 2),
+        'positions': len(model.stocks),
+        'cash_usd': round(model.cash_usd, 2),
+        'total_with_cash_usd': round(model.stocks_usd + model.cash_usd, 2)
     }
 
 def analyze_crypto_portfolio() -> Dict[str, Any]:
     """Analiza portfela krypto z live prices"""
-    krypto = load_json_file('krypto.json', {'krypto': []})
+    model = get_portfolio_model(get_usd_pln_rate())
     
-    positions = krypto.get('krypto', [])
+    positions = [p.raw for p in model.crypto]
     if not positions:
         return {'total_value_usd': 0, 'positions': 0}
     
@@ -118,11 +102,8 @@ def analyze_crypto_portfolio() -> Dict[str, Any]:
         except Exception as e:
             print(f"⚠️ Błąd live prices crypto: {e}")
     
-    # Fallback - użyj cen zakupu (statyczne dane)
-    total_value = sum(
-        float(pos.get('ilosc', 0)) * float(pos.get('cena_zakupu_usd', 0))
-        for pos in positions if isinstance(pos, dict)
-    )
+    # Fallback - wartość z modelu (ceny zapisane w krypto.json)
+    total_value = model.crypto_usd
     
     print(f"⚠️ Crypto używa cen zakupu (live prices niedostępne): ${total_value:,.2f}")
     
@@ -133,20 +114,14 @@ def analyze_crypto_portfolio() -> Dict[str, Any]:
 
 def analyze_debt() -> Dict[str, Any]:
     """Analiza zadłużenia"""
-    kredyty = load_json_file('kredyty.json', {'kredyty': []})
+    model = get_portfolio_model(get_usd_pln_rate())
     
-    loans = kredyty.get('kredyty', [])
-    if not loans:
+    if not model.loans:
         return {'total_debt_pln': 0, 'active_loans': 0}
     
-    total_debt = sum(
-        float(loan.get('kwota_poczatkowa', 0)) - float(loan.get('splacono', 0))
-        for loan in loans if isinstance(loan, dict)
-    )
-    
     return {
-        'total_debt_pln': round(total_debt, 2),
-        'active_loans': len(loans)
+        'total_debt_pln': round(model.debt_pln, 2),
+        'active_loans': len(model.loans)
     }
 
 def analyze_goals() -> Dict[str, Any]:
@@ -159,12 +134,9 @@ def analyze_goals() -> Dict[str, Any]:
     add_target = float(cele.get('ADD_wartosc_docelowa_PLN', 50000))
     
     # DODAJ cash z Trading212 do rezerwy
-    trading212 = load_json_file('trading212_cache.json', {})
-    cash_usd = float(trading212.get('data', {}).get('account', {}).get('free', 0))
-    
-    # Kurs USD/PLN
-    usd_pln = get_usd_pln_rate()
-    cash_pln = cash_usd * usd_pln
+    model = get_portfolio_model(get_usd_pln_rate())
+    cash_usd = model.cash_usd
+    cash_pln = model.cash_pln
     
     # CAŁKOWITA rezerwa = rezerwa z cele.json + cash z Trading212
     rezerwa_current = rezerwa_base + cash_pln
@@ -199,25 +171,18 @@ def check_compliance() -> List[Dict[str, Any]]:
         })
     
     # Sprawdź dywersyfikację akcji
-    cache = load_json_file('trading212_cache.json')
-    if cache and 'data' in cache:
-        positions = cache.get('data', {}).get('positions', [])
-        if positions:
-            total_value = sum(float(pos.get('quantity', 0)) * float(pos.get('currentPrice', 0)) for pos in positions)
-            
-            for pos in positions:
-                ticker = pos.get('ticker', '')
-                position_value = float(pos.get('quantity', 0)) * float(pos.get('currentPrice', 0))
-                percentage = (position_value / total_value * 100) if total_value > 0 else 0
-                
-                # Ostrzeżenie jeśli pojedyncza pozycja > 15% portfela
-                if percentage > 15:
-                    issues.append({
-                        'category': 'diversification',
-                        'severity': 'info',
-                        'message': f'{ticker} stanowi {percentage:.1f}% portfela (>15%)',
-                        'recommendation': 'Rozważ rebalansowanie przy kolejnych wpłatach'
-                    })
+    model = get_portfolio_model(get_usd_pln_rate())
+    for ticker, weight in model.stocks.weights.items():
+        percentage = weight * 100
+        
+        # Ostrzeżenie jeśli pojedyncza pozycja > 15% portfela
+        if percentage > 15:
+            issues.append({
+                'category': 'diversification',
+                'severity': 'info',
+                'message': f'{ticker} stanowi {percentage:.1f}% portfela (>15%)',
+                'recommendation': 'Rozważ rebalansowanie przy kolejnych wpłatach'
+            })
     
     return issues
 
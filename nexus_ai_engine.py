@@ -18,6 +18,11 @@ from datetime import datetime
 from typing import Dict, List, Optional, Tuple, Any
 import google.generativeai as genai
 
+from response_cache import get_response_cache, make_cache_key, portfolio_state_hash, is_cache_disabled
+from llm_streaming import TimedStream, stream_gemini, stream_claude, stream_openai
+from perf_registry import get_timing_registry
+from persona_context_builder import update_persona_memory
+
 # Try to load dotenv if available
 try:
     from dotenv import load_dotenv
@@ -97,18 +102,17 @@ class NexusAIEngine:
     
     def _save_config(self):
         """Save updated configuration back to persona_memory.json"""
-        try:
-            with open(PERSONA_MEMORY_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
+        def apply(data):
             # Update Nexus config
-            if 'Nexus' in data:
-                data['Nexus']['ai_config'] = self.config
-                data['Nexus']['ai_config']['performance_tracking'] = self.performance
-            
-            with open(PERSONA_MEMORY_FILE, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            
+            if 'Nexus' not in data:
+                return False
+            data['Nexus']['ai_config'] = self.config
+            data['Nexus']['ai_config']['performance_tracking'] = self.performance
+            return True
+        
+        try:
+            # Fresh read + atomic write under the shared persona memory lock
+            update_persona_memory(apply)
             return True
         except Exception as e:
             print(f"❌ Error saving Nexus config: {e}")
@@ -154,11 +158,41 @@ class NexusAIEngine:
             except Exception as e:
                 print(f"   ⚠️ OpenAI initialization failed: {e}")
     
-    def generate_response(
+    def _cache_key(self, prompt: str, context: Optional[Dict], mode: str) -> str:
+        return make_cache_key('Nexus', f"{self.current_model}:{mode}", prompt, portfolio_state_hash(context))
+    
+    def get_cached_response(
         self,
         prompt: str,
         context: Optional[Dict] = None,
         use_ensemble: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Cached generate_response result (metadata['cached'] = True) or None
+        
+        Lets budget-gated callers check the cache before reserving an API call.
+        """
+        if is_cache_disabled():
+            return None
+        start_time = datetime.now()
+        mode = 'ensemble' if (self.ensemble_enabled and use_ensemble) else 'single'
+        entry = get_response_cache().get(self._cache_key(prompt, context, mode))
+        if entry is None:
+            return None
+        result = dict(entry['response'])
+        result['metadata'] = {
+            **result.get('metadata', {}),
+            'cached': True,
+            'response_time_ms': (datetime.now() - start_time).total_seconds() * 1000
+        }
+        return result
+    
+    def generate_response(
+        self,
+        prompt: str,
+        context: Optional[Dict] = None,
+        use_ensemble: bool = False,
+        bypass_cache: bool = False
     ) -> Optional[Dict[str, Any]]:
         """
         Generate response from Nexus AI with fallback on error
@@ -167,14 +201,27 @@ class NexusAIEngine:
             prompt: User query or topic to discuss
             context: Additional context (portfolio data, market data, etc.)
             use_ensemble: Force ensemble mode if enabled (default: False)
+            bypass_cache: Skip the response cache and always call the model
         
         Returns:
             Dict with response, confidence, reasoning, and metadata
             OR None if error (allows main code to use fallback)
+            metadata['cached'] is True when served from cache (caller should
+            record it via APIUsageTracker.track_cache_hit instead of track_call)
         """
         try:
             start_time = datetime.now()
             
+            # Response cache - keyed on prompt + context (portfolio state)
+            mode = 'ensemble' if (self.ensemble_enabled and use_ensemble) else 'single'
+            cache = get_response_cache()
+            cache_key = self._cache_key(prompt, context, mode)
+            
+            if not bypass_cache:
+                result = self.get_cached_response(prompt, context, use_ensemble)
+                if result is not None:
+                    return result
+            
             # Build full prompt with context
             full_prompt = self._build_prompt(prompt, context)
             
@@ -201,15 +248,99 @@ class NexusAIEngine:
                 'model_used': self.current_model,
                 'response_time_ms': response_time,
                 'timestamp': datetime.now().isoformat(),
-                'ensemble_enabled': self.ensemble_enabled
+                'ensemble_enabled': self.ensemble_enabled,
+                'cached': False
             }
             
+            cache.set(cache_key, result)
+            
             return result
             
         except Exception as e:
             print(f"❌ Nexus AI Engine error: {e}")
             return None  # Fallback to standard AI in streamlit_app.py
     
+    def stream_response(
+        self,
+        prompt: str,
+        context: Optional[Dict] = None,
+        provider: str = 'gemini',
+        bypass_cache: bool = False
+    ) -> Optional[TimedStream]:
+        """
+        Stream Nexus response chunk by chunk (for st.write_stream)
+
+        Args:
+            prompt: User query or topic to discuss
+            context: Additional context (portfolio data, market data, etc.)
+            provider: 'gemini', 'claude' or 'openai' - client from _init_ai_clients
+            bypass_cache: Skip the response cache and always call the model
+
+        Returns:
+            TimedStream (iterable of text chunks; .text holds the full answer
+            once consumed) OR None if the provider client is not available.
+            Time-to-first-token is recorded per provider in APIUsageTracker.
+            The completed answer is stored in the response cache under a key
+            that includes the provider (Gemini shares generate_response's
+            single-mode key).
+        """
+        # Resolve the provider before the cache lookup - a Gemini fallback must not
+        # serve or overwrite another provider's cache entry
+        if provider == 'claude' and self.claude_client:
+            api_name = 'claude'
+        elif provider == 'openai' and self.openai_client:
+            api_name = 'openai'
+        elif self.gemini_client:
+            api_name = 'gemini_nexus'
+        else:
+            print(f"❌ Nexus: no client available for streaming ({provider})")
+            return None
+
+        # Gemini shares generate_response's single-mode key, other providers get their own
+        model_key = f"{self.current_model}:single"
+        if api_name != 'gemini_nexus':
+            model_key += f":{api_name}"
+        cache = get_response_cache()
+        cache_key = make_cache_key('Nexus', model_key, prompt, portfolio_state_hash(context))
+
+        if not bypass_cache and not is_cache_disabled():
+            entry = cache.get(cache_key)
+            if entry is not None:
+                return TimedStream([entry['response'].get('response', '')], api_name, cached=True)
+
+        full_prompt = self._build_prompt(prompt, context)
+
+        if api_name == 'claude':
+            chunks = stream_claude(self.claude_client, full_prompt)
+        elif api_name == 'openai':
+            chunks = stream_openai(self.openai_client, full_prompt, model="gpt-4")
+        else:
+            chunks = stream_gemini(self.gemini_client, full_prompt)
+
+        start_time = datetime.now()
+
+        def on_complete(text: str):
+            response_time = (datetime.now() - start_time).total_seconds() * 1000
+            self._update_performance(response_time)
+            if text and not text.startswith('[BŁĄD') and not text.startswith('[ODPOWIEDŹ ZABLOKOWANA'):
+                cache.set(cache_key, {
+                    'response': text,
+                    'confidence': self._extract_confidence(text),
+                    'reasoning': f'Single model analysis (streamed, {api_name})',
+                    'success': True,
+                    'model': self.current_model,
+                    'metadata': {
+                        'mode': 'single',
+                        'model_used': self.current_model,
+                        'response_time_ms': response_time,
+                        'timestamp': datetime.now().isoformat(),
+                        'ensemble_enabled': self.ensemble_enabled,
+                        'cached': False
+                    }
+                })
+
+        return TimedStream(chunks, api_name, on_complete=on_complete)
+
     def _build_prompt(self, prompt: str, context: Optional[Dict] = None) -> str:
         """Build comprehensive prompt with context"""
         system_instruction = """You are Nexus, the meta-advisor of Horyzont Partnerów.
@@ -495,6 +626,9 @@ Provide critical perspective highlighting risks and potential issues."""
         self.performance['avg_response_time_ms'] = (
             (current_avg * (total - 1) + response_time_ms) / total
         )
+        
+        # Rozkład (p50/p95) w rejestrze czasów - średnia ukrywa ogony
+        get_timing_registry().record("nexus.response", response_time_ms)
     
     def check_ensemble_eligibility(self) -> Tuple[bool, str]:
         """
@@ -0,0 +1,215 @@
+"""
+perf_registry.py
+
+Lekki rejestr czasów gorących ścieżek aplikacji.
+
+- span(name) (context manager) i timed(name) (dekorator) mierzą czas ściany
+- dla każdej nazwy: liczba wywołań, suma, ring buffer ostatnich próbek -> p50/p95
+- spany zagnieżdżone w obrębie jednego wątku tworzą drzewo; zakończone drzewa
+  (np. cały rerun Streamlit) trafiają do bufora ostatnich przebiegów
+- opcjonalny zrzut cProfile dla jednego przebiegu
+
+Koszt przy braku profilowania: dwa perf_counter() i operacje na deque - bez I/O.
+"""
+
+import cProfile
+import io
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, List, Optional
+
+SAMPLES_PER_SPAN = 512  # Ring buffer próbek na nazwę spanu
+RECENT_TREES = 20  # Ile ostatnich drzew (rerunów) trzymać
+MAX_CHILDREN = 200  # Ochrona przed pętlami tworzącymi tysiące dzieci
+
+
+class SpanNode:
+    """Węzeł drzewa spanów jednego przebiegu"""
+
+    __slots__ = ('name', 'start', 'duration_ms', 'children', 'dropped')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.duration_ms = 0.0
+        self.children: List['SpanNode'] = []
+        self.dropped = 0
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'ms': round(self.duration_ms, 2),
+            'children': [c.to_dict() for c in self.children],
+            'dropped': self.dropped
+        }
+
+
+class SpanStats:
+    """Statystyki jednej nazwy spanu"""
+
+    __slots__ = ('count', 'total_ms', 'max_ms', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.samples = deque(maxlen=SAMPLES_PER_SPAN)
+
+    def add(self, ms: float):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.samples.append(ms)
+
+    def percentile(self, pct: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        idx = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+        return ordered[idx]
+
+
+class TimingRegistry:
+    """Rejestr spanów (bezpieczny wątkowo)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, SpanStats] = {}
+        self._trees = deque(maxlen=RECENT_TREES)
+        self._local = threading.local()
+        self.last_profile: Optional[str] = None
+
+    def _stack(self) -> List[SpanNode]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def record(self, name: str, ms: float):
+        """Zapisz pomiar zmierzony poza rejestrem (np. czas odpowiedzi API)"""
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = SpanStats()
+            stats.add(ms)
+
+    @contextmanager
+    def span(self, name: str):
+        """Mierzy blok kodu; zagnieżdżone spany budują drzewo przebiegu"""
+        stack = self._stack()
+        node = SpanNode(name)
+        parent = stack[-1] if stack else None
+        if parent is not None:
+            if len(parent.children) < MAX_CHILDREN:
+                parent.children.append(node)
+            else:
+                parent.dropped += 1
+        stack.append(node)
+        try:
+            yield node
+        finally:
+            node.duration_ms = (time.perf_counter() - node.start) * 1000
+            stack.pop()
+            self.record(name, node.duration_ms)
+            if parent is None:
+                with self._lock:
+                    self._trees.append({
+                        'name': name,
+                        'at': time.strftime('%H:%M:%S'),
+                        'ms': round(node.duration_ms, 2),
+                        'tree': node.to_dict()
+                    })
+
+    def timed(self, name: Optional[str] = None):
+        """Dekorator: każde wywołanie funkcji to span (domyślnie nazwa funkcji)"""
+        def decorator(func):
+            span_name = name or func.__name__
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @contextmanager
+    def run(self, name: str = "rerun", profile: bool = False, profile_limit: int = 40):
+        """Span główny przebiegu, opcjonalnie z cProfile (wynik w last_profile)"""
+        profiler = cProfile.Profile() if profile else None
+        if profiler is not None:
+            profiler.enable()
+        try:
+            with self.span(name) as node:
+                yield node
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                out = io.StringIO()
+                pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(profile_limit)
+                self.last_profile = out.getvalue()
+
+    def summary(self) -> List[Dict]:
+        """Statystyki wszystkich spanów, posortowane po łącznym czasie"""
+        with self._lock:
+            rows = [
+                {
+                    'span': name,
+                    'calls': s.count,
+                    'total_ms': round(s.total_ms, 1),
+                    'avg_ms': round(s.total_ms / s.count, 2) if s.count else 0.0,
+                    'p50_ms': round(s.percentile(50), 2),
+                    'p95_ms': round(s.percentile(95), 2),
+                    'max_ms': round(s.max_ms, 2)
+                }
+                for name, s in self._stats.items()
+            ]
+        return sorted(rows, key=lambda r: r['total_ms'], reverse=True)
+
+    def recent_trees(self) -> List[Dict]:
+        with self._lock:
+            return list(self._trees)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._trees.clear()
+            self.last_profile = None
+
+
+def format_tree(node: Dict, indent: int = 0) -> str:
+    """Drzewo spanów jako tekst (do st.code)"""
+    line = f"{'  ' * indent}{node['name']}  {node['ms']:.1f} ms"
+    lines = [line]
+    for child in node.get('children', []):
+        lines.append(format_tree(child, indent + 1))
+    if node.get('dropped'):
+        lines.append(f"{'  ' * (indent + 1)}... +{node['dropped']} pominiętych")
+    return "\n".join(lines)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_timing_registry() -> TimingRegistry:
+    """Singleton rejestru (jeden na proces - wspólny dla wszystkich sesji)"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = TimingRegistry()
+    return _registry
+
+
+def timed(name: Optional[str] = None):
+    """Skrót: @timed("nazwa") na globalnym rejestrze"""
+    return get_timing_registry().timed(name)
+
+
+def span(name: str):
+    """Skrót: with span("nazwa"): na globalnym rejestrze"""
+    return get_timing_registry().span(name)
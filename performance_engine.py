@@ -0,0 +1,484 @@
+"""
+performance_engine.py
+
+Silnik stóp zwrotu portfela: TWR (time-weighted, łańcuchowo) i MWR (money-weighted,
+XIRR) na dziennych snapshotach oczyszczonych z przepływów pieniężnych.
+
+Zwrot liczony wprost z wartości netto (np.diff(values) / values[:-1]) traktuje
+dokupienie akcji, zakup krypto czy zaciągnięty kredyt jak zysk/stratę. Tutaj każdy
+okres między snapshotami jest korygowany o przepływ zewnętrzny F_t:
+
+    r_t = (V_t - F_t) / V_{t-1} - 1        TWR = prod(1 + r_t) - 1
+
+- przepływy: zmiany pozycji T212 (trading212_position_history.jsonl), zakupy krypto
+  (krypto.json) i zmiana zadłużenia (kredyt zaciągnięty = wypływ z wartości netto,
+  spłacona rata = wpływ)
+- klasy aktywów: stocks, crypto, total (wartość netto)
+- przepływ trafia do pierwszego snapshotu zrobionego po nim (searchsorted na znacznikach czasu)
+- stan (wartości, przepływy, indeks TWR) w performance_state.json - odświeżenie dolicza
+  tylko nowe snapshoty i nowe linie historii pozycji (offset w pliku), reszta to odczyt
+"""
+
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DAILY_SNAPSHOTS_FILE = "daily_snapshots.json"
+POSITION_HISTORY_FILE = "trading212_position_history.jsonl"
+KRYPTO_FILE = "krypto.json"
+PERFORMANCE_STATE_FILE = "performance_state.json"
+STATE_VERSION = 1
+
+ASSET_CLASSES = ("stocks", "crypto", "total")
+DEFAULT_PERIODS = (7, 30, 90, 365)
+REBASE_THRESHOLD = 0.01  # Wartość po odjęciu przepływu < 1% poprzedniej = zmiana bazy, nie zwrot
+
+XIRR_MAX_ITER = 100
+XIRR_TOLERANCE = 1e-10
+XIRR_BRACKET = (-0.9999, 1e4)  # Zakres szukania rocznej stopy przy bisekcji
+
+
+def _write_json_atomic(path: str, data) -> None:
+    """Zapis przez plik tymczasowy + os.replace - czytelnik nigdy nie widzi połowy pliku"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _norm_ts(value) -> str:
+    """Znacznik czasu jako 'YYYY-MM-DDTHH:MM:SS' (snapshot ma spację, sync T212 ma 'T')"""
+    text = str(value or "").replace(" ", "T")[:19]
+    return text if len(text) == 19 else text[:10] + "T00:00:00"
+
+
+def _file_signature(path: str) -> Optional[Tuple[float, int]]:
+    try:
+        st = os.stat(path)
+        return st.st_mtime, st.st_size
+    except OSError:
+        return None
+
+
+def chain_link(returns: np.ndarray) -> float:
+    """Łańcuchowe złożenie zwrotów okresowych"""
+    if len(returns) == 0:
+        return 0.0
+    return float(np.prod(1.0 + np.asarray(returns, dtype=float)) - 1.0)
+
+
+def xirr(amounts: Sequence[float], days: Sequence[float]) -> Optional[float]:
+    """
+    Roczna wewnętrzna stopa zwrotu dla nieregularnych przepływów
+
+    Args:
+        amounts: przepływy z perspektywy inwestora (wpłata < 0, wartość końcowa > 0)
+        days: dzień każdego przepływu liczony od pierwszego
+
+    Returns:
+        Stopa roczna (0.12 = 12%) albo None, gdy nie istnieje (brak zmiany znaku)
+    """
+    a = np.asarray(amounts, dtype=float)
+    t = np.asarray(days, dtype=float) / 365.0
+    if len(a) < 2 or not (np.any(a > 0) and np.any(a < 0)):
+        return None
+
+    def npv(rate: float) -> float:
+        return float(np.sum(a * np.power(1.0 + rate, -t)))
+
+    # Newton - zwykle kilka iteracji
+    rate = 0.1
+    for _ in range(XIRR_MAX_ITER):
+        discount = np.power(1.0 + rate, -t)
+        value = float(np.sum(a * discount))
+        slope = float(np.sum(-t * a * discount / (1.0 + rate)))
+        if slope == 0 or not np.isfinite(slope):
+            break
+        step = value / slope
+        rate -= step
+        if not np.isfinite(rate) or rate <= XIRR_BRACKET[0]:
+            break
+        if abs(step) < XIRR_TOLERANCE:
+            return float(rate)
+
+    # Bisekcja jako zabezpieczenie (Newton ucieka przy skrajnych przepływach)
+    low, high = XIRR_BRACKET
+    f_low, f_high = npv(low), npv(high)
+    if not (np.isfinite(f_low) and np.isfinite(f_high)) or f_low * f_high > 0:
+        return None
+    for _ in range(200):
+        mid = (low + high) / 2
+        f_mid = npv(mid)
+        if abs(f_mid) < XIRR_TOLERANCE or (high - low) < XIRR_TOLERANCE:
+            return float(mid)
+        if f_low * f_mid < 0:
+            high = mid
+        else:
+            low, f_low = mid, f_mid
+    return float((low + high) / 2)
+
+
+class PerformanceEngine:
+    """Przyrostowo liczone TWR / MWR portfela i klas aktywów"""
+
+    def __init__(self, snapshots_file: str = DAILY_SNAPSHOTS_FILE,
+                 history_file: str = POSITION_HISTORY_FILE,
+                 krypto_file: str = KRYPTO_FILE,
+                 state_file: str = PERFORMANCE_STATE_FILE):
+        self.snapshots_file = snapshots_file
+        self.history_file = history_file
+        self.krypto_file = krypto_file
+        self.state_file = state_file
+        self._lock = threading.RLock()
+        self._state = None
+        self._state_path = None  # Ścieżka bezwzględna - zmiana katalogu roboczego = inny stan
+        self._signature = None
+        self._arrays: Dict[str, np.ndarray] = {}
+
+    # === STAN ===
+
+    @staticmethod
+    def _empty_state() -> Dict:
+        return {
+            "version": STATE_VERSION,
+            "history_offset": 0,
+            "crypto_ids": [],
+            "pending": {"stocks": [], "crypto": []},  # [ts, usd] po ostatnim snapshocie
+            "dates": [], "ts": [], "rates": [], "debt": [],
+            "values": {c: [] for c in ASSET_CLASSES},
+            "flows": {c: [] for c in ASSET_CLASSES},
+            "index": {c: [] for c in ASSET_CLASSES},
+        }
+
+    def _load_state(self):
+        self._state_path = os.path.abspath(self.state_file)
+        self._signature = None
+        self._state = self._empty_state()
+        if os.path.exists(self.state_file):
+            try:
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                if state.get("version") == STATE_VERSION:
+                    self._state = state
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"⚠️ Stan silnika zwrotów uszkodzony ({e}) - liczę od nowa")
+        self._rebuild_arrays()
+
+    def _rebuild_arrays(self):
+        s = self._state
+        self._arrays = {"dates": np.array(s["dates"], dtype="datetime64[D]")}
+        for c in ASSET_CLASSES:
+            self._arrays[f"values.{c}"] = np.array(s["values"][c], dtype=float)
+            self._arrays[f"flows.{c}"] = np.array(s["flows"][c], dtype=float)
+            self._arrays[f"index.{c}"] = np.array(s["index"][c], dtype=float)
+
+    def _load_snapshots(self) -> List[Dict]:
+        try:
+            with open(self.snapshots_file, 'r', encoding='utf-8') as f:
+                snapshots = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return []
+        by_day = {}
+        for snap in snapshots:
+            day = (snap.get('date_only') or snap.get('date') or "")[:10]
+            if day:
+                by_day[day] = snap  # Jeden snapshot na dzień, późniejszy wygrywa
+        return [by_day[day] for day in sorted(by_day)]
+
+    def _history_rewritten(self, snapshots: List[Dict]) -> bool:
+        """Czy snapshoty już policzone zmieniły się (import, ręczna edycja)"""
+        s = self._state
+        count = len(s["dates"])
+        if count == 0:
+            return False
+        if len(snapshots) < count:
+            return True
+        last = snapshots[count - 1]
+        totals = last.get('totals') or {}
+        return (last.get('date_only') or last.get('date', ""))[:10] != s["dates"][-1] or \
+            round(float(totals.get('net_worth_pln') or 0), 2) != round(s["values"]["total"][-1], 2)
+
+    # === PRZEPŁYWY ===
+
+    def _read_stock_flows(self) -> List[Tuple[str, float]]:
+        """Nowe linie historii pozycji T212 (od zapamiętanego offsetu) jako (ts, usd)"""
+        s = self._state
+        flows = []
+        if not os.path.exists(self.history_file):
+            return flows
+        with open(self.history_file, 'rb') as f:
+            f.seek(s["history_offset"])
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # Linia w trakcie zapisu - wrócimy do niej przy następnym odświeżeniu
+                s["history_offset"] += len(raw)
+                try:
+                    wpis = json.loads(raw)
+                except json.JSONDecodeError:
+                    continue
+                ts = _norm_ts(wpis.get('timestamp'))
+                for z in wpis.get('changes', []):
+                    price = z.get('price')
+                    if price is not None:
+                        flows.append((ts, float(z.get('delta') or 0) * float(price)))
+        return flows
+
+    def _read_crypto_flows(self) -> List[Tuple[str, float]]:
+        """Zakupy krypto jeszcze nieuwzględnione (po id wpisu) jako (ts, usd)"""
+        s = self._state
+        try:
+            with open(self.krypto_file, 'r', encoding='utf-8') as f:
+                krypto = json.load(f).get('krypto', [])
+        except (OSError, json.JSONDecodeError, AttributeError):
+            return []
+        seen = set(s["crypto_ids"])
+        flows = []
+        for k in krypto:
+            kid = str(k.get('id') or f"{k.get('symbol')}@{k.get('data_dodania')}")
+            if kid in seen:
+                continue
+            seen.add(kid)
+            s["crypto_ids"].append(kid)
+            flows.append((_norm_ts(k.get('data_dodania')),
+                          float(k.get('ilosc') or 0) * float(k.get('cena_zakupu_usd') or 0)))
+        return flows
+
+    @staticmethod
+    def _bucket(flows: List, new_ts: np.ndarray, rates: np.ndarray, has_previous: bool) -> Tuple[np.ndarray, List]:
+        """
+        Suma przepływów (PLN) na nowy snapshot + przepływy po ostatnim snapshocie
+
+        Przepływ z czasem <= pierwszego nowego snapshotu trafia do niego (także
+        spóźniony zapis z dnia już policzonego); przy liczeniu od zera przepływy
+        sprzed pierwszego snapshotu są częścią wartości początkowej.
+        """
+        if not flows:
+            return np.zeros(len(new_ts)), []
+        ts = np.array([f[0] for f in flows])
+        usd = np.array([f[1] for f in flows], dtype=float)
+        pos = np.searchsorted(new_ts, ts, side='left')
+        pending = [[str(t), float(u)] for t, u, p in zip(ts, usd, pos) if p == len(new_ts)]
+        mask = pos < len(new_ts)
+        if not has_previous:
+            mask &= pos > 0
+        pln = np.bincount(pos[mask], weights=usd[mask] * rates[pos[mask]], minlength=len(new_ts))
+        return pln[:len(new_ts)], pending
+
+    # === ODŚWIEŻANIE ===
+
+    def refresh(self) -> int:
+        """
+        Dolicz nowe snapshoty i przepływy
+
+        Returns:
+            Liczba nowych dni
+        """
+        with self._lock:
+            if self._state is None or self._state_path != os.path.abspath(self.state_file):
+                self._load_state()
+
+            signature = tuple(_file_signature(p) for p in (self.snapshots_file, self.history_file, self.krypto_file))
+            if signature == self._signature:
+                return 0  # Nic się nie zmieniło od ostatniego odświeżenia
+
+            snapshots = self._load_snapshots()
+            history_size = (signature[1] or (0, 0))[1]
+            if self._history_rewritten(snapshots) or history_size < self._state["history_offset"]:
+                print("🔄 Historia snapshotów zmieniona - przeliczam zwroty od początku")
+                self._state = self._empty_state()
+
+            s = self._state
+            count = len(s["dates"])
+            new_snaps = snapshots[count:]
+
+            stock_flows = [tuple(p) for p in s["pending"]["stocks"]] + self._read_stock_flows()
+            crypto_flows = [tuple(p) for p in s["pending"]["crypto"]] + self._read_crypto_flows()
+
+            if new_snaps:
+                self._append(new_snaps, stock_flows, crypto_flows, has_previous=count > 0)
+            else:
+                s["pending"] = {"stocks": [list(f) for f in stock_flows], "crypto": [list(f) for f in crypto_flows]}
+
+            _write_json_atomic(self.state_file, s)
+            self._signature = signature
+            self._rebuild_arrays()
+            return len(new_snaps)
+
+    def _append(self, new_snaps: List[Dict], stock_flows: List, crypto_flows: List, has_previous: bool):
+        """Wektorowo: wartości, przepływy i indeks TWR dla nowych dni"""
+        s = self._state
+        new_ts = np.array([_norm_ts(snap.get('date') or snap.get('date_only')) for snap in new_snaps])
+        rates = np.array([float(snap.get('usd_pln_rate') or 0) for snap in new_snaps])
+
+        def section(key, field):
+            return np.array([float((snap.get(key) or {}).get(field) or 0) for snap in new_snaps])
+
+        values = {
+            "stocks": section('stocks', 'value_pln'),
+            "crypto": section('crypto', 'value_pln'),
+            "total": section('totals', 'net_worth_pln'),
+        }
+        debt = section('totals', 'debt_pln')
+
+        stock_pln, pending_stocks = self._bucket(stock_flows, new_ts, rates, has_previous)
+        crypto_pln, pending_crypto = self._bucket(crypto_flows, new_ts, rates, has_previous)
+
+        prev_debt = np.concatenate(([s["debt"][-1] if has_previous else debt[0]], debt[:-1]))
+        flows = {"stocks": stock_pln, "crypto": crypto_pln}
+        returns = {}
+        for c in ASSET_CLASSES:
+            if c == "total":
+                # Nowy kredyt obniża wartość netto bez straty inwestycyjnej, spłata ją podnosi
+                flows[c] = flows["stocks"] + flows["crypto"] - (debt - prev_debt)
+            v = values[c]
+            prev = np.concatenate(([s["values"][c][-1] if has_previous else v[0]], v[:-1]))
+            # Przepływ "zjadający" prawie całą wartość końcową to ponowne wprowadzenie
+            # pozycji do rejestru (np. data_dodania w krypto.json), a nie strata -99%
+            rebase = (prev > 0) & (v - flows[c] <= REBASE_THRESHOLD * prev)
+            flows[c] = np.where(rebase, v - prev, flows[c])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                r = np.where(prev > 0, (v - flows[c]) / prev - 1.0, 0.0)
+            if not has_previous:
+                r[0] = 0.0  # Pierwszy dzień = baza indeksu
+            returns[c] = r
+
+        for c in ASSET_CLASSES:
+            base = s["index"][c][-1] if has_previous else 1.0
+            s["values"][c].extend(values[c].tolist())
+            s["flows"][c].extend(flows[c].tolist())
+            s["index"][c].extend((base * np.cumprod(1.0 + returns[c])).tolist())
+
+        s["dates"].extend(str(t)[:10] for t in new_ts)
+        s["ts"].extend(str(t) for t in new_ts)
+        s["rates"].extend(rates.tolist())
+        s["debt"].extend(debt.tolist())
+        s["pending"] = {"stocks": pending_stocks, "crypto": pending_crypto}
+
+    # === ZAPYTANIA ===
+
+    def _window(self, start: Optional[str], end: Optional[str], days: Optional[int]) -> Optional[Tuple[int, int]]:
+        """Indeksy (i0, i1) snapshotów otaczających okno - bazą jest ostatni snapshot <= start"""
+        dates = self._arrays["dates"]
+        if len(dates) < 2:
+            return None
+        i1 = len(dates) - 1 if end is None else int(np.searchsorted(dates, np.datetime64(end[:10]), side='right')) - 1
+        if i1 < 1:
+            return None
+        if days is not None:
+            start = str(dates[i1] - np.timedelta64(int(days), 'D'))
+        i0 = 0 if start is None else max(0, int(np.searchsorted(dates, np.datetime64(start[:10]), side='right')) - 1)
+        return (i0, i1) if i0 < i1 else None
+
+    def twr(self, asset_class: str = "total", start: Optional[str] = None, end: Optional[str] = None,
+            days: Optional[int] = None) -> Optional[float]:
+        """Time-weighted return w oknie (0.05 = 5%) - None, gdy za mało snapshotów"""
+        self.refresh()
+        window = self._window(start, end, days)
+        if window is None:
+            return None
+        index = self._arrays[f"index.{asset_class}"]
+        i0, i1 = window
+        return float(index[i1] / index[i0] - 1.0) if index[i0] else None
+
+    def mwr(self, asset_class: str = "total", start: Optional[str] = None, end: Optional[str] = None,
+            days: Optional[int] = None, annualize: bool = True) -> Optional[float]:
+        """
+        Money-weighted return (XIRR) w oknie
+
+        Args:
+            annualize: True = stopa roczna, False = zwrot za samo okno
+        """
+        self.refresh()
+        window = self._window(start, end, days)
+        if window is None:
+            return None
+        i0, i1 = window
+        dates = self._arrays["dates"][i0:i1 + 1]
+        values = self._arrays[f"values.{asset_class}"]
+        flows = self._arrays[f"flows.{asset_class}"][i0 + 1:i1 + 1]
+
+        amounts = np.concatenate(([-values[i0]], -flows, [values[i1]]))
+        offsets = (np.concatenate((dates, dates[-1:])) - dates[0]).astype(float)
+        mask = amounts != 0
+        rate = xirr(amounts[mask], offsets[mask])
+        if rate is None or annualize:
+            return rate
+        return float((1.0 + rate) ** (offsets[-1] / 365.0) - 1.0)
+
+    def period_returns(self, dates: Sequence[str], asset_class: str = "total") -> Optional[np.ndarray]:
+        """
+        Zwroty TWR między kolejnymi podanymi datami (np. historia przekazana do RiskAnalytics)
+
+        Returns:
+            Tablica len(dates) - 1 albo None, gdy któraś data nie ma snapshotu w silniku
+        """
+        self.refresh()
+        known = self._arrays["dates"]
+        if len(dates) < 2 or len(known) == 0:
+            return None
+        wanted = np.array([d[:10] for d in dates], dtype="datetime64[D]")
+        pos = np.searchsorted(known, wanted)
+        if np.any(pos >= len(known)) or np.any(known[np.minimum(pos, len(known) - 1)] != wanted):
+            return None
+        index = self._arrays[f"index.{asset_class}"][pos]
+        return index[1:] / index[:-1] - 1.0
+
+    def index_series(self, asset_class: str = "total") -> Tuple[np.ndarray, np.ndarray]:
+        """(daty, indeks TWR od 1.0) - do wykresów i drawdownu bez skoków od wpłat"""
+        self.refresh()
+        return self._arrays["dates"], self._arrays[f"index.{asset_class}"]
+
+    def summary(self, periods: Sequence[int] = DEFAULT_PERIODS) -> Dict[str, Dict]:
+        """
+        TWR i MWR (w %) dla okien i klas aktywów - do dashboardu
+
+        Returns:
+            {klasa: {"7": {"twr": %, "mwr": % rocznie}, ..., "all": {...}}}
+        """
+        self.refresh()
+        result = {}
+        for c in ASSET_CLASSES:
+            windows = {str(days): {"days": days} for days in periods}
+            windows["all"] = {"days": None}
+            for key, spec in windows.items():
+                twr = self.twr(c, days=spec["days"])
+                mwr = self.mwr(c, days=spec["days"])
+                windows[key] = {
+                    "twr": round(twr * 100, 2) if twr is not None else None,
+                    "mwr": round(mwr * 100, 2) if mwr is not None else None,
+                }
+            result[c] = windows
+        return result
+
+    @property
+    def last_date(self) -> Optional[str]:
+        self.refresh()
+        return self._state["dates"][-1] if self._state["dates"] else None
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_performance_engine() -> PerformanceEngine:
+    """Singleton silnika zwrotów"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = PerformanceEngine()
+    return _engine
+
+
+if __name__ == "__main__":
+    engine = get_performance_engine()
+    added = engine.refresh()
+    print(f"📈 Silnik zwrotów: {added} nowych dni (ostatni: {engine.last_date})")
+    for asset_class, windows in engine.summary().items():
+        print(f"\n{asset_class}:")
+        for key, res in windows.items():
+            label = f"{key} dni" if key != "all" else "całość"
+            print(f"  {label:>9}: TWR {res['twr']}%  MWR {res['mwr']}% rocznie")
@@ -1,12 +1,30 @@
 """
 Persistent Storage dla Streamlit Cloud
 Zapisuje dane do st.secrets i synchronizuje z GitHub
+
+Zapis pliku:
+- serializacja RAZ (orjson jeśli dostępny) - kawałkami: jeden rekord = jeden kawałek,
+  z których składany jest dokument (układ jak json.dump(indent=2); bez orjson bajt
+  w bajt, z orjson liczby zmiennoprzecinkowe mogą mieć inny zapis, np. 1e16 zamiast 1e+16)
+- atomowo: plik tymczasowy + fsync + os.replace - czytelnik nigdy nie widzi połowy pliku
+  (uprawnienia jak u poprzedniej wersji pliku)
+- backup (.backup) przez hardlink do starej wersji (bez kopiowania treści)
+- do kolejki synchronizacji trafiają tylko zmienione rekordy (diff po odciskach kawałków)
 """
 
 import streamlit as st
 import json
+import math
 from datetime import datetime
 import os
+import shutil
+import tempfile
+
+try:
+    import orjson
+    ORJSON_OK = True
+except ImportError:
+    ORJSON_OK = False
 
 # Import GitHub API
 try:
@@ -18,7 +36,7 @@ except:
 # Pliki wymagające persystencji
 PERSISTENT_FILES = [
     'persona_memory.json',
-    'autonomous_conversations.json',
+    'autonomous_conversations/index.json',
     'partner_conversations.json',
     'user_preferences.json',
     'wyplaty.json',
@@ -32,17 +50,177 @@ PERSISTENT_FILES = [
     'api_usage.json'
 ]
 
-def load_persistent_data(filename):
+# Umask procesu - nowe pliki dostają te same uprawnienia co przy zwykłym open()
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def _has_non_finite(obj):
+    """Czy obiekt zawiera NaN/Infinity (orjson zapisałby je jako null)"""
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        return any(_has_non_finite(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(_has_non_finite(v) for v in obj)
+    return False
+
+def _encode(obj):
+    """Jeden obiekt -> bytes w formacie json.dump(indent=2, ensure_ascii=False)"""
+    if ORJSON_OK:
+        try:
+            chunk = orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            chunk = None  # numpy.float64, int > 64 bitów itp. - json.dumps je przyjmuje
+        # NaN/Infinity serializuje json jak dotąd; zwykłe None zostaje w orjson
+        if chunk is not None and not _has_non_finite(obj):
+            return chunk
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+
+def _record_id(item, position):
+    if isinstance(item, dict) and isinstance(item.get('id'), (str, int)):
+        return str(item['id'])
+    return f"#{position}"
+
+def _nest(chunk, indent):
+    """Wcięcie zagnieżdżonego kawałka (stringi JSON nie zawierają surowych \\n)"""
+    return chunk.replace(b"\n", b"\n" + b" " * indent)
+
+def _serialize(data):
+    """
+    Serializuje dane raz, rekord po rekordzie
+    
+    Returns:
+        (dokument bytes, {ścieżka_rekordu: (odcisk, wartość)})
+        ścieżka: "klucz" dla wartości w słowniku, "klucz/id" dla rekordu listy
+    """
+    records = {}
+    
+    def encode_list(items, prefix, indent):
+        if not items:
+            return b"[]"
+        pad = b" " * (indent + 2)
+        parts = []
+        for i, item in enumerate(items):
+            chunk = _encode(item)
+            path = f"{prefix}{_record_id(item, i)}"
+            if path in records:
+                path = f"{prefix}#{i}"  # Zdublowane id - rekord rozpoznawany po pozycji
+            records[path] = (hash(chunk), item)
+            parts.append(pad + _nest(chunk, indent + 2))
+        return b"[\n" + b",\n".join(parts) + b"\n" + b" " * indent + b"]"
+    
+    if isinstance(data, list):
+        return encode_list(data, "", 0), records
+    if not isinstance(data, dict):
+        chunk = _encode(data)
+        return chunk, {"": (hash(chunk), data)}
+    if not data:
+        return b"{}", records
+    
+    parts = []
+    for key, value in data.items():
+        key_bytes = json.dumps(str(key), ensure_ascii=False).encode('utf-8')
+        if isinstance(value, list):
+            chunk = encode_list(value, f"{key}/", 2)
+        else:
+            chunk = _nest(_encode(value), 2)
+            records[str(key)] = (hash(chunk), value)
+        parts.append(b"  " + key_bytes + b": " + chunk)
+    return b"{\n" + b",\n".join(parts) + b"\n}", records
+
+def _rotate_backup(filename):
+    """filename.backup = dotychczasowa wersja (hardlink, a gdy niedostępny - rename)"""
+    if not os.path.exists(filename):
+        return
+    backup_filename = f"{filename}.backup"
+    link_tmp = f"{backup_filename}.tmp"
+    try:
+        if os.path.lexists(link_tmp):
+            os.remove(link_tmp)
+        os.link(filename, link_tmp)
+        os.replace(link_tmp, backup_filename)
+    except OSError:
+        os.replace(filename, backup_filename)  # FS bez hardlinków - stara wersja zmienia nazwę
+
+def _write_atomic(filename, payload):
+    """Zapis: plik tymczasowy (fsync) -> backup starej wersji -> os.replace"""
+    directory = os.path.dirname(filename) or '.'
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(filename)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp tworzy plik 0600 - zachowaj uprawnienia dotychczasowego pliku
+        if os.path.exists(filename):
+            shutil.copymode(filename, tmp_path)
+        else:
+            os.chmod(tmp_path, 0o666 & ~_UMASK)
+        _rotate_backup(filename)
+        os.replace(tmp_path, filename)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _fingerprints(records):
+    return {path: fingerprint for path, (fingerprint, _) in records.items()}
+
+def _remember_fingerprints(filename, data):
+    """Odciski rekordów wczytanej wersji - baza diffu przy następnym zapisie"""
+    try:
+        _, records = _serialize(data)
+        st.session_state[f'persistent_fp_{filename}'] = _fingerprints(records)
+    except (TypeError, ValueError):
+        pass
+
+def _queue_changes(filename, data, records):
+    """Dopisz do kolejki synchronizacji tylko zmienione / usunięte rekordy"""
+    if 'sync_queue' not in st.session_state:
+        st.session_state.sync_queue = {}
+    
+    fp_key = f'persistent_fp_{filename}'
+    previous = st.session_state.get(fp_key)
+    current = _fingerprints(records)
+    st.session_state[fp_key] = current
+    
+    entry = st.session_state.sync_queue.get(filename)
+    if previous is None:
+        # Brak wersji bazowej w tej sesji - kolejkujemy pełny stan pliku
+        entry = {'replace': True, 'data': data, 'upsert': {}, 'delete': set()}
+    else:
+        changed = {path: records[path][1] for path, fp in current.items() if previous.get(path) != fp}
+        deleted = set(previous) - set(current)
+        if not changed and not deleted and entry is None:
+            return
+        if entry is None:
+            entry = {'replace': False, 'upsert': {}, 'delete': set()}
+        if entry['replace']:
+            entry['data'] = data
+        for path in deleted:
+            entry['upsert'].pop(path, None)
+            entry['delete'].add(path)
+        for path, value in changed.items():
+            entry['delete'].discard(path)
+            entry['upsert'][path] = value
+    
+    entry['timestamp'] = datetime.now().isoformat()
+    entry['changes'] = len(entry['upsert']) + len(entry['delete'])
+    st.session_state.sync_queue[filename] = entry
+
+def load_persistent_data(filename, fresh=False):
     """
     Wczytuje dane z hierarchii:
-    1. st.session_state (najszybsze)
+    1. st.session_state (najszybsze; pomijane gdy fresh=True)
     2. Lokalny plik (dla rozwoju lokalnego)
     3. st.secrets (backup dla Streamlit Cloud)
+    
+    fresh=True: odczyt load-modify-save pod blokadą pliku (plik mógł zmienić inny proces)
     """
     cache_key = f'persistent_{filename}'
     
     # 1. Session state (już w pamięci)
-    if cache_key in st.session_state:
+    if not fresh and cache_key in st.session_state:
         return st.session_state[cache_key]
     
     # 2. Lokalny plik
@@ -50,8 +228,9 @@ def load_persistent_data(filename):
         if os.path.exists(filename):
             with open(filename, 'r', encoding='utf-8') as f:
                 data = json.load(f)
-                st.session_state[cache_key] = data
-                return data
+            st.session_state[cache_key] = data
+            _remember_fingerprints(filename, data)
+            return data
     except json.JSONDecodeError as e:
         # Plik jest corrupted - próbuj odzyskać z backupu
         st.warning(f"⚠️ Plik {filename} uszkodzony, próba odzyskania z backupu...")
@@ -60,12 +239,15 @@ def load_persistent_data(filename):
             if os.path.exists(backup_filename):
                 with open(backup_filename, 'r', encoding='utf-8') as f_backup:
                     data = json.load(f_backup)
-                    st.session_state[cache_key] = data
-                    st.success(f"✅ Odzyskano dane z backupu {backup_filename}")
-                    # Nadpisz uszkodzony plik backupem
-                    with open(filename, 'w', encoding='utf-8') as f:
-                        json.dump(data, f, indent=2, ensure_ascii=False)
-                    return data
+                st.session_state[cache_key] = data
+                st.success(f"✅ Odzyskano dane z backupu {backup_filename}")
+                # Nadpisz uszkodzony plik backupem - uszkodzona wersja odkładana jako .corrupted,
+                # żeby rotacja nie nadpisała nią backupu
+                os.replace(filename, f"{filename}.corrupted")
+                payload, records = _serialize(data)
+                _write_atomic(filename, payload)
+                st.session_state[f'persistent_fp_{filename}'] = _fingerprints(records)
+                return data
         except Exception:
             pass
         st.error(f"❌ Nie udało się odzyskać {filename} - użyto wartości domyślnych")
@@ -78,6 +260,7 @@ def load_persistent_data(filename):
         if secret_key in st.secrets:
             data = json.loads(st.secrets[secret_key])
             st.session_state[cache_key] = data
+            _remember_fingerprints(filename, data)
             return data
     except Exception:
         pass
@@ -102,12 +285,12 @@ def save_persistent_data(filename, data):
     """
     Zapisuje dane w 3 miejscach:
     1. st.session_state (natychmiastowy dostęp)
-    2. Lokalny plik (dla rozwoju)
-    3. Kolejka do synchronizacji z GitHub
+    2. Lokalny plik (atomowo, z backupem poprzedniej wersji)
+    3. Kolejka do synchronizacji z GitHub (tylko zmienione rekordy)
     """
-    # Walidacja - sprawdź czy data jest JSON-serializable
+    # Serializacja = walidacja (jeden przebieg, wynik od razu trafia do pliku)
     try:
-        json.dumps(data, ensure_ascii=False)
+        payload, records = _serialize(data)
     except (TypeError, ValueError) as e:
         st.error(f"⚠️ Błąd walidacji danych dla {filename}: {e}")
         return False
@@ -119,31 +302,12 @@ def save_persistent_data(filename, data):
     
     # 2. Lokalny plik (może się nie udać na Streamlit Cloud)
     try:
-        # Backup istniejącego pliku przed nadpisaniem
-        if os.path.exists(filename):
-            backup_filename = f"{filename}.backup"
-            try:
-                with open(filename, 'r', encoding='utf-8') as f_old:
-                    old_data = f_old.read()
-                with open(backup_filename, 'w', encoding='utf-8') as f_backup:
-                    f_backup.write(old_data)
-            except Exception:
-                pass  # Jeśli backup się nie uda, kontynuuj
-        
-        # Zapisz nowe dane
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-    except Exception:
+        _write_atomic(filename, payload)
+    except OSError:
         pass  # Streamlit Cloud - read-only filesystem
     
     # 3. Dodaj do kolejki synchronizacji
-    if 'sync_queue' not in st.session_state:
-        st.session_state.sync_queue = {}
-    
-    st.session_state.sync_queue[filename] = {
-        'data': data,
-        'timestamp': datetime.now().isoformat()
-    }
+    _queue_changes(filename, data, records)
     
     return True
 
@@ -187,7 +351,9 @@ def show_sync_widget():
         
         with st.sidebar.expander("📁 Pliki do synchronizacji"):
             for f in status['files']:
-                st.caption(f"• {f}")
+                entry = st.session_state.sync_queue.get(f, {})
+                detail = "cały plik" if entry.get('replace') else f"{entry.get('changes', 0)} zmian"
+                st.caption(f"• {f} ({detail})")
             st.caption("")
             st.info("ℹ️ **Automatyczna synchronizacja co godzinę** przez GitHub Actions")
         
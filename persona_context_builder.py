@@ -5,32 +5,275 @@ Rozbudowany system kontekstu wykorzystujący nowe featury:
 - Relacje między partnerami
 - System głosowania z bonusami
 - Komunikacja i catchphrases
+
+Odczyt: load_persona_memory() - cache przeładowywany tylko po zmianie pliku (mtime).
+Zapis: PersonaMemorySession - unit of work na spotkanie Rady (jeden odczyt,
+zmiany nastroju/relacji/sesji zbierane jako operacje, na końcu odtwarzane na
+świeżym pliku pod blokadą i zapisane jednym atomowym zapisem).
+Pozostałe zapisy (decyzje, audyt, wagi, rozmowy): update_persona_memory() lub
+write_persona_memory() pod persona_memory_lock().
 """
 
+import copy
 import json
+import os
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 
+try:
+    import fcntl
+    FCNTL_OK = True
+except ImportError:  # Windows - blokada tylko w obrębie procesu
+    FCNTL_OK = False
+
+MEMORY_FILE = 'persona_memory.json'
+
+_cache_lock = threading.Lock()
+_write_lock = threading.Lock()
+_cache = {"mtime": None, "memory": {}}
+
+
 def load_persona_memory():
-    """Wczytaj persona_memory.json"""
+    """
+    Wczytaj persona_memory.json (read-through cache po mtime pliku)
+    
+    Zwracany słownik jest współdzielony - traktuj go jako tylko do odczytu,
+    zmiany rób przez PersonaMemorySession.
+    """
     try:
-        with open('persona_memory.json', 'r', encoding='utf-8-sig') as f:
-            return json.load(f)
-    except Exception as e:
+        mtime = os.path.getmtime(MEMORY_FILE)
+    except OSError as e:
         print(f"❌ Błąd wczytywania pamięci: {e}")
         return {}
+    
+    with _cache_lock:
+        if _cache["mtime"] != mtime:
+            try:
+                with open(MEMORY_FILE, 'r', encoding='utf-8-sig') as f:
+                    _cache["memory"] = json.load(f)
+                _cache["mtime"] = mtime
+            except Exception as e:
+                print(f"❌ Błąd wczytywania pamięci: {e}")
+                return {}
+        return _cache["memory"]
+
+
+def _apply_increment_session(memory, persona_name, now=None):
+    """Zwiększ licznik sesji (jak persona_memory_manager.increment_session)"""
+    if persona_name not in memory or persona_name == "meta":
+        return False
+    stats = memory[persona_name].setdefault('stats', {})
+    stats['sessions_participated'] = stats.get('sessions_participated', 0) + 1
+    meta = memory.setdefault('meta', {})
+    meta['total_sessions'] = meta.get('total_sessions', 0) + 1
+    return True
+
+
+def _apply_emotional_state(memory, persona_name, new_mood, stress_delta=0, excitement_delta=0,
+                           fear_delta=0, now=None):
+    """Zmiana nastroju - patrz update_emotional_state()"""
+    if persona_name not in memory:
+        return False
+    now = now or datetime.now().strftime('%Y-%m-%d %H:%M')
+    
+    emotions = memory[persona_name].get('emotional_state', {})
+    
+    # Aktualizuj mood
+    old_mood = emotions.get('current_mood', 'neutral')
+    emotions['current_mood'] = new_mood
+    emotions['last_emotion_change'] = now
+    
+    # Aktualizuj poziomy (clamp 0-1)
+    emotions['stress_level'] = max(0, min(1, emotions.get('stress_level', 0.3) + stress_delta))
+    emotions['excitement'] = max(0, min(1, emotions.get('excitement', 0.4) + excitement_delta))
+    emotions['fear_index'] = max(0, min(1, emotions.get('fear_index', 0.2) + fear_delta))
+    
+    # Zapisz do historii
+    mood_history = emotions.get('mood_history', [])
+    mood_history.append({
+        'date': now,
+        'from': old_mood,
+        'to': new_mood,
+        'trigger': 'manual_update'
+    })
+    emotions['mood_history'] = mood_history[-20:]  # Ostatnie 20 zmian
+    
+    memory[persona_name]['emotional_state'] = emotions
+    return True
+
+
+def _apply_relationship(memory, persona1, persona2, trust_delta=0, agreement_delta=0,
+                        interaction_type='neutral', now=None):
+    """Zmiana relacji persona1 -> persona2 - patrz update_relationship()"""
+    if persona1 not in memory or persona2 not in memory:
+        return False
+    
+    relationships = memory[persona1].get('relationships', {})
+    if persona2 not in relationships:
+        return False
+    
+    rel = relationships[persona2]
+    rel['trust'] = max(0, min(1, rel.get('trust', 0.5) + trust_delta))
+    rel['agreement_rate'] = max(0, min(1, rel.get('agreement_rate', 0.5) + agreement_delta))
+    rel['last_interaction'] = interaction_type
+    
+    if interaction_type == 'conflict':
+        rel['conflicts'] = rel.get('conflicts', 0) + 1
+    elif interaction_type == 'alliance':
+        rel['alliances'] = rel.get('alliances', 0) + 1
+    
+    # Zapisz moment
+    notable = rel.get('notable_moments', [])
+    notable.append({
+        'date': (now or datetime.now().strftime('%Y-%m-%d %H:%M'))[:10],
+        'type': interaction_type,
+        'trust_after': rel['trust'],
+        'agreement_after': rel['agreement_rate']
+    })
+    rel['notable_moments'] = notable[-10:]  # Ostatnie 10
+    
+    relationships[persona2] = rel
+    memory[persona1]['relationships'] = relationships
+    return True
+
+
+@contextmanager
+def persona_memory_lock():
+    """Blokada zapisu persona_memory.json (wątki + procesy, na Windows tylko wątki)"""
+    with _write_lock:
+        lock_file = None
+        if FCNTL_OK:
+            lock_file = open(f"{MEMORY_FILE}.lock", "a")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if lock_file is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+
+
+def write_persona_memory(memory):
+    """Atomowy zapis persona_memory.json (tmp + os.replace) - wywołujący trzyma persona_memory_lock()"""
+    tmp_file = f"{MEMORY_FILE}.tmp.{os.getpid()}.{threading.get_ident()}"
+    try:
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(memory, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_file, MEMORY_FILE)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def update_persona_memory(apply, *args, **kwargs):
+    """
+    Jednorazowa zmiana pamięci: apply(memory, *args, **kwargs) na świeżym pliku
+    pod blokadą, zapis atomowy tylko gdy apply zwróci wartość prawdziwą.
+    
+    Returns:
+        Wynik apply (np. zapisany rekord decyzji)
+    """
+    with persona_memory_lock():
+        memory = {}
+        if os.path.exists(MEMORY_FILE):
+            with open(MEMORY_FILE, 'r', encoding='utf-8-sig') as f:
+                memory = json.load(f)
+        result = apply(memory, *args, **kwargs)
+        if result:
+            write_persona_memory(memory)
+    return result
+
+
+class PersonaMemorySession:
+    """
+    Unit of work dla pamięci person (np. jedno spotkanie Rady)
+    
+    Pamięć wczytywana raz (kopia z cache) i służy do odczytu w trakcie spotkania.
+    Zmiany stosowane są do tej kopii i zapamiętywane jako operacje - commit()
+    pod blokadą pliku wczytuje świeży persona_memory.json, odtwarza na nim
+    operacje sesji i zapisuje wynik jednym atomowym zapisem. Zapisy zrobione
+    w trakcie spotkania (record_decision, audyt, inne sesje) nie są nadpisywane.
+    
+        with PersonaMemorySession() as session:
+            build_enhanced_context(name, memory=session.memory)
+            session.increment_session(name)
+            session.update_relationship(a, b, trust_delta=0.02)
+    """
+    
+    def __init__(self):
+        self.memory = copy.deepcopy(load_persona_memory())
+        self._ops = []  # (funkcja _apply_*, args, kwargs) do odtworzenia przy commit()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        return False
+    
+    @property
+    def changes(self):
+        return len(self._ops)
+    
+    def _record(self, apply, *args, **kwargs):
+        kwargs['now'] = datetime.now().strftime('%Y-%m-%d %H:%M')
+        if apply(self.memory, *args, **kwargs):
+            self._ops.append((apply, args, kwargs))
+    
+    def increment_session(self, persona_name):
+        """Zwiększ licznik sesji (jak persona_memory_manager.increment_session)"""
+        self._record(_apply_increment_session, persona_name)
+    
+    def update_emotional_state(self, persona_name, new_mood, stress_delta=0, excitement_delta=0, fear_delta=0):
+        """Zmiana nastroju - patrz update_emotional_state()"""
+        self._record(_apply_emotional_state, persona_name, new_mood, stress_delta, excitement_delta, fear_delta)
+    
+    def update_relationship(self, persona1, persona2, trust_delta=0, agreement_delta=0, interaction_type='neutral'):
+        """Zmiana relacji persona1 -> persona2 - patrz update_relationship()"""
+        self._record(_apply_relationship, persona1, persona2, trust_delta, agreement_delta, interaction_type)
+    
+    def commit(self):
+        """Odtwórz zmiany sesji na świeżym pliku i zapisz go atomowo (nic nie robi bez zmian)"""
+        if not self._ops:
+            return False
+        
+        try:
+            with persona_memory_lock():
+                with open(MEMORY_FILE, 'r', encoding='utf-8-sig') as f:
+                    memory = json.load(f)
+                for apply, args, kwargs in self._ops:
+                    apply(memory, *args, **kwargs)
+                
+                write_persona_memory(memory)
+                mtime = os.path.getmtime(MEMORY_FILE)
+        except Exception as e:
+            print(f"❌ Błąd zapisu pamięci person: {e}")
+            return False
+        
+        with _cache_lock:
+            _cache["memory"] = memory
+            _cache["mtime"] = mtime
+        self.memory = copy.deepcopy(memory)
+        self._ops = []
+        return True
+
 
-def build_enhanced_context(persona_name, limit=5):
+def build_enhanced_context(persona_name, limit=5, memory=None):
     """
     Buduje PEŁNY kontekst wykorzystujący wszystkie featury v2.0
     
     Args:
         persona_name: Nazwa persony
         limit: Liczba ostatnich decyzji
+        memory: Pamięć z PersonaMemorySession (domyślnie: cache pliku)
         
     Returns:
         str: Bogaty kontekst z emocjami, relacjami, stylami komunikacji
     """
-    memory = load_persona_memory()
+    if memory is None:
+        memory = load_persona_memory()
     
     if persona_name not in memory:
         return ""
@@ -187,14 +430,15 @@ def build_enhanced_context(persona_name, limit=5):
     return context
 
 
-def get_voting_weight(persona_name):
+def get_voting_weight(persona_name, memory=None):
     """
     Pobierz efektywną wagę głosu persony
     
     Returns:
         float: Efektywna waga w procentach
     """
-    memory = load_persona_memory()
+    if memory is None:
+        memory = load_persona_memory()
     
     if persona_name not in memory:
         return 5.0
@@ -203,14 +447,15 @@ def get_voting_weight(persona_name):
     return voting.get('effective_weight', voting.get('base_weight', 5.0))
 
 
-def get_emotional_modifier(persona_name):
+def get_emotional_modifier(persona_name, memory=None):
     """
     Zwraca modyfikator emocjonalny do prompta
     
     Returns:
         str: Tekst wskazówki bazującej na emocjach
     """
-    memory = load_persona_memory()
+    if memory is None:
+        memory = load_persona_memory()
     
     if persona_name not in memory:
         return ""
@@ -234,7 +479,8 @@ def get_emotional_modifier(persona_name):
 
 def update_emotional_state(persona_name, new_mood, stress_delta=0, excitement_delta=0, fear_delta=0):
     """
-    Aktualizuj stan emocjonalny persony
+    Aktualizuj stan emocjonalny persony (pojedyncza zmiana = osobny zapis;
+    w trakcie spotkania używaj PersonaMemorySession)
     
     Args:
         persona_name: Nazwa persony
@@ -243,46 +489,14 @@ def update_emotional_state(persona_name, new_mood, stress_delta=0, excitement_de
         excitement_delta: Zmiana podekscytowania
         fear_delta: Zmiana strachu
     """
-    memory = load_persona_memory()
-    
-    if persona_name not in memory:
-        return
-    
-    emotions = memory[persona_name].get('emotional_state', {})
-    
-    # Aktualizuj mood
-    old_mood = emotions.get('current_mood', 'neutral')
-    emotions['current_mood'] = new_mood
-    emotions['last_emotion_change'] = datetime.now().strftime('%Y-%m-%d %H:%M')
-    
-    # Aktualizuj poziomy (clamp 0-1)
-    emotions['stress_level'] = max(0, min(1, emotions.get('stress_level', 0.3) + stress_delta))
-    emotions['excitement'] = max(0, min(1, emotions.get('excitement', 0.4) + excitement_delta))
-    emotions['fear_index'] = max(0, min(1, emotions.get('fear_index', 0.2) + fear_delta))
-    
-    # Zapisz do historii
-    mood_history = emotions.get('mood_history', [])
-    mood_history.append({
-        'date': datetime.now().strftime('%Y-%m-%d %H:%M'),
-        'from': old_mood,
-        'to': new_mood,
-        'trigger': 'manual_update'
-    })
-    emotions['mood_history'] = mood_history[-20:]  # Ostatnie 20 zmian
-    
-    memory[persona_name]['emotional_state'] = emotions
-    
-    # Zapisz
-    try:
-        with open('persona_memory.json', 'w', encoding='utf-8') as f:
-            json.dump(memory, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        print(f"❌ Błąd zapisu emocji: {e}")
+    with PersonaMemorySession() as session:
+        session.update_emotional_state(persona_name, new_mood, stress_delta, excitement_delta, fear_delta)
 
 
 def update_relationship(persona1, persona2, trust_delta=0, agreement_delta=0, interaction_type='neutral'):
     """
-    Aktualizuj relację między dwiema personami
+    Aktualizuj relację między dwiema personami (pojedyncza zmiana = osobny zapis;
+    w trakcie spotkania używaj PersonaMemorySession)
     
     Args:
         persona1: Nazwa pierwszej persony
@@ -291,43 +505,8 @@ def update_relationship(persona1, persona2, trust_delta=0, agreement_delta=0, in
         agreement_delta: Zmiana wskaźnika zgody
         interaction_type: Typ interakcji (agreement, conflict, neutral, alliance)
     """
-    memory = load_persona_memory()
-    
-    if persona1 not in memory or persona2 not in memory:
-        return
-    
-    # Aktualizuj relację persona1 -> persona2
-    relationships = memory[persona1].get('relationships', {})
-    if persona2 in relationships:
-        rel = relationships[persona2]
-        rel['trust'] = max(0, min(1, rel.get('trust', 0.5) + trust_delta))
-        rel['agreement_rate'] = max(0, min(1, rel.get('agreement_rate', 0.5) + agreement_delta))
-        rel['last_interaction'] = interaction_type
-        
-        if interaction_type == 'conflict':
-            rel['conflicts'] = rel.get('conflicts', 0) + 1
-        elif interaction_type == 'alliance':
-            rel['alliances'] = rel.get('alliances', 0) + 1
-        
-        # Zapisz moment
-        notable = rel.get('notable_moments', [])
-        notable.append({
-            'date': datetime.now().strftime('%Y-%m-%d'),
-            'type': interaction_type,
-            'trust_after': rel['trust'],
-            'agreement_after': rel['agreement_rate']
-        })
-        rel['notable_moments'] = notable[-10:]  # Ostatnie 10
-        
-        relationships[persona2] = rel
-        memory[persona1]['relationships'] = relationships
-    
-    # Zapisz
-    try:
-        with open('persona_memory.json', 'w', encoding='utf-8') as f:
-            json.dump(memory, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        print(f"❌ Błąd zapisu relacji: {e}")
+    with PersonaMemorySession() as session:
+        session.update_relationship(persona1, persona2, trust_delta, agreement_delta, interaction_type)
 
 
 if __name__ == "__main__":
@@ -5,9 +5,22 @@ Używa persona_memory.json jako źródło prawdy
 
 import json
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from persona_context_builder import (
+    PersonaMemorySession, persona_memory_lock, update_persona_memory, write_persona_memory
+)
+
+try:
+    import yfinance as yf
+    YFINANCE_OK = True
+except ImportError:
+    YFINANCE_OK = False
 
 MEMORY_FILE = "persona_memory.json"
+AUDIT_MIN_AGE_DAYS = 7  # Decyzja jest rozliczana automatycznie po tylu dniach
 
 def load_memory():
     """Wczytaj pamięć wszystkich person"""
@@ -17,9 +30,9 @@ def load_memory():
     return {}
 
 def save_memory(memory):
-    """Zapisz pamięć"""
-    with open(MEMORY_FILE, 'w', encoding='utf-8') as f:
-        json.dump(memory, f, indent=2, ensure_ascii=False)
+    """Zapisz całą pamięć (atomowo, pod blokadą pliku - zmiany rób przez update_persona_memory)"""
+    with persona_memory_lock():
+        write_persona_memory(memory)
 
 def get_persona_context(persona_name):
     """
@@ -94,6 +107,16 @@ def get_persona_context(persona_name):
     
     return context
 
+def _apply_decision(memory, persona_name, decision):
+    if persona_name not in memory or persona_name == "meta":
+        return None
+    
+    memory[persona_name]["decision_history"].append(decision)
+    memory[persona_name]["stats"]["decisions_made"] += 1
+    memory[persona_name]["stats"]["last_updated"] = datetime.now().strftime("%Y-%m-%d")
+    memory["meta"]["total_decisions"] += 1
+    return decision
+
 def record_decision(persona_name, decision_type, ticker, reasoning, 
                    current_price, confidence=0.5):
     """
@@ -110,11 +133,6 @@ def record_decision(persona_name, decision_type, ticker, reasoning,
     Returns:
         dict: Decision record z ID
     """
-    memory = load_memory()
-    
-    if persona_name not in memory or persona_name == "meta":
-        return None
-    
     decision_id = f"{persona_name.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
     
     decision = {
@@ -133,27 +151,32 @@ def record_decision(persona_name, decision_type, ticker, reasoning,
         "impact_pln": None
     }
     
-    memory[persona_name]["decision_history"].append(decision)
-    memory[persona_name]["stats"]["decisions_made"] += 1
-    memory[persona_name]["stats"]["last_updated"] = datetime.now().strftime("%Y-%m-%d")
-    memory["meta"]["total_decisions"] += 1
-    
-    save_memory(memory)
-    
-    return decision
+    return update_persona_memory(_apply_decision, persona_name, decision)
 
 def increment_session(persona_name):
     """Zwiększ licznik sesji"""
-    memory = load_memory()
+    with PersonaMemorySession() as session:
+        session.increment_session(persona_name)
+
+def build_decision_index(memory):
+    """
+    Indeks decyzji: id -> (persona, pozycja w decision_history)
     
-    if persona_name in memory and persona_name != "meta":
-        memory[persona_name]["stats"]["sessions_participated"] += 1
-        memory["meta"]["total_sessions"] = memory["meta"].get("total_sessions", 0) + 1
-        save_memory(memory)
+    Budowany raz na wczytaną pamięć - wyszukanie decyzji to O(1) zamiast skanu wszystkich person.
+    """
+    index = {}
+    for persona_name, data in memory.items():
+        if persona_name == "meta":
+            continue
+        for i, dec in enumerate(data.get("decision_history", [])):
+            if dec.get("id"):
+                index[dec["id"]] = (persona_name, i)
+    return index
 
-def get_all_pending_decisions():
+def get_all_pending_decisions(memory=None):
     """Zwróć wszystkie nierozliczone decyzje (outcome = None)"""
-    memory = load_memory()
+    if memory is None:
+        memory = load_memory()
     pending = []
     
     for persona_name, data in memory.items():
@@ -169,6 +192,56 @@ def get_all_pending_decisions():
     
     return pending
 
+def score_decisions(entry_prices, current_prices, decision_types):
+    """
+    Wynik i trafność wielu decyzji naraz (wektorowo)
+    
+    Reguły: BUY trafne gdy wzrost, SELL gdy spadek, WARN gdy spadek > 5%,
+    HOLD gdy zmiana w granicach ±10%; pozostałe typy liczone jako nietrafne.
+    
+    Returns:
+        tuple: (result_pct: np.ndarray, was_correct: np.ndarray[bool])
+    """
+    entry = np.asarray(entry_prices, dtype=float)
+    current = np.asarray(current_prices, dtype=float)
+    types = np.asarray(decision_types, dtype=object)
+    
+    result_pct = (current - entry) / entry * 100
+    was_correct = (
+        ((types == "BUY") & (result_pct > 0)) |
+        ((types == "SELL") & (result_pct < 0)) |
+        ((types == "WARN") & (result_pct < -5)) |
+        ((types == "HOLD") & (np.abs(result_pct) < 10))
+    )
+    return result_pct, was_correct
+
+def _apply_audit(memory, persona_name, i, current_price, result_pct, was_correct,
+                 actual_outcome, impact_pln=0):
+    """Zapisz wynik audytu w decyzji i statystykach persony (bez zapisu pliku)"""
+    decision = memory[persona_name]["decision_history"][i]
+    decision.update({
+        "outcome": actual_outcome,
+        "result_price": current_price,
+        "result_pct": round(float(result_pct), 2),
+        "was_correct": bool(was_correct),
+        "impact_pln": impact_pln,
+        "audit_date": datetime.now().strftime("%Y-%m-%d")
+    })
+    
+    stats = memory[persona_name]["stats"]
+    if was_correct:
+        stats["successful_calls"] += 1
+    else:
+        stats["failed_calls"] += 1
+    stats["total_impact_pln"] += impact_pln
+    
+    # Recalculate credibility
+    total = stats["successful_calls"] + stats["failed_calls"]
+    if total > 0:
+        stats["credibility_score"] = round(stats["successful_calls"] / total, 3)
+    
+    return decision
+
 def audit_decision(decision_id, current_price, actual_outcome, impact_pln=0):
     """
     Oceń decyzję - czy się sprawdziła?
@@ -176,72 +249,156 @@ def audit_decision(decision_id, current_price, actual_outcome, impact_pln=0):
     Returns:
         dict: Updated decision lub None
     """
+    def apply(memory):
+        location = build_decision_index(memory).get(decision_id)
+        if location is None:
+            return None
+        
+        persona_name, i = location
+        dec = memory[persona_name]["decision_history"][i]
+        result_pct, was_correct = score_decisions(
+            [dec["current_price"]], [current_price], [dec.get("decision_type", "")]
+        )
+        return _apply_audit(memory, persona_name, i, current_price, result_pct[0],
+                            was_correct[0], actual_outcome, impact_pln)
+    
+    return update_persona_memory(apply)
+
+def _yf_symbol(ticker):
+    """Ticker z decyzji -> symbol Yahoo (bez sufiksów Trading212)"""
+    return ticker.strip().upper().replace("_US_EQ", "").replace("_EQ", "")
+
+def fetch_current_prices(tickers):
+    """
+    Ostatnie ceny zamknięcia dla wielu tickerów jednym zapytaniem yfinance
+    
+    Returns:
+        dict: {ticker: cena} - tickery bez notowań są pomijane
+    """
+    tickers = sorted(set(t for t in tickers if t))
+    if not tickers or not YFINANCE_OK:
+        return {}
+    
+    symbols = {t: _yf_symbol(t) for t in tickers}
+    try:
+        data = yf.download(sorted(set(symbols.values())), period="5d",
+                           progress=False, auto_adjust=False, threads=True)
+    except Exception as e:
+        print(f"⚠️ Błąd pobierania cen do audytu: {e}")
+        return {}
+    if data is None or data.empty or "Close" not in data:
+        return {}
+    
+    close = data["Close"]
+    prices = {}
+    for ticker, symbol in symbols.items():
+        if hasattr(close, "columns"):
+            if symbol not in close.columns:
+                continue
+            series = close[symbol].dropna()
+        else:
+            series = close.dropna()  # Pojedynczy ticker - płaska kolumna
+        if len(series):
+            prices[ticker] = float(series.iloc[-1])
+    return prices
+
+def audit_pending_decisions(min_age_days=AUDIT_MIN_AGE_DAYS, prices=None, dry_run=False):
+    """
+    Rozlicz wszystkie dojrzałe decyzje w jednym przebiegu
+    
+    Jedno wczytanie pamięci, jedno zapytanie o ceny (dla wszystkich tickerów naraz),
+    wektorowa ocena i jeden zapis - koszt nie rośnie z liczbą zaległych decyzji.
+    Ceny pobierane są bez blokady; wyniki odtwarzane na świeżym pliku pod blokadą
+    (decyzje rozliczone w międzyczasie są pomijane).
+    
+    Args:
+        min_age_days: minimalny wiek decyzji (dni) do rozliczenia
+        prices: gotowe ceny {ticker: cena} (domyślnie fetch_current_prices)
+        dry_run: policz wyniki bez zapisu pamięci
+        
+    Returns:
+        dict: audited / not_due / no_price + lista rozliczonych decyzji
+    """
     memory = load_memory()
+    index = build_decision_index(memory)
+    cutoff = (datetime.now() - timedelta(days=min_age_days)).strftime("%Y-%m-%d")
     
-    for persona_name, data in memory.items():
-        if persona_name == "meta":
+    due = []
+    not_due = 0
+    for decision_id, (persona_name, i) in index.items():
+        dec = memory[persona_name]["decision_history"][i]
+        if dec.get("outcome") is not None:
             continue
-        
-        for i, dec in enumerate(data.get("decision_history", [])):
-            if dec.get("id") == decision_id:
-                # Calculate result
-                result_pct = ((current_price - dec["current_price"]) / dec["current_price"]) * 100
-                
-                # Determine correctness
-                was_correct = False
-                dec_type = dec.get("decision_type", "")
-                
-                if dec_type == "BUY" and result_pct > 0:
-                    was_correct = True
-                elif dec_type == "SELL" and result_pct < 0:
-                    was_correct = True
-                elif dec_type == "WARN" and result_pct < -5:
-                    was_correct = True
-                elif dec_type == "HOLD" and abs(result_pct) < 10:
-                    was_correct = True
-                
-                # Update decision
-                memory[persona_name]["decision_history"][i].update({
-                    "outcome": actual_outcome,
-                    "result_price": current_price,
-                    "result_pct": round(result_pct, 2),
-                    "was_correct": was_correct,
-                    "impact_pln": impact_pln,
-                    "audit_date": datetime.now().strftime("%Y-%m-%d")
-                })
-                
-                # Update stats
-                if was_correct:
-                    memory[persona_name]["stats"]["successful_calls"] += 1
-                else:
-                    memory[persona_name]["stats"]["failed_calls"] += 1
-                
-                memory[persona_name]["stats"]["total_impact_pln"] += impact_pln
-                
-                # Recalculate credibility
-                total = (memory[persona_name]["stats"]["successful_calls"] + 
-                        memory[persona_name]["stats"]["failed_calls"])
-                if total > 0:
-                    memory[persona_name]["stats"]["credibility_score"] = round(
-                        memory[persona_name]["stats"]["successful_calls"] / total, 3
-                    )
-                
-                save_memory(memory)
-                
-                return memory[persona_name]["decision_history"][i]
+        if (dec.get("date") or "") > cutoff:
+            not_due += 1
+            continue
+        due.append((decision_id, persona_name, i, dec))
+    
+    summary = {"audited": 0, "not_due": not_due, "no_price": 0, "results": []}
+    if not due:
+        return summary
+    
+    if prices is None:
+        prices = fetch_current_prices(dec.get("ticker", "") for _, _, _, dec in due)
+    
+    scorable = [
+        item for item in due
+        if prices.get(item[3].get("ticker")) and (item[3].get("current_price") or 0) > 0
+    ]
+    summary["no_price"] = len(due) - len(scorable)
+    if not scorable:
+        return summary
+    
+    current = [prices[dec["ticker"]] for _, _, _, dec in scorable]
+    result_pct, was_correct = score_decisions(
+        [dec["current_price"] for _, _, _, dec in scorable],
+        current,
+        [dec.get("decision_type", "") for _, _, _, dec in scorable]
+    )
+    
+    audits = []
+    for k, (decision_id, persona_name, i, dec) in enumerate(scorable):
+        outcome = f"Auto-audyt: {dec['ticker']} {dec['current_price']} → {current[k]:.2f} ({result_pct[k]:+.1f}%)"
+        audits.append((decision_id, current[k], result_pct[k], was_correct[k], outcome))
+        summary["results"].append({
+            "id": decision_id,
+            "persona": persona_name,
+            "ticker": dec["ticker"],
+            "result_pct": round(float(result_pct[k]), 2),
+            "was_correct": bool(was_correct[k])
+        })
+    summary["audited"] = len(scorable)
+    
+    if not dry_run:
+        update_persona_memory(_apply_batch_audit, audits)
     
-    return None
+    return summary
+
+def _apply_batch_audit(memory, audits):
+    index = build_decision_index(memory)
+    for decision_id, current_price, result_pct, was_correct, outcome in audits:
+        location = index.get(decision_id)
+        if location is None:
+            continue
+        persona_name, i = location
+        if memory[persona_name]["decision_history"][i].get("outcome") is not None:
+            continue
+        _apply_audit(memory, persona_name, i, current_price, result_pct, was_correct, outcome)
+    memory.setdefault("meta", {})["last_batch_audit"] = datetime.now().isoformat()
+    return True
 
 def add_lesson(persona_name, lesson):
     """Dodaj lekcję do pamięci persony"""
-    memory = load_memory()
-    
-    if persona_name in memory and persona_name != "meta":
+    def apply(memory):
+        if persona_name not in memory or persona_name == "meta":
+            return False
         memory[persona_name]["key_lessons"].append({
             "date": datetime.now().strftime("%Y-%m-%d"),
             "lesson": lesson
         })
-        save_memory(memory)
+        return True
+    
+    update_persona_memory(apply)
 
 def evolve_trait(persona_name, trait, delta):
     """
@@ -251,19 +408,19 @@ def evolve_trait(persona_name, trait, delta):
         trait: np. "risk_tolerance"
         delta: zmiana -1 do 1
     """
-    memory = load_memory()
+    def apply(memory):
+        if persona_name in memory and persona_name != "meta":
+            traits = memory[persona_name].get("personality_traits", {})
+            if trait in traits:
+                old_value = traits[trait]
+                new_value = max(0.0, min(1.0, old_value + delta))
+                memory[persona_name]["personality_traits"][trait] = round(new_value, 2)
+                
+                return (old_value, new_value)
+        
+        return None
     
-    if persona_name in memory and persona_name != "meta":
-        traits = memory[persona_name].get("personality_traits", {})
-        if trait in traits:
-            old_value = traits[trait]
-            new_value = max(0.0, min(1.0, old_value + delta))
-            memory[persona_name]["personality_traits"][trait] = round(new_value, 2)
-            save_memory(memory)
-            
-            return (old_value, new_value)
-    
-    return None
+    return update_persona_memory(apply)
 
 def get_leaderboard():
     """Ranking person według wiarygodności"""
@@ -289,3 +446,12 @@ def get_leaderboard():
     leaderboard.sort(key=lambda x: x["credibility"], reverse=True)
     
     return leaderboard
+
+
+if __name__ == "__main__":
+    # Nocny audyt (GitHub Actions): python persona_memory_manager.py
+    print("🔍 Audyt nierozliczonych decyzji...")
+    wynik = audit_pending_decisions()
+    for r in wynik["results"]:
+        print(f"   {'✓' if r['was_correct'] else '✗'} {r['persona']}: {r['ticker']} ({r['result_pct']:+.1f}%)")
+    print(f"✅ Rozliczono: {wynik['audited']} | za wcześnie: {wynik['not_due']} | brak ceny: {wynik['no_price']}")
@@ -0,0 +1,439 @@
+"""
+portfolio_model.py
+
+Kanoniczny model portfela w pamięci - jedno źródło prawdy dla UI, snapshotów,
+audytu miesięcznego i dziennego insightu Nexusa.
+
+Budowany raz z trading212_cache.json + krypto.json + kredyty.json:
+- pozycje jako zwarte rekordy ze __slots__
+- kolumny ilość/cena/wartość jako tablice numpy (sumy i alokacje bez pętli w Pythonie)
+- sumy i alokacje liczone leniwie i zapamiętywane (model jest niemutowalny)
+- gotowy model jest cache'owany w procesie i przebudowywany dopiero po zmianie zawartości plików lub kursu
+
+Adaptery to_*() zwracają słowniki w formatach, których używają istniejący konsumenci.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from functools import cached_property
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from file_dependencies import files_signature
+
+TRADING212_CACHE_FILE = "trading212_cache.json"
+KRYPTO_FILE = "krypto.json"
+KREDYTY_FILE = "kredyty.json"
+
+NBP_API_URL = "https://api.nbp.pl/api/exchangerates/rates/a/usd/?format=json"
+DEFAULT_USD_PLN_RATE = 3.65  # Kurs awaryjny gdy NBP nie odpowiada
+FX_CACHE_SECONDS = 3600  # Kurs NBP (tabela A) zmienia się raz dziennie
+FX_RETRY_SECONDS = 300  # Po błędzie NBP ponów dopiero po 5 minutach
+
+
+class Position:
+    """Pojedyncza pozycja (akcja lub krypto) - zwarty rekord bez __dict__"""
+
+    __slots__ = ('ticker', 'quantity', 'avg_price', 'current_price', 'ppl',
+                 'frontend', 'asset_class', 'raw')
+
+    def __init__(self, ticker: str, quantity: float, avg_price: float, current_price: float,
+                 ppl: float = 0.0, frontend: str = "", asset_class: str = "stock",
+                 raw: Optional[Dict] = None):
+        self.ticker = ticker
+        self.quantity = quantity
+        self.avg_price = avg_price
+        self.current_price = current_price
+        self.ppl = ppl
+        self.frontend = frontend
+        self.asset_class = asset_class
+        self.raw = raw  # Oryginalny rekord (np. platforma/APY dla krypto)
+
+    @property
+    def value(self) -> float:
+        return self.quantity * self.current_price
+
+    @property
+    def in_pie(self) -> bool:
+        return self.frontend == "AUTOINVEST"
+
+    def __repr__(self):
+        return f"Position({self.ticker!r}, qty={self.quantity}, price={self.current_price})"
+
+
+class Loan:
+    """Zobowiązanie z kredyty.json"""
+
+    __slots__ = ('name', 'initial_amount', 'repaid', 'monthly_payment', 'raw')
+
+    def __init__(self, name: str, initial_amount: float, repaid: float,
+                 monthly_payment: float, raw: Optional[Dict] = None):
+        self.name = name
+        self.initial_amount = initial_amount
+        self.repaid = repaid
+        self.monthly_payment = monthly_payment
+        self.raw = raw
+
+    @property
+    def remaining(self) -> float:
+        """Pozostało do spłaty (nadpłata nie tworzy ujemnego długu)"""
+        return max(0.0, self.initial_amount - self.repaid)
+
+
+class PositionBook:
+    """
+    Zbiór pozycji jednej klasy aktywów z kolumnami numpy
+
+    Wartości są w walucie notowania (USD), przeliczenie na PLN robi PortfolioModel.
+    """
+
+    def __init__(self, positions: List[Position]):
+        self.positions = positions
+        self.tickers = [p.ticker for p in positions]
+        self.quantity = np.fromiter((p.quantity for p in positions), dtype=np.float64, count=len(positions))
+        self.price = np.fromiter((p.current_price for p in positions), dtype=np.float64, count=len(positions))
+        self.avg_price = np.fromiter((p.avg_price for p in positions), dtype=np.float64, count=len(positions))
+        self.value = self.quantity * self.price
+        self.cost = self.quantity * self.avg_price
+        for arr in (self.quantity, self.price, self.avg_price, self.value, self.cost):
+            arr.flags.writeable = False
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __iter__(self):
+        return iter(self.positions)
+
+    @cached_property
+    def total(self) -> float:
+        return float(self.value.sum())
+
+    @cached_property
+    def total_cost(self) -> float:
+        return float(self.cost.sum())
+
+    @cached_property
+    def weights(self) -> Dict[str, float]:
+        """Udział każdej pozycji w wartości zbioru (0-1)"""
+        if self.total <= 0:
+            return {t: 0.0 for t in self.tickers}
+        return dict(zip(self.tickers, (self.value / self.total).tolist()))
+
+    @cached_property
+    def pie_count(self) -> int:
+        return sum(1 for p in self.positions if p.in_pie)
+
+    @cached_property
+    def index(self) -> Dict[str, int]:
+        return {t: i for i, t in enumerate(self.tickers)}
+
+    def get(self, ticker: str) -> Optional[Position]:
+        i = self.index.get(ticker)
+        return self.positions[i] if i is not None else None
+
+
+class PortfolioModel:
+    """Niemutowalny obraz portfela: akcje (T212) + krypto + zobowiązania"""
+
+    def __init__(self, stocks: PositionBook, crypto: PositionBook, loans: List[Loan],
+                 usd_pln: float, cash_usd: float = 0.0, dividends: Optional[List] = None,
+                 t212_timestamp: Optional[str] = None):
+        self.stocks = stocks
+        self.crypto = crypto
+        self.loans = loans
+        self.usd_pln = usd_pln
+        self.cash_usd = cash_usd
+        self.dividends = dividends or []
+        self.t212_timestamp = t212_timestamp
+
+    # === BUDOWANIE ===
+
+    @staticmethod
+    def parse_t212_positions(dane_t212: Optional[Dict]) -> List[Position]:
+        """Surowe pozycje Trading212 API -> rekordy Position"""
+        positions = []
+        for pos in (dane_t212 or {}).get("positions", []) or []:
+            if not isinstance(pos, dict):
+                continue
+            positions.append(Position(
+                ticker=pos.get("ticker", "UNKNOWN"),
+                quantity=float(pos.get("quantity") or 0),
+                avg_price=float(pos.get("averagePrice") or 0),
+                current_price=float(pos.get("currentPrice") or 0),
+                ppl=float(pos.get("ppl") or 0),
+                frontend=pos.get("frontend", "") or "",
+                asset_class="stock",
+            ))
+        return positions
+
+    @staticmethod
+    def parse_crypto(krypto_lista: List[Dict]) -> List[Position]:
+        """Wpisy z krypto.json -> rekordy Position (cena aktualna jeśli zapisana, inaczej cena zakupu)"""
+        positions = []
+        for coin in krypto_lista or []:
+            if not isinstance(coin, dict):
+                continue
+            cena_zakupu = float(coin.get('cena_zakupu_usd') or 0)
+            positions.append(Position(
+                ticker=coin.get('symbol', 'UNKNOWN'),
+                quantity=float(coin.get('ilosc') or 0),
+                avg_price=cena_zakupu,
+                current_price=float(coin.get('cena_aktualna_usd') or cena_zakupu),
+                asset_class="crypto",
+                raw=coin,
+            ))
+        return positions
+
+    @staticmethod
+    def parse_loans(kredyty_lista: List[Dict]) -> List[Loan]:
+        loans = []
+        for k in kredyty_lista or []:
+            if not isinstance(k, dict):
+                continue
+            loans.append(Loan(
+                name=k.get('nazwa', ''),
+                initial_amount=float(k.get('kwota_poczatkowa') or 0),
+                repaid=float(k.get('splacono') or 0),
+                monthly_payment=float(k.get('rata_miesieczna') or 0),
+                raw=k,
+            ))
+        return loans
+
+    @classmethod
+    def from_t212(cls, dane_t212: Optional[Dict], usd_pln: float) -> 'PortfolioModel':
+        """Model tylko z danymi akcji (np. dane świeżo pobrane z API)"""
+        dane_t212 = dane_t212 or {}
+        return cls(
+            stocks=PositionBook(cls.parse_t212_positions(dane_t212)),
+            crypto=PositionBook([]),
+            loans=[],
+            usd_pln=usd_pln,
+            cash_usd=float((dane_t212.get("account") or {}).get("free") or 0),
+            dividends=dane_t212.get("dividends", []),
+        )
+
+    @classmethod
+    def from_files(cls, usd_pln: float,
+                   t212_path: str = TRADING212_CACHE_FILE,
+                   krypto_path: str = KRYPTO_FILE,
+                   kredyty_path: str = KREDYTY_FILE) -> 'PortfolioModel':
+        """Buduje model z lokalnych plików JSON (brakujące pliki = puste sekcje)"""
+        t212_cache = _load_json(t212_path, {})
+        krypto_data = _load_json(krypto_path, {})
+        kredyty_data = _load_json(kredyty_path, {})
+
+        if not isinstance(t212_cache, dict):
+            t212_cache = {}
+        dane_t212 = t212_cache.get("data") or {}
+        krypto_lista = krypto_data.get('krypto', []) if isinstance(krypto_data, dict) else krypto_data
+        kredyty_lista = kredyty_data.get('kredyty', []) if isinstance(kredyty_data, dict) else kredyty_data
+
+        return cls(
+            stocks=PositionBook(cls.parse_t212_positions(dane_t212)),
+            crypto=PositionBook(cls.parse_crypto(krypto_lista if isinstance(krypto_lista, list) else [])),
+            loans=cls.parse_loans(kredyty_lista if isinstance(kredyty_lista, list) else []),
+            usd_pln=usd_pln,
+            cash_usd=float((dane_t212.get("account") or {}).get("free") or 0),
+            dividends=dane_t212.get("dividends", []),
+            t212_timestamp=t212_cache.get("timestamp"),
+        )
+
+    # === WARTOŚCI POCHODNE (memoizowane) ===
+
+    @cached_property
+    def stocks_usd(self) -> float:
+        return self.stocks.total
+
+    @cached_property
+    def stocks_pln(self) -> float:
+        return self.stocks.total * self.usd_pln
+
+    @cached_property
+    def crypto_usd(self) -> float:
+        return self.crypto.total
+
+    @cached_property
+    def crypto_pln(self) -> float:
+        return self.crypto.total * self.usd_pln
+
+    @cached_property
+    def cash_pln(self) -> float:
+        return self.cash_usd * self.usd_pln
+
+    @cached_property
+    def debt_pln(self) -> float:
+        return sum(l.remaining for l in self.loans)
+
+    @cached_property
+    def monthly_payments_pln(self) -> float:
+        return sum(l.monthly_payment for l in self.loans)
+
+    @cached_property
+    def assets_pln(self) -> float:
+        return self.stocks_pln + self.crypto_pln
+
+    @cached_property
+    def net_worth_pln(self) -> float:
+        return self.assets_pln - self.debt_pln
+
+    @cached_property
+    def allocation(self) -> Dict[str, float]:
+        """Udział klas aktywów w aktywach (0-1)"""
+        total = self.assets_pln
+        if total <= 0:
+            return {'akcje': 0.0, 'krypto': 0.0}
+        return {'akcje': self.stocks_pln / total, 'krypto': self.crypto_pln / total}
+
+    def t212_age_hours(self) -> Optional[float]:
+        """Wiek danych Trading212 w godzinach (None gdy brak timestampu)"""
+        if not self.t212_timestamp:
+            return None
+        try:
+            return (datetime.now() - datetime.fromisoformat(self.t212_timestamp)).total_seconds() / 3600
+        except ValueError:
+            return None
+
+    # === ADAPTERY DLA ISTNIEJĄCYCH KONSUMENTÓW ===
+
+    def to_portfel_akcji(self) -> Dict:
+        """Format PORTFEL_AKCJI używany przez streamlit_app.pobierz_stan_spolki"""
+        pozycje_szczegoly = {}
+        value_pln = self.stocks.value * self.usd_pln
+        for i, p in enumerate(self.stocks.positions):
+            pozycje_szczegoly[p.ticker] = {
+                "ticker": p.ticker,
+                "ilosc": p.quantity,
+                "quantity": p.quantity,
+                "current_price": p.current_price,
+                "avg_price": p.avg_price,
+                "value_usd": round(float(self.stocks.value[i]), 2),
+                "value_pln": round(float(value_pln[i]), 2),
+                "ppl": p.ppl,
+                "frontend": p.frontend
+            }
+        return {
+            "Suma_PLN": round(self.stocks_pln, 2),
+            "Suma_USD": round(self.stocks_usd, 2),
+            "Liczba_pozycji_calkowita": len(self.stocks),
+            "Liczba_pozycji_rdzennych": len(self.stocks) - self.stocks.pie_count,
+            "Liczba_pozycji_w_pie": self.stocks.pie_count,
+            "Cash_free_USD": round(self.cash_usd, 2),
+            "Zrodlo": "Trading212 Cache",
+            "Pozycje_szczegoly": pozycje_szczegoly,
+            "pozycje": pozycje_szczegoly,  # Alias dla kompatybilności
+            "Dane_rynkowe": {},  # Wypełniane w normalize_stan_spolki
+            "dywidendy": self.dividends
+        }
+
+    def to_portfel_krypto(self) -> Dict:
+        """Format PORTFEL_KRYPTO (pozycje = oryginalne wpisy krypto.json)"""
+        return {
+            "Suma_USD": round(self.crypto_usd, 2),
+            "Suma_PLN": round(self.crypto_pln, 2),
+            "Liczba_pozycji": len(self.crypto),
+            "pozycje": [p.raw for p in self.crypto.positions]
+        }
+
+    def to_zobowiazania(self) -> Dict:
+        """Format ZOBOWIAZANIA"""
+        return {
+            "Suma_dlugu_PLN": round(self.debt_pln, 2),
+            "Suma_rat_PLN": round(self.monthly_payments_pln, 2),
+            "Liczba_kredytow": len(self.loans)
+        }
+
+    def to_stan_spolki_lite(self) -> Dict:
+        """Format lowercase (akcje/krypto) używany przez generate_daily_nexus_insight"""
+        akcje_pozycje = {}
+        for i, p in enumerate(self.stocks.positions):
+            akcje_pozycje[p.ticker] = {
+                'ilosc': p.quantity,
+                'cena_aktualna': p.current_price,
+                'cena_srednia': p.avg_price,
+                'wartosc_usd': float(self.stocks.value[i]),
+                'wartosc_pln': float(self.stocks.value[i]) * self.usd_pln,
+                'frontend': p.frontend
+            }
+        krypto_pozycje = {}
+        for i, p in enumerate(self.crypto.positions):
+            krypto_pozycje[p.ticker] = {
+                'ilosc': p.quantity,
+                'cena_usd': p.current_price,
+                'wartosc_pln': float(self.crypto.value[i]) * self.usd_pln
+            }
+        return {
+            'akcje': {
+                'wartosc_pln': self.stocks_pln,
+                'pozycje': akcje_pozycje,
+                'liczba_pozycji': len(self.stocks)
+            },
+            'krypto': {
+                'wartosc_pln': self.crypto_pln,
+                'pozycje': krypto_pozycje
+            }
+        }
+
+
+def _load_json(path: str, default):
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ Błąd wczytywania {path}: {e}")
+        return default
+
+
+# === KURS USD/PLN ===
+
+_fx_cache = {"rate": None, "fetched_at": 0.0}
+_fx_lock = threading.Lock()
+
+
+def get_usd_pln_rate(default: float = DEFAULT_USD_PLN_RATE) -> float:
+    """Kurs USD/PLN z NBP, zapamiętywany w procesie na FX_CACHE_SECONDS"""
+    with _fx_lock:
+        if _fx_cache["rate"] and time.time() - _fx_cache["fetched_at"] < FX_CACHE_SECONDS:
+            return _fx_cache["rate"]
+        try:
+            import requests
+            response = requests.get(NBP_API_URL, timeout=5)
+            response.raise_for_status()
+            rate = float(response.json()['rates'][0]['mid'])
+        except Exception as e:
+            print(f"⚠️ Błąd pobierania kursu USD/PLN: {e}")
+            # Zapamiętaj porażkę na krótko, żeby offline nie czekać na timeout przy każdym wywołaniu
+            rate = _fx_cache["rate"] or default
+            _fx_cache.update(rate=rate, fetched_at=time.time() - FX_CACHE_SECONDS + FX_RETRY_SECONDS)
+            return rate
+        _fx_cache.update(rate=rate, fetched_at=time.time())
+        return rate
+
+
+# === SINGLETON Z INWALIDACJĄ PO ZAWARTOŚCI PLIKÓW ===
+
+_model_cache = {"key": None, "model": None}
+_model_lock = threading.Lock()
+
+
+def get_portfolio_model(usd_pln: Optional[float] = None, force: bool = False) -> PortfolioModel:
+    """
+    Zwraca wspólny model portfela
+
+    Model jest budowany raz i współdzielony - przebudowa następuje tylko gdy
+    zmieni się zawartość któregoś z plików źródłowych albo kurs USD/PLN.
+    """
+    if usd_pln is None:
+        usd_pln = get_usd_pln_rate()
+    paths = (TRADING212_CACHE_FILE, KRYPTO_FILE, KREDYTY_FILE)
+    with _model_lock:
+        key = (files_signature(*paths), round(float(usd_pln), 6))
+        if force or _model_cache["key"] != key or _model_cache["model"] is None:
+            _model_cache["model"] = PortfolioModel.from_files(float(usd_pln), *paths)
+            _model_cache["key"] = key
+        return _model_cache["model"]
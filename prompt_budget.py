@@ -0,0 +1,276 @@
+"""
+📏 Prompt Budget - budżetowanie rozmiaru promptów partnerów AI
+
+- Szacowanie tokenów i budżet per wywołanie
+- Sekcje promptu z priorytetami (najmniej ważne przycinane pierwsze)
+- Deduplikacja powtarzających się bloków (np. dane portfela)
+- Kroczące podsumowania (digest) starej pamięci - liczone raz, cache per partner
+- Kompresja transkryptu rady (poprzednie wypowiedzi partnerów)
+- Log rozmiaru promptu przed/po kompresji dla każdego wywołania
+"""
+
+import json
+import os
+import re
+import threading
+from collections import deque
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+# Szacunek: ~4 znaki na token (PL wychodzi nieco gorzej niż EN, ale wystarcza do budżetu)
+CHARS_PER_TOKEN = 4
+DEFAULT_PROMPT_BUDGET = 6000  # tokenów na jedno wywołanie partnera
+DIGEST_FILE = "memory_digests.json"
+DIGEST_ENTRY_CHARS = 220  # Max długość jednego wpisu digestu
+COUNCIL_FULL_RESPONSES = 1  # Ile ostatnich wypowiedzi rady wstawiać w całości
+COUNCIL_SUMMARY_CHARS = 350  # Długość skrótu starszych wypowiedzi rady
+PROMPT_LOG_SIZE = 200  # Ile ostatnich wpisów logu trzymać w pamięci
+
+TRUNCATION_MARKER = "\n[...skrócono...]\n"
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_WS_RE = re.compile(r"\s+")
+
+_prompt_log = deque(maxlen=PROMPT_LOG_SIZE)
+_digest_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    """Przybliżona liczba tokenów tekstu"""
+    return (len(text or "") + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Przytnij tekst do max_tokens (po granicy linii jeśli to możliwe)"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+
+    limit = max(max_tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARKER), 0)
+    cut = text[:limit]
+    newline = cut.rfind("\n")
+    if newline > limit * 0.6:
+        cut = cut[:newline]
+    return cut.rstrip() + TRUNCATION_MARKER
+
+
+def first_sentences(text: str, max_chars: int) -> str:
+    """Pierwsze zdania tekstu mieszczące się w max_chars (ekstrakcyjne streszczenie)"""
+    text = _WS_RE.sub(" ", text or "").strip()
+    if len(text) <= max_chars:
+        return text
+
+    summary = ""
+    for sentence in _SENTENCE_RE.split(text):
+        if len(summary) + len(sentence) + 1 > max_chars:
+            break
+        summary = f"{summary} {sentence}".strip()
+
+    return summary or text[:max_chars].rstrip() + "..."
+
+
+class PromptBuilder:
+    """
+    Składa prompt z sekcji w zadanej kolejności, mieszcząc się w budżecie tokenów.
+
+    Sekcje o niższym priorytecie są przycinane (do min_tokens), a w razie
+    potrzeby usuwane w całości, zanim ruszone zostaną ważniejsze.
+    Sekcje z priority >= REQUIRED_PRIORITY nigdy nie są przycinane.
+    """
+
+    REQUIRED_PRIORITY = 100
+
+    def __init__(self, budget_tokens: int = DEFAULT_PROMPT_BUDGET):
+        self.budget_tokens = budget_tokens
+        self.sections: List[Dict[str, Any]] = []
+
+    def add(self, name: str, text: str, priority: int = 50, min_tokens: int = 0):
+        """
+        Dodaj sekcję promptu
+
+        Args:
+            name: Nazwa sekcji (do logów)
+            text: Treść
+            priority: 0-100, wyższy = ważniejszy
+            min_tokens: Do ilu tokenów można przyciąć zanim sekcja zostanie usunięta
+        """
+        self.sections.append({
+            "name": name,
+            "text": text or "",
+            "priority": priority,
+            "min_tokens": min_tokens,
+        })
+        return self
+
+    def _dedupe(self):
+        """Usuń akapity powtórzone w kilku sekcjach - zostaje kopia w najważniejszej"""
+        seen = set()
+        for section in sorted(self.sections, key=lambda s: -s["priority"]):
+            blocks = section["text"].split("\n\n")
+            kept = []
+            for block in blocks:
+                key = _WS_RE.sub(" ", block).strip().lower()
+                if len(key) >= 40 and key in seen:
+                    continue
+                if len(key) >= 40:
+                    seen.add(key)
+                kept.append(block)
+            section["text"] = "\n\n".join(kept)
+
+    def build(self, partner: str = "", call_type: str = "partner") -> str:
+        """Złóż prompt w budżecie i zaloguj rozmiar przed/po kompresji"""
+        tokens_before = sum(estimate_tokens(s["text"]) for s in self.sections)
+
+        self._dedupe()
+        total = sum(estimate_tokens(s["text"]) for s in self.sections)
+
+        truncated, dropped = [], []
+        for section in sorted(self.sections, key=lambda s: s["priority"]):
+            if total <= self.budget_tokens:
+                break
+            if section["priority"] >= self.REQUIRED_PRIORITY or not section["text"]:
+                continue
+
+            current = estimate_tokens(section["text"])
+            overflow = total - self.budget_tokens
+            target = current - overflow
+
+            if target >= section["min_tokens"] and target > 0:
+                section["text"] = truncate_to_tokens(section["text"], target)
+                truncated.append(section["name"])
+            else:
+                section["text"] = ""
+                dropped.append(section["name"])
+
+            total += estimate_tokens(section["text"]) - current
+
+        prompt = "\n\n".join(s["text"].strip("\n") for s in self.sections if s["text"].strip())
+        log_prompt_size(partner, tokens_before, estimate_tokens(prompt), call_type, truncated, dropped)
+        return prompt
+
+
+def log_prompt_size(partner: str, tokens_before: int, tokens_after: int, call_type: str = "partner",
+                    truncated: Optional[List[str]] = None, dropped: Optional[List[str]] = None):
+    """Zapisz rozmiar promptu (przed i po kompresji) do logu"""
+    entry = {
+        "timestamp": datetime.now().isoformat(),
+        "partner": partner,
+        "call_type": call_type,
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "truncated": truncated or [],
+        "dropped": dropped or [],
+    }
+    _prompt_log.append(entry)
+
+    saved = tokens_before - tokens_after
+    print(f"📏 Prompt [{call_type}] {partner}: {tokens_before} → {tokens_after} tokenów"
+          + (f" (-{saved / tokens_before:.0%})" if tokens_before and saved > 0 else ""))
+
+
+def get_prompt_log(limit: int = 50) -> List[Dict[str, Any]]:
+    """Ostatnie wpisy logu rozmiaru promptów"""
+    return list(_prompt_log)[-limit:]
+
+
+# ----------------------------------------------------------------------
+# Kroczące podsumowania pamięci
+# ----------------------------------------------------------------------
+
+def _load_digests() -> Dict[str, Any]:
+    if not os.path.exists(DIGEST_FILE):
+        return {}
+    try:
+        with open(DIGEST_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ Błąd wczytywania digestów pamięci: {e}")
+        return {}
+
+
+def _save_digests(digests: Dict[str, Any]):
+    try:
+        with open(DIGEST_FILE, "w", encoding="utf-8") as f:
+            json.dump(digests, f, indent=2, ensure_ascii=False)
+    except Exception:
+        pass  # Streamlit Cloud - read-only filesystem
+
+
+def _digest_entry(conv: Dict[str, Any]) -> Dict[str, str]:
+    """Jedna linijka digestu dla rozmowy"""
+    user_message = conv.get("user_message", "")
+    # Wiadomości z rady zawierają transkrypt - właściwe pytanie jest na końcu
+    if "PYTANIE PARTNERA ZARZĄDZAJĄCEGO:" in user_message:
+        user_message = user_message.rsplit("PYTANIE PARTNERA ZARZĄDZAJĄCEGO:", 1)[1]
+
+    return {
+        "timestamp": conv.get("timestamp", ""),
+        "q": first_sentences(user_message, DIGEST_ENTRY_CHARS // 2),
+        "a": first_sentences(conv.get("ai_response", ""), DIGEST_ENTRY_CHARS),
+    }
+
+
+def get_memory_digest(partner_key: str, conversations: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """
+    Zwróć digest (skrót) podanych rozmów partnera.
+
+    Wpisy są liczone tylko raz - kolejne wywołania dopisują jedynie rozmowy
+    nowsze niż ostatnia już podsumowana, a reszta czytana jest z DIGEST_FILE.
+    """
+    if not conversations:
+        return []
+
+    with _digest_lock:
+        digests = _load_digests()
+        cached = digests.get(partner_key, {"entries": []})
+        entries = cached["entries"]
+        known = {entry["timestamp"] for entry in entries}
+
+        new_entries = [_digest_entry(conv) for conv in conversations if conv.get("timestamp", "") not in known]
+        if new_entries:
+            entries = sorted(entries + new_entries, key=lambda e: e["timestamp"])
+            digests[partner_key] = {
+                "entries": entries,
+                "updated_at": datetime.now().isoformat()
+            }
+            _save_digests(digests)
+
+    wanted = {conv.get("timestamp", "") for conv in conversations}
+    return [entry for entry in entries if entry["timestamp"] in wanted]
+
+
+def format_memory_digest(entries: List[Dict[str, str]]) -> str:
+    """Sformatuj digest pamięci do promptu"""
+    if not entries:
+        return ""
+
+    lines = [f"🗂️ SKRÓT WCZEŚNIEJSZYCH ROZMÓW ({len(entries)}):"]
+    for entry in entries:
+        lines.append(f"• [{entry['timestamp'][:10]}] P: {entry['q']} → {entry['a']}")
+    return "\n".join(lines) + "\n"
+
+
+# ----------------------------------------------------------------------
+# Transkrypt rady
+# ----------------------------------------------------------------------
+
+def compress_council_responses(previous_responses: List[Tuple[str, str]],
+                               full_count: int = COUNCIL_FULL_RESPONSES,
+                               summary_chars: int = COUNCIL_SUMMARY_CHARS) -> str:
+    """
+    Skompresuj poprzednie wypowiedzi na spotkaniu rady.
+
+    Ostatnie `full_count` wypowiedzi zostają w całości, starsze są skracane
+    do pierwszych zdań - rozmiar kontekstu rośnie liniowo zamiast kwadratowo.
+    """
+    lines = []
+    cutoff = len(previous_responses) - full_count
+
+    for i, (partner, response) in enumerate(previous_responses):
+        if i < cutoff:
+            lines.append(f"\n**{partner}** (skrót):\n{first_sentences(response, summary_chars)}\n")
+        else:
+            lines.append(f"\n**{partner}** powiedział:\n{response}\n")
+
+    return "".join(lines)
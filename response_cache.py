@@ -0,0 +1,220 @@
+"""
+💾 Response Cache - cache odpowiedzi modeli AI
+
+Klucz: (partner, model, znormalizowany prompt, hash stanu portfela)
+- Warstwa w pamięci: LRU z TTL
+- Warstwa na dysku: llm_response_cache.json (przeżywa restart aplikacji) - zapis
+  najwyżej raz na SAVE_INTERVAL_SECONDS i przy wyjściu procesu
+- Jawny bypass (parametr bypass_cache lub LLM_CACHE_DISABLED=1)
+
+Trafienia w cache rejestrowane są w APIUsageTracker jako wywołania o koszcie 0,
+więc powtarzane pytania nie zużywają dziennego budżetu.
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+CACHE_FILE = "llm_response_cache.json"
+DEFAULT_TTL_SECONDS = 6 * 3600  # 6h - portfel i rynek zmieniają się w ciągu dnia
+MAX_MEMORY_ENTRIES = 256
+MAX_DISK_ENTRIES = 1000
+SAVE_INTERVAL_SECONDS = 30  # Jak często zapisywać warstwę dyskową po nowych wpisach
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalizacja promptu: lowercase, zwinięte białe znaki, bez końcowej interpunkcji"""
+    return _WS_RE.sub(" ", (prompt or "").lower()).strip().rstrip("?!. ")
+
+
+def _round_floats(obj: Any, ndigits: int = 0) -> Any:
+    """Zaokrąglij liczby - drobne wahania kursów nie powinny unieważniać cache"""
+    if isinstance(obj, float):
+        return round(obj, ndigits)
+    if isinstance(obj, dict):
+        return {str(k): _round_floats(v, ndigits) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_round_floats(v, ndigits) for v in obj]
+    return obj
+
+
+def portfolio_state_hash(*states: Any) -> str:
+    """
+    Hash stanu portfela (np. stan_spolki, cele).
+
+    Wartości liczbowe zaokrąglane są do pełnych jednostek, więc odświeżenie
+    kursów o grosze nie zmienia klucza.
+    """
+    payload = json.dumps(_round_floats(list(states)), sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def make_cache_key(partner: str, model: str, prompt: str, state_hash: str = "") -> str:
+    """Klucz cache dla (partner, model, prompt, stan portfela)"""
+    raw = "\x1f".join([partner or "", model or "", normalize_prompt(prompt), state_hash or ""])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def is_cache_disabled() -> bool:
+    """Globalny bypass przez zmienną środowiskową"""
+    return os.getenv("LLM_CACHE_DISABLED", "").lower() in ("1", "true", "yes")
+
+
+class ResponseCache:
+    """Dwuwarstwowy cache odpowiedzi (LRU w pamięci + plik JSON)"""
+
+    def __init__(self, cache_file: str = CACHE_FILE, ttl_seconds: int = DEFAULT_TTL_SECONDS,
+                 max_memory_entries: int = MAX_MEMORY_ENTRIES, max_disk_entries: int = MAX_DISK_ENTRIES):
+        self.cache_file = cache_file
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._disk: Optional[Dict[str, Dict[str, Any]]] = None  # ładowany leniwie
+        self._lock = threading.Lock()
+        self._dirty = False  # Nowe wpisy jeszcze nie zapisane na dysk
+        self._last_save = 0.0
+
+        self.stats = {"hits": 0, "misses": 0, "disk_hits": 0}
+
+    # ------------------------------------------------------------------
+    # Warstwa dyskowa
+    # ------------------------------------------------------------------
+
+    def _load_disk(self) -> Dict[str, Dict[str, Any]]:
+        if self._disk is None:
+            self._disk = {}
+            if os.path.exists(self.cache_file):
+                try:
+                    with open(self.cache_file, "r", encoding="utf-8") as f:
+                        self._disk = json.load(f)
+                except Exception as e:
+                    print(f"⚠️ Błąd wczytywania cache odpowiedzi: {e}")
+        return self._disk
+
+    def _save_disk(self, force: bool = True):
+        """Zapisz warstwę dyskową (force=False - najwyżej raz na SAVE_INTERVAL_SECONDS)"""
+        now = time.time()
+        if not force and now - self._last_save < SAVE_INTERVAL_SECONDS:
+            self._dirty = True
+            return
+        self._dirty = False
+        self._last_save = now
+        disk = self._load_disk()
+
+        # Usuń wygasłe i najstarsze ponad limit
+        for key in [k for k, v in disk.items() if v.get("expires_at", 0) <= now]:
+            del disk[key]
+        if len(disk) > self.max_disk_entries:
+            for key, _ in sorted(disk.items(), key=lambda kv: kv[1].get("created_at", 0))[:len(disk) - self.max_disk_entries]:
+                del disk[key]
+
+        try:
+            tmp_file = f"{self.cache_file}.tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(disk, f, ensure_ascii=False)
+            os.replace(tmp_file, self.cache_file)
+        except Exception:
+            pass  # Streamlit Cloud - read-only filesystem
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Pobierz wpis z cache
+
+        Returns:
+            Dict z polami response, metadata, created_at lub None (brak/wygasł)
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry["expires_at"] > now:
+                self._memory.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry
+            if entry is not None:
+                del self._memory[key]
+
+            entry = self._load_disk().get(key)
+            if entry is not None and entry.get("expires_at", 0) > now:
+                self._remember(key, entry)
+                self.stats["hits"] += 1
+                self.stats["disk_hits"] += 1
+                return entry
+
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, key: str, response: Any, metadata: Optional[Dict[str, Any]] = None,
+            ttl_seconds: Optional[int] = None):
+        """Zapisz odpowiedź w obu warstwach"""
+        now = time.time()
+        entry = {
+            "response": response,
+            "metadata": metadata or {},
+            "created_at": now,
+            "expires_at": now + (ttl_seconds or self.ttl_seconds),
+        }
+        with self._lock:
+            self._remember(key, entry)
+            self._load_disk()[key] = entry
+            self._save_disk(force=False)
+
+    def flush(self):
+        """Zapisz niezapisane wpisy na dysk (wywoływane też przy wyjściu procesu)"""
+        with self._lock:
+            if self._dirty:
+                self._save_disk()
+
+    def _remember(self, key: str, entry: Dict[str, Any]):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def invalidate(self, key: Optional[str] = None):
+        """Usuń jeden wpis lub (bez argumentu) cały cache"""
+        with self._lock:
+            if key is None:
+                self._memory.clear()
+                self._disk = {}
+            else:
+                self._memory.pop(key, None)
+                self._load_disk().pop(key, None)
+            self._save_disk()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Statystyki trafień"""
+        total = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / total, 3) if total else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_entries": len(self._disk) if self._disk is not None else None,
+        }
+
+
+# Singleton instance
+_cache_instance = None
+_cache_lock = threading.Lock()
+
+def get_response_cache() -> ResponseCache:
+    """Zwróć singleton cache odpowiedzi"""
+    global _cache_instance
+    with _cache_lock:
+        if _cache_instance is None:
+            _cache_instance = ResponseCache()
+            atexit.register(_cache_instance.flush)
+    return _cache_instance
@@ -10,6 +10,12 @@ from datetime import datetime, timedelta
 import json
 import os
 
+try:
+    from performance_engine import get_performance_engine
+    PERFORMANCE_ENGINE_OK = True
+except ImportError:
+    PERFORMANCE_ENGINE_OK = False
+
 
 class RiskAnalytics:
     """Zaawansowana analiza ryzyka portfela"""
@@ -244,6 +250,21 @@ class RiskAnalytics:
         
         return annual_volatility
     
+    def _flow_adjusted_returns(self) -> Optional[np.ndarray]:
+        """
+        Zwroty TWR między snapshotami historii z silnika zwrotów
+        
+        Returns:
+            Tablica zwrotów albo None (stary format historii / daty spoza daily_snapshots.json)
+        """
+        if not PERFORMANCE_ENGINE_OK or not all('totals' in h and 'date' in h for h in self.history):
+            return None
+        try:
+            return get_performance_engine().period_returns([h['date'] for h in self.history])
+        except Exception as e:
+            print(f"⚠️ Silnik zwrotów niedostępny: {e}")
+            return None
+    
     def generate_risk_report(self) -> Dict[str, Any]:
         """
         Generuj kompletny raport ryzyka
@@ -277,8 +298,12 @@ class RiskAnalytics:
             
             values = np.array(values)
             
-            # Oblicz zwroty
-            returns = np.diff(values) / values[:-1]
+            # Oblicz zwroty - skorygowane o przepływy (wpłaty, zakupy, kredyty), gdy to snapshoty
+            returns = self._flow_adjusted_returns()
+            flow_adjusted = returns is not None
+            if not flow_adjusted:
+                returns = np.diff(values) / values[:-1]
+            report['metrics']['flow_adjusted'] = flow_adjusted
             
             # Sharpe Ratio
             report['metrics']['sharpe_ratio'] = self.calculate_sharpe_ratio(returns)
@@ -286,8 +311,9 @@ class RiskAnalytics:
             # Sortino Ratio
             report['metrics']['sortino_ratio'] = self.calculate_sortino_ratio(returns)
             
-            # Maximum Drawdown
-            max_dd, start_idx, end_idx = self.calculate_max_drawdown(values)
+            # Maximum Drawdown (na indeksie TWR - dopłata nie "odrabia" spadku)
+            growth = np.concatenate(([1.0], np.cumprod(1.0 + returns))) if flow_adjusted else values
+            max_dd, start_idx, end_idx = self.calculate_max_drawdown(growth)
             report['metrics']['max_drawdown_percent'] = max_dd
             report['metrics']['max_drawdown_period'] = f"{start_idx} -> {end_idx}"
             
@@ -305,7 +331,12 @@ class RiskAnalytics:
             report['metrics']['average_return_percent'] = np.mean(returns) * 100
             
             # Całkowity zwrot
-            if values[0] != 0:
+            if flow_adjusted:
+                report['metrics']['total_return_percent'] = (growth[-1] - 1.0) * 100
+                mwr = get_performance_engine().mwr(start=self.history[0]['date'], end=self.history[-1]['date'])
+                if mwr is not None:
+                    report['metrics']['mwr_annual_percent'] = mwr * 100
+            elif values[0] != 0:
                 total_return = ((values[-1] - values[0]) / values[0]) * 100
                 report['metrics']['total_return_percent'] = total_return
         
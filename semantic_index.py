@@ -0,0 +1,517 @@
+"""
+🧭 Semantic Index - lokalny indeks wektorowy dla bazy wiedzy i pamięci partnerów
+
+Hashowane wektory TF-IDF (bez modelu, tylko CPU/NumPy) w płaskim indeksie:
+- knowledge_base/articles.json
+- knowledge_base/quarterly_reports.json
+- partner_memories/*.json (każda rozmowa = osobny dokument)
+- autonomous_conversations/ (każda wypowiedź = osobny dokument)
+
+Indeks aktualizuje się przyrostowo (tylko nowe dokumenty) i odpowiada
+na zapytania top-k w pojedynczych milisekundach.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterable, Tuple, Union
+
+import numpy as np
+
+# Ścieżki
+INDEX_FILE = "knowledge_base/semantic_index.npz"
+ARTICLES_FILE = "knowledge_base/articles.json"
+REPORTS_FILE = "knowledge_base/quarterly_reports.json"
+PARTNER_MEMORIES_DIR = "partner_memories"
+AUTONOMOUS_FILE = "autonomous_conversations/index.json"  # Indeks conversation_store (mtime = zmiana)
+
+# Parametry wektoryzacji
+HASH_DIM = 2 ** 18  # Liczba kubełków hashowania (kolizje praktycznie pomijalne)
+MIN_TOKEN_LEN = 2
+STEM_PREFIX = 6  # Prosty stemming: polska fleksja zmienia głównie końcówki ("rezerwa"/"rezerwy")
+MAX_TEXT_CHARS = 6000  # Dłuższe teksty przycinane przed wektoryzacją
+PREVIEW_CHARS = 400  # Podgląd tekstu trzymany w metadanych
+COMPACT_RATIO = 0.25  # Kompaktuj indeks gdy >25% wierszy usuniętych
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_HTML_RE = re.compile(r"<[^>]+>")
+
+# Krótka lista stop-words PL/EN (reszta wygaszana przez IDF)
+STOP_WORDS = {
+    "i", "w", "z", "na", "do", "to", "że", "ze", "sie", "się", "nie", "jest", "jak", "co",
+    "a", "o", "od", "po", "za", "dla", "oraz", "ale", "czy", "tak", "już", "juz", "by",
+    "the", "and", "of", "to", "in", "is", "for", "on", "with", "at", "by", "an", "be",
+}
+
+
+def fold_diacritics(text: str) -> str:
+    """Usuń polskie znaki diakrytyczne (ł -> l, ą -> a, ...)"""
+    text = text.replace("ł", "l").replace("Ł", "L")
+    normalized = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in normalized if not unicodedata.combining(ch))
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokenizacja: lowercase, bez HTML i diakrytyków, prefiksy słów, unigramy + bigramy"""
+    text = _HTML_RE.sub(" ", text or "")[:MAX_TEXT_CHARS]
+    words = [
+        w[:STEM_PREFIX] for w in _TOKEN_RE.findall(fold_diacritics(text.lower()))
+        if len(w) >= MIN_TOKEN_LEN and w not in STOP_WORDS
+    ]
+    bigrams = [f"{a}_{b}" for a, b in zip(words, words[1:])]
+    return words + bigrams
+
+
+def hash_vector(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Zamień tekst na rzadki wektor TF (sublinear) w przestrzeni HASH_DIM.
+
+    Returns:
+        (indices, values) - posortowane indeksy kubełków i wagi 1 + log(tf)
+    """
+    tokens = tokenize(text)
+    if not tokens:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+    # crc32 jest stabilny między procesami (w przeciwieństwie do hash())
+    buckets = np.fromiter(
+        (zlib.crc32(t.encode("utf-8")) % HASH_DIM for t in tokens),
+        dtype=np.int64, count=len(tokens)
+    )
+    indices, counts = np.unique(buckets, return_counts=True)
+    values = 1.0 + np.log(counts.astype(np.float32))
+    return indices.astype(np.int32), values.astype(np.float32)
+
+
+class SemanticIndex:
+    """
+    Płaski indeks rzadkich wektorów TF z IDF liczonym w momencie zapytania.
+
+    Wektory przechowywane są jako TF, a wagi IDF (z licznika document frequency)
+    nakładane przy wyszukiwaniu - dzięki temu dodanie dokumentu nie wymaga
+    przeliczania całego indeksu.
+    """
+
+    def __init__(self, index_file: str = INDEX_FILE):
+        self.index_file = index_file
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        """Pusty indeks"""
+        # Rzadka macierz w formacie COO (wiersz, kubełek, wartość)
+        self._rows = np.empty(0, dtype=np.int32)
+        self._cols = np.empty(0, dtype=np.int32)
+        self._vals = np.empty(0, dtype=np.float32)
+        self._df = np.zeros(HASH_DIM, dtype=np.int32)
+
+        # Metadane dokumentów (wiersz -> dict) i mapa doc_id -> wiersz
+        self.docs: List[Optional[Dict[str, Any]]] = []
+        self.id_to_row: Dict[str, int] = {}
+        self.source_mtimes: Dict[str, float] = {}
+
+        # Bufor dokumentów dodanych od ostatniego scalenia z macierzą
+        self._pending: List[Tuple[int, np.ndarray, np.ndarray]] = []
+        self._norms_cache: Optional[np.ndarray] = None
+        self._dirty = False
+
+    # ------------------------------------------------------------------
+    # Persystencja
+    # ------------------------------------------------------------------
+
+    def _load(self):
+        """Wczytaj indeks z dysku (jeśli istnieje)"""
+        if not os.path.exists(self.index_file):
+            return
+
+        try:
+            with np.load(self.index_file, allow_pickle=False) as data:
+                self._rows = data["rows"]
+                self._cols = data["cols"]
+                self._vals = data["vals"]
+                self._df = data["df"]
+                meta = json.loads(str(data["meta"]))
+
+            self.docs = meta.get("docs", [])
+            self.source_mtimes = meta.get("source_mtimes", {})
+            self.id_to_row = {
+                doc["id"]: row for row, doc in enumerate(self.docs) if doc is not None
+            }
+        except Exception as e:
+            print(f"⚠️ Błąd wczytywania indeksu semantycznego: {e} - buduję od zera")
+            self._reset()
+
+    def save(self) -> bool:
+        """Zapisz indeks na dysk (tylko jeśli były zmiany)"""
+        if not self._dirty:
+            return True
+
+        self._flush_pending()
+        if self.docs and self.docs.count(None) > COMPACT_RATIO * len(self.docs):
+            self._compact()
+
+        try:
+            os.makedirs(os.path.dirname(self.index_file) or ".", exist_ok=True)
+            meta = json.dumps({
+                "docs": self.docs,
+                "source_mtimes": self.source_mtimes,
+                "saved_at": datetime.now().isoformat()
+            }, ensure_ascii=False)
+
+            tmp_file = f"{self.index_file}.tmp.npz"
+            np.savez_compressed(
+                tmp_file,
+                rows=self._rows, cols=self._cols, vals=self._vals,
+                df=self._df, meta=np.array(meta)
+            )
+            os.replace(tmp_file, self.index_file)
+            self._dirty = False
+            return True
+        except Exception as e:
+            print(f"⚠️ Błąd zapisu indeksu semantycznego: {e}")
+            return False
+
+    # ------------------------------------------------------------------
+    # Modyfikacje
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.id_to_row)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.id_to_row
+
+    def add(self, doc_id: str, text: str, metadata: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Dodaj dokument do indeksu
+
+        Args:
+            doc_id: Unikalny ID (np. "article:ea67461a554238dd")
+            text: Tekst do zindeksowania
+            metadata: Dodatkowe pola (source, partner, date, ref...)
+
+        Returns:
+            bool: False jeśli dokument już istnieje lub jest pusty
+        """
+        if doc_id in self.id_to_row:
+            return False
+
+        indices, values = hash_vector(text)
+        if len(indices) == 0:
+            return False
+
+        row = len(self.docs)
+        doc = {"id": doc_id, "preview": _HTML_RE.sub(" ", text)[:PREVIEW_CHARS].strip()}
+        doc.update(metadata or {})
+
+        self.docs.append(doc)
+        self.id_to_row[doc_id] = row
+        self._pending.append((row, indices, values))
+        self._df[indices] += 1
+        self._norms_cache = None
+        self._dirty = True
+        return True
+
+    def remove(self, doc_id: str) -> bool:
+        """Usuń dokument (tombstone - fizycznie usuwany przy kompaktowaniu)"""
+        row = self.id_to_row.pop(doc_id, None)
+        if row is None:
+            return False
+
+        self._flush_pending()
+        mask = self._rows == row
+        self._df[self._cols[mask]] -= 1
+        self._vals[mask] = 0.0
+        self.docs[row] = None
+        self._norms_cache = None
+        self._dirty = True
+        return True
+
+    def _flush_pending(self):
+        """Scal bufor nowych dokumentów z główną macierzą"""
+        if not self._pending:
+            return
+
+        self._rows = np.concatenate(
+            [self._rows] + [np.full(len(idx), row, dtype=np.int32) for row, idx, _ in self._pending]
+        )
+        self._cols = np.concatenate([self._cols] + [idx for _, idx, _ in self._pending])
+        self._vals = np.concatenate([self._vals] + [val for _, _, val in self._pending])
+        self._pending = []
+
+    def _compact(self):
+        """Usuń fizycznie wiersze oznaczone jako usunięte i przenumeruj"""
+        alive_rows = np.array([doc is not None for doc in self.docs], dtype=bool)
+        new_row_ids = np.cumsum(alive_rows) - 1
+
+        keep = alive_rows[self._rows]
+        self._rows = new_row_ids[self._rows[keep]].astype(np.int32)
+        self._cols = self._cols[keep]
+        self._vals = self._vals[keep]
+
+        self.docs = [doc for doc in self.docs if doc is not None]
+        self.id_to_row = {doc["id"]: row for row, doc in enumerate(self.docs)}
+        self._norms_cache = None
+
+    # ------------------------------------------------------------------
+    # Wyszukiwanie
+    # ------------------------------------------------------------------
+
+    def _idf(self) -> np.ndarray:
+        n_docs = max(len(self.id_to_row), 1)
+        return np.log((1.0 + n_docs) / (1.0 + self._df)).astype(np.float32) + 1.0
+
+    def search(self, query: str, k: int = 5, source: Optional[Union[str, Iterable[str]]] = None,
+               partner: Optional[str] = None, exclude_ids: Optional[Iterable[str]] = None,
+               min_score: float = 0.05) -> List[Dict[str, Any]]:
+        """
+        Zwróć top-k dokumentów najbardziej podobnych (cosine TF-IDF) do zapytania
+
+        Args:
+            query: Tekst zapytania
+            k: Liczba wyników
+            source: Filtr źródła ("article", "report", "memory", "autonomous") lub kilka źródeł
+            partner: Filtr partnera (dla pamięci i rozmów autonomicznych)
+            exclude_ids: ID dokumentów do pominięcia (np. już obecne w prompcie)
+            min_score: Minimalne podobieństwo
+
+        Returns:
+            Lista metadanych dokumentów z polem "score", posortowana malejąco
+        """
+        if not self.id_to_row:
+            return []
+
+        q_idx, q_val = hash_vector(query)
+        if len(q_idx) == 0:
+            return []
+
+        self._flush_pending()
+        idf = self._idf()
+
+        # Wektor zapytania (gęsty) z wagami IDF^2 - iloczyn skalarny liczony rzadko
+        q_weights = np.zeros(HASH_DIM, dtype=np.float32)
+        q_weights[q_idx] = q_val * idf[q_idx] ** 2
+        q_norm = float(np.sqrt(np.sum((q_val * idf[q_idx]) ** 2)))
+
+        n_rows = len(self.docs)
+        dots = np.bincount(self._rows, weights=self._vals * q_weights[self._cols], minlength=n_rows)
+
+        if self._norms_cache is None:
+            self._norms_cache = np.sqrt(np.bincount(
+                self._rows, weights=(self._vals * idf[self._cols]) ** 2, minlength=n_rows
+            ))
+        norms = self._norms_cache
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scores = np.where(norms > 0, dots / (norms * q_norm), 0.0)
+
+        excluded = set(exclude_ids or [])
+        sources = {source} if isinstance(source, str) else set(source or [])
+        candidates = np.argsort(-scores)
+
+        results = []
+        for row in candidates:
+            score = float(scores[row])
+            if score < min_score:
+                break
+            doc = self.docs[row]
+            if doc is None or doc["id"] in excluded:
+                continue
+            if sources and doc.get("source") not in sources:
+                continue
+            if partner and doc.get("partner") != partner:
+                continue
+            results.append({**doc, "score": round(score, 4)})
+            if len(results) >= k:
+                break
+
+        return results
+
+    # ------------------------------------------------------------------
+    # Synchronizacja ze źródłami
+    # ------------------------------------------------------------------
+
+    def _source_changed(self, path: str) -> bool:
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return False
+        return self.source_mtimes.get(path) != mtime
+
+    def _mark_source(self, path: str):
+        try:
+            self.source_mtimes[path] = os.path.getmtime(path)
+            self._dirty = True
+        except OSError:
+            pass
+
+    def sync(self, force: bool = False) -> int:
+        """
+        Dodaj do indeksu nowe dokumenty ze wszystkich źródeł.
+
+        Pliki, których mtime się nie zmienił, są pomijane bez parsowania.
+        Artykuły usunięte z articles.json są usuwane z indeksu.
+
+        Returns:
+            int: Liczba dodanych dokumentów
+        """
+        start = time.time()
+        added = 0
+
+        sources = [(ARTICLES_FILE, _iter_articles), (REPORTS_FILE, _iter_reports), (AUTONOMOUS_FILE, _iter_autonomous)]
+        if os.path.isdir(PARTNER_MEMORIES_DIR):
+            sources += [
+                (str(path), _iter_partner_memory)
+                for path in sorted(Path(PARTNER_MEMORIES_DIR).glob("*.json"))
+            ]
+
+        for path, iterator in sources:
+            if not force and not self._source_changed(path):
+                continue
+
+            try:
+                seen_ids = set()
+                for doc_id, text, metadata in iterator(path):
+                    seen_ids.add(doc_id)
+                    if self.add(doc_id, text, metadata):
+                        added += 1
+
+                # Artykuły są rotowane przez knowledge_base_updater - usuń wygasłe
+                if path == ARTICLES_FILE:
+                    stale = [
+                        doc["id"] for doc in self.docs
+                        if doc is not None and doc.get("source") == "article" and doc["id"] not in seen_ids
+                    ]
+                    for doc_id in stale:
+                        self.remove(doc_id)
+
+                self._mark_source(path)
+            except Exception as e:
+                print(f"⚠️ Błąd indeksowania {path}: {e}")
+
+        if added:
+            print(f"🧭 Semantic index: +{added} dokumentów ({len(self)} łącznie, {time.time() - start:.2f}s)")
+
+        return added
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Statystyki indeksu"""
+        by_source: Dict[str, int] = {}
+        for doc in self.docs:
+            if doc is not None:
+                by_source[doc.get("source", "unknown")] = by_source.get(doc.get("source", "unknown"), 0) + 1
+
+        return {
+            "documents": len(self),
+            "by_source": by_source,
+            "nonzeros": int(len(self._vals) + sum(len(idx) for _, idx, _ in self._pending)),
+            "index_file": self.index_file
+        }
+
+
+# ----------------------------------------------------------------------
+# Iteratory źródeł: (doc_id, text, metadata)
+# ----------------------------------------------------------------------
+
+def _read_json(path: str):
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return json.load(f)
+
+
+def _iter_articles(path: str):
+    for article in _read_json(path).get("articles", []):
+        text = f"{article.get('title', '')}\n{article.get('summary', '')}\n{' '.join(article.get('key_points', []))}"
+        yield f"article:{article.get('id')}", text, {
+            "source": "article",
+            "ref": article.get("id"),
+            "title": article.get("title", ""),
+            "date": article.get("date"),
+        }
+
+
+def _iter_reports(path: str):
+    for report in _read_json(path).get("quarterly_reports", []):
+        ticker = report.get("ticker", "")
+        quarter = report.get("quarter", "")
+        text = "\n".join([
+            f"{report.get('company', '')} {ticker} {quarter}",
+            *report.get("highlights", []),
+            *report.get("concerns", []),
+        ])
+        yield f"report:{ticker}:{quarter}", text, {
+            "source": "report",
+            "ref": ticker,
+            "title": f"{report.get('company', ticker)} - {quarter}",
+            "date": report.get("date"),
+        }
+
+
+def _iter_partner_memory(path: str):
+    memory = _read_json(path)
+    partner = memory.get("partner_name") or Path(path).stem.replace("_", " ")
+    for conv in memory.get("conversations", []):
+        timestamp = conv.get("timestamp", "")
+        text = f"{conv.get('user_message', '')}\n{conv.get('ai_response', '')}"
+        yield f"memory:{Path(path).stem}:{timestamp}", text, {
+            "source": "memory",
+            "partner": partner,
+            "date": timestamp,
+            "user_message": conv.get("user_message", "")[:PREVIEW_CHARS],
+        }
+
+
+def _iter_autonomous(path: str):
+    from conversation_store import ConversationStore
+
+    for conv in ConversationStore(os.path.dirname(path), legacy_file=None).iter_conversations():
+        for i, msg in enumerate(conv.get("messages", [])):
+            number = msg.get("message_number", i + 1)
+            yield f"autonomous:{conv.get('id')}:{number}", msg.get("message", ""), {
+                "source": "autonomous",
+                "partner": msg.get("partner"),
+                "ref": conv.get("id"),
+                "title": conv.get("topic_name", ""),
+                "date": msg.get("timestamp") or conv.get("date"),
+            }
+
+
+# Singleton instance
+_index_instance = None
+_index_lock = threading.Lock()
+
+def get_semantic_index(auto_sync: bool = True) -> SemanticIndex:
+    """
+    Zwróć singleton indeksu semantycznego.
+
+    Przy auto_sync=True przed zwróceniem dołącza nowe dokumenty
+    (koszt ~0 gdy pliki źródłowe się nie zmieniły).
+    """
+    global _index_instance
+    with _index_lock:
+        if _index_instance is None:
+            _index_instance = SemanticIndex()
+
+        if auto_sync and _index_instance.sync():
+            _index_instance.save()
+
+    return _index_instance
+
+
+if __name__ == "__main__":
+    # Test / pełna przebudowa
+    index = SemanticIndex()
+    added = index.sync(force=True)
+    index.save()
+    print(f"📊 {index.get_stats()}")
+
+    start = time.time()
+    results = index.search("ryzyko koncentracji w technologii", k=5)
+    print(f"\n🔎 Top-5 ({(time.time() - start) * 1000:.1f} ms):")
+    for r in results:
+        print(f"   {r['score']:.3f} [{r['source']}] {r.get('title') or r.get('partner')}: {r['preview'][:80]}")
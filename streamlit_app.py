@@ -4,13 +4,16 @@ Interaktywny dashboard do zarządzania portfelem inwestycyjnym
 """
 
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 import pandas as pd
 import plotly.graph_objects as go
 from datetime import datetime, timedelta, date
 import json
 import os
 from pathlib import Path
+from contextlib import nullcontext
 import hashlib
+import time
 
 # Import systemu persystencji
 try:
@@ -33,6 +36,15 @@ NBP_API_URL = "https://api.nbp.pl/api/exchangerates/rates/a/usd/?format=json"
 TRADING212_CACHE_FILE = "trading212_cache.json"
 TRADING212_CACHE_HOURS = 24  # Cache na 24 godziny (aktualizowany przez GitHub Actions co 6h)
 
+# Pliki źródłowe wyników cache'owanych w st.cache_data - zmiana zawartości = przeliczenie
+PORTFOLIO_SOURCE_FILES = (TRADING212_CACHE_FILE, "krypto.json", "kredyty.json", "cele.json", "wyplaty.json")
+KNOWLEDGE_SOURCE_FILES = ("knowledge_base/*.json",)
+MARKET_DATA_TTL = 24 * 3600  # Dane dywidendowe z yfinance (zewnętrzne - tu TTL ma sens)
+DASHBOARD_SOURCE_FILES = PORTFOLIO_SOURCE_FILES + ("portfolio_history.json", "wydatki.json")
+DASHBOARD_METRICS_TTL = 3600  # Delty liczone względem "teraz minus 7 dni" - odśwież co godzinę
+AUTONOMOUS_PAGE_SIZE = 10  # Rozmów na stronę w Historii Rozmów
+WEEKLY_REPORTS_PAGE_SIZE = 5  # Raportów tygodniowych na stronę w Portfolio Co-Pilot
+
 # === HELPER FUNCTIONS ===
 def get_total_emergency_fund(cele_data: dict = None, usd_pln_rate: float = None) -> float:
     """
@@ -58,26 +70,14 @@ def get_total_emergency_fund(cele_data: dict = None, usd_pln_rate: float = None)
     # Rezerwa z cele.json
     rezerwa_pln = float(cele_data.get('Rezerwa_gotowkowa_obecna_PLN', 0))
     
-    # Cash z Trading212
-    cash_usd = 0
+    # Cash z Trading212 (model pobierze kurs NBP jeśli nie podano)
     try:
-        with open(TRADING212_CACHE_FILE, 'r', encoding='utf-8') as f:
-            t212_data = json.load(f)
-            cash_usd = float(t212_data.get('data', {}).get('account', {}).get('free', 0))
-    except:
-        pass
-    
-    # Kurs USD/PLN
-    if usd_pln_rate is None:
-        try:
-            import requests
-            response = requests.get(NBP_API_URL, timeout=5)
-            if response.status_code == 200:
-                usd_pln_rate = response.json()['rates'][0]['mid']
-            else:
-                usd_pln_rate = DEFAULT_USD_PLN_RATE
-        except:
-            usd_pln_rate = DEFAULT_USD_PLN_RATE
+        model = get_portfolio_model(usd_pln_rate)
+        cash_usd = model.cash_usd
+        usd_pln_rate = model.usd_pln
+    except Exception:
+        cash_usd = 0
+        usd_pln_rate = usd_pln_rate or DEFAULT_USD_PLN_RATE
     
     # Przelicz cash na PLN i dodaj
     cash_pln = cash_usd * usd_pln_rate
@@ -167,6 +167,37 @@ from email_notifier import get_conversation_notifier
 # Consultation System (dla Fazy 2D)
 from consultation_system import get_consultation_manager
 
+# Prompt Budget (limit tokenów i kompresja kontekstu partnerów)
+from prompt_budget import (
+    PromptBuilder, DEFAULT_PROMPT_BUDGET, get_memory_digest, format_memory_digest,
+    compress_council_responses
+)
+
+# Response Cache (powtarzane pytania bez płatnych wywołań)
+from response_cache import get_response_cache, make_cache_key, portfolio_state_hash, is_cache_disabled
+
+# LLM Streaming (odpowiedzi partnerów fragment po fragmencie, pomiar TTFT)
+from llm_streaming import CLAUDE_MODEL, TimedStream, stream_gemini, stream_claude, stream_openai
+
+# Kanoniczny model portfela (wspólny dla UI, snapshotów, audytu i insightu)
+from portfolio_model import PortfolioModel, get_portfolio_model, get_usd_pln_rate
+
+# Sygnatury plików źródłowych (unieważnianie cache po zawartości zamiast TTL)
+from file_dependencies import signature_key
+
+# Rejestr czasów gorących ścieżek (strona diagnostyki w Ustawieniach)
+from perf_registry import get_timing_registry, timed, span as perf_span, format_tree
+
+# Słowa kluczowe heurystyk Rady skompilowane do jednego automatu (jeden skan na tekst)
+from keyword_matcher import get_council_matcher
+
+# Semantic Index (przywoływanie starszych rozmów i artykułów)
+try:
+    from semantic_index import get_semantic_index
+    SEMANTIC_INDEX_OK = True
+except ImportError:
+    SEMANTIC_INDEX_OK = False
+
 # Folder dla pamięci długoterminowej
 MEMORY_FOLDER = Path("partner_memories")
 MEMORY_FOLDER.mkdir(exist_ok=True)
@@ -186,14 +217,17 @@ try:
     
     from risk_analytics import RiskAnalytics, PortfolioHistory
     from animated_timeline import AnimatedTimeline
-    from excel_reporter import ExcelReportGenerator, generate_full_report
+    from excel_reporter import ExcelReportGenerator, generate_streaming_report
     
     if not st.session_state.app_loaded:
         status_text.text("🧠 Inicjalizuję pamięć AI partnerów...")
         progress_bar.progress(80)
     
     import persona_memory_manager as pmm
-    from persona_context_builder import build_enhanced_context, get_emotional_modifier, load_persona_memory
+    from persona_context_builder import (
+        build_enhanced_context, get_emotional_modifier, load_persona_memory, PersonaMemorySession,
+        persona_memory_lock
+    )
     from crypto_portfolio_manager import CryptoPortfolioManager
     
     # Nexus AI Engine
@@ -293,16 +327,8 @@ def wczytaj_cele():
         return CELE_DOMYSLNE
 
 def pobierz_kurs_usd_pln():
-    """Pobiera aktualny kurs USD/PLN z API NBP."""
-    try:
-        import requests
-        response = requests.get(NBP_API_URL, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        kurs = data['rates'][0]['mid']
-        return kurs
-    except Exception as e:
-        return 4.00  # Kurs awaryjny
+    """Pobiera aktualny kurs USD/PLN z API NBP (zapamiętywany w procesie na godzinę)."""
+    return get_usd_pln_rate(default=4.00)  # Kurs awaryjny
 
 # === TRADING212 CACHE FUNCTIONS ===
 
@@ -329,74 +355,17 @@ def wczytaj_t212_cache():
         return None
 
 def parsuj_dane_t212_do_portfela(dane_t212, kurs_usd_pln, cele):
-    """Parsuje dane z Trading212 API do formatu PORTFEL_AKCJI."""
+    """Parsuje dane z Trading212 API do formatu PORTFEL_AKCJI (przez PortfolioModel)."""
     if not dane_t212:
         return None
     
     try:
-        positions = dane_t212.get("positions", [])
-        account = dane_t212.get("account", {})
-        
-        suma_pln = 0
-        suma_usd = 0
-        pozycje_szczegoly = {}
-        liczba_pozycji_rdzennych = 0
-        liczba_pozycji_w_pie = 0
-        
-        for pos in positions:
-            ticker = pos.get("ticker", "")
-            quantity = pos.get("quantity", 0)
-            current_price = pos.get("currentPrice", 0)
-            avg_price = pos.get("averagePrice", 0)
-            ppl = pos.get("ppl", 0)  # Profit/Loss w walucie
-            
-            wartosc_usd = quantity * current_price
-            wartosc_pln = wartosc_usd * kurs_usd_pln
-            
-            suma_usd += wartosc_usd
-            suma_pln += wartosc_pln
-            
-            # Rozróżnienie Pie vs Rdzenne
-            if pos.get("frontend") == "AUTOINVEST":
-                liczba_pozycji_w_pie += 1
-            else:
-                liczba_pozycji_rdzennych += 1
-            
-            pozycje_szczegoly[ticker] = {
-                "ticker": ticker,
-                "ilosc": quantity,  # Zmieniono z quantity na ilosc dla kompatybilności
-                "quantity": quantity,
-                "current_price": current_price,
-                "avg_price": avg_price,
-                "value_usd": round(wartosc_usd, 2),
-                "value_pln": round(wartosc_pln, 2),
-                "ppl": ppl,
-                "frontend": pos.get("frontend", "")
-            }
-        
-        # Saldo gotówkowe
-        cash_free = account.get("free", 0)
-        
-        # Dywidendy z Trading212 (jeśli dostępne)
-        dividends = dane_t212.get("dividends", [])
-        
-        return {
-            "Suma_PLN": round(suma_pln, 2),
-            "Suma_USD": round(suma_usd, 2),
-            "Liczba_pozycji_calkowita": len(positions),
-            "Liczba_pozycji_rdzennych": liczba_pozycji_rdzennych,
-            "Liczba_pozycji_w_pie": liczba_pozycji_w_pie,
-            "Cash_free_USD": round(cash_free, 2),
-            "Zrodlo": "Trading212 Cache",
-            "Pozycje_szczegoly": pozycje_szczegoly,
-            "pozycje": pozycje_szczegoly,  # Alias dla kompatybilności
-            "Dane_rynkowe": {},  # Będzie wypełnione w normalize_stan_spolki
-            "dywidendy": dividends  # Historia dywidend z Trading212
-        }
+        return PortfolioModel.from_t212(dane_t212, kurs_usd_pln).to_portfel_akcji()
     except Exception as e:
         print(f"❌ Błąd parsowania danych T212: {e}")
         return None
 
+@timed()
 def pobierz_stan_spolki(cele):
     """
     Pobiera podstawowe dane portfela (uproszczona wersja - bez Trading212/Google Sheets).
@@ -408,38 +377,18 @@ def pobierz_stan_spolki(cele):
         kurs_usd = pobierz_kurs_usd_pln()
         stan_spolki["Kurs_USD_PLN"] = kurs_usd
         
-        # KRYPTO - Z LOKALNEGO PLIKU
+        # KRYPTO + KREDYTY + AKCJE - jeden wspólny model z lokalnych plików
         try:
-            with open('krypto.json', 'r', encoding='utf-8') as f:
-                krypto_data = json.load(f)
-                krypto_lista = krypto_data.get('krypto', [])
-            
-            suma_krypto_usd = sum(k['ilosc'] * k['cena_zakupu_usd'] for k in krypto_lista)
-            
-            stan_spolki["PORTFEL_KRYPTO"] = {
-                "Suma_USD": round(suma_krypto_usd, 2),
-                "Suma_PLN": round(suma_krypto_usd * kurs_usd, 2),
-                "Liczba_pozycji": len(krypto_lista),
-                "pozycje": krypto_lista
-            }
-        except:
-            stan_spolki["PORTFEL_KRYPTO"] = {"Suma_USD": 0, "Suma_PLN": 0, "Liczba_pozycji": 0, "pozycje": []}
+            model = get_portfolio_model(kurs_usd)
+        except Exception as e:
+            print(f"⚠️ Błąd budowania modelu portfela: {e}")
+            model = None
         
-        # KREDYTY - Z LOKALNEGO PLIKU
-        try:
-            with open('kredyty.json', 'r', encoding='utf-8') as f:
-                kredyty_data = json.load(f)
-                kredyty_lista = kredyty_data.get('kredyty', [])
-            
-            suma_dlugu_pln = sum(k['kwota_poczatkowa'] - k.get('splacono', 0) for k in kredyty_lista)
-            suma_rat_pln = sum(k.get('rata_miesieczna', 0) for k in kredyty_lista)
-            
-            stan_spolki["ZOBOWIAZANIA"] = {
-                "Suma_dlugu_PLN": round(suma_dlugu_pln, 2),
-                "Suma_rat_PLN": round(suma_rat_pln, 2),
-                "Liczba_kredytow": len(kredyty_lista)
-            }
-        except:
+        if model is not None:
+            stan_spolki["PORTFEL_KRYPTO"] = model.to_portfel_krypto()
+            stan_spolki["ZOBOWIAZANIA"] = model.to_zobowiazania()
+        else:
+            stan_spolki["PORTFEL_KRYPTO"] = {"Suma_USD": 0, "Suma_PLN": 0, "Liczba_pozycji": 0, "pozycje": []}
             stan_spolki["ZOBOWIAZANIA"] = {"Suma_dlugu_PLN": 0, "Suma_rat_PLN": 0, "Liczba_kredytow": 0}
         
         # WYPŁATY - Z LOKALNEGO PLIKU
@@ -459,35 +408,8 @@ def pobierz_stan_spolki(cele):
             stan_spolki["PRZYCHODY_I_WYDATKI"] = {"wyplata": 0, "Liczba_wyplat": 0, "wyplaty": []}
         
         # AKCJE - Z TRADING212 CACHE (aktualizowany przez GitHub Actions co 6h)
-        try:
-            cache = wczytaj_t212_cache()
-            if cache:
-                dane_t212 = cache.get("data")
-                portfel_akcji = parsuj_dane_t212_do_portfela(dane_t212, kurs_usd, cele)
-                if portfel_akcji:
-                    stan_spolki["PORTFEL_AKCJI"] = portfel_akcji
-                    print(f"✓ Dane akcji z Trading212 cache: {portfel_akcji['Suma_PLN']:.2f} PLN")
-                else:
-                    # Fallback jeśli parsowanie nie powiodło się
-                    stan_spolki["PORTFEL_AKCJI"] = {
-                        "Suma_PLN": 0,
-                        "Suma_USD": 0,
-                        "Liczba_pozycji": 0,
-                        "Zrodlo": "Trading212 Cache (parse error)",
-                        "Dane_rynkowe": {}
-                    }
-            else:
-                # Cache nie istnieje lub wygasł
-                print("⚠ Trading212 cache niedostępny - używam GitHub Actions dla aktualizacji")
-                stan_spolki["PORTFEL_AKCJI"] = {
-                    "Suma_PLN": 0,
-                    "Suma_USD": 0,
-                    "Liczba_pozycji": 0,
-                    "Zrodlo": "Trading212 Cache (outdated)",
-                    "Dane_rynkowe": {}
-                }
-        except Exception as e:
-            print(f"⚠️ Błąd ładowania Trading212 cache: {e}")
+        age_hours = model.t212_age_hours() if model is not None else None
+        if model is None:
             stan_spolki["PORTFEL_AKCJI"] = {
                 "Suma_PLN": 0,
                 "Suma_USD": 0,
@@ -495,81 +417,142 @@ def pobierz_stan_spolki(cele):
                 "Zrodlo": "Trading212 Cache (error)",
                 "Dane_rynkowe": {}
             }
+        elif age_hours is not None and age_hours < TRADING212_CACHE_HOURS:
+            print(f"✓ Używam cache Trading212 (wiek: {age_hours:.1f}h)")
+            portfel_akcji = model.to_portfel_akcji()
+            stan_spolki["PORTFEL_AKCJI"] = portfel_akcji
+            print(f"✓ Dane akcji z Trading212 cache: {portfel_akcji['Suma_PLN']:.2f} PLN")
+        else:
+            # Cache nie istnieje lub wygasł
+            print("⚠ Trading212 cache niedostępny - używam GitHub Actions dla aktualizacji")
+            stan_spolki["PORTFEL_AKCJI"] = {
+                "Suma_PLN": 0,
+                "Suma_USD": 0,
+                "Liczba_pozycji": 0,
+                "Zrodlo": "Trading212 Cache (outdated)",
+                "Dane_rynkowe": {}
+            }
         
     except Exception as e:
         st.error(f"Błąd pobierania stanu spółki: {e}")
     
     return stan_spolki
 
+def get_api_name_for_partner(persona_name):
+    """Nazwa API w APIUsageTracker dla modelu danego partnera"""
+    model_engine = PERSONAS.get(persona_name, {}).get('model_engine', 'gemini')
+    if model_engine == 'claude':
+        return "claude"
+    if model_engine.startswith('openrouter'):
+        return "openai"
+    return "gemini_nexus" if persona_name == "Nexus" else "gemini"
+
+def is_cacheable_response(response_text):
+    """Komunikaty o błędach i blokadach nie trafiają do cache odpowiedzi"""
+    return bool(response_text) and not response_text.startswith(
+        ("[BŁĄD", "[Błąd", "[ODPOWIEDŹ ZABLOKOWANA")
+    )
+
+# Mapowanie model_engine na konkretny model OpenRouter (darmowe)
+OPENROUTER_MODELS = {
+    'openrouter_llama': "meta-llama/llama-4-maverick:free",
+    'openrouter_mistral': "mistralai/mistral-7b-instruct:free",
+    'openrouter_mixtral': "meta-llama/llama-4-scout:free",
+    'openrouter_glm': "z-ai/glm-4.5-air:free",
+}
+DEFAULT_OPENROUTER_MODEL = "mistralai/mistral-7b-instruct:free"
+# CRITICAL: MUST use gemini-2.5-pro (NOT gemini-1.5-flash - deprecated!)
+# DO NOT CHANGE THIS MODEL NAME
+GEMINI_PARTNER_MODEL = 'gemini-2.5-pro'
+
+def resolve_partner_model(persona_name):
+    """
+    Dostawca, model i klucz API partnera (wspólne dla generuj_odpowiedz_ai i wersji strumieniowej)
+    
+    Returns:
+        (provider, model_name, api_key, błąd) - provider: 'claude' / 'openrouter' / 'gemini',
+        błąd to komunikat "[BŁĄD: ...]" gdy brak klucza (inaczej None)
+    """
+    model_engine = PERSONAS.get(persona_name, {}).get('model_engine', 'gemini')
+    
+    # === CLAUDE (ANTHROPIC) ===
+    if model_engine == 'claude':
+        api_key = st.secrets.get("ANTHROPIC_API_KEY", os.getenv("ANTHROPIC_API_KEY"))
+        error = None if api_key else "[BŁĄD: Brak klucza ANTHROPIC_API_KEY - fallback do Gemini]"
+        return 'claude', CLAUDE_MODEL, api_key, error
+    
+    # === OPENROUTER MODELS (darmowe) ===
+    if model_engine.startswith('openrouter'):
+        api_key = st.secrets.get("OPENROUTER_API_KEY", os.getenv("OPENROUTER_API_KEY"))
+        error = None if api_key else "[BŁĄD: Brak klucza OPENROUTER_API_KEY - fallback do Gemini]"
+        return 'openrouter', OPENROUTER_MODELS.get(model_engine, DEFAULT_OPENROUTER_MODEL), api_key, error
+    
+    # === GEMINI PRO (domyślny) ===
+    # Nexus ma osobne konto, inni partnerzy wspólne
+    api_key = None
+    if persona_name == "Nexus":
+        api_key = st.secrets.get("GOOGLE_API_KEY_NEXUS", os.getenv("GOOGLE_API_KEY_NEXUS"))
+    if not api_key:
+        # Fallback na główny klucz jeśli Nexus nie ma osobnego
+        api_key = st.secrets.get("GOOGLE_API_KEY", os.getenv("GOOGLE_API_KEY"))
+    error = None if api_key else "[BŁĄD: Brak klucza GOOGLE_API_KEY]"
+    return 'gemini', GEMINI_PARTNER_MODEL, api_key, error
+
 def generuj_odpowiedz_ai(persona_name, prompt):
     """
     Kieruje zapytanie do odpowiedniego modelu AI na podstawie konfiguracji partnera.
     Obsługuje: Gemini Pro, OpenRouter (Mixtral/Llama/inne), Claude (Anthropic)
     """
     try:
-        # Pobierz konfigurację partnera
-        persona_config = PERSONAS.get(persona_name, {})
-        model_engine = persona_config.get('model_engine', 'gemini')
+        provider, model_name, api_key, error = resolve_partner_model(persona_name)
+        if error:
+            return error
         
         # Track API call
         tracker = get_tracker()
         
         # === CLAUDE (ANTHROPIC) ===
-        if model_engine == 'claude':
+        if provider == 'claude':
             import anthropic
             
-            # Pobierz klucz Anthropic
-            anthropic_key = st.secrets.get("ANTHROPIC_API_KEY", os.getenv("ANTHROPIC_API_KEY"))
-            if not anthropic_key:
-                return "[BŁĄD: Brak klucza ANTHROPIC_API_KEY - fallback do Gemini]"
-            
             # Inicjalizuj Claude client
-            client = anthropic.Anthropic(api_key=anthropic_key)
-            
-            response = client.messages.create(
-                model="claude-3-5-sonnet-20241022",  # Najnowszy Claude
-                max_tokens=2048,
-                messages=[{"role": "user", "content": prompt}]
-            )
+            client = anthropic.Anthropic(api_key=api_key)
+            
+            call_start = time.perf_counter()
+            with perf_span("llm.claude"):
+                response = client.messages.create(
+                    model=model_name,
+                    max_tokens=2048,
+                    messages=[{"role": "user", "content": prompt}]
+                )
             
             # Track API call
-            tracker.track_call("claude", is_autonomous=False)
+            tracker.track_call("claude", is_autonomous=False,
+                               latency_ms=(time.perf_counter() - call_start) * 1000, partner=persona_name)
             
             return response.content[0].text
         
         # === OPENROUTER MODELS (darmowe) ===
-        elif model_engine.startswith('openrouter'):
+        elif provider == 'openrouter':
             from openai import OpenAI
             
-            # Pobierz klucz OpenRouter
-            openrouter_key = st.secrets.get("OPENROUTER_API_KEY", os.getenv("OPENROUTER_API_KEY"))
-            if not openrouter_key:
-                return "[BŁĄD: Brak klucza OPENROUTER_API_KEY - fallback do Gemini]"
-            
-            # Mapowanie model_engine na konkretny model OpenRouter
-            model_map = {
-                'openrouter_llama': "meta-llama/llama-4-maverick:free",
-                'openrouter_mistral': "mistralai/mistral-7b-instruct:free",
-                'openrouter_mixtral': "meta-llama/llama-4-scout:free",
-                'openrouter_glm': "z-ai/glm-4.5-air:free",
-            }
-            
-            model_name = model_map.get(model_engine, "mistralai/mistral-7b-instruct:free")
-            
             # Inicjalizuj OpenRouter client
             client = OpenAI(
-                api_key=openrouter_key,
+                api_key=api_key,
                 base_url="https://openrouter.ai/api/v1"
             )
             
-            response = client.chat.completions.create(
-                model=model_name,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7
-            )
+            call_start = time.perf_counter()
+            with perf_span("llm.openai"):
+                response = client.chat.completions.create(
+                    model=model_name,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.7
+                )
             
             # Track API call (OpenRouter używa OpenAI compatible API)
-            tracker.track_call("openai", is_autonomous=False)
+            tracker.track_call("openai", is_autonomous=False,
+                               latency_ms=(time.perf_counter() - call_start) * 1000, partner=persona_name)
             
             return response.choices[0].message.content
         
@@ -577,30 +560,16 @@ def generuj_odpowiedz_ai(persona_name, prompt):
         else:
             import google.generativeai as genai
             
-            # Wybierz klucz API - Nexus ma osobne konto, inni partnerzy wspólne
-            if persona_name == "Nexus":
-                api_key = st.secrets.get("GOOGLE_API_KEY_NEXUS", os.getenv("GOOGLE_API_KEY_NEXUS"))
-                if not api_key:
-                    # Fallback na główny klucz jeśli Nexus nie ma osobnego
-                    api_key = st.secrets.get("GOOGLE_API_KEY", os.getenv("GOOGLE_API_KEY"))
-            else:
-                api_key = st.secrets.get("GOOGLE_API_KEY", os.getenv("GOOGLE_API_KEY"))
-            
-            if not api_key:
-                return "[BŁĄD: Brak klucza GOOGLE_API_KEY]"
-            
             genai.configure(api_key=api_key)
-            # CRITICAL: MUST use gemini-2.5-pro (NOT gemini-1.5-flash - deprecated!)
-            # DO NOT CHANGE THIS MODEL NAME
-            model = genai.GenerativeModel('gemini-2.5-pro')
+            model = genai.GenerativeModel(model_name)
             
-            response = model.generate_content(prompt)
+            call_start = time.perf_counter()
+            with perf_span("llm.gemini_nexus" if persona_name == "Nexus" else "llm.gemini"):
+                response = model.generate_content(prompt)
             
             # Track API call - różne countery dla Nexus vs inne
-            if persona_name == "Nexus":
-                tracker.track_call("gemini_nexus", is_autonomous=False)
-            else:
-                tracker.track_call("gemini", is_autonomous=False)
+            tracker.track_call("gemini_nexus" if persona_name == "Nexus" else "gemini", is_autonomous=False,
+                               latency_ms=(time.perf_counter() - call_start) * 1000, partner=persona_name)
             
             if not response.parts:
                 return "[ODPOWIEDŹ ZABLOKOWANA PRZEZ FILTRY BEZPIECZEŃSTWA GEMINI]"
@@ -610,6 +579,50 @@ def generuj_odpowiedz_ai(persona_name, prompt):
     except Exception as e:
         return f"[BŁĄD API: {str(e)}]"
 
+def generuj_odpowiedz_ai_stream(persona_name, prompt, on_complete=None):
+    """
+    Strumieniowa wersja generuj_odpowiedz_ai - zwraca TimedStream z fragmentami
+    odpowiedzi (do st.write_stream). TTFT zapisywany jest per dostawca,
+    a on_complete(pełny_tekst) wywoływany po zakończeniu strumienia.
+    """
+    api_name = get_api_name_for_partner(persona_name)
+
+    def error_stream(message):
+        return TimedStream([message], api_name, on_complete=on_complete, track_latency=False)
+
+    try:
+        provider, model_name, api_key, error = resolve_partner_model(persona_name)
+        if error:
+            return error_stream(error)
+
+        tracker = get_tracker()
+
+        # === CLAUDE (ANTHROPIC) ===
+        if provider == 'claude':
+            import anthropic
+
+            chunks = stream_claude(anthropic.Anthropic(api_key=api_key), prompt, model=model_name)
+
+        # === OPENROUTER MODELS ===
+        elif provider == 'openrouter':
+            from openai import OpenAI
+
+            client = OpenAI(api_key=api_key, base_url="https://openrouter.ai/api/v1")
+            chunks = stream_openai(client, prompt, model=model_name)
+
+        # === GEMINI PRO (domyślny) ===
+        else:
+            import google.generativeai as genai
+
+            genai.configure(api_key=api_key)
+            chunks = stream_gemini(genai.GenerativeModel(model_name), prompt)
+
+        tracker.track_call(api_name, is_autonomous=False, partner=persona_name)
+        return TimedStream(chunks, api_name, on_complete=on_complete)
+
+    except Exception as e:
+        return error_stream(f"[BŁĄD API: {str(e)}]")
+
 def load_personas_from_memory_json(filename="persona_memory.json"):
     """
     Ładuje PERSONAS z persona_memory.json.
@@ -781,8 +794,29 @@ def zapisz_wagi_glosu_do_kodeksu(wagi):
         return False
 
 # Funkcje pomocnicze do integracji AI
-def send_to_ai_partner(partner_name, message, stan_spolki=None, cele=None, tryb_odpowiedzi="normalny"):
-    """Wysyła wiadomość do pojedynczego Partnera AI z pełnym kontekstem jak w gra_rpg.py"""
+def send_to_ai_partner(partner_name, message, stan_spolki=None, cele=None, tryb_odpowiedzi="normalny",
+                       council_context=None, prompt_budget=DEFAULT_PROMPT_BUDGET, bypass_cache=False,
+                       stream=False, persona_session=None):
+    """
+    Wysyła wiadomość do pojedynczego Partnera AI z pełnym kontekstem jak w gra_rpg.py
+    
+    Args:
+        council_context: Skompresowany transkrypt spotkania rady (wstawiany przed pytaniem)
+        persona_session: PersonaMemorySession spotkania - pamięć person czytana z niej,
+                         licznik sesji zapisywany przy jej commit() (bez zapisu na partnera)
+        prompt_budget: Budżet tokenów promptu - sekcje o niskim priorytecie są przycinane
+        bypass_cache: True = wymuś świeżą odpowiedź (pomija cache odpowiedzi)
+        stream: True = zwróć TimedStream zamiast tekstu (do st.write_stream);
+                zapis do pamięci i cache następuje po zakończeniu strumienia
+    
+    Returns:
+        (tekst odpowiedzi lub TimedStream, relevant_knowledge)
+    """
+    def as_result(text):
+        if stream:
+            return TimedStream([text], get_api_name_for_partner(partner_name), track_latency=False)
+        return text
+    
     try:
         # ==================== NEXUS SPECIAL HANDLING ====================
         if partner_name == "Nexus" and NEXUS_OK:
@@ -813,11 +847,20 @@ def send_to_ai_partner(partner_name, message, stan_spolki=None, cele=None, tryb_
                     'mode': tryb_odpowiedzi
                 }
                 
+                if stream:
+                    nexus_stream = nexus.stream_response(message, context=context, bypass_cache=bypass_cache)
+                    if nexus_stream is not None:
+                        if nexus_stream.cached:
+                            get_tracker().track_cache_hit("gemini_nexus", is_autonomous=False)
+                        return nexus_stream, []
+                
                 # Generate Nexus response
-                result = nexus.generate_response(message, context=context)
+                result = nexus.generate_response(message, context=context, bypass_cache=bypass_cache)
                 
                 if result and result.get('success'):
-                    return result.get('response', 'No response'), []
+                    if result.get('metadata', {}).get('cached'):
+                        get_tracker().track_cache_hit("gemini_nexus", is_autonomous=False)
+                    return as_result(result.get('response', 'No response')), []
                 else:
                     # Fallback to standard if Nexus fails
                     st.warning("⚠️ Nexus response failed, using standard AI")
@@ -826,11 +869,28 @@ def send_to_ai_partner(partner_name, message, stan_spolki=None, cele=None, tryb_
         # ================================================================
         
         if not IMPORTS_OK:
-            return "[Błąd importu modułów]", []
+            return as_result("[Błąd importu modułów]"), []
         
         # Pobierz konfigurację partnera
         persona_config = PERSONAS.get(partner_name, {})
         
+        # === CACHE ODPOWIEDZI (przed budową kosztownego kontekstu) ===
+        response_cache = get_response_cache()
+        cache_key = make_cache_key(
+            partner_name,
+            persona_config.get('model_engine', 'gemini'),
+            f"{tryb_odpowiedzi}\n{council_context or ''}\n{message}",
+            portfolio_state_hash(stan_spolki, cele)
+        )
+        if not bypass_cache and not is_cache_disabled():
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                get_tracker().track_cache_hit(get_api_name_for_partner(partner_name), is_autonomous=False)
+                if stream:
+                    return (TimedStream([cached["response"]["text"]], get_api_name_for_partner(partner_name), cached=True),
+                            cached["response"]["knowledge"])
+                return cached["response"]["text"], cached["response"]["knowledge"]
+        
         # === KODEKS SPÓŁKI ===
         kodeks = ""
         if os.path.exists('kodeks_spolki.txt'):
@@ -948,7 +1008,7 @@ TRYB ODPOWIEDZI: NORMALNY
 """
         
         # === PAMIĘĆ DŁUGOTERMINOWA (20 ostatnich rozmów dla lepszego kontekstu) ===
-        memory_context = load_memory_context(partner_name, limit=20)
+        memory_context = load_memory_context(partner_name, limit=20, query=message)
         memory_section = memory_context if memory_context else ""
         
         # === PAMIĘĆ PERSONY (track record i ewolucja) ===
@@ -958,13 +1018,17 @@ TRYB ODPOWIEDZI: NORMALNY
             try:
                 if MEMORY_V2:
                     # v2.0: Rozbudowany kontekst z emocjami, relacjami, voting weights
-                    persona_memory_section = build_enhanced_context(partner_name, limit=5)
-                    emotional_hint = get_emotional_modifier(partner_name)
+                    session_memory = persona_session.memory if persona_session else None
+                    persona_memory_section = build_enhanced_context(partner_name, limit=5, memory=session_memory)
+                    emotional_hint = get_emotional_modifier(partner_name, memory=session_memory)
                 else:
                     # v1.0: Podstawowy kontekst
                     persona_memory_section = pmm.get_persona_context(partner_name)
                 
-                pmm.increment_session(partner_name)
+                if persona_session is not None:
+                    persona_session.increment_session(partner_name)
+                else:
+                    pmm.increment_session(partner_name)
             except KeyError as e:
                 # Konkretny błąd KeyError - pokazujemy jakie pole brakuje
                 st.warning(f"⚠️ Błąd wczytywania pamięci persony (brak pola): {e}")
@@ -1013,29 +1077,21 @@ TRYB ODPOWIEDZI: NORMALNY
             # Jeśli news_aggregator nie działa, pomijamy tę sekcję
             pass
         
-        # === BUDOWA PROMPTU (JAK W GRA_RPG.PY) ===
-        prompt = f"""{persona_config.get('system_instruction', '')}
-
-KODEKS SPÓŁKI "HORYZONT PARTNERÓW":
-    {kodeks}
-
----
+        # === BUDOWA PROMPTU (JAK W GRA_RPG.PY) - w budżecie tokenów ===
+        builder = PromptBuilder(prompt_budget)
+        builder.add("system", persona_config.get('system_instruction', ''), priority=100)
+        builder.add("kodeks", f"""KODEKS SPÓŁKI "HORYZONT PARTNERÓW":
+    {kodeks}""", priority=90, min_tokens=600)
+        builder.add("cel", f"""---
 Twoim tajnym celem jest: {persona_config.get('ukryty_cel', 'Wspieranie rozwoju spółki')}
----
-
-{persona_memory_section}
-
-{emotional_hint}
-
-{memory_section}
-
-{mood_modifier}
-
-{alerts_section}
-
-{knowledge_section}
-
-AKTUALNY STAN FINANSOWY SPÓŁKI:
+---""", priority=100)
+        builder.add("persona_memory", persona_memory_section, priority=40, min_tokens=200)
+        builder.add("emotions", emotional_hint, priority=60)
+        builder.add("memory", memory_section, priority=30, min_tokens=300)
+        builder.add("mood", mood_modifier, priority=60)
+        builder.add("alerts", alerts_section, priority=70, min_tokens=100)
+        builder.add("knowledge", knowledge_section, priority=50, min_tokens=150)
+        builder.add("finances", f"""AKTUALNY STAN FINANSOWY SPÓŁKI:
 
 💰 PODSUMOWANIE:
     - Wartość netto: {akcje_val + krypto_val + rezerwa_val - dlugi_val:.2f} PLN (Akcje + Krypto + Rezerwa - Zobowiązania)
@@ -1043,33 +1099,38 @@ AKTUALNY STAN FINANSOWY SPÓŁKI:
 - Krypto: {krypto_val:.2f} PLN ({stan_spolki.get('krypto', {}).get('liczba_pozycji', 0)} pozycji)
 - Rezerwa Gotówkowa: {rezerwa_val:.2f} PLN  
 - Zobowiązania: {dlugi_val:.2f} PLN
-- Dostępne na inwestycje: {dostepne:.2f} PLN/mies.
-
-{szczegoly_top10}
-
-{dane_rynkowe_str}
-
-{kontekst_skali}
-
-{snapshot_section}
-
-{news_section}
-
----
+- Dostępne na inwestycje: {dostepne:.2f} PLN/mies.""", priority=100)
+        builder.add("top10", szczegoly_top10, priority=80, min_tokens=150)
+        builder.add("market_data", dane_rynkowe_str, priority=45, min_tokens=80)
+        builder.add("scale", kontekst_skali, priority=85)
+        builder.add("snapshots", snapshot_section, priority=35, min_tokens=80)
+        builder.add("news", news_section, priority=25, min_tokens=100)
+        builder.add("length", f"""---
 {length_instruction}
----
-
-PYTANIE UŻYTKOWNIKA:
-    "{message}"
-
-TWOJE ZADANIE:
+---""", priority=100)
+        builder.add("council", council_context or "", priority=75, min_tokens=400)
+        builder.add("question", f'PYTANIE UŻYTKOWNIKA:\n    "{message}"', priority=100)
+        builder.add("task", """TWOJE ZADANIE:
     Odpowiedz jako członek Zarządu spółki inwestycyjnej:
 - Odwołuj się do Kodeksu gdy stosowne (np. "Zgodnie z Artykułem IV §1...")
 - Analizuj konkretne liczby z portfela
 - Ton profesjonalny ale nie przesadnie korporacyjny
 - Wykorzystaj swoją unikalną perspektywę i wiedzę
 - Realizuj swój ukryty cel w sposób subtelny
-"""
+""", priority=100)
+        prompt = builder.build(partner=partner_name, call_type="council" if council_context else "partner")
+        
+        def finalize_response(response_text):
+            # Zapisz do pamięci długoterminowej
+            save_conversation_to_memory(partner_name, message, response_text, stan_spolki)
+            
+            if is_cacheable_response(response_text):
+                response_cache.set(cache_key, {"text": response_text, "knowledge": relevant_knowledge},
+                                   {"partner": partner_name})
+        
+        # Strumień - pierwsze fragmenty od razu w UI, zapis po zakończeniu
+        if stream:
+            return generuj_odpowiedz_ai_stream(partner_name, prompt, on_complete=finalize_response), relevant_knowledge
         
         # Wywołaj AI
         response = generuj_odpowiedz_ai(partner_name, prompt)
@@ -1082,15 +1143,14 @@ TWOJE ZADANIE:
         else:
             response_text = str(response)
         
-        # Zapisz do pamięci długoterminowej
-        save_conversation_to_memory(partner_name, message, response_text, stan_spolki)
+        finalize_response(response_text)
         
         return response_text, relevant_knowledge
         
     except Exception as e:
         import traceback
         error_detail = traceback.format_exc()
-        return f"[Błąd AI: {str(e)}\n{error_detail}]", []
+        return as_result(f"[Błąd AI: {str(e)}\n{error_detail}]"), []
 
 # === ADVISOR SCORING INTEGRATION ===
 def get_current_voting_weights() -> dict:
@@ -1132,6 +1192,10 @@ def get_current_voting_weights() -> dict:
             "Changpeng Zhao (CZ)": 13.75
         }
 
+def _persona_memory_lock():
+    """Blokada zapisu persona_memory.json (wspólna z PersonaMemorySession; bez modułu pamięci - brak)"""
+    return persona_memory_lock() if MEMORY_V2 else nullcontext()
+
 def sync_weights_to_personas():
     """
     Synchronizuje wagi ze scoring system do persona_memory.json
@@ -1139,107 +1203,122 @@ def sync_weights_to_personas():
     try:
         weights = get_current_voting_weights()
         
-        if PERSISTENT_OK:
-            persona_data = load_persistent_data('persona_memory.json')
-        else:
-            with open('persona_memory.json', 'r', encoding='utf-8') as f:
-                persona_data = json.load(f)
-        
-        if not persona_data:
-            return False
-        
-        # Update voting weights
-        for advisor_name, weight in weights.items():
-            if advisor_name in persona_data:
-                if 'voting' not in persona_data[advisor_name]:
-                    persona_data[advisor_name]['voting'] = {}
-                
-                persona_data[advisor_name]['voting']['effective_weight'] = weight
-                persona_data[advisor_name]['voting']['current_weight'] = weight
-        
-        # Save back
-        if PERSISTENT_OK:
-            save_persistent_data('persona_memory.json', persona_data)
-        else:
-            with open('persona_memory.json', 'w', encoding='utf-8') as f:
-                json.dump(persona_data, f, indent=2, ensure_ascii=False)
+        # Odczyt świeżego pliku i zapis pod blokadą - bez nadpisywania zmian sesji Rady
+        with _persona_memory_lock():
+            if PERSISTENT_OK:
+                persona_data = load_persistent_data('persona_memory.json', fresh=True)
+            else:
+                with open('persona_memory.json', 'r', encoding='utf-8') as f:
+                    persona_data = json.load(f)
+            
+            if not persona_data:
+                return False
+            
+            # Update voting weights
+            for advisor_name, weight in weights.items():
+                if advisor_name in persona_data:
+                    if 'voting' not in persona_data[advisor_name]:
+                        persona_data[advisor_name]['voting'] = {}
+                    
+                    persona_data[advisor_name]['voting']['effective_weight'] = weight
+                    persona_data[advisor_name]['voting']['current_weight'] = weight
+            
+            # Save back
+            if PERSISTENT_OK:
+                save_persistent_data('persona_memory.json', persona_data)
+            else:
+                with open('persona_memory.json', 'w', encoding='utf-8') as f:
+                    json.dump(persona_data, f, indent=2, ensure_ascii=False)
         
         return True
     except Exception as e:
         st.error(f"❌ Błąd synchronizacji wag: {e}")
         return False
 
+@timed()
 def save_conversation_to_memory(partner_name, user_message, ai_response, stan_spolki=None):
     """Zapisuje rozmowę do pamięci długoterminowej partnera"""
     try:
-        # Załaduj istniejącą pamięć przez persistence system
-        if PERSISTENT_OK:
-            memory = load_persistent_data('persona_memory.json')
-            if memory is None:
-                memory = {}
-        else:
-            # Fallback - odczyt z pliku
-            memory_file = MEMORY_FOLDER / f"{partner_name.replace('/', '_').replace(' ', '_')}.json"
-            if memory_file.exists():
-                with open(memory_file, 'r', encoding='utf-8-sig') as f:
-                    memory = json.load(f)
+        # persona_memory.json: odczyt świeżego pliku i zapis pod blokadą (jak sync_weights_to_personas)
+        with _persona_memory_lock() if PERSISTENT_OK else nullcontext():
+            # Załaduj istniejącą pamięć przez persistence system
+            if PERSISTENT_OK:
+                memory = load_persistent_data('persona_memory.json', fresh=True)
+                if memory is None:
+                    memory = {}
             else:
-                memory = {}
-        
-        # Stwórz strukturę dla partnera jeśli nie istnieje
-        partner_key = partner_name.replace('/', '_').replace(' ', '_')
-        if partner_key not in memory:
-            memory[partner_key] = {
-                "partner_name": partner_name,
-                "conversations": [],
-                "statistics": {
-                    "total_messages": 0,
-                    "first_interaction": datetime.now().isoformat(),
-                    "last_interaction": None,
-                    "topics_discussed": []
-                },
-                "insights": {
-                    "user_preferences": [],
-                    "recurring_questions": [],
-                    "portfolio_changes_noted": []
+                # Fallback - odczyt z pliku
+                memory_file = MEMORY_FOLDER / f"{partner_name.replace('/', '_').replace(' ', '_')}.json"
+                if memory_file.exists():
+                    with open(memory_file, 'r', encoding='utf-8-sig') as f:
+                        memory = json.load(f)
+                else:
+                    memory = {}
+        
+            # Stwórz strukturę dla partnera jeśli nie istnieje
+            partner_key = partner_name.replace('/', '_').replace(' ', '_')
+            if partner_key not in memory:
+                memory[partner_key] = {
+                    "partner_name": partner_name,
+                    "conversations": [],
+                    "statistics": {
+                        "total_messages": 0,
+                        "first_interaction": datetime.now().isoformat(),
+                        "last_interaction": None,
+                        "topics_discussed": []
+                    },
+                    "insights": {
+                        "user_preferences": [],
+                        "recurring_questions": [],
+                        "portfolio_changes_noted": []
+                    }
                 }
-            }
         
-        # Dodaj nową rozmowę
-        conversation_entry = {
-            "timestamp": datetime.now().isoformat(),
-            "user_message": user_message,
-            "ai_response": ai_response,
-            "portfolio_snapshot": {
-                "total_value": (stan_spolki.get('akcje', {}).get('wartosc_pln', 0) + 
-                               stan_spolki.get('krypto', {}).get('wartosc_pln', 0)) if stan_spolki else 0,
-                "debt": get_suma_kredytow()  # Pobierz z kredyty.json
-            } if stan_spolki else None
-        }
+            # Dodaj nową rozmowę
+            conversation_entry = {
+                "timestamp": datetime.now().isoformat(),
+                "user_message": user_message,
+                "ai_response": ai_response,
+                "portfolio_snapshot": {
+                    "total_value": (stan_spolki.get('akcje', {}).get('wartosc_pln', 0) + 
+                                   stan_spolki.get('krypto', {}).get('wartosc_pln', 0)) if stan_spolki else 0,
+                    "debt": get_suma_kredytow()  # Pobierz z kredyty.json
+                } if stan_spolki else None
+            }
         
-        memory[partner_key]["conversations"].append(conversation_entry)
-        memory[partner_key]["statistics"]["total_messages"] += 1
-        memory[partner_key]["statistics"]["last_interaction"] = datetime.now().isoformat()
+            memory[partner_key]["conversations"].append(conversation_entry)
+            memory[partner_key]["statistics"]["total_messages"] += 1
+            memory[partner_key]["statistics"]["last_interaction"] = datetime.now().isoformat()
         
-        # USUNIĘTY LIMIT - pamięć długoterminowa powinna kumulować całą wiedzę!
-        # Partnerzy uczą się z każdej rozmowy i nigdy nie zapominają
+            # USUNIĘTY LIMIT - pamięć długoterminowa powinna kumulować całą wiedzę!
+            # Partnerzy uczą się z każdej rozmowy i nigdy nie zapominają
         
-        # Zapisz przez persistence system
-        if PERSISTENT_OK:
-            return save_persistent_data('persona_memory.json', memory)
-        else:
-            # Fallback - zapis do pliku
-            memory_file = MEMORY_FOLDER / f"{partner_name.replace('/', '_').replace(' ', '_')}.json"
-            with open(memory_file, 'w', encoding='utf-8') as f:
-                json.dump(memory[partner_key], f, ensure_ascii=False, indent=2)
-            return True
+            # Zapisz przez persistence system
+            if PERSISTENT_OK:
+                return save_persistent_data('persona_memory.json', memory)
+            else:
+                # Fallback - zapis do pliku
+                memory_file = MEMORY_FOLDER / f"{partner_name.replace('/', '_').replace(' ', '_')}.json"
+                with open(memory_file, 'w', encoding='utf-8') as f:
+                    json.dump(memory[partner_key], f, ensure_ascii=False, indent=2)
+                return True
             
     except Exception as e:
         print(f"Błąd zapisu pamięci dla {partner_name}: {e}")
         return False
 
-def load_memory_context(partner_name, limit=20):
-    """Ładuje kontekst z pamięci długoterminowej partnera"""
+@timed()
+def load_memory_context(partner_name, limit=20, query=None, related_limit=3, full_text_limit=3):
+    """
+    Ładuje kontekst z pamięci długoterminowej partnera
+    
+    Args:
+        partner_name: Nazwa partnera
+        limit: Liczba ostatnich rozmów uwzględnianych w kontekście
+        query: Bieżące pytanie - jeśli podane, dołącza starsze podobne rozmowy z indeksu semantycznego
+        related_limit: Max liczba przywołanych starszych rozmów
+        full_text_limit: Ile najnowszych rozmów wstawić w całości (starsze jako digest)
+    """
     try:
         partner_key = partner_name.replace('/', '_').replace(' ', '_')
         
@@ -1263,12 +1342,30 @@ def load_memory_context(partner_name, limit=20):
         if not recent_conversations:
             return None
         
-        # Formatuj kontekst - PEŁNE teksty dla lepszego zrozumienia
+        # Starsze rozmowy podobne do bieżącego pytania (spoza ostatnich N)
+        related_conversations = []
+        if query and SEMANTIC_INDEX_OK:
+            try:
+                recent_ids = {f"memory:{partner_key}:{conv['timestamp']}" for conv in recent_conversations}
+                related_conversations = get_semantic_index().search(
+                    query, k=related_limit, source="memory", partner=partner_name, exclude_ids=recent_ids
+                )
+            except Exception as e:
+                print(f"⚠️ Semantic recall error: {e}")
+        
+        # Starsze z ostatnich N jako digest (liczony raz i cache'owany), najnowsze w całości
+        full_conversations = recent_conversations[-full_text_limit:] if full_text_limit else []
+        digest_conversations = recent_conversations[:len(recent_conversations) - len(full_conversations)]
+        
         context = "\n\n📚 TWOJA PAMIĘĆ DŁUGOTERMINOWA:\n"
-        context += f"Masz {memory['statistics']['total_messages']} rozmów w pamięci. "
-        context += f"Oto ostatnie {len(recent_conversations)} rozmów:\n\n"
+        context += f"Masz {memory['statistics']['total_messages']} rozmów w pamięci.\n\n"
+        
+        if digest_conversations:
+            context += format_memory_digest(get_memory_digest(partner_key, digest_conversations)) + "\n"
         
-        for conv in recent_conversations:
+        context += f"Ostatnie {len(full_conversations)} rozmów w całości:\n\n"
+        
+        for conv in full_conversations:
             date = datetime.fromisoformat(conv['timestamp']).strftime("%Y-%m-%d %H:%M")
             context += f"{'='*60}\n"
             context += f"📅 [{date}]\n\n"
@@ -1283,6 +1380,15 @@ def load_memory_context(partner_name, limit=20):
                 context += f"   Długi: {snapshot.get('debt', 0):,.0f} PLN\n\n"
         
         context += f"{'='*60}\n\n"
+        
+        if related_conversations:
+            context += "🔎 WCZEŚNIEJSZE ROZMOWY ZWIĄZANE Z TYM PYTANIEM:\n"
+            for related in related_conversations:
+                date = related.get('date', '')[:10]
+                context += f"• [{date}] Użytkownik: {related.get('user_message', '').strip()[:200]}\n"
+                context += f"  Fragment rozmowy: {related['preview'][:300]}...\n"
+            context += "\n"
+        
         context += "💡 Wykorzystaj tę wiedzę aby udzielać spersonalizowanych, kontekstowych odpowiedzi!\n"
         
         return context
@@ -1748,8 +1854,13 @@ def generate_smart_questions(stan_spolki, cele=None):
 # KNOWLEDGE BASE FUNCTIONS
 # =====================================================
 
-@st.cache_data(ttl=3600)  # Cache na 1 godzinę
+@timed()
 def load_knowledge_base():
+    """Wczytuje bazę wiedzy (przeliczana tylko po zmianie plików knowledge_base/*.json)"""
+    return _load_knowledge_base(signature_key(*KNOWLEDGE_SOURCE_FILES))
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def _load_knowledge_base(files_key):
     """Wczytuje bazę wiedzy z artykułów i raportów kwartalnych"""
     knowledge = {
         "articles": [],
@@ -1775,6 +1886,7 @@ def load_knowledge_base():
     
     return knowledge
 
+@timed()
 def get_relevant_knowledge(query, stan_spolki=None, partner_name=None, max_items=3):
     """
     Zwraca relevantne artykuły i raporty na podstawie zapytania i kontekstu portfela
@@ -1788,18 +1900,6 @@ def get_relevant_knowledge(query, stan_spolki=None, partner_name=None, max_items
     knowledge = load_knowledge_base()
     relevant_items = []
     
-    # Keywords mapping dla różnych tematów
-    topic_keywords = {
-        "value": ["value", "wartość", "wycena", "graham", "p/e", "p/b", "margin", "bezpieczeństwo"],
-        "growth": ["wzrost", "growth", "fisher", "innowacja", "tech", "roi", "roe"],
-        "risk": ["ryzyko", "risk", "dźwignia", "leverage", "straty", "volatility", "bezpieczeństwo"],
-        "psychology": ["psychologia", "psychology", "emocje", "soros", "refleksywność", "panika"],
-        "diversification": ["dywersyfikacja", "diversification", "koncentracja", "alokacja"],
-        "crypto": ["crypto", "krypto", "bitcoin", "ethereum", "blockchain"],
-        "valuation": ["wycena", "valuation", "p/e", "pe", "eps", "earnings"],
-        "trading": ["sprzedaż", "trading", "realizacja", "profit", "zyski", "stop loss"]
-    }
-    
     # Dopasuj partnera do kategorii
     partner_preferences = {
         "Nexus": ["portfolio", "risk", "optimization", "tax"],
@@ -1808,20 +1908,31 @@ def get_relevant_knowledge(query, stan_spolki=None, partner_name=None, max_items
         "Changpeng Zhao (CZ)": ["crypto", "blockchain"]
     }
     
-    # Wykryj tematy w zapytaniu
+    # Wykryj tematy w zapytaniu (słowa kluczowe: keyword_matcher.COUNCIL_KEYWORDS["topic.*"])
     query_lower = query.lower()
-    detected_topics = []
-    for topic, keywords in topic_keywords.items():
-        if any(kw in query_lower for kw in keywords):
-            detected_topics.append(topic)
+    matcher = get_council_matcher()
+    query_hits = matcher.scan(query)
+    detected_topics = [
+        category.split(".", 1)[1] for category in matcher.categories
+        if category.startswith("topic.") and category in query_hits
+    ]
     
     # Dodaj preferencje partnera
     if partner_name and partner_name in partner_preferences:
         detected_topics.extend(partner_preferences[partner_name])
     
+    # Podobieństwo semantyczne (TF-IDF) - łapie artykuły bez dokładnych słów kluczowych
+    semantic_scores = {}
+    if SEMANTIC_INDEX_OK:
+        try:
+            for hit in get_semantic_index().search(query, k=max_items * 5, source=("article", "report")):
+                semantic_scores[(hit["source"], hit.get("ref"))] = hit["score"]
+        except Exception as e:
+            print(f"⚠️ Semantic search error: {e}")
+    
     # Filtruj artykuły
     for article in knowledge["articles"]:
-        score = 0
+        score = 10 * semantic_scores.get(("article", article.get("id")), 0)
         
         # Sprawdź relevance (może być int lub lista)
         article_relevance = article.get("relevance", [])
@@ -1863,6 +1974,9 @@ def get_relevant_knowledge(query, stan_spolki=None, partner_name=None, max_items
             elif any(ticker.lower() in query_lower for ticker in [report.get("ticker", ""), report.get("company", "")]):
                 # Raport wspomniany w pytaniu
                 relevant_items.append(("report", report, 5))
+            elif ("report", ticker) in semantic_scores:
+                # Raport podobny treściowo do pytania
+                relevant_items.append(("report", report, 10 * semantic_scores[("report", ticker)]))
     
     # Sortuj po score i ogranicz
     relevant_items.sort(key=lambda x: x[2], reverse=True)
@@ -1948,7 +2062,8 @@ def display_knowledge_sources(knowledge_items):
 # DIVIDEND ANALYSIS FUNCTION
 # =====================================================
 
-@st.cache_data(ttl=3600)  # Cache na 1 godzinę
+@st.cache_data(max_entries=8, show_spinner=False)  # Kluczowane zawartością stan_spolki - bez TTL
+@timed()
 def calculate_portfolio_dividends(stan_spolki):
     """
     Oblicza dokładne dywidendy dla całego portfela akcji.
@@ -2311,7 +2426,8 @@ def generate_weekly_report(stan_spolki, cele):
     report = {
         "date": datetime.now().isoformat(),
         "week_number": datetime.now().isocalendar()[1],
-        "year": datetime.now().year
+        "year": datetime.now().isocalendar()[0],  # Rok ISO - tydzień 1 może zacząć się w grudniu
+        "source": "live"
     }
     
     try:
@@ -2559,50 +2675,37 @@ def generate_weekly_report(stan_spolki, cele):
         }
 
 def save_weekly_report(report):
-    """Zapisuje raport do pliku JSON"""
-    from datetime import datetime
+    """Zapisuje raport do katalogu weekly_reports/ (plik tygodnia + indeks)"""
+    from weekly_report_catalog import get_report_catalog
     
     try:
-        reports_folder = Path("weekly_reports")
-        reports_folder.mkdir(exist_ok=True)
-        
         # Nazwa pliku: weekly_report_2024_W42.json
-        filename = f"weekly_report_{report['year']}_W{report['week_number']:02d}.json"
-        filepath = reports_folder / filename
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(report, f, indent=2, ensure_ascii=False)
-        
-        return filepath
+        return get_report_catalog().save(report)
         
     except Exception as e:
         print(f"⚠️ Błąd zapisu raportu: {e}")
         return None
 
-def load_weekly_reports(limit=10):
-    """Wczytuje ostatnie raporty tygodniowe"""
-    reports_folder = Path("weekly_reports")
-    
-    if not reports_folder.exists():
-        return []
+def load_weekly_reports(limit=10, offset=0):
+    """
+    Strona raportów tygodniowych z indeksu (od najnowszego) - bez czytania treści
     
-    reports = []
+    Returns:
+        tuple: (liczba raportów, lista metadanych)
+    """
+    from weekly_report_catalog import get_report_catalog
     
     try:
-        # Znajdź wszystkie pliki raportów
-        report_files = sorted(reports_folder.glob("weekly_report_*.json"), reverse=True)
-        
-        for filepath in report_files[:limit]:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                report = json.load(f)
-                report["filename"] = filepath.name
-                reports.append(report)
-        
-        return reports
+        return get_report_catalog().page(limit=limit, offset=offset)
         
     except Exception as e:
         print(f"⚠️ Błąd wczytywania raportów: {e}")
-        return []
+        return 0, []
+
+def load_weekly_report(week_key):
+    """Pełna treść jednego raportu (wczytywana dopiero przy wyświetleniu)"""
+    from weekly_report_catalog import get_report_catalog
+    return get_report_catalog().get(week_key)
 
 def display_weekly_report(report):
     """Wyświetla raport tygodniowy w Streamlit UI"""
@@ -3010,34 +3113,18 @@ def determine_speaking_order(message, partner_names):
     Określa dynamiczną kolejność wypowiedzi na podstawie tematu.
     Eksperci w danej dziedzinie mówią pierwsi.
     """
-    message_lower = message.lower()
-    
-    # Definicje ekspertyz (NOWA RADA - 5 partnerów)
-    crypto_experts = ['Changpeng Zhao (CZ)']
-    value_experts = ['Warren Buffett']
-    trading_experts = ['George Soros']
-    analytics_experts = ['Nexus']
-    strategic_experts = ['Nexus']
-    
-    # Słowa kluczowe dla różnych tematów
-    crypto_keywords = ['krypto', 'bitcoin', 'btc', 'eth', 'blockchain', 'defi', 'nft', 'altcoin', 'token']
-    value_keywords = ['wartość', 'fundamenty', 'dywidenda', 'p/e', 'p/b', 'margin of safety', 'value investing']
-    trading_keywords = ['trading', 'short', 'spekulacja', 'momentum', 'swing', 'pozycja krótka']
-    quality_keywords = ['jakość', 'zarządzanie', 'moat', 'przewaga konkurencyjna', 'model biznesowy']
-    strategic_keywords = ['strategia', 'plan', 'cel', 'alokacja', 'dywersyfikacja', 'portfel']
-    
-    # Wykryj temat
-    priority_experts = []
-    if any(keyword in message_lower for keyword in crypto_keywords):
-        priority_experts = crypto_experts
-    elif any(keyword in message_lower for keyword in value_keywords):
-        priority_experts = value_experts
-    elif any(keyword in message_lower for keyword in trading_keywords):
-        priority_experts = trading_experts
-    elif any(keyword in message_lower for keyword in quality_keywords):
-        priority_experts = quality_experts
-    elif any(keyword in message_lower for keyword in strategic_keywords):
-        priority_experts = strategic_experts
+    # Definicje ekspertyz (NOWA RADA - 5 partnerów), w kolejności priorytetu tematów
+    experts_by_topic = {
+        "speaking.crypto": ['Changpeng Zhao (CZ)'],
+        "speaking.value": ['Warren Buffett'],
+        "speaking.trading": ['George Soros'],
+        "speaking.quality": ['Warren Buffett'],
+        "speaking.strategic": ['Nexus']
+    }
+    
+    # Wykryj temat (słowa kluczowe: keyword_matcher.COUNCIL_KEYWORDS["speaking.*"])
+    topic = get_council_matcher().first(message, *experts_by_topic)
+    priority_experts = experts_by_topic.get(topic, [])
     
     # Utwórz listę: najpierw eksperci, potem reszta
     ordered_names = []
@@ -3051,34 +3138,26 @@ def determine_speaking_order(message, partner_names):
     
     return ordered_names
 
-def analyze_sentiment(response):
+# Kolejność kluczy = priorytet w analyze_sentiment ("nie zgadzam się" zawiera "zgadzam się")
+SENTIMENT_REACTIONS = {
+    "sentiment.zaprzeczenie": ("❌", "sprzeciw"),  # "[nie zgadzam się ❌]" z zasad rozmowy Rady - przed zgodą
+    "sentiment.zgoda": ("✅", "zgoda"),  # Silne zgadzanie się
+    "sentiment.sprzeciw": ("❌", "sprzeciw"),  # Silne niezgadzanie się
+    "sentiment.ostrzezenie": ("⚠️", "ostrzeżenie"),
+    "sentiment.refleksja": ("💭", "refleksja"),  # Neutralne/rozwijające
+    "sentiment.pytanie": ("❓", "pytanie")  # Pytanie/wątpliwość
+}
+
+def analyze_sentiment(response, hits=None):
     """
     Analizuje reakcję/emocję w odpowiedzi partnera.
     Zwraca emoji i typ reakcji.
-    """
-    response_lower = response.lower()
-    
-    # Silne zgadzanie się
-    if any(word in response_lower for word in ['zgadzam się', 'całkowicie racja', 'dokładnie', 'wspieramy', 'popieram']):
-        return "✅", "zgoda"
-    
-    # Silne niezgadzanie się
-    if any(word in response_lower for word in ['nie zgadzam się', 'błąd', 'mylisz się', 'to ryzykowne', 'ostrzegam', 'sprzeciwiam']):
-        return "❌", "sprzeciw"
-    
-    # Ostrzeżenie
-    if any(word in response_lower for word in ['uwaga', 'ostrożnie', 'ryzyko', 'problem', 'zagrożenie']):
-        return "⚠️", "ostrzeżenie"
     
-    # Neutralne/rozwijające
-    if any(word in response_lower for word in ['rozumiem', 'widzę', 'interesujące', 'warto rozważyć']):
-        return "💭", "refleksja"
-    
-    # Pytanie/wątpliwość
-    if '?' in response or any(word in response_lower for word in ['czy', 'jak', 'dlaczego', 'kiedy']):
-        return "❓", "pytanie"
-    
-    return "💬", "komentarz"
+    Args:
+        hits: Gotowy wynik get_council_matcher().scan(response) (bez ponownego skanu)
+    """
+    category = get_council_matcher().first(response if hits is None else hits, *SENTIMENT_REACTIONS)
+    return SENTIMENT_REACTIONS.get(category, ("💬", "komentarz"))
 
 def should_interrupt(partner, message, previous_responses):
     """
@@ -3091,30 +3170,31 @@ def should_interrupt(partner, message, previous_responses):
         return False
     
     partner_lower = partner.lower()
-    message_lower = message.lower()
+    matcher = get_council_matcher()  # scan() zapamiętuje wyniki - poprzednie odpowiedzi nie są skanowane ponownie
     
     # Buffett przerywa gdy ktoś komplikuje prostą sprawę
     if 'buffett' in partner_lower:
         for _, prev_resp in previous_responses:
-            if len(prev_resp) > 500 and 'skomplikowany' in prev_resp.lower():
+            if len(prev_resp) > 500 and "interrupt.complicated" in matcher.scan(prev_resp):
                 return True
     
     # Nexus przerywa gdy ktoś ignoruje dane
     if 'nexus' in partner_lower:
         for _, prev_resp in previous_responses:
-            if any(word in prev_resp.lower() for word in ['intuicja', 'przeczucie', 'feeling']):
+            if "interrupt.intuition" in matcher.scan(prev_resp):
                 return True
     
     # CZ przerywa gdy mówią o krypto a nie znają technologii
     if 'zhao' in partner_lower or 'cz' in partner_lower:
-        if any(word in message_lower for word in ['bitcoin', 'krypto', 'blockchain']):
+        if "interrupt.crypto" in matcher.scan(message):
             for prev_partner, _ in previous_responses:
                 if 'buffett' in prev_partner.lower():
                     return True
     
     return False
 
-def send_to_all_partners(message, stan_spolki=None, cele=None, tryb_odpowiedzi="normalny"):
+def send_to_all_partners(message, stan_spolki=None, cele=None, tryb_odpowiedzi="normalny", bypass_cache=False,
+                         stream=False):
     """
     Generator - wysyła wiadomość do wszystkich Partnerów kolejno (jeden za drugim).
     NOWE FUNKCJE:
@@ -3123,6 +3203,9 @@ def send_to_all_partners(message, stan_spolki=None, cele=None, tryb_odpowiedzi="
     - Przerywanie gdy silna opinia przeciwna
     - Reakcje/emocje w dialogu
     - Głosowanie po dyskusji
+    
+    stream=True: dla każdego partnera najpierw yield {"partner", "stream": TimedStream, ...}
+    (do wyświetlenia przez st.write_stream), a po nim pełny wynik z "streamed": True.
     """
     # Inicjalizuj historię odpowiedzi w session_state jeśli nie istnieje
     if 'partner_history' not in st.session_state:
@@ -3144,16 +3227,31 @@ def send_to_all_partners(message, stan_spolki=None, cele=None, tryb_odpowiedzi="
     previous_responses = []
     partner_votes = {}  # Do głosowania końcowego
     
+    # Pamięć person wczytana raz na spotkanie - liczniki sesji zapisywane jednym zapisem na końcu
+    persona_session = PersonaMemorySession() if MEMORY_OK else None
+    try:
+        yield from _council_round(message, ordered_partners, previous_responses, partner_votes, stan_spolki, cele,
+                                  tryb_odpowiedzi, bypass_cache, stream, persona_session)
+    finally:
+        if persona_session is not None:
+            persona_session.commit()
+    
+    # 📊 PODSUMOWANIE GŁOSOWANIA (jeśli były głosy)
+    yield from _voting_summary(partner_votes)
+
+def _council_round(message, ordered_partners, previous_responses, partner_votes, stan_spolki, cele,
+                   tryb_odpowiedzi, bypass_cache, stream, persona_session):
+    """Tura wypowiedzi wszystkich partnerów (część send_to_all_partners)"""
     for partner in ordered_partners:
         # 🤚 SYSTEM PRZERYWANIA
         is_interrupting = should_interrupt(partner, message, previous_responses)
         
-        # Dodaj kontekst poprzednich odpowiedzi do wiadomości
-        message_with_context = message
+        # Kontekst poprzednich odpowiedzi (osobno od pytania - do pamięci trafia samo pytanie)
+        council_context = None
         if previous_responses:
+            # Starsze wypowiedzi skrócone - kontekst rośnie liniowo, nie kwadratowo
             context_section = "\n\n💬 POPRZEDNIE WYPOWIEDZI NA TYM SPOTKANIU RADY:\n"
-            for prev_partner, prev_response in previous_responses:
-                context_section += f"\n**{prev_partner}** powiedział:\n{prev_response}\n"
+            context_section += compress_council_responses(previous_responses)
             context_section += "\n---\n"
             
             # 👥 SYSTEM ZWRACANIA SIĘ DO SIEBIE
@@ -3176,23 +3274,37 @@ def send_to_all_partners(message, stan_spolki=None, cele=None, tryb_odpowiedzi="
                 context_section += "🤚 PRZERWIJ DYSKUSJĘ! Twoja ekspertyza/opinia jest KLUCZOWA w tym temacie!\n"
                 context_section += "Zacznij od: 'Moment! Muszę przerwać, bo...' lub 'Przepraszam że przerwę, ale...'\n\n"
             
-            message_with_context = context_section + "\n\nPYTANIE PARTNERA ZARZĄDZAJĄCEGO:\n" + message
+            council_context = context_section
         
         # Wysyłaj z trybem odpowiedzi i kontekstem poprzednich
-        response, knowledge = send_to_ai_partner(partner, message_with_context, stan_spolki, cele, tryb_odpowiedzi)
+        response, knowledge = send_to_ai_partner(
+            partner, message, stan_spolki, cele, tryb_odpowiedzi,
+            council_context=council_context, bypass_cache=bypass_cache, stream=stream,
+            persona_session=persona_session
+        )
+        
+        if stream:
+            # Najpierw strumień (konsument wyświetla fragmenty na bieżąco), potem pełny tekst
+            yield {
+                "partner": partner,
+                "stream": response,
+                "knowledge": knowledge,
+                "is_interrupting": is_interrupting
+            }
+            response = response.consume()
+        
+        # Jeden skan odpowiedzi - reakcja i głos czytane z tych samych trafień
+        response_hits = get_council_matcher().scan(response)
         
         # 🎭 ANALIZA REAKCJI/EMOCJI
-        sentiment_emoji, sentiment_type = analyze_sentiment(response)
+        sentiment_emoji, sentiment_type = analyze_sentiment(response, hits=response_hits)
         
         # 📊 WYCIĄGNIJ GŁOS (jeśli jest w odpowiedzi)
-        vote = None
-        response_lower = response.lower()
-        if '[głosuję: tak]' in response_lower or 'głosuję za' in response_lower:
-            vote = "ZA"
-        elif '[głosuję: nie]' in response_lower or 'głosuję przeciw' in response_lower:
-            vote = "PRZECIW"
-        elif '[głosuję: wstrzymuję]' in response_lower or 'wstrzymuję się' in response_lower:
-            vote = "WSTRZYMANY"
+        vote = {
+            "vote.za": "ZA",
+            "vote.przeciw": "PRZECIW",
+            "vote.wstrzymany": "WSTRZYMANY"
+        }.get(get_council_matcher().first(response_hits, "vote.za", "vote.przeciw", "vote.wstrzymany"))
         
         # Zapisz głos partnera
         if vote:
@@ -3243,10 +3355,12 @@ def send_to_all_partners(message, stan_spolki=None, cele=None, tryb_odpowiedzi="
             "sentiment_emoji": sentiment_emoji,
             "sentiment_type": sentiment_type,
             "vote": vote,
-            "is_interrupting": is_interrupting
+            "is_interrupting": is_interrupting,
+            "streamed": stream
         }
-    
-    # 📊 PODSUMOWANIE GŁOSOWANIA (jeśli były głosy)
+
+def _voting_summary(partner_votes):
+    """Podsumowanie głosowania po turze partnerów (część send_to_all_partners)"""
     if partner_votes:
         # Wczytaj wagi głosów z Kodeksu
         voting_weights = wczytaj_wagi_glosu_z_kodeksu()
@@ -3494,6 +3608,21 @@ def pobierz_dane_dywidendowe_yfinance(pozycje):
         print(f"⚠️ Błąd pobierania danych yfinance: {e}")
         return {}
 
+@st.cache_data(ttl=MARKET_DATA_TTL, show_spinner=False)
+def pobierz_dane_dywidendowe_cached(tickers):
+    """
+    Dane dywidendowe kluczowane zbiorem tickerów - sync Trading212, który zmienia
+    tylko ilości, nie pobiera ponownie danych z yfinance.
+    """
+    return pobierz_dane_dywidendowe_yfinance({ticker: {} for ticker in tickers})
+
+def odswiez_dane_rynkowe():
+    """Wymusza ponowne pobranie danych zewnętrznych (cache plikowe odświeżają się same)"""
+    pobierz_dane_dywidendowe_cached.clear()
+    # Wyczyść cache cen crypto żeby pobrać świeże przy następnym renderze
+    st.session_state.pop('crypto_prices_cache', None)
+    st.session_state.pop('crypto_prices_symbols', None)
+
 def init_session_state():
     """Inicjalizuje session state z domyślnymi wartościami lub zapisanymi preferencjami"""
     # Wczytaj zapisane preferencje
@@ -3515,6 +3644,7 @@ def init_session_state():
         st.session_state.selected_partner = "Wszyscy"
 
 # Funkcja normalizująca strukturę danych
+@timed()
 def normalize_stan_spolki(stan_spolki):
     """Normalizuje strukturę danych do oczekiwanego formatu (lowercase keys)"""
     if not stan_spolki:
@@ -3532,7 +3662,7 @@ def normalize_stan_spolki(stan_spolki):
         
         if not dane_rynkowe and pozycje:
             print("🔄 Wzbogacam dane Trading212 o informacje dywidendowe z yfinance...")
-            dane_rynkowe = pobierz_dane_dywidendowe_yfinance(pozycje)
+            dane_rynkowe = pobierz_dane_dywidendowe_cached(tuple(sorted(pozycje)))
         
         normalized['akcje'] = {
             'wartosc_pln': raw_akcje.get('Suma_PLN', 0),
@@ -3628,13 +3758,22 @@ def normalize_stan_spolki(stan_spolki):
     return normalized
 
 # Funkcja do ładowania danych
-@st.cache_data(ttl=60)  # Cache na 1 minutę (zmniejszono z 5 minut dla szybszej synchronizacji)
-@st.cache_data(ttl=300)  # Cache na 5 minut
+@timed()
 def load_portfolio_data():
-    """Pobiera dane portfela"""
+    """
+    Pobiera dane portfela
+    
+    Wynik jest kluczowany zawartością plików źródłowych i kursem USD/PLN -
+    sync z GitHub Actions jest widoczny od razu, a bez zmian nic nie jest liczone ponownie.
+    """
     if not IMPORTS_OK:
         return None, None
     
+    return _load_portfolio_data(signature_key(*PORTFOLIO_SOURCE_FILES), pobierz_kurs_usd_pln())
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def _load_portfolio_data(files_key, kurs_usd_pln):
+    """Buduje stan_spolki dla danej sygnatury plików (argumenty służą jako klucz cache)"""
     try:
         cele = wczytaj_cele()
         stan_spolki_raw = pobierz_stan_spolki(cele)
@@ -3885,6 +4024,34 @@ def create_allocation_pie_chart(stan_spolki, cele=None):
     return fig
 
 
+# === MEMOIZOWANE WEJŚCIA DASHBOARDU ===
+# stan_spolki pochodzi z load_portfolio_data (klucz: pliki portfela + kurs), więc ten sam
+# klucz rozszerzony o pliki czytane przez metryki/wykresy wystarcza do memoizacji.
+# Argumenty z "_" nie są haszowane przez Streamlit - o trafieniu decyduje inputs_key.
+
+DASHBOARD_CHARTS = {
+    "struktura": create_portfolio_value_chart,
+    "alokacja": create_allocation_pie_chart,
+}
+
+def dashboard_inputs_key():
+    """Klucz wejść dashboardu: sygnatura plików źródłowych + kurs USD/PLN"""
+    return f"{signature_key(*DASHBOARD_SOURCE_FILES)}:{pobierz_kurs_usd_pln()}"
+
+@st.cache_data(ttl=DASHBOARD_METRICS_TTL, max_entries=4, show_spinner=False)
+def cached_portfolio_deltas(inputs_key, _stan_spolki, _cele):
+    return calculate_portfolio_deltas(_stan_spolki, _cele)
+
+@st.cache_data(ttl=DASHBOARD_METRICS_TTL, max_entries=4, show_spinner=False)
+def cached_health_score(inputs_key, _stan_spolki, _cele):
+    return calculate_portfolio_health_score(_stan_spolki, _cele)
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def cached_chart(name, inputs_key, _stan_spolki, _cele):
+    """Figura Plotly zbudowana raz na zestaw wejść (name = klucz DASHBOARD_CHARTS)"""
+    return DASHBOARD_CHARTS[name](_stan_spolki, _cele)
+
+
 # ============================================================================
 # TRANSACTIONS LOG - Strona dziennika transakcji
 # ============================================================================
@@ -4785,12 +4952,7 @@ def main():
         
         # Przycisk odświeżania
         if st.button("🔄 Odśwież Dane", width="stretch", key="refresh_data_btn"):
-            st.cache_data.clear()
-            # Wyczyść cache cen crypto żeby pobrać świeże przy następnym renderze
-            if 'crypto_prices_cache' in st.session_state:
-                del st.session_state.crypto_prices_cache
-            if 'crypto_prices_symbols' in st.session_state:
-                del st.session_state.crypto_prices_symbols
+            odswiez_dane_rynkowe()
             st.rerun()
         
         st.markdown("")
@@ -5146,6 +5308,119 @@ def calculate_portfolio_health_score(stan_spolki, cele):
             'factors': {}
         }
 
+def pokaz_raport_excel(stan_spolki, key):
+    """
+    Generuje pełny raport Excel (tryb write-only, z historią) i pokazuje przycisk pobrania.
+
+    Skoroszyt trafia prosto na dysk (katalog tymczasowy) - przycisk dostaje jego bajty,
+    a plik tymczasowy jest od razu usuwany.
+    """
+    try:
+        with st.spinner("📊 Generuję raport..."):
+            dywidendy_info = calculate_portfolio_dividends(stan_spolki) or {}
+            filename = generate_streaming_report(
+                model=get_portfolio_model(pobierz_kurs_usd_pln()),
+                dywidendy_szczegoly=dywidendy_info.get('szczegoly', [])
+            )
+        if not filename:
+            st.error("❌ Błąd generowania raportu - szczegóły w logach")
+            return
+        
+        try:
+            with open(filename, "rb") as file:
+                report_bytes = file.read()
+        finally:
+            os.remove(filename)
+        
+        st.download_button(
+            label="⬇️ Pobierz raport",
+            data=report_bytes,
+            file_name=os.path.basename(filename),
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            use_container_width=True,
+            key=key
+        )
+        st.success(f"✅ Raport wygenerowany: {os.path.basename(filename)}")
+    except Exception as e:
+        st.error(f"❌ Błąd generowania raportu: {e}")
+
+# === FRAGMENTY DASHBOARDU ===
+# Interakcja wewnątrz fragmentu uruchamia ponownie tylko ten fragment, nie cały main().
+# Nawigacja (st.rerun() bez scope) nadal przeładowuje całą aplikację.
+
+def rerun_fragment():
+    """st.rerun(scope="fragment"), a gdy fragment wykonuje się w pełnym przebiegu - zwykły rerun"""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+@st.fragment
+@timed("fragment.dashboard_quick_actions")
+def dashboard_quick_actions(stan_spolki):
+    """Panel szybkich akcji (raport Excel generuje się bez przeliczania dashboardu)"""
+    st.markdown("### ⚡ Szybkie Akcje")
+    
+    col_action1, col_action2, col_action3, col_action4 = st.columns(4)
+    
+    with col_action1:
+        if st.button("🤖 Zapytaj AI o Portfel", use_container_width=True, key="quick_ai"):
+            st.session_state.page = "💬 Partnerzy"
+            st.session_state.quick_question = "Jak oceniasz mój obecny portfel? Jakie widzisz ryzyka i szanse?"
+            st.rerun()
+    
+    with col_action2:
+        if st.button("📊 Szczegółowa Analiza", use_container_width=True, key="quick_analiza"):
+            st.session_state.page = "📈 Analiza"
+            st.rerun()
+    
+    with col_action3:
+        if st.button("📄 Generuj Raport Excel", use_container_width=True, key="quick_raport"):
+            pokaz_raport_excel(stan_spolki, key="download_raport")
+    
+    with col_action4:
+        if st.button("💳 Zarządzaj Finansami", use_container_width=True, key="quick_finanse"):
+            st.session_state.page = "💳 Kredyty"
+            st.rerun()
+
+@st.fragment
+@timed("fragment.dashboard_charts")
+def dashboard_charts(stan_spolki, cele, inputs_key):
+    """Wykresy struktury i alokacji - figury z cache po kluczu wejść"""
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        fig = cached_chart("struktura", inputs_key, stan_spolki, cele)
+        st.plotly_chart(fig, config={'displayModeBar': False})
+    
+    with col2:
+        fig = cached_chart("alokacja", inputs_key, stan_spolki, cele)
+        st.plotly_chart(fig, config={'displayModeBar': False})
+
+@st.fragment
+@timed("fragment.dashboard_footer_actions")
+def dashboard_footer_actions(stan_spolki):
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        if st.button("🔄 Odśwież Portfolio", width="stretch", key="refresh_portfolio_btn"):
+            odswiez_dane_rynkowe()
+            st.rerun()
+    
+    with col2:
+        if st.button("📊 Analiza Ryzyka", width="stretch", key="analiza_ryzyka_btn"):
+            st.session_state.page = "📈 Analiza"
+            st.rerun()
+    
+    with col3:
+        if st.button("📄 Generuj Raport Excel", width="stretch", key="raport_excel_btn"):
+            pokaz_raport_excel(stan_spolki, key="download_raport_portfolio")
+    
+    with col4:
+        if st.button("🎮 Symuluj Scenariusz", width="stretch"):
+            st.session_state.page = "🎮 Symulacje"
+            st.rerun()
+
 def show_dashboard(stan_spolki, cele):
     """Główny dashboard"""
     
@@ -5164,19 +5439,22 @@ def show_dashboard(stan_spolki, cele):
         st.json(stan_spolki)  # Pokaż co mamy
         return
     
+    # Klucz memoizacji metryk i wykresów - przeliczenie tylko po zmianie plików/kursu
+    inputs_key = dashboard_inputs_key()
+    
     # === HEADER Z TIMESTAMP ===
     col_title, col_timestamp = st.columns([3, 1])
     with col_title:
         st.title("📊 Dashboard Portfela")
     with col_timestamp:
-        deltas = calculate_portfolio_deltas(stan_spolki, cele)
+        deltas = cached_portfolio_deltas(inputs_key, stan_spolki, cele)
         st.caption(f"🕐 Ostatnia aktualizacja:")
         st.caption(f"**{deltas['last_update']}**")
     
     st.markdown("---")
     
     # === PORTFOLIO HEALTH SCORE ===
-    health = calculate_portfolio_health_score(stan_spolki, cele)
+    health = cached_health_score(inputs_key, stan_spolki, cele)
     
     col_health1, col_health2, col_health3 = st.columns([1, 2, 1])
     
@@ -5398,44 +5676,7 @@ def show_dashboard(stan_spolki, cele):
     st.markdown("---")
     
     # === QUICK ACTIONS PANEL ===
-    st.markdown("### ⚡ Szybkie Akcje")
-    
-    col_action1, col_action2, col_action3, col_action4 = st.columns(4)
-    
-    with col_action1:
-        if st.button("🤖 Zapytaj AI o Portfel", use_container_width=True, key="quick_ai"):
-            st.session_state.page = "💬 Partnerzy"
-            st.session_state.quick_question = "Jak oceniasz mój obecny portfel? Jakie widzisz ryzyka i szanse?"
-            st.rerun()
-    
-    with col_action2:
-        if st.button("📊 Szczegółowa Analiza", use_container_width=True, key="quick_analiza"):
-            st.session_state.page = "📈 Analiza"
-            st.rerun()
-    
-    with col_action3:
-        if st.button("📄 Generuj Raport Excel", use_container_width=True, key="quick_raport"):
-            try:
-                with st.spinner("📊 Generuję raport..."):
-                    filename = generate_full_report(stan_spolki)
-                    
-                    with open(filename, "rb") as file:
-                        st.download_button(
-                            label="⬇️ Pobierz raport",
-                            data=file,
-                            file_name=filename,
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                            use_container_width=True,
-                            key="download_raport"
-                        )
-                    st.success(f"✅ Raport wygenerowany: {filename}")
-            except Exception as e:
-                st.error(f"❌ Błąd generowania raportu: {e}")
-    
-    with col_action4:
-        if st.button("💳 Zarządzaj Finansami", use_container_width=True, key="quick_finanse"):
-            st.session_state.page = "💳 Kredyty"
-            st.rerun()
+    dashboard_quick_actions(stan_spolki)
     
     st.markdown("---")
     
@@ -5530,15 +5771,7 @@ Wróć później aby zobaczyć świeżą analizę!
     st.markdown("---")
     
     # Wykresy
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        fig = create_portfolio_value_chart(stan_spolki, cele)
-        st.plotly_chart(fig, config={'displayModeBar': False})
-    
-    with col2:
-        fig = create_allocation_pie_chart(stan_spolki, cele)
-        st.plotly_chart(fig, config={'displayModeBar': False})
+    dashboard_charts(stan_spolki, cele, inputs_key)
     
     st.markdown("---")
     
@@ -6052,43 +6285,7 @@ Wróć później aby zobaczyć świeżą analizę!
     
     # Quick actions
     st.markdown("---")
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        if st.button("🔄 Odśwież Portfolio", width="stretch", key="refresh_portfolio_btn"):
-            st.cache_data.clear()
-            st.rerun()
-    
-    with col2:
-        if st.button("📊 Analiza Ryzyka", width="stretch", key="analiza_ryzyka_btn"):
-            st.session_state.page = "📈 Analiza"
-            st.rerun()
-    
-    with col3:
-        if st.button("📄 Generuj Raport Excel", width="stretch", key="raport_excel_btn"):
-            try:
-                with st.spinner("� Generuję raport..."):
-                    filename = generate_full_report(stan_spolki)
-                    
-                    # Read file and offer download
-                    with open(filename, "rb") as file:
-                        btn = st.download_button(
-                            label="⬇️ Pobierz raport",
-                            data=file,
-                            file_name=filename,
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                        )
-                    
-                    st.success(f"✅ Raport wygenerowany: {filename}")
-            except Exception as e:
-                st.error(f"❌ Błąd generowania raportu: {e}")
-                import traceback
-                st.code(traceback.format_exc())
-    
-    with col4:
-        if st.button("🎮 Symuluj Scenariusz", width="stretch"):
-            st.session_state.page = "🎮 Symulacje"
-            st.rerun()
+    dashboard_footer_actions(stan_spolki)
 
 def show_kodeks_page():
     """Wyświetla Kodeks Spółki z możliwością edycji i dynamicznym odświeżaniem"""
@@ -6689,6 +6886,7 @@ def show_autonomous_conversations_page():
                 if conversation:
                     st.success(f"✅ Rozmowa zakończona! ID: {conversation['id']}")
                     st.info(f"📝 Liczba wiadomości: {len(conversation['messages'])}")
+                    st.caption("🧵 Podsumowanie i meta-analiza Nexusa generują się w tle - odśwież listę za chwilę")
                     st.rerun()
                 else:
                     st.error("❌ Nie udało się uruchomić rozmowy (brak budżetu API?)")
@@ -6736,9 +6934,9 @@ def show_autonomous_conversations_page():
     st.markdown("---")
     st.markdown("### 📜 Historia Rozmów")
     
-    conversations = engine.get_recent_conversations(limit=50)
+    store = engine.store
     
-    if not conversations:
+    if not len(store):
         st.info("📭 Brak autonomicznych rozmów. Kliknij 'Uruchom nową rozmowę' aby rozpocząć!")
         return
     
@@ -6810,30 +7008,32 @@ def show_autonomous_conversations_page():
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        topics = list(set([c.get('topic_name', 'Unknown') for c in conversations]))
-        selected_topic = st.selectbox("🏷️ Filtruj po temacie", ["Wszystkie"] + topics)
+        selected_topic = st.selectbox("🏷️ Filtruj po temacie", ["Wszystkie"] + store.topics())
     
     with col2:
-        dates = list(set([c.get('date', '')[:10] for c in conversations if c.get('date')]))
-        dates.sort(reverse=True)
-        selected_date = st.selectbox("📅 Filtruj po dacie", ["Wszystkie"] + dates)
+        selected_date = st.selectbox("📅 Filtruj po dacie", ["Wszystkie"] + store.days())
     
     with col3:
         min_messages = st.slider("📝 Min. liczba wiadomości", 0, 20, 0)
     
-    # Zastosuj filtry
-    filtered_conversations = conversations
-    
-    if selected_topic != "Wszystkie":
-        filtered_conversations = [c for c in filtered_conversations if c.get('topic_name') == selected_topic]
-    
-    if selected_date != "Wszystkie":
-        filtered_conversations = [c for c in filtered_conversations if c.get('date', '')[:10] == selected_date]
+    # Filtry działają na indeksie (metadane) - treść czytana tylko dla bieżącej strony
+    filters = {
+        'topic': None if selected_topic == "Wszystkie" else selected_topic,
+        'day': None if selected_date == "Wszystkie" else selected_date,
+        'min_messages': min_messages
+    }
+    total_matches, _ = store.query(**filters, limit=0)
+    total_pages = max(1, -(-total_matches // AUTONOMOUS_PAGE_SIZE))
     
-    if min_messages > 0:
-        filtered_conversations = [c for c in filtered_conversations if len(c.get('messages', [])) >= min_messages]
+    col_info, col_page = st.columns([3, 1])
+    with col_page:
+        page = st.number_input("📄 Strona", min_value=1, max_value=total_pages, value=1, step=1,
+                               key="autonomous_history_page")
+    with col_info:
+        st.info(f"📊 Znaleziono: {total_matches} rozmów (strona {page}/{total_pages})")
     
-    st.info(f"📊 Znaleziono: {len(filtered_conversations)} rozmów")
+    _, page_meta = store.query(**filters, limit=AUTONOMOUS_PAGE_SIZE, offset=(page - 1) * AUTONOMOUS_PAGE_SIZE)
+    filtered_conversations = [c for c in (store.get(m['id']) for m in page_meta) if c is not None]
     
     # Wyświetl rozmowy
     for idx, conv in enumerate(filtered_conversations):
@@ -6853,6 +7053,9 @@ def show_autonomous_conversations_page():
             st.markdown(f"**Uczestnicy:** {', '.join(participants)}")
             st.markdown(f"**Wywołania API:** {api_calls}")
             st.markdown(f"**Status:** {conv.get('status', 'unknown')}")
+            pending_analyses = [name for name, state in conv.get('post_processing', {}).items() if state == "pending"]
+            if pending_analyses:
+                st.caption(f"⏳ Analizy w tle: {', '.join(pending_analyses)}")
             
             # Pokaż AI Summary jeśli istnieje (NOWE!)
             if summary:
@@ -7526,6 +7729,164 @@ def show_consultations_page():
                         
                         st.info(f"**💡 Rekomendacja:** {summary.get('recommendation', '')}")
 
+def get_partner_messages(partner):
+    """Wiadomości bieżącej rozmowy z partnerem (z session_state)"""
+    return st.session_state.partner_conversations[partner]['messages']
+
+def add_partner_message(partner, msg):
+    st.session_state.partner_conversations[partner]['messages'].append(msg)
+    # Zapisz rozmowy po każdej wiadomości
+    if PERSISTENT_OK:
+        save_persistent_data('partner_conversations.json', st.session_state.partner_conversations)
+
+
+@st.fragment
+@timed("fragment.partners_chat")
+def partners_chat(current_partner, tryb, bypass_cache):
+    """
+    Historia rozmowy + pole czatu jako fragment.
+
+    Wysłanie wiadomości przebudowuje tylko ten fragment - nastrój portfela, alerty,
+    zakładki profili i wag nie są liczone ponownie przy każdej odpowiedzi.
+    """
+    def get_messages():
+        return get_partner_messages(current_partner)
+    
+    def add_message(msg):
+        add_partner_message(current_partner, msg)
+    
+    # Display messages
+    chat_container = st.container()
+    with chat_container:
+        for msg in get_messages():
+            # TEMPORARY FIX: Wyłączamy custom avatary - używamy domyślnych Streamlit
+            # msg_avatar = msg.get("avatar", "🤖")
+            # if not isinstance(msg_avatar, str) or not msg_avatar or len(msg_avatar) > 10:
+            #     msg_avatar = "🤖" if msg["role"] == "assistant" else "👤"
+            
+            with st.chat_message(msg["role"]):  # Bez custom avatara
+                st.markdown(msg["content"])
+                
+                # Wyświetl źródła wiedzy jeśli są
+                if msg["role"] == "assistant" and msg.get("knowledge"):
+                    display_knowledge_sources(msg["knowledge"])
+    
+    # Input area
+    col1, col2 = st.columns([6, 1])
+    
+    with col1:
+        user_input = st.chat_input("Napisz wiadomość do Partnerów...")
+    
+    with col2:
+        if st.button("📎"):
+            st.info("Załączniki wkrótce!")
+    
+    # Handle user input
+    if user_input:
+        # Add user message
+        add_message({
+            "role": "user",
+            "content": user_input,
+            "avatar": "👤"
+        })
+    
+        # Get current portfolio data for context
+        try:
+            stan_spolki, cele = load_portfolio_data()
+        except:
+            stan_spolki, cele = None, None
+    
+        # Generate real AI responses
+        # Pobierz tryb odpowiedzi z session_state (z ustawień) lub z local radio
+        if 'ai_response_mode' in st.session_state:
+            tryb_odpowiedzi = st.session_state.ai_response_mode
+        else:
+            # Fallback na lokalny wybór
+            tryb_map = {
+            "Zwięzły": "zwiezly",
+            "Normalny": "normalny",
+            "Szczegółowy": "szczegolowy"
+            }
+            tryb_odpowiedzi = tryb_map.get(tryb, "normalny")
+    
+        if st.session_state.selected_partner == "Wszyscy":
+            # Response from all partners - jeden za drugim, wyświetlaj na żywo
+            with st.spinner("🤔 Partnerzy rozmawiają..."):
+                for resp in send_to_all_partners(user_input, stan_spolki, cele, tryb_odpowiedzi,
+                                                 bypass_cache=bypass_cache, stream=True):
+                    # Strumień - fragmenty odpowiedzi na żywo, pełny wynik przychodzi w kolejnym elemencie
+                    if resp.get('stream') is not None:
+                        prefix = "**[PRZERWANIE]** " if resp.get('is_interrupting') else ""
+                        with st.chat_message("assistant"):
+                            st.markdown(f"{prefix}**{resp['partner']}**:")
+                            st.write_stream(resp['stream'])
+                        continue
+                    
+                    # Formatuj wiadomość z emoji reakcji i flagą przerywania
+                    sentiment = resp.get('sentiment_emoji', '💬')
+                    is_interrupting = resp.get('is_interrupting', False)
+                    is_voting = resp.get('is_voting_summary', False)
+                    
+                    if is_voting:
+                        # Specjalne formatowanie dla podsumowania głosowania
+                        content = resp['response']
+                    elif is_interrupting:
+                        content = f"{sentiment} **[PRZERWANIE]** **{resp['partner']}**: {resp['response']}"
+                    else:
+                        content = f"{sentiment} **{resp['partner']}**: {resp['response']}"
+                    
+                    # Dodaj do historii
+                    add_message({
+                        "role": "assistant",
+                        "content": content,
+                        "avatar": resp.get('avatar', '🤖'),
+                        "knowledge": resp.get('knowledge', [])
+                    })
+                    
+                    # Wyświetl natychmiast BEZ avatara (TEMPORARY FIX - avatar causing crashes)
+                    # avatar_to_use = resp.get('avatar', '🤖')
+                    # if not isinstance(avatar_to_use, str) or not avatar_to_use:
+                    #     avatar_to_use = '🤖'
+                    
+                    if not resp.get('streamed'):
+                        with st.chat_message("assistant"):  # Bez avatara - Streamlit użyje domyślnego
+                            st.markdown(content)
+        
+        else:
+            # Single partner response - kontekst budowany pod spinnerem, odpowiedź strumieniowana
+            with st.spinner(f"💭 {st.session_state.selected_partner} myśli..."):
+                response_stream, knowledge = send_to_ai_partner(
+                    st.session_state.selected_partner,
+                    user_input,
+                    stan_spolki,
+                    cele,
+                    tryb_odpowiedzi,
+                    bypass_cache=bypass_cache,
+                    stream=True
+                )
+            
+            with st.chat_message("assistant"):
+                st.markdown(f"**{st.session_state.selected_partner}**:")
+                st.write_stream(response_stream)
+            response = response_stream.text
+        
+            avatar = {
+                "Marek": "🎭",
+                "Ania": "🎨", 
+                "Kasia": "📊",
+                "Tomek": "🔥"
+            }.get(st.session_state.selected_partner, "🤖")
+        
+            add_message({
+                "role": "assistant",
+                "content": f"**{st.session_state.selected_partner}**: {response}",
+                "avatar": avatar,
+                "knowledge": knowledge  # Zapisz knowledge
+            })
+
+        rerun_fragment()
+
+
 def show_partners_page():
     """Strona z partnerami"""
     st.title("💬 Chat z Partnerami AI")
@@ -7559,13 +7920,10 @@ def show_partners_page():
     
     # Helper function to get current conversation messages
     def get_messages():
-        return st.session_state.partner_conversations[current_partner]['messages']
+        return get_partner_messages(current_partner)
     
     def add_message(msg):
-        st.session_state.partner_conversations[current_partner]['messages'].append(msg)
-        # Zapisz rozmowy po każdej wiadomości
-        if PERSISTENT_OK:
-            save_persistent_data('partner_conversations.json', st.session_state.partner_conversations)
+        add_partner_message(current_partner, msg)
     
     def clear_messages():
         st.session_state.partner_conversations[current_partner]['messages'] = []
@@ -7768,6 +8126,11 @@ def show_partners_page():
             
             fight_club = st.checkbox("🥊 Fight Club", value=True)
             auto_vote = st.checkbox("🗳️ Auto głosowania", value=False)
+            bypass_cache = st.checkbox(
+                "♻️ Świeża odpowiedź",
+                value=False,
+                help="Pomiń cache odpowiedzi - każde pytanie trafia do modelu AI (płatne wywołanie)"
+            )
         
         # Main chat area
         st.markdown(f"### Rozmowa z: **{st.session_state.selected_partner}**")
@@ -7869,7 +8232,7 @@ def show_partners_page():
                                     response_container = st.empty()
                                     
                                     with st.spinner("🤔 Partnerzy rozmawiają..."):
-                                        for resp in send_to_all_partners(question, stan_spolki, cele, tryb_odpowiedzi):
+                                        for resp in send_to_all_partners(question, stan_spolki, cele, tryb_odpowiedzi, bypass_cache=bypass_cache):
                                             # Formatuj wiadomość z emoji reakcji i flagą przerywania
                                             sentiment = resp.get('sentiment_emoji', '💬')
                                             is_interrupting = resp.get('is_interrupting', False)
@@ -7895,13 +8258,19 @@ def show_partners_page():
                                         with st.chat_message("assistant"):
                                             st.markdown(content)
                                 else:
-                                    response, knowledge = send_to_ai_partner(
+                                    response_stream, knowledge = send_to_ai_partner(
                                         st.session_state.selected_partner,
                                         question,
                                         stan_spolki,
                                         cele,
-                                        tryb_odpowiedzi
+                                        tryb_odpowiedzi,
+                                        bypass_cache=bypass_cache,
+                                        stream=True
                                     )
+                                    with st.chat_message("assistant"):
+                                        st.markdown(f"**{st.session_state.selected_partner}**:")
+                                        st.write_stream(response_stream)
+                                    response = response_stream.text
                                     avatar = "🤖"
                                     if st.session_state.selected_partner in PERSONAS:
                                         color_map = {
@@ -7922,119 +8291,8 @@ def show_partners_page():
             except Exception as e:
                 pass  # Cicho ignoruj błędy sugestii
         
-        # Display messages
-        chat_container = st.container()
-        with chat_container:
-            for msg in get_messages():
-                # TEMPORARY FIX: Wyłączamy custom avatary - używamy domyślnych Streamlit
-                # msg_avatar = msg.get("avatar", "🤖")
-                # if not isinstance(msg_avatar, str) or not msg_avatar or len(msg_avatar) > 10:
-                #     msg_avatar = "🤖" if msg["role"] == "assistant" else "👤"
-                
-                with st.chat_message(msg["role"]):  # Bez custom avatara
-                    st.markdown(msg["content"])
-                    
-                    # Wyświetl źródła wiedzy jeśli są
-                    if msg["role"] == "assistant" and msg.get("knowledge"):
-                        display_knowledge_sources(msg["knowledge"])
-        
-        # Input area
-        col1, col2 = st.columns([6, 1])
-        
-        with col1:
-            user_input = st.chat_input("Napisz wiadomość do Partnerów...")
-        
-        with col2:
-            if st.button("📎"):
-                st.info("Załączniki wkrótce!")
-        
-        # Handle user input
-        if user_input:
-            # Add user message
-            add_message({
-                "role": "user",
-                "content": user_input,
-                "avatar": "👤"
-            })
-        
-            # Get current portfolio data for context
-            try:
-                stan_spolki, cele = load_portfolio_data()
-            except:
-                stan_spolki, cele = None, None
-        
-            # Generate real AI responses
-            # Pobierz tryb odpowiedzi z session_state (z ustawień) lub z local radio
-            if 'ai_response_mode' in st.session_state:
-                tryb_odpowiedzi = st.session_state.ai_response_mode
-            else:
-                # Fallback na lokalny wybór
-                tryb_map = {
-                "Zwięzły": "zwiezly",
-                "Normalny": "normalny",
-                "Szczegółowy": "szczegolowy"
-                }
-                tryb_odpowiedzi = tryb_map.get(tryb, "normalny")
-        
-                if st.session_state.selected_partner == "Wszyscy":
-                    # Response from all partners - jeden za drugim, wyświetlaj na żywo
-                    with st.spinner("🤔 Partnerzy rozmawiają..."):
-                        for resp in send_to_all_partners(user_input, stan_spolki, cele, tryb_odpowiedzi):
-                            # Formatuj wiadomość z emoji reakcji i flagą przerywania
-                            sentiment = resp.get('sentiment_emoji', '💬')
-                            is_interrupting = resp.get('is_interrupting', False)
-                            is_voting = resp.get('is_voting_summary', False)
-                            
-                            if is_voting:
-                                # Specjalne formatowanie dla podsumowania głosowania
-                                content = resp['response']
-                            elif is_interrupting:
-                                content = f"{sentiment} **[PRZERWANIE]** **{resp['partner']}**: {resp['response']}"
-                            else:
-                                content = f"{sentiment} **{resp['partner']}**: {resp['response']}"
-                            
-                            # Dodaj do historii
-                            add_message({
-                                "role": "assistant",
-                                "content": content,
-                                "avatar": resp.get('avatar', '🤖'),
-                                "knowledge": resp.get('knowledge', [])
-                            })
-                            
-                            # Wyświetl natychmiast BEZ avatara (TEMPORARY FIX - avatar causing crashes)
-                            # avatar_to_use = resp.get('avatar', '🤖')
-                            # if not isinstance(avatar_to_use, str) or not avatar_to_use:
-                            #     avatar_to_use = '🤖'
-                            
-                            with st.chat_message("assistant"):  # Bez avatara - Streamlit użyje domyślnego
-                                st.markdown(content)
-                
-                else:
-                    # Single partner response
-                    with st.spinner(f"💭 {st.session_state.selected_partner} myśli..."):
-                        response, knowledge = send_to_ai_partner(
-                            st.session_state.selected_partner,
-                            user_input,
-                            stan_spolki,
-                            cele,
-                            tryb_odpowiedzi
-                        )
-                
-                    avatar = {
-                        "Marek": "🎭",
-                        "Ania": "🎨", 
-                        "Kasia": "📊",
-                        "Tomek": "🔥"
-                    }.get(st.session_state.selected_partner, "🤖")
-                
-                    add_message({
-                        "role": "assistant",
-                        "content": f"**{st.session_state.selected_partner}**: {response}",
-                        "avatar": avatar,
-                        "knowledge": knowledge  # Zapisz knowledge
-                    })
-        
-                st.rerun()
+        # Historia + czat (fragment - odświeża się niezależnie od reszty strony)
+        partners_chat(current_partner, tryb, bypass_cache)
         
         # Special commands
         st.markdown("---")
@@ -8133,6 +8391,14 @@ def show_partners_page():
                     pending = pmm.get_all_pending_decisions()
                     if pending:
                         st.write(f"**{len(pending)} nierozliczonych decyzji:**")
+                        if st.button("⚡ Rozlicz dojrzałe automatycznie", key="batch_audit_btn",
+                                     help=f"Decyzje starsze niż {pmm.AUDIT_MIN_AGE_DAYS} dni - ceny z yfinance jednym zapytaniem"):
+                            with st.spinner("🔍 Rozliczam decyzje..."):
+                                wynik = pmm.audit_pending_decisions()
+                            st.success(f"✓ Rozliczono {wynik['audited']} decyzji "
+                                       f"(za wcześnie: {wynik['not_due']}, brak ceny: {wynik['no_price']})")
+                            if wynik['audited']:
+                                st.rerun()
                         for item in pending[:10]:
                             dec = item["decision"]
                             with st.container():
@@ -8731,7 +8997,13 @@ def show_analytics_page(stan_spolki):
             st.metric("🌊 Zmienność roczna", f"{vol:.2f}%")
             
             ret = metrics.get('total_return_percent', 0)
-            st.metric("💰 Całkowity zwrot", f"{ret:+.2f}%")
+            if metrics.get('flow_adjusted'):
+                st.metric("💰 Całkowity zwrot (TWR)", f"{ret:+.2f}%")
+                st.caption("Bez wpłat, zakupów i kredytów - zmiana wartości netto to nie zwrot")
+                if 'mwr_annual_percent' in metrics:
+                    st.metric("💵 MWR (XIRR, rocznie)", f"{metrics['mwr_annual_percent']:+.2f}%")
+            else:
+                st.metric("💰 Całkowity zwrot", f"{ret:+.2f}%")
             
             beta = metrics.get('beta', 0)
             st.metric("📈 Beta (vs S&P 500)", f"{beta:.3f}")
@@ -13631,7 +13903,8 @@ def show_settings_page():
     """)
     
     # === OSTATNI RAPORT (jeśli istnieje) ===
-    latest_reports = load_weekly_reports(limit=1)
+    # Podgląd z indeksu - treść raportu czytana dopiero po rozwinięciu pełnego raportu
+    total_reports, latest_reports = load_weekly_reports(limit=1)
     if latest_reports:
         latest_report = latest_reports[0]
         
@@ -13641,21 +13914,20 @@ def show_settings_page():
         col_m1, col_m2, col_m3, col_m4 = st.columns(4)
         
         with col_m1:
-            mood_emoji = latest_report.get("mood", {}).get("emoji", "😐")
-            mood_level = latest_report.get("mood", {}).get("level", "neutral")
+            mood_emoji = latest_report.get("mood_emoji", "😐")
+            mood_level = latest_report.get("mood_level", "neutral")
             st.metric("Nastrój", f"{mood_emoji} {mood_level.title()}")
         
         with col_m2:
-            achievements = latest_report.get("achievements", [])
-            st.metric("Osiągnięcia", len(achievements), delta="pozytywne" if achievements else None)
+            achievements = latest_report.get("achievements", 0)
+            st.metric("Osiągnięcia", achievements, delta="pozytywne" if achievements else None)
         
         with col_m3:
-            warnings = latest_report.get("warnings", [])
-            st.metric("Ostrzeżenia", len(warnings), delta="negatywne" if warnings else None)
+            warnings = latest_report.get("warnings", 0)
+            st.metric("Ostrzeżenia", warnings, delta="negatywne" if warnings else None)
         
         with col_m4:
-            actions = latest_report.get("action_items", [])
-            st.metric("Akcje", len(actions))
+            st.metric("Akcje", latest_report.get("action_items", 0))
         
         # Szybki przegląd - najważniejsze informacje
         summary = latest_report.get("summary", "")
@@ -13666,22 +13938,24 @@ def show_settings_page():
         col_preview1, col_preview2 = st.columns(2)
         
         with col_preview1:
-            achievements = latest_report.get("achievements", [])
-            if achievements:
+            top_achievements = latest_report.get("top_achievements", [])
+            if top_achievements:
                 st.markdown("**🎉 Top 3 Osiągnięcia:**")
-                for ach in achievements[:3]:
+                for ach in top_achievements:
                     st.markdown(f"- {ach.get('icon', '✓')} {ach.get('title', 'N/A')}")
         
         with col_preview2:
-            warnings = latest_report.get("warnings", [])
-            if warnings:
+            top_warnings = latest_report.get("top_warnings", [])
+            if top_warnings:
                 st.markdown("**⚠️ Top 3 Ostrzeżenia:**")
-                for warn in warnings[:3]:
+                for warn in top_warnings:
                     st.markdown(f"- {warn.get('icon', '⚠')} {warn.get('title', 'N/A')}")
         
-        # Pełny raport w expanderze
-        with st.expander("📖 Pokaż pełny raport", expanded=False):
-            display_weekly_report(latest_report)
+        # Pełny raport na żądanie
+        if st.toggle("📖 Pokaż pełny raport", key="show_latest_weekly_report"):
+            full_report = load_weekly_report(latest_report["week_key"])
+            if full_report:
+                display_weekly_report(full_report)
         
         st.markdown("---")
     
@@ -13724,48 +13998,72 @@ def show_settings_page():
     # Historia raportów
     st.markdown("**📚 Historia Raportów:**")
     
-    reports = load_weekly_reports(limit=5)
-    
-    if reports:
-        st.caption(f"Znaleziono {len(reports)} ostatnich raportów")
+    if total_reports:
+        total_pages = max(1, -(-total_reports // WEEKLY_REPORTS_PAGE_SIZE))
+        col_info, col_page = st.columns([3, 1])
+        with col_page:
+            page = st.number_input("📄 Strona", min_value=1, max_value=total_pages, value=1, step=1,
+                                   key="weekly_reports_page")
+        with col_info:
+            st.caption(f"Raportów w katalogu: {total_reports} (strona {page}/{total_pages})")
+        
+        _, reports = load_weekly_reports(limit=WEEKLY_REPORTS_PAGE_SIZE,
+                                         offset=(page - 1) * WEEKLY_REPORTS_PAGE_SIZE)
+        
+        for report in reports:
+            twr = report.get("twr_percent")
+            twr_text = f" | TWR {twr:+.2f}%" if twr is not None else ""
+            st.markdown(
+                f"{report.get('mood_emoji', '😐')} **Tydzień {report.get('week_number', '?')}/{report.get('year', '?')}**"
+                f" - {report.get('net_worth') or 0:,.0f} PLN{twr_text}"
+            )
+            st.caption(report.get('summary', 'Brak opisu'))
         
-        for i, report in enumerate(reports):
-            with st.expander(f"📄 Tydzień {report.get('week_number', '?')}/{report.get('year', '?')} - {report.get('summary', 'Brak opisu')[:60]}..."):
-                display_weekly_report(report)
-                
-                col_del1, col_del2, col_del3 = st.columns([2, 1, 1])
-                
-                with col_del2:
-                    if st.button("📥 Eksportuj", key=f"export_report_{i}"):
-                        st.info("Eksport wkrótce!")
-                
-                with col_del3:
-                    if st.button("🗑️ Usuń", key=f"delete_report_{i}"):
-                        try:
-                            reports_folder = Path("weekly_reports")
-                            filepath = reports_folder / report.get("filename", "")
-                            if filepath.exists():
-                                filepath.unlink()
-                                st.success("✅ Raport usunięty")
-                                st.rerun()
-                        except Exception as e:
-                            st.error(f"❌ Błąd usuwania: {e}")
+        # Treść tylko wybranego tygodnia
+        selected_week = st.selectbox(
+            "📄 Otwórz raport",
+            [r["week_key"] for r in reports],
+            key="weekly_report_selected"
+        )
+        if selected_week:
+            report = load_weekly_report(selected_week)
+            if report:
+                with st.expander(f"📄 Tydzień {report.get('week_number', '?')}/{report.get('year', '?')} - {report.get('summary', 'Brak opisu')[:60]}...", expanded=True):
+                    display_weekly_report(report)
+                    
+                    col_del1, col_del2, col_del3 = st.columns([2, 1, 1])
+                    
+                    with col_del2:
+                        if st.button("📥 Eksportuj", key=f"export_report_{selected_week}"):
+                            st.info("Eksport wkrótce!")
+                    
+                    with col_del3:
+                        if st.button("🗑️ Usuń", key=f"delete_report_{selected_week}"):
+                            try:
+                                from weekly_report_catalog import get_report_catalog
+                                if get_report_catalog().delete(selected_week):
+                                    st.success("✅ Raport usunięty")
+                                    st.rerun()
+                            except Exception as e:
+                                st.error(f"❌ Błąd usuwania: {e}")
     else:
         st.info("Brak raportów. Wygeneruj pierwszy raport przyciskiem powyżej!")
     
     # Ustawienia auto-generowania
     with st.expander("⚙️ Ustawienia Auto-generowania"):
-        auto_gen = st.checkbox(
-            "Automatycznie generuj raport w niedzielę",
-            value=False,
-            help="System automatycznie wygeneruje raport w każdą niedzielę o 20:00"
-        )
-        
-        if auto_gen:
-            st.success("✅ Auto-generowanie włączone")
-            st.caption("Raport będzie generowany każdą niedzielę o 20:00")
-        else:
-            st.info("ℹ️ Auto-generowanie wyłączone - generuj ręcznie")
+        st.info("ℹ️ Workflow Daily Snapshot codziennie uzupełnia raporty zakończonych tygodni "
+                "(ze snapshotów i rejestru transakcji) - także tygodnie pominięte")
+        st.caption("Ręcznie: `python weekly_report_catalog.py`")
+        
+        if st.button("🧩 Uzupełnij zaległe tygodnie", key="backfill_weekly_reports"):
+            with st.spinner("📊 Generuję brakujące raporty..."):
+                from weekly_report_catalog import generate_missing_reports
+                generated = generate_missing_reports()
+            if generated:
+                st.success(f"✅ Wygenerowano {len(generated)} raportów: {', '.join(generated)}")
+                st.rerun()
+            else:
+                st.info("✅ Raporty tygodniowe aktualne")
     
     st.markdown("---")
     
@@ -13809,5 +14107,50 @@ def show_settings_page():
     with col3:
         if st.button("❌ Anuluj zmiany", width="stretch"):
             st.rerun()
+    
+    # Ukryta diagnostyka wydajności - dostępna pod ?diag=1
+    if st.query_params.get("diag") == "1":
+        show_diagnostics_section()
+
+def show_diagnostics_section():
+    """Diagnostyka wydajności: statystyki spanów, drzewa ostatnich rerunów, cProfile"""
+    st.markdown("---")
+    st.subheader("🩺 Diagnostyka wydajności")
+    
+    registry = get_timing_registry()
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if st.button("🔬 Profiluj następny rerun (cProfile)", width="stretch", key="perf_profile_btn"):
+            st.session_state.perf_profile_next_run = True
+            st.rerun()
+    with col2:
+        if st.button("🧹 Wyzeruj pomiary", width="stretch", key="perf_reset_btn"):
+            registry.reset()
+            st.rerun()
+    with col3:
+        st.caption("Pomiary są wspólne dla procesu (wszystkie sesje) i nie są zapisywane na dysk.")
+    
+    summary = registry.summary()
+    if summary:
+        st.markdown("**Spany (p50/p95 z ostatnich próbek)**")
+        st.dataframe(pd.DataFrame(summary), width="stretch", hide_index=True)
+    else:
+        st.info("Brak pomiarów - przejdź po kilku stronach aplikacji.")
+    
+    trees = registry.recent_trees()
+    if trees:
+        st.markdown("**Ostatnie reruny**")
+        for entry in reversed(trees[-5:]):
+            with st.expander(f"{entry['at']} · {entry['name']} · {entry['ms']:.0f} ms"):
+                st.code(format_tree(entry['tree']), language=None)
+    
+    if registry.last_profile:
+        with st.expander("📄 Ostatni zrzut cProfile (sortowanie: cumulative)"):
+            st.code(registry.last_profile, language=None)
+
 if __name__ == "__main__":
-    main()
+    # Cały rerun jako span główny; cProfile tylko gdy włączony na stronie diagnostyki
+    with get_timing_registry().run("rerun", profile=st.session_state.get("perf_profile_next_run", False)):
+        st.session_state.perf_profile_next_run = False
+        main()
@@ -7,14 +7,16 @@ Cel: Walidacja integralności danych przed sync do repo
 """
 
 import os
+import glob
 import json
 from datetime import datetime
 from typing import List, Dict, Any
 
-# Kluczowe pliki danych do monitorowania
+# Kluczowe pliki danych do monitorowania (wzorce glob rozwijane przy walidacji)
 DATA_FILES = [
     'persona_memory.json',
-    'autonomous_conversations.json',
+    'autonomous_conversations/index.json',
+    'autonomous_conversations/*.json',  # Rozmowy wskazywane przez indeks (plik na rozmowę)
     'partner_conversations.json',
     'user_preferences.json',
     'wyplaty.json',
@@ -27,9 +29,22 @@ DATA_FILES = [
     'portfolio_history.json',
     'api_usage.json',
     'trading212_cache.json',
-    'advisor_scoring.json'
+    'advisor_scoring.json',
+    'weekly_reports/index.json',
+    'weekly_reports/weekly_report_*.json'  # Raporty wskazywane przez indeks (plik na tydzień)
 ]
 
+def expand_data_files(patterns: List[str]) -> List[str]:
+    """Rozwiń wzorce glob (kolejność zachowana, bez duplikatów)"""
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            path = path.replace(os.sep, '/')
+            if path not in files:
+                files.append(path)
+    return files
+
 def validate_json_file(filepath: str) -> Dict[str, Any]:
     """
     Waliduj plik JSON
@@ -70,14 +85,15 @@ def sync_data():
     print(f"📅 {datetime.now().isoformat()}")
     print("-" * 60)
     
-    total_files = len(DATA_FILES)
+    data_files = expand_data_files(DATA_FILES)
+    total_files = len(data_files)
     valid_files = 0
     missing_files = 0
     invalid_files = 0
     
     results = []
     
-    for filepath in DATA_FILES:
+    for filepath in data_files:
         result = validate_json_file(filepath)
         results.append(result)
         
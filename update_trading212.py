@@ -3,19 +3,98 @@
 Update Trading212 Data
 Pobiera dane z Trading212 API i zapisuje do cache.
 Uruchamiane przez GitHub Actions co 6 godzin.
+
+- trading212_cache.json - gorący cache dla UI (tylko pozycje + gotówka)
+- trading212_instruments.json - metadata instrumentów, odświeżane raz w tygodniu
+- trading212_position_history.jsonl - append-only historia zmian pozycji między syncami
 """
 
 import os
 import json
+import time
 import requests
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 
 # Konfiguracja
 TRADING212_BASE_URL = "https://live.trading212.com/api/v0"
-TRADING212_CACHE_FILE = "trading212_cache.json"
+TRADING212_CACHE_FILE = "trading212_cache.json"  # Gorący cache czytany przez UI - tylko pozycje i gotówka
+INSTRUMENTS_CACHE_FILE = "trading212_instruments.json"  # Metadata instrumentów (duże, rzadko się zmienia)
+INSTRUMENTS_MAX_AGE = timedelta(days=7)
+POSITION_HISTORY_FILE = "trading212_position_history.jsonl"  # Append-only historia zmian pozycji
+
+MAX_RETRIES = 4
+QUANTITY_EPSILON = 1e-8  # Zmiany ilości poniżej tej wartości to szum zaokrągleń
+
+def _retry_delay(response, attempt):
+    """Ile czekać przed ponowieniem - nagłówki limitu Trading212 albo backoff wykładniczy"""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(float(retry_after), 60)
+            except ValueError:
+                pass
+        reset_at = response.headers.get("x-ratelimit-reset")
+        if reset_at:
+            try:
+                return min(max(float(reset_at) - time.time(), 1), 60)
+            except ValueError:
+                pass
+    return min(2 ** attempt, 30)
+
+def _get_json(session, path, timeout=10):
+    """GET z ponawianiem przy 429/5xx i błędach sieci (limity Trading212 są per endpoint)"""
+    for attempt in range(MAX_RETRIES + 1):
+        response = None
+        try:
+            response = session.get(f"{TRADING212_BASE_URL}{path}", timeout=timeout)
+            if response.status_code == 429 or response.status_code >= 500:
+                if attempt == MAX_RETRIES:
+                    response.raise_for_status()
+                delay = _retry_delay(response, attempt)
+                print(f"  ⏳ {path}: HTTP {response.status_code} - ponowienie za {delay:.0f}s")
+                time.sleep(delay)
+                continue
+            response.raise_for_status()
+            return response.json()
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt == MAX_RETRIES:
+                raise
+            delay = _retry_delay(None, attempt)
+            print(f"  ⏳ {path}: błąd sieci - ponowienie za {delay:.0f}s")
+            time.sleep(delay)
+
+def wczytaj_json(path, default=None):
+    """Bezpieczne wczytanie pliku JSON"""
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ Błąd wczytywania {path}: {e}")
+        return default
+
+def zapisz_json(path, data, indent=2):
+    """Atomowy zapis JSON (UI nigdy nie widzi połowy pliku)"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def metadata_wymaga_odswiezenia():
+    """Metadata instrumentów odświeżamy raz w tygodniu"""
+    cache = wczytaj_json(INSTRUMENTS_CACHE_FILE)
+    if not cache or not cache.get("timestamp"):
+        return True
+    try:
+        return datetime.now() - datetime.fromisoformat(cache["timestamp"]) > INSTRUMENTS_MAX_AGE
+    except ValueError:
+        return True
 
 def pobierz_dane_trading212():
-    """Pobiera dane z Trading212 API."""
+    """Pobiera dane z Trading212 API (niezależne endpointy równolegle)."""
     api_key = os.getenv("TRADING212_API_KEY")
     
     if not api_key:
@@ -24,36 +103,45 @@ def pobierz_dane_trading212():
     
     print("📊 Pobieram dane z Trading212 API...")
     
-    headers = {
-        "Authorization": api_key
-    }
+    session = requests.Session()
+    session.headers.update({"Authorization": api_key})
     
     dane_t212 = {}
+    odswiez_metadata = metadata_wymaga_odswiezenia()
     
     try:
-        # 1. Pobierz pozycje w portfelu
-        print("  ↪ Pobieram pozycje...")
-        response = requests.get(
-            f"{TRADING212_BASE_URL}/equity/portfolio",
-            headers=headers,
-            timeout=10
-        )
-        response.raise_for_status()
-        dane_t212["positions"] = response.json()
-        print(f"  ✓ Pobrano {len(dane_t212['positions'])} pozycji")
-        
-        # 2. Pobierz informacje o koncie (saldo gotówkowe)
-        print("  ↪ Pobieram info o koncie...")
-        response = requests.get(
-            f"{TRADING212_BASE_URL}/equity/account/cash",
-            headers=headers,
-            timeout=10
-        )
-        response.raise_for_status()
-        dane_t212["account"] = response.json()
-        cash = dane_t212['account'].get('free', 0)
-        currency = dane_t212['account'].get('currencyCode', 'USD')
-        print(f"  ✓ Saldo: {cash:.2f} {currency}")
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            print("  ↪ Pobieram pozycje i info o koncie...")
+            positions_future = pool.submit(_get_json, session, "/equity/portfolio")
+            cash_future = pool.submit(_get_json, session, "/equity/account/cash")
+            metadata_future = None
+            if odswiez_metadata:
+                print("  ↪ Pobieram metadata instrumentów (cotygodniowe odświeżenie)...")
+                metadata_future = pool.submit(_get_json, session, "/equity/metadata/instruments", 30)
+            
+            # 1. Pozycje w portfelu
+            dane_t212["positions"] = positions_future.result()
+            print(f"  ✓ Pobrano {len(dane_t212['positions'])} pozycji")
+            
+            # 2. Informacje o koncie (saldo gotówkowe)
+            dane_t212["account"] = cash_future.result()
+            cash = dane_t212['account'].get('free', 0)
+            currency = dane_t212['account'].get('currencyCode', 'USD')
+            print(f"  ✓ Saldo: {cash:.2f} {currency}")
+            
+            # 4. Metadata (opcjonalne) - osobny plik, nie trafia do gorącego cache
+            if metadata_future is not None:
+                try:
+                    instruments = metadata_future.result()
+                    zapisz_json(INSTRUMENTS_CACHE_FILE, {
+                        "timestamp": datetime.now().isoformat(),
+                        "instruments": instruments
+                    }, indent=None)
+                    print(f"  ✓ Zapisano metadata {len(instruments)} instrumentów do {INSTRUMENTS_CACHE_FILE}")
+                except Exception as e:
+                    print(f"  ⚠️ Metadata instrumentów niedostępne: {e}")
+            else:
+                print(f"  ℹ️ Metadata instrumentów aktualne ({INSTRUMENTS_CACHE_FILE})")
         
         # 3. Dywidendy - endpoint wymaga specjalnych uprawnień API key
         # Większość kluczy API Trading212 nie ma dostępu do /history/*
@@ -62,20 +150,6 @@ def pobierz_dane_trading212():
         dane_t212["dividends"] = []
         print("  💡 Dywidendy będą kalkulowane w aplikacji na podstawie yfinance")
         
-        
-        # 4. Pobierz metadata (opcjonalne)
-        try:
-            response = requests.get(
-                f"{TRADING212_BASE_URL}/equity/metadata/instruments",
-                headers=headers,
-                timeout=10
-            )
-            if response.status_code == 200:
-                dane_t212["instruments_metadata"] = response.json()
-                print(f"  ✓ Pobrano metadata instrumentów")
-        except:
-            pass
-        
         return dane_t212
         
     except requests.exceptions.HTTPError as e:
@@ -92,20 +166,70 @@ def pobierz_dane_trading212():
         print(f"❌ Błąd pobierania z Trading212 API: {e}")
         return None
 
+def porownaj_pozycje(poprzednie, aktualne):
+    """
+    Różnica pozycji między dwoma syncami
+    
+    Returns:
+        list[dict]: zdarzenia opened / closed / changed
+    """
+    stare = {p.get("ticker"): p for p in poprzednie or [] if isinstance(p, dict)}
+    nowe = {p.get("ticker"): p for p in aktualne or [] if isinstance(p, dict)}
+    zmiany = []
+    
+    for ticker, pos in nowe.items():
+        qty = float(pos.get("quantity") or 0)
+        if ticker not in stare:
+            zmiany.append({"ticker": ticker, "event": "opened", "quantity": qty, "delta": qty,
+                           "price": pos.get("currentPrice"), "avg_price": pos.get("averagePrice")})
+            continue
+        old_qty = float(stare[ticker].get("quantity") or 0)
+        if abs(qty - old_qty) > QUANTITY_EPSILON:
+            zmiany.append({"ticker": ticker, "event": "changed", "quantity": qty, "delta": qty - old_qty,
+                           "price": pos.get("currentPrice"), "avg_price": pos.get("averagePrice")})
+    
+    for ticker, pos in stare.items():
+        if ticker not in nowe:
+            old_qty = float(pos.get("quantity") or 0)
+            zmiany.append({"ticker": ticker, "event": "closed", "quantity": 0.0, "delta": -old_qty,
+                           "price": pos.get("currentPrice"), "avg_price": pos.get("averagePrice")})
+    return zmiany
+
+def dopisz_historie_pozycji(zmiany, timestamp):
+    """Dopisuje zmiany pozycji do append-only historii (jedna linia JSON na sync)"""
+    if not zmiany:
+        return False
+    with open(POSITION_HISTORY_FILE, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({"timestamp": timestamp, "changes": zmiany}, ensure_ascii=False) + "\n")
+    return True
+
 def zapisz_cache(dane):
-    """Zapisuje dane do pliku cache."""
+    """Zapisuje gorący cache (pozycje + gotówka) i dopisuje zmiany pozycji do historii."""
     if not dane:
         print("⚠️ Brak danych do zapisania")
         return False
     
     try:
+        poprzedni = wczytaj_json(TRADING212_CACHE_FILE, {}) or {}
+        timestamp = datetime.now().isoformat()
+        
         cache = {
-            "timestamp": datetime.now().isoformat(),
-            "data": dane
+            "timestamp": timestamp,
+            "data": {
+                "positions": dane.get("positions", []),
+                "account": dane.get("account", {}),
+                "dividends": dane.get("dividends", [])
+            }
         }
         
-        with open(TRADING212_CACHE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(cache, f, indent=2, ensure_ascii=False)
+        # Diff względem poprzedniego syncu -> append-only historia
+        zmiany = porownaj_pozycje(poprzedni.get("data", {}).get("positions", []), cache["data"]["positions"])
+        if dopisz_historie_pozycji(zmiany, timestamp):
+            print(f"✓ Zmiany pozycji: {len(zmiany)} (zapisane w {POSITION_HISTORY_FILE})")
+        else:
+            print("✓ Brak zmian w pozycjach od poprzedniego syncu")
+        
+        zapisz_json(TRADING212_CACHE_FILE, cache)
         
         file_size = os.path.getsize(TRADING212_CACHE_FILE)
         print(f"✓ Cache zapisany: {file_size} bajtów ({file_size/1024:.1f} KB)")
@@ -0,0 +1,309 @@
+"""
+📒 Usage Ledger - rejestr wywołań API w SQLite
+
+- Jeden wiersz na zdarzenie (wywołanie, trafienie cache, pomiar TTFT) z kosztem i latencją
+- Dzienne liczniki per API aktualizowane atomowo (UPSERT w jednej transakcji)
+- Bezpieczny dla wielu wątków (połączenie per wątek) i procesów (WAL + busy_timeout)
+- Historia godzinowa / dzienna bez limitu 30 dni
+"""
+
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+LEDGER_FILE = "api_usage.db"
+BUSY_TIMEOUT_MS = 10000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS api_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts TEXT NOT NULL,
+    day TEXT NOT NULL,
+    hour TEXT NOT NULL,
+    api TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    is_autonomous INTEGER NOT NULL DEFAULT 0,
+    cost_usd REAL NOT NULL DEFAULT 0,
+    latency_ms REAL,
+    ttft_ms REAL,
+    partner TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_api_events_hour ON api_events (hour, api);
+CREATE INDEX IF NOT EXISTS idx_api_events_day ON api_events (day, api);
+
+CREATE TABLE IF NOT EXISTS daily_usage (
+    day TEXT NOT NULL,
+    api TEXT NOT NULL,
+    user_calls INTEGER NOT NULL DEFAULT 0,
+    autonomous_calls INTEGER NOT NULL DEFAULT 0,
+    cache_hits INTEGER NOT NULL DEFAULT 0,
+    cost_usd REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, api)
+);
+
+CREATE TABLE IF NOT EXISTS daily_meta (
+    day TEXT PRIMARY KEY,
+    autonomous_conversations INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Kolumny, po których wolno grupować historię
+_GROUP_COLUMNS = {"hour": "hour", "day": "day"}
+
+
+def _today() -> str:
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+class UsageLedger:
+    """Rejestr wykorzystania API (SQLite, WAL)"""
+
+    def __init__(self, db_path: str = LEDGER_FILE):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._uri = False
+
+        try:
+            self._init_schema()
+        except sqlite3.OperationalError as e:
+            # Streamlit Cloud - read-only filesystem: ledger tylko w pamięci procesu
+            print(f"⚠️ Usage ledger niedostępny na dysku ({e}) - używam bazy w pamięci")
+            self.db_path = "file:api_usage_ledger?mode=memory&cache=shared"
+            self._uri = True
+            self._keepalive = self._connect()
+            self._init_schema()
+
+    # ------------------------------------------------------------------
+    # Połączenia
+    # ------------------------------------------------------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000,
+                               isolation_level=None, uri=self._uri, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        if not self._uri:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Połączenie dla bieżącego wątku"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _init_schema(self):
+        self.conn.executescript(_SCHEMA)
+
+    # ------------------------------------------------------------------
+    # Zapis
+    # ------------------------------------------------------------------
+
+    def _insert_event(self, api: str, kind: str, is_autonomous: bool = False, cost_usd: float = 0.0,
+                      latency_ms: Optional[float] = None, ttft_ms: Optional[float] = None,
+                      partner: Optional[str] = None, day: Optional[str] = None):
+        now = datetime.now()
+        self.conn.execute(
+            "INSERT INTO api_events (ts, day, hour, api, kind, is_autonomous, cost_usd, latency_ms, ttft_ms, partner) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (now.isoformat(timespec="seconds"), day or now.strftime("%Y-%m-%d"), now.strftime("%Y-%m-%d %H:00"),
+             api, kind, int(is_autonomous), cost_usd, latency_ms, ttft_ms, partner)
+        )
+
+    def _increment(self, day: str, api: str, user: int = 0, autonomous: int = 0,
+                   cache_hits: int = 0, cost_usd: float = 0.0):
+        self.conn.execute(
+            "INSERT INTO daily_usage (day, api, user_calls, autonomous_calls, cache_hits, cost_usd) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(day, api) DO UPDATE SET "
+            "user_calls = user_calls + excluded.user_calls, "
+            "autonomous_calls = autonomous_calls + excluded.autonomous_calls, "
+            "cache_hits = cache_hits + excluded.cache_hits, "
+            "cost_usd = cost_usd + excluded.cost_usd",
+            (day, api, user, autonomous, cache_hits, cost_usd)
+        )
+
+    def record_call(self, api: str, is_autonomous: bool = False, cost_usd: float = 0.0,
+                    latency_ms: Optional[float] = None, partner: Optional[str] = None,
+                    autonomous_limit: Optional[int] = None) -> bool:
+        """
+        Zarejestruj wywołanie API (atomowo: sprawdzenie limitu + inkrement)
+
+        Args:
+            autonomous_limit: Jeśli podany i is_autonomous - odmów gdy licznik osiągnął limit
+
+        Returns:
+            bool: False jeśli limit autonomiczny przekroczony (nic nie zapisano)
+        """
+        day = _today()
+        conn = self.conn
+        # BEGIN IMMEDIATE - blokada zapisu od razu, więc sprawdzenie i inkrement
+        # nie przeplatają się z innymi procesami
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if is_autonomous and autonomous_limit is not None:
+                row = conn.execute(
+                    "SELECT autonomous_calls FROM daily_usage WHERE day = ? AND api = ?", (day, api)
+                ).fetchone()
+                if row is not None and row["autonomous_calls"] >= autonomous_limit:
+                    conn.execute("ROLLBACK")
+                    return False
+
+            self._increment(day, api, user=0 if is_autonomous else 1, autonomous=1 if is_autonomous else 0,
+                            cost_usd=cost_usd)
+            self._insert_event(api, "call", is_autonomous, cost_usd, latency_ms=latency_ms,
+                               partner=partner, day=day)
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def record_cache_hit(self, api: str, is_autonomous: bool = False, partner: Optional[str] = None):
+        """Zarejestruj trafienie w cache odpowiedzi (koszt 0)"""
+        day = _today()
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._increment(day, api, cache_hits=1)
+            self._insert_event(api, "cache_hit", is_autonomous, partner=partner, day=day)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def record_latency(self, api: str, ttft_ms: Optional[float] = None, latency_ms: Optional[float] = None,
+                       partner: Optional[str] = None):
+        """Zarejestruj pomiar latencji (np. TTFT strumienia)"""
+        self._insert_event(api, "latency", latency_ms=latency_ms, ttft_ms=ttft_ms, partner=partner)
+
+    def increment_autonomous_conversations(self, count: int = 1):
+        """Zwiększ dzienny licznik autonomicznych rozmów"""
+        self.conn.execute(
+            "INSERT INTO daily_meta (day, autonomous_conversations) VALUES (?, ?) "
+            "ON CONFLICT(day) DO UPDATE SET autonomous_conversations = autonomous_conversations + excluded.autonomous_conversations",
+            (_today(), count)
+        )
+
+    def import_day(self, day: str, usage: Dict[str, Dict[str, Any]], autonomous_conversations: int = 0):
+        """Jednorazowy import liczników z dawnego api_usage.json (bez zdarzeń)"""
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            exists = conn.execute("SELECT 1 FROM daily_usage WHERE day = ? LIMIT 1", (day,)).fetchone()
+            if exists is None:
+                for api, counts in usage.items():
+                    self._increment(day, api, user=counts.get("user", 0), autonomous=counts.get("autonomous", 0),
+                                    cache_hits=counts.get("cache_hits", 0))
+                conn.execute(
+                    "INSERT OR IGNORE INTO daily_meta (day, autonomous_conversations) VALUES (?, ?)",
+                    (day, autonomous_conversations)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # ------------------------------------------------------------------
+    # Odczyt
+    # ------------------------------------------------------------------
+
+    def get_day_usage(self, day: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Liczniki per API dla dnia: {api: {user, autonomous, total, cache_hits, cost_usd}}"""
+        rows = self.conn.execute(
+            "SELECT api, user_calls, autonomous_calls, cache_hits, cost_usd FROM daily_usage WHERE day = ?",
+            (day or _today(),)
+        ).fetchall()
+        return {
+            row["api"]: {
+                "user": row["user_calls"],
+                "autonomous": row["autonomous_calls"],
+                "total": row["user_calls"] + row["autonomous_calls"],
+                "cache_hits": row["cache_hits"],
+                "cost_usd": row["cost_usd"],
+            }
+            for row in rows
+        }
+
+    def get_autonomous_conversations(self, day: Optional[str] = None) -> int:
+        row = self.conn.execute(
+            "SELECT autonomous_conversations FROM daily_meta WHERE day = ?", (day or _today(),)
+        ).fetchone()
+        return row["autonomous_conversations"] if row else 0
+
+    def get_latency_stats(self, day: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Średnie TTFT / latencje per API dla dnia"""
+        rows = self.conn.execute(
+            "SELECT api, COUNT(ttft_ms) AS count, AVG(ttft_ms) AS avg_ttft_ms, AVG(latency_ms) AS avg_latency_ms, "
+            "MAX(CASE WHEN ttft_ms IS NOT NULL THEN id END) AS last_id "
+            "FROM api_events WHERE day = ? AND (ttft_ms IS NOT NULL OR latency_ms IS NOT NULL) GROUP BY api",
+            (day or _today(),)
+        ).fetchall()
+
+        stats = {}
+        for row in rows:
+            last = None
+            if row["last_id"] is not None:
+                last = self.conn.execute("SELECT ttft_ms FROM api_events WHERE id = ?", (row["last_id"],)).fetchone()
+            stats[row["api"]] = {
+                "count": row["count"],
+                "avg_ttft_ms": round(row["avg_ttft_ms"] or 0.0, 1),
+                "last_ttft_ms": round(last["ttft_ms"], 1) if last else 0.0,
+                "avg_latency_ms": round(row["avg_latency_ms"] or 0.0, 1),
+            }
+        return stats
+
+    def get_history(self, since: Optional[str] = None, until: Optional[str] = None, group_by: str = "hour",
+                    api: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Historia wywołań zgrupowana per godzina/dzień i API
+
+        Args:
+            since, until: Granice okresu (ISO, np. "2025-11-01" lub "2025-11-01T12:00")
+            group_by: "hour" lub "day"
+            api: Opcjonalny filtr API
+        """
+        column = _GROUP_COLUMNS.get(group_by)
+        if column is None:
+            raise ValueError(f"Nieobsługiwane grupowanie: {group_by}")
+
+        where, params = [], []
+        if since:
+            where.append("ts >= ?")
+            params.append(since)
+        if until:
+            where.append("ts < ?")
+            params.append(until)
+        if api:
+            where.append("api = ?")
+            params.append(api)
+
+        sql = (
+            f"SELECT {column} AS period, api, "
+            "SUM(kind = 'call' AND is_autonomous = 0) AS user_calls, "
+            "SUM(kind = 'call' AND is_autonomous = 1) AS autonomous_calls, "
+            "SUM(kind = 'cache_hit') AS cache_hits, "
+            "ROUND(SUM(cost_usd), 4) AS cost_usd, "
+            "AVG(latency_ms) AS avg_latency_ms, AVG(ttft_ms) AS avg_ttft_ms "
+            "FROM api_events"
+            + (" WHERE " + " AND ".join(where) if where else "")
+            + f" GROUP BY {column}, api ORDER BY {column}, api"
+        )
+        return [dict(row) for row in self.conn.execute(sql, params).fetchall()]
+
+
+# Singleton instance
+_ledger_instance = None
+_ledger_lock = threading.Lock()
+
+def get_usage_ledger() -> UsageLedger:
+    """Zwróć singleton rejestru wykorzystania API"""
+    global _ledger_instance
+    with _ledger_lock:
+        if _ledger_instance is None:
+            _ledger_instance = UsageLedger()
+    return _ledger_instance
@@ -0,0 +1,507 @@
+"""
+weekly_report_catalog.py
+
+Katalog raportów tygodniowych Portfolio Co-Pilot: jeden plik JSON na tydzień + lekki indeks.
+
+    weekly_reports/
+        index.json                      # tydzień, kluczowe metryki, nazwa pliku (bez treści)
+        weekly_report_2025_W43.json     # pełny raport jednego tygodnia
+
+- lista / podgląd ostatniego raportu czytają tylko indeks (przeładowywany po mtime)
+- treść raportu wczytywana leniwie, dopiero dla wybranego tygodnia
+- generator (python weekly_report_catalog.py) buduje raporty zakończonych tygodni
+  z różnic snapshotów i rejestru transakcji - brakujące tygodnie uzupełnia w jednym
+  przebiegu (jeden odczyt snapshotów i historii, jeden zapis indeksu)
+- przy pierwszym użyciu indeks budowany jest z istniejących plików raportów
+"""
+
+import json
+import os
+import re
+import threading
+from collections import defaultdict
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+REPORTS_DIR = "weekly_reports"
+INDEX_NAME = "index.json"
+INDEX_VERSION = 1
+DAILY_SNAPSHOTS_FILE = "daily_snapshots.json"
+POSITION_HISTORY_FILE = "trading212_position_history.jsonl"
+KRYPTO_FILE = "krypto.json"
+WYPLATY_FILE = "wyplaty.json"
+
+PREVIEW_ITEMS = 3  # Tytuły osiągnięć / ostrzeżeń trzymane w indeksie do podglądu
+_FILENAME_RE = re.compile(r"weekly_report_(\d{4})_W(\d{2})\.json$")
+
+# (próg score, poziom, emoji, opis) - te same progi co analyze_portfolio_mood
+MOOD_LEVELS = [
+    (50, "very_bullish", "🤩", "Świetnie! Portfel rośnie silnie!"),
+    (20, "bullish", "😊", "Dobry momentum, wszystko idzie dobrze"),
+    (-20, "neutral", "😐", "Stabilna sytuacja, bez większych zmian"),
+    (-50, "cautious", "😟", "Ostrożnie, niektóre sygnały ostrzegawcze"),
+    (None, "bearish", "😰", "Trudny okres, wymaga uwagi i działania"),
+]
+
+
+def _write_json_atomic(path: str, data) -> None:
+    """Zapis przez plik tymczasowy + os.replace - czytelnik nigdy nie widzi połowy pliku"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def week_key(year: int, week: int) -> str:
+    """Klucz tygodnia ISO, np. '2025-W43' (sortuje się chronologicznie)"""
+    return f"{int(year)}-W{int(week):02d}"
+
+
+def report_filename(year: int, week: int) -> str:
+    return f"weekly_report_{int(year)}_W{int(week):02d}.json"
+
+
+def report_meta(report: Dict, filename: str) -> Dict:
+    """Metadane raportu trzymane w indeksie (wszystko, czego potrzebuje lista i podgląd)"""
+    stats = report.get("portfolio_stats") or {}
+    mood = report.get("mood") or {}
+    week = report.get("week") or {}
+    return {
+        "week_key": week_key(report.get("year", 0), report.get("week_number", 0)),
+        "year": report.get("year"),
+        "week_number": report.get("week_number"),
+        "date": report.get("date", ""),
+        "filename": filename,
+        "source": report.get("source", "live"),
+        "summary": report.get("summary", ""),
+        "net_worth": stats.get("net_worth"),
+        "stocks_value": stats.get("stocks_value"),
+        "crypto_value": stats.get("crypto_value"),
+        "twr_percent": week.get("twr_percent"),
+        "mood_level": mood.get("level", "neutral"),
+        "mood_emoji": mood.get("emoji", "😐"),
+        "achievements": len(report.get("achievements", [])),
+        "warnings": len(report.get("warnings", [])),
+        "action_items": len(report.get("action_items", [])),
+        "top_achievements": [{"icon": a.get("icon", "✓"), "title": a.get("title", "")}
+                             for a in report.get("achievements", [])[:PREVIEW_ITEMS]],
+        "top_warnings": [{"icon": w.get("icon", "⚠"), "title": w.get("title", "")}
+                         for w in report.get("warnings", [])[:PREVIEW_ITEMS]],
+    }
+
+
+class WeeklyReportCatalog:
+    """Indeksowany katalog raportów tygodniowych (bezpieczny wątkowo w obrębie procesu)"""
+
+    def __init__(self, directory: str = REPORTS_DIR):
+        self.directory = directory
+        self.index_path = os.path.join(directory, INDEX_NAME)
+        self._lock = threading.RLock()
+        self._by_key: Dict[str, Dict] = {}
+        self._keys: List[str] = []  # Rosnąco (najstarszy tydzień pierwszy)
+        self._index_mtime: Optional[float] = None
+        self._load()
+
+    # === INDEKS ===
+
+    def _reset(self, metas: Iterable[Dict]):
+        self._by_key = {m["week_key"]: m for m in metas if m.get("week_key")}
+        self._keys = sorted(self._by_key)
+
+    def _load(self):
+        with self._lock:
+            if os.path.exists(self.index_path):
+                try:
+                    with open(self.index_path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    self._reset(data.get("reports", []))
+                    self._index_mtime = os.path.getmtime(self.index_path)
+                    return
+                except (OSError, json.JSONDecodeError) as e:
+                    print(f"⚠️ Indeks raportów uszkodzony ({e}) - odbudowuję z plików")
+            if os.path.isdir(self.directory):
+                self.rebuild_index()
+            else:
+                self._reset([])
+
+    def _refresh_if_changed(self):
+        """Przeładuj indeks, jeśli zapisał go inny proces (np. git pull po workflow)"""
+        try:
+            mtime = os.path.getmtime(self.index_path)
+        except OSError:
+            return
+        if mtime != self._index_mtime:
+            self._load()
+
+    def _save_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        metas = [self._by_key[key] for key in self._keys]
+        _write_json_atomic(self.index_path, {"version": INDEX_VERSION, "reports": metas})
+        self._index_mtime = os.path.getmtime(self.index_path)
+
+    def rebuild_index(self) -> int:
+        """Odbuduj indeks skanując pliki raportów (np. po ręcznym dodaniu pliku)"""
+        with self._lock:
+            metas = []
+            if os.path.isdir(self.directory):
+                for name in sorted(os.listdir(self.directory)):
+                    if not _FILENAME_RE.match(name):
+                        continue
+                    try:
+                        with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                            metas.append(report_meta(json.load(f), name))
+                    except (OSError, json.JSONDecodeError) as e:
+                        print(f"⚠️ Pomijam uszkodzony raport {name}: {e}")
+            self._reset(metas)
+            self._save_index()
+            return len(metas)
+
+    # === ZAPIS ===
+
+    def _write_report(self, report: Dict) -> Tuple[Dict, Path]:
+        filename = report_filename(report["year"], report["week_number"])
+        path = Path(self.directory) / filename
+        _write_json_atomic(str(path), report)
+        meta = report_meta(report, filename)
+        self._by_key[meta["week_key"]] = meta
+        return meta, path
+
+    def save(self, report: Dict) -> Path:
+        """Zapisz (lub nadpisz) raport tygodnia i zaktualizuj indeks"""
+        return self.save_many([report])[0]
+
+    def save_many(self, reports: List[Dict]) -> List[Path]:
+        """Zapis wielu raportów z jednym zapisem indeksu (uzupełnianie zaległych tygodni)"""
+        with self._lock:
+            self._refresh_if_changed()
+            os.makedirs(self.directory, exist_ok=True)
+            paths = [self._write_report(report)[1] for report in reports]
+            self._keys = sorted(self._by_key)
+            self._save_index()
+        return paths
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            self._refresh_if_changed()
+            meta = self._by_key.pop(key, None)
+            if meta is None:
+                return False
+            try:
+                os.remove(os.path.join(self.directory, meta["filename"]))
+            except OSError:
+                pass
+            self._keys.remove(key)
+            self._save_index()
+            return True
+
+    # === ODCZYT ===
+
+    def __len__(self) -> int:
+        self._refresh_if_changed()
+        return len(self._keys)
+
+    def __contains__(self, key: str) -> bool:
+        self._refresh_if_changed()
+        return key in self._by_key
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Pełny raport tygodnia (wczytywany dopiero teraz)"""
+        self._refresh_if_changed()
+        meta = self._by_key.get(key)
+        if meta is None:
+            return None
+        try:
+            with open(os.path.join(self.directory, meta["filename"]), 'r', encoding='utf-8') as f:
+                report = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Nie można wczytać raportu {key}: {e}")
+            return None
+        report["filename"] = meta["filename"]
+        return report
+
+    def page(self, limit: int = 10, offset: int = 0) -> Tuple[int, List[Dict]]:
+        """
+        Strona metadanych od najnowszego tygodnia
+
+        Returns:
+            (liczba raportów, metadane ze strony)
+        """
+        self._refresh_if_changed()
+        with self._lock:
+            total = len(self._keys)
+            end = total - offset
+            keys = self._keys[max(0, end - limit):max(end, 0)]
+            return total, [self._by_key[key] for key in reversed(keys)]
+
+    def latest(self) -> Optional[Dict]:
+        """Metadane najnowszego raportu"""
+        _, metas = self.page(limit=1)
+        return metas[0] if metas else None
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_report_catalog() -> WeeklyReportCatalog:
+    """Singleton katalogu raportów"""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = WeeklyReportCatalog()
+    return _catalog
+
+
+# === GENERATOR Z SNAPSHOTÓW ===
+
+def _load_json(path: str, default):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return default
+
+
+def _iso_week(value) -> Optional[Tuple[int, int]]:
+    try:
+        day = date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+    iso = day.isocalendar()
+    return iso[0], iso[1]
+
+
+def _week_events(history_path: str = POSITION_HISTORY_FILE, krypto_path: str = KRYPTO_FILE,
+                 wyplaty_path: str = WYPLATY_FILE) -> Dict[str, Dict[str, list]]:
+    """Jeden przebieg po rejestrze: zdarzenia pogrupowane po tygodniu ISO"""
+    events: Dict[str, Dict[str, list]] = defaultdict(lambda: defaultdict(list))
+
+    if os.path.exists(history_path):
+        with open(history_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    wpis = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Urwana ostatnia linia po przerwanym zapisie
+                week = _iso_week(wpis.get('timestamp'))
+                if week is None:
+                    continue
+                for z in wpis.get('changes', []):
+                    if z.get('event') in ('opened', 'closed'):
+                        events[week_key(*week)][z['event']].append(z.get('ticker'))
+
+    for k in _load_json(krypto_path, {}).get('krypto', []):
+        week = _iso_week(k.get('data_dodania'))
+        if week is not None:
+            events[week_key(*week)]['crypto'].append(k.get('symbol'))
+
+    for w in _load_json(wyplaty_path, {}).get('wyplaty', []):
+        week = _iso_week(w.get('data'))
+        if week is not None:
+            events[week_key(*week)]['income'].append(float(w.get('kwota') or 0))
+
+    return events
+
+
+def _snapshot_stats(snap: Dict) -> Dict:
+    stocks = snap.get('stocks') or {}
+    crypto = snap.get('crypto') or {}
+    totals = snap.get('totals') or {}
+    reserve = (snap.get('emergency_fund') or {}).get('current_pln', 0)
+    assets = (totals.get('assets_pln') or 0) + reserve
+    debt = totals.get('debt_pln') or 0
+    return {
+        "net_worth": (totals.get('net_worth_pln') or 0) + reserve,
+        "stocks_value": stocks.get('value_pln') or 0,
+        "crypto_value": crypto.get('value_pln') or 0,
+        "cash_reserve": reserve,
+        "debt": debt,
+        "leverage_ratio": (debt / assets * 100) if assets > 0 else 0,
+        "total_positions": stocks.get('positions') or 0,
+    }
+
+
+def _mood(score: int) -> Dict:
+    for threshold, level, emoji, description in MOOD_LEVELS:
+        if threshold is None or score >= threshold:
+            return {"level": level, "emoji": emoji, "description": description, "score": score}
+
+
+def build_weekly_report(year: int, week: int, end_snap: Dict, prev_snap: Optional[Dict],
+                        events: Dict[str, list], twr: Optional[float], snapshot_count: int = 1) -> Dict:
+    """
+    Raport tygodnia z różnicy snapshotów (koniec tygodnia vs koniec poprzedniego)
+    i zdarzeń z rejestru - ta sama struktura co generate_weekly_report
+
+    Args:
+        twr: zwrot TWR tygodnia (0.01 = 1%) z silnika zwrotów albo None
+    """
+    stats = _snapshot_stats(end_snap)
+    prev = _snapshot_stats(prev_snap) if prev_snap else None
+    twr_percent = round(twr * 100, 2) if twr is not None else None
+    net_change = stats["net_worth"] - prev["net_worth"] if prev else None
+
+    achievements, warnings, action_items = [], [], []
+    score = 0
+
+    if twr_percent is not None:
+        if twr_percent >= 3:
+            score += 40
+            achievements.append({"type": "strong_week", "icon": "🎉", "title": "Świetny tydzień!",
+                                 "description": f"Zwrot tygodnia (TWR): +{twr_percent:.2f}%"})
+        elif twr_percent >= 1:
+            score += 20
+            achievements.append({"type": "good_week", "icon": "📈", "title": "Dobry tydzień",
+                                 "description": f"Zwrot tygodnia (TWR): +{twr_percent:.2f}%"})
+        elif twr_percent <= -3:
+            score -= 40
+            warnings.append({"type": "weak_week", "icon": "📉", "title": "Portfel spada",
+                             "description": f"Zwrot tygodnia (TWR): {twr_percent:.2f}%",
+                             "action": "Sprawdź, które pozycje ciągną wynik w dół"})
+        elif twr_percent <= -1:
+            score -= 20
+            warnings.append({"type": "soft_week", "icon": "⚠️", "title": "Lekkie spadki",
+                             "description": f"Zwrot tygodnia (TWR): {twr_percent:.2f}%",
+                             "action": ""})
+
+    leverage = stats["leverage_ratio"]
+    if leverage > 50:
+        score -= 30
+        warnings.append({"type": "high_leverage", "icon": "🔴", "title": "WYSOKI leverage",
+                         "description": f"Dźwignia {leverage:.1f}%",
+                         "action": "Priorytet: spłata zobowiązań"})
+    elif leverage > 30:
+        score -= 15
+    elif 0 < leverage < 25:
+        score += 10
+        achievements.append({"type": "low_leverage", "icon": "🛡", "title": "Konserwatywny poziom dźwigni",
+                             "description": f"Dźwignia {leverage:.1f}% - bezpieczny poziom ryzyka"})
+
+    if prev and stats["debt"] < prev["debt"]:
+        achievements.append({"type": "debt_reduced", "icon": "💪", "title": "Spłata zobowiązań",
+                             "description": f"Dług spadł o {prev['debt'] - stats['debt']:,.0f} PLN w tym tygodniu"})
+    elif prev and stats["debt"] > prev["debt"]:
+        warnings.append({"type": "debt_increased", "icon": "💳", "title": "Nowe zobowiązanie",
+                         "description": f"Dług wzrósł o {stats['debt'] - prev['debt']:,.0f} PLN",
+                         "action": "Upewnij się, że rata mieści się w budżecie"})
+
+    if stats["net_worth"] > 50000:
+        score += 20
+        achievements.append({"type": "net_worth_milestone", "icon": "💰", "title": "Świetna wartość portfela",
+                             "description": f"Wartość netto: {stats['net_worth']:,.0f} PLN"})
+    elif stats["net_worth"] < 0:
+        score -= 50
+
+    opened, closed = events.get('opened', []), events.get('closed', [])
+    if opened or closed:
+        parts = []
+        if opened:
+            parts.append(f"nowe: {', '.join(opened[:5])}")
+        if closed:
+            parts.append(f"zamknięte: {', '.join(closed[:5])}")
+        action_items.append({"priority": "low", "icon": "🔍", "title": "Przejrzyj zmiany pozycji",
+                             "description": f"W tym tygodniu {'; '.join(parts)} - czy teza inwestycyjna się trzyma?"})
+    if events.get('crypto'):
+        action_items.append({"priority": "low", "icon": "💎", "title": "Nowe zakupy krypto",
+                             "description": f"Dodano: {', '.join(events['crypto'][:5])}"})
+    income = sum(events.get('income', []))
+    if income > 0:
+        action_items.append({"priority": "medium", "icon": "💵", "title": "Wpływ wypłaty",
+                             "description": f"{income:,.0f} PLN wpłynęło w tym tygodniu - zaplanuj alokację"})
+
+    mood = _mood(score)
+    summary_parts = [f"Wartość netto: {stats['net_worth']:,.0f} PLN"]
+    if twr_percent is not None:
+        summary_parts.append(f"TWR tygodnia: {twr_percent:+.2f}%")
+    summary_parts.append(f"Nastrój: {mood['description']}")
+    if achievements:
+        summary_parts.append(f"{len(achievements)} osiągnięć")
+    if warnings:
+        summary_parts.append(f"{len(warnings)} ostrzeżeń")
+    if action_items:
+        summary_parts.append(f"{len(action_items)} rekomendacji")
+
+    return {
+        "date": end_snap.get('date', "").replace(" ", "T"),
+        "week_number": week,
+        "year": year,
+        "source": "snapshots",
+        "portfolio_stats": stats,
+        "week": {
+            "start": date.fromisocalendar(year, week, 1).isoformat(),
+            "end": date.fromisocalendar(year, week, 7).isoformat(),
+            "twr_percent": twr_percent,
+            "net_worth_change": round(net_change, 2) if net_change is not None else None,
+            "snapshots": snapshot_count,
+        },
+        "mood": mood,
+        "achievements": achievements,
+        "warnings": warnings,
+        "action_items": action_items,
+        "summary": " | ".join(summary_parts),
+    }
+
+
+def generate_missing_reports(catalog: Optional[WeeklyReportCatalog] = None, today: Optional[date] = None,
+                             snapshots_path: str = DAILY_SNAPSHOTS_FILE) -> List[str]:
+    """
+    Raporty dla zakończonych tygodni, których jeszcze nie ma w katalogu
+
+    Jeden przebieg: snapshoty i rejestr czytane raz, raporty zapisane razem z jednym
+    zapisem indeksu. Tygodnie bez snapshotu są pomijane.
+
+    Returns:
+        Klucze wygenerowanych tygodni
+    """
+    if catalog is None:
+        catalog = get_report_catalog()
+    today = today or date.today()
+    current_week = week_key(*today.isocalendar()[:2])
+
+    by_week: Dict[str, List[Dict]] = defaultdict(list)
+    for snap in sorted(_load_json(snapshots_path, []), key=lambda s: s.get('date', "")):
+        week = _iso_week(snap.get('date_only') or snap.get('date'))
+        if week is not None:
+            by_week[week_key(*week)].append(snap)
+
+    keys = sorted(by_week)
+    missing = [key for key in keys if key < current_week and key not in catalog]
+    if not missing:
+        return []
+
+    try:
+        from performance_engine import get_performance_engine
+        engine = get_performance_engine()
+    except ImportError:
+        engine = None
+
+    events = _week_events()
+    position = {key: i for i, key in enumerate(keys)}
+    reports = []
+    for key in missing:
+        year, week = int(key[:4]), int(key[6:])
+        week_snaps = by_week[key]
+        pos = position[key]
+        prev_snap = by_week[keys[pos - 1]][-1] if pos > 0 else None
+        twr = None
+        if engine is not None:
+            start = prev_snap['date'] if prev_snap else week_snaps[0]['date']
+            twr = engine.twr("total", start=start, end=week_snaps[-1]['date'])
+        reports.append(build_weekly_report(year, week, week_snaps[-1], prev_snap, events.get(key, {}), twr,
+                                           snapshot_count=len(week_snaps)))
+
+    catalog.save_many(reports)
+    return missing
+
+
+if __name__ == "__main__":
+    generated = generate_missing_reports()
+    if generated:
+        print(f"📊 Wygenerowano {len(generated)} raportów tygodniowych: {', '.join(generated)}")
+    else:
+        print("✅ Raporty tygodniowe aktualne - brak zaległych tygodni")